@@ -1,114 +1,293 @@
 import os
-import spacy
-from flask import Flask
+import json
+from flask import Flask, Response, request
 from flask_restx import Api, Resource, fields
 from werkzeug.middleware.proxy_fix import ProxyFix
-from openai import AzureOpenAI
 from dotenv import load_dotenv 
+from response_cache import ResponseCache
+from local_ner import LocalNER, refine_messages, parse_refined
+from map_reduce_summary import MapReduceSummarizer, REDUCE_SYSTEM_PROMPT, split_segments
+from neuradocs.lazy_resource import LazyResource, warm_up, readiness
+from neuradocs.metrics import registry, instrument_flask, cache_metrics, gateway_metrics, CONTENT_TYPE
 
 # Load environment variables
 load_dotenv()
 
 app = Flask(__name__)
 app.wsgi_app = ProxyFix(app.wsgi_app)
+instrument_flask(app)  # Request latency histograms and, with TRACE_IDS, per-request trace IDs
 
 api = Api(app, version='1.0', title='Simple API', description='A simple API with Flask-RESTx')
-nlp = spacy.load("en_core_web_sm")
 
 ns_query = api.namespace('query', description='Query operations')
 ns_summary = api.namespace('summary', description='Summarizer')
 ns_sentiment = api.namespace('sentiment', description='Sentiment analysis')
 ns_ner = api.namespace('NER', description='Named Entity Recognition')
+ns_gateway = api.namespace('gateway', description='LLM gateway metrics')
+ns_cache = api.namespace('cache', description='Response cache')
 
-query_model = api.model('Query', {'query': fields.String(required=True, description='User query')})
-summary_model = api.model('Summary', {'text': fields.String(required=True, description='Text to summarize')})
-sentiment_model = api.model('Sentiment', {'text': fields.String(required=True, description='Text for sentiment analysis')})
-ner_model = api.model('NER', {'text': fields.String(required=True, description='Text for named entity recognition')})
+
+stream_field = fields.Boolean(default=False, description='Stream tokens as server-sent events')
+query_model = api.model('Query', {'query': fields.String(required=True, description='User query'), 'stream': stream_field})
+summary_model = api.model('Summary', {
+    'text': fields.String(required=True, description='Text to summarize'), 'stream': stream_field,
+    'mode': fields.String(enum=['single', 'map_reduce'], description="'single' (one prompt) or 'map_reduce' (texts longer than one segment are summarised in segments, then merged); defaults to SUMMARY_MODE")})
+sentiment_model = api.model('Sentiment', {'text': fields.String(required=True, description='Text for sentiment analysis'), 'stream': stream_field})
+ner_model = api.model('NER', {
+    'text': fields.String(required=True, description='Text for named entity recognition'), 'stream': stream_field,
+    'mode': fields.String(enum=['llm', 'local'], description="'llm' (free-text answer) or 'local' (spaCy spans); defaults to NER_MODE"),
+    'refine': fields.Boolean(default=False, description='Local mode: let the LLM correct the spaCy entities')})
+ner_bulk_model = api.model('NERBulk', {'texts': fields.List(fields.String, required=True, description='Texts for local named entity recognition')})
 
 # Function to fetch environment variables with defaults
 def get_env_var(var_name, default_value, cast_type):
     value = os.getenv(var_name, default_value)
     return cast_type(value)
 
-def get_openai_response(system_prompt, user_prompt, max_tokens, temperature):
-    endpoint = os.getenv("ENDPOINT_URL", "")  
-    deployment = os.getenv("DEPLOYMENT_NAME", "gpt-35-turbo")  
-    subscription_key = os.getenv("AZURE_OPENAI_API_KEY", "")  
-    
-    client = AzureOpenAI(
-        azure_endpoint=endpoint,  
-        api_key=subscription_key,  
-        api_version="2024-05-01-preview",
+# Summary/sentiment/NER responses for resubmitted texts (memory LRU + optional SQLite tier)
+response_cache = ResponseCache(
+    max_entries=get_env_var("RESPONSE_CACHE_SIZE", 1024, int),
+    path=os.getenv("RESPONSE_CACHE_PATH") or None,  # Unset keeps the cache in memory only
+    ttl=get_env_var("RESPONSE_CACHE_TTL", 86400, int),
+    max_temperature=get_env_var("RESPONSE_CACHE_MAX_TEMPERATURE", 0.5, float)  # Higher temperatures bypass the cache
+)
+
+def load_gateway():
+    # One pooled, rate-limited client for the whole process (LLM_RPM / LLM_TPM / LLM_MAX_RETRIES / LLM_TIMEOUT)
+    from neuradocs.llm_gateway import LLMGateway
+    return LLMGateway.from_env()
+
+def load_local_ner():
+    # spaCy entity spans for mode=local and /NER/bulk
+    import spacy
+    return LocalNER(
+        spacy.load("en_core_web_sm"),
+        batch_size=get_env_var("NER_BATCH_SIZE", 64, int),
+        n_process=get_env_var("NER_N_PROCESS", 1, int)  # Worker processes for large /NER/bulk requests
     )
+
+# Heavy resources are built on first use, or in the background right after startup (WARM_UP), behind /ready
+gateway = LazyResource("openai", load_gateway)
+local_ner = LazyResource("spacy", load_local_ner)
+resources = [gateway, local_ner]
+if os.getenv("WARM_UP", "true").lower() == "true":
+    warm_up(resources)
+
+@registry.collector
+def collect_metrics():
+    # Response cache hits and LLM token/retry counters, read when /metrics is scraped
+    return cache_metrics("response", response_cache.stats()) + gateway_metrics(gateway)
+
+def wants_stream():
+    """Streaming is requested with `"stream": true` in the body or `?stream=true`."""
+    return bool(api.payload.get("stream")) or request.args.get("stream", "").lower() == "true"
+
+def sse_response(deltas, result_key, on_complete=None):
+    """Relay text deltas as server-sent events; the final `done` event carries the full text under `result_key`."""
+    def events():
+        parts = []
+        try:
+            for delta in deltas:
+                parts.append(delta)
+                yield f"data: {json.dumps({'delta': delta})}\n\n"
+        except Exception as e:
+            yield f"event: error\ndata: {json.dumps({'message': str(e)})}\n\n"
+            return
+        text = ''.join(parts)
+        if on_complete:
+            on_complete(text)
+        yield f"event: done\ndata: {json.dumps({result_key: text})}\n\n"
+
+    return Response(events(), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+def get_openai_response(system_prompt, user_prompt, max_tokens, temperature, stream=False, name="chat"):
+    """Return the completion text, or with `stream=True` a generator of text deltas as they arrive."""
+    deployment = os.getenv("DEPLOYMENT_NAME", "gpt-35-turbo")  
     
     chat_prompt = [
         {"role": "system", "content": system_prompt},
         {"role": "user", "content": user_prompt}
     ]
     
-    completion = client.chat.completions.create(
-        model=deployment,
-        messages=chat_prompt,
+    completion = gateway.chat(
+        chat_prompt,
+        deployment,
+        name=name,
         max_tokens=max_tokens,
         temperature=temperature,
         top_p=0.9,
         frequency_penalty=0,
-        presence_penalty=0
+        presence_penalty=0,
+        stream=stream
     )
-    
+
+    if stream:
+        # Azure sends a first chunk without choices (prompt filter results)
+        return (chunk.choices[0].delta.content for chunk in completion
+                if chunk.choices and chunk.choices[0].delta.content)
     return completion.choices[0].message.content
 
+def respond(result_key, system_prompt, user_prompt, max_tokens, temperature, cache_text=None):
+    """JSON `{result_key: text}`, or an SSE token stream when the client asked for one.
+
+    With `cache_text` (the submitted text), the response is served from and stored in the response cache.
+    """
+    key = None
+    if cache_text is not None and response_cache.cacheable(temperature):
+        deployment = os.getenv("DEPLOYMENT_NAME", "gpt-35-turbo")
+        key = response_cache.key(result_key, system_prompt, cache_text, deployment, max_tokens, temperature)
+        cached = response_cache.get(key)
+        if cached is not None:
+            return sse_response([cached], result_key) if wants_stream() else {result_key: cached}
+
+    if wants_stream():
+        deltas = get_openai_response(system_prompt, user_prompt, max_tokens, temperature, stream=True, name=result_key)
+        return sse_response(deltas, result_key, on_complete=(lambda text: response_cache.put(key, text)) if key else None)
+    response = get_openai_response(system_prompt, user_prompt, max_tokens, temperature, name=result_key)
+    if key:
+        response_cache.put(key, response)
+    return {result_key: response}
+
+# Long documents: segments summarised concurrently, then merged in a tree; segment summaries are cached
+summarizer = MapReduceSummarizer(
+    get_openai_response,
+    response_cache,
+    os.getenv("DEPLOYMENT_NAME", "gpt-35-turbo"),
+    segment_tokens=get_env_var("SUMMARY_SEGMENT_TOKENS", 3000, int),
+    fan_in=get_env_var("SUMMARY_FAN_IN", 4, int),  # Partial summaries merged per reduce call
+    max_tokens=get_env_var("SUMMARY_SEGMENT_MAX_TOKENS", 300, int),
+    temperature=get_env_var("SUMMARY_TEMPERATURE", 0.5, float),
+    max_workers=get_env_var("SUMMARY_CONCURRENCY", 8, int)
+)
+
+def local_entities(text, refine=False):
+    """spaCy entity spans, optionally corrected by the LLM (the spaCy spans stand if its answer is unusable)."""
+    spans = local_ner.extract(text)
+    if not refine:
+        return {"entities": spans, "source": "spacy"}
+    completion = gateway.chat(
+        refine_messages(text, spans),
+        os.getenv("DEPLOYMENT_NAME", "gpt-35-turbo"),
+        name="entities_refine",
+        max_tokens=get_env_var("NER_MAX_TOKENS", 500, int),
+        temperature=0
+    )
+    refined = parse_refined(text, completion.choices[0].message.content)
+    if refined is None:
+        return {"entities": spans, "source": "spacy"}
+    return {"entities": refined, "source": "spacy+llm"}
+
 @ns_query.route('/')
 class QueryResource(Resource):
     @api.expect(query_model)
     def post(self):
         user_query = api.payload.get("query", "").lower()
-        response = get_openai_response(
+        return respond(
+            "response",
             "You are an AI assistant that helps people find information in Computer Science.", 
             user_query, 
             max_tokens=get_env_var("QUERY_MAX_TOKENS", 800, int), 
             temperature=get_env_var("QUERY_TEMPERATURE", 0.21, float)
         )
-        return {"response": response}
 
 @ns_summary.route('/')
 class Summarizer(Resource):
     @api.expect(summary_model)
     def post(self):
         text_to_summarize = api.payload.get("text", "")
-        response = get_openai_response(
+        mode = (api.payload.get("mode") or os.getenv("SUMMARY_MODE", "map_reduce")).lower()
+        if mode not in ("single", "map_reduce"):
+            return {"message": "mode must be 'single' or 'map_reduce'"}, 400
+        segments = split_segments(text_to_summarize, summarizer.segment_tokens) if mode == "map_reduce" else []
+        if len(segments) > 1:
+            # The final merge goes through respond(), so it streams and is cached like a single-prompt summary
+            partials = summarizer.reduce(segments)
+            return respond(
+                "summary",
+                REDUCE_SYSTEM_PROMPT,
+                partials,
+                max_tokens=get_env_var("SUMMARY_MAX_TOKENS", 200, int),
+                temperature=get_env_var("SUMMARY_TEMPERATURE", 0.5, float),
+                cache_text=partials
+            )
+        return respond(
+            "summary",
             "You are an advanced AI summarizer. Generate a concise summary while preserving key points.", 
             f"Summarize the following text: {text_to_summarize}", 
             max_tokens=get_env_var("SUMMARY_MAX_TOKENS", 200, int), 
-            temperature=get_env_var("SUMMARY_TEMPERATURE", 0.5, float)
+            temperature=get_env_var("SUMMARY_TEMPERATURE", 0.5, float),
+            cache_text=text_to_summarize
         )
-        return {"summary": response}
 
 @ns_sentiment.route('/')
 class SentimentResource(Resource):
     @api.expect(sentiment_model)
     def post(self):
         text_to_analyze = api.payload.get("text", "")
-        response = get_openai_response(
+        return respond(
+            "sentiment",
             "You are an AI that performs sentiment analysis. Identify whether the sentiment is Positive, Negative, or Neutral and explain briefly.", 
             f"Analyze the sentiment of the following text: {text_to_analyze}", 
             max_tokens=get_env_var("SENTIMENT_MAX_TOKENS", 800, int), 
-            temperature=get_env_var("SENTIMENT_TEMPERATURE", 0.34, float)
+            temperature=get_env_var("SENTIMENT_TEMPERATURE", 0.34, float),
+            cache_text=text_to_analyze
         )
-        return {"sentiment": response}
 
 @ns_ner.route('/')
 class NERResource(Resource):
     @api.expect(ner_model)
     def post(self):
         text_to_analyze = api.payload.get("text", "")
-        response = get_openai_response(
+        mode = (api.payload.get("mode") or os.getenv("NER_MODE", "llm")).lower()
+        if mode == "local":
+            return local_entities(text_to_analyze, refine=bool(api.payload.get("refine")))
+        if mode != "llm":
+            return {"message": "mode must be 'llm' or 'local'"}, 400
+        return respond(
+            "entities",
             "You are an AI trained to extract named entities from text. Identify persons, organizations, locations, dates, and other important entities.", 
             f"Extract named entities from the following text:\n\n{text_to_analyze}", 
             max_tokens=get_env_var("NER_MAX_TOKENS", 500, int), 
-            temperature=get_env_var("NER_TEMPERATURE", 0.3, float)
+            temperature=get_env_var("NER_TEMPERATURE", 0.3, float),
+            cache_text=text_to_analyze
         )
-        return {"entities": response}
+
+@ns_ner.route('/bulk')
+class NERBulkResource(Resource):
+    @api.expect(ner_bulk_model)
+    def post(self):
+        """spaCy entity spans for many texts in one call (batched nlp.pipe)."""
+        texts = api.payload.get("texts")
+        if not isinstance(texts, list) or not texts or not all(isinstance(text, str) for text in texts):
+            return {"message": "texts must be a non-empty list of strings"}, 400
+        if len(texts) > get_env_var("NER_BULK_MAX_TEXTS", 10000, int):
+            return {"message": "Too many texts in one request"}, 400
+        return {"entities": local_ner.extract_many(texts)}
+
+@api.route('/ready')
+class ReadinessResource(Resource):
+    def get(self):
+        """200 once the OpenAI client and spaCy pipeline are loaded, 503 (with per-resource status) until then."""
+        return readiness(resources)
+
+@ns_gateway.route('/stats')
+class GatewayStatsResource(Resource):
+    def get(self):
+        """Per-endpoint LLM call counts, token usage, retries, throttling and latency percentiles."""
+        return gateway.stats()
+
+@ns_cache.route('/stats')
+class ResponseCacheStatsResource(Resource):
+    def get(self):
+        """Hit/miss/bypass counts of the summary, sentiment and NER response cache."""
+        return response_cache.stats()
+
+@api.route('/metrics')
+class MetricsResource(Resource):
+    def get(self):
+        """Prometheus metrics: LLM latency histogram, per-route latencies, token/retry counters and cache hits."""
+        return Response(registry.render(), content_type=CONTENT_TYPE)
 
 if __name__ == '__main__':
     app.run(debug=True, use_reloader=False)
@@ -0,0 +1,307 @@
+import os
+import json
+from starlette.applications import Starlette
+from starlette.concurrency import run_in_threadpool
+from starlette.exceptions import HTTPException
+from starlette.responses import JSONResponse, StreamingResponse, Response
+from starlette.routing import Route
+from dotenv import load_dotenv
+from response_cache import ResponseCache
+from local_ner import LocalNER, refine_messages, parse_refined
+from map_reduce_summary import AsyncMapReduceSummarizer, REDUCE_SYSTEM_PROMPT, split_segments
+from neuradocs.lazy_resource import LazyResource, warm_up, readiness
+from neuradocs.metrics import registry, log, cache_metrics, gateway_metrics, ASGIMetricsMiddleware, CONTENT_TYPE
+
+# Async (ASGI) serving mode of CleanAPI: same routes, request bodies and responses.
+# Run with: uvicorn CleanAPI_async:app --host 0.0.0.0 --port 5000
+
+# Load environment variables
+load_dotenv()
+
+# Function to fetch environment variables with defaults
+def get_env_var(var_name, default_value, cast_type):
+    value = os.getenv(var_name, default_value)
+    return cast_type(value)
+
+# Summary/sentiment/NER responses for resubmitted texts (memory LRU + optional SQLite tier)
+response_cache = ResponseCache(
+    max_entries=get_env_var("RESPONSE_CACHE_SIZE", 1024, int),
+    path=os.getenv("RESPONSE_CACHE_PATH") or None,  # Unset keeps the cache in memory only
+    ttl=get_env_var("RESPONSE_CACHE_TTL", 86400, int),
+    max_temperature=get_env_var("RESPONSE_CACHE_MAX_TEMPERATURE", 0.5, float)  # Higher temperatures bypass the cache
+)
+
+def load_gateway():
+    # One pooled AsyncAzureOpenAI client; requests wait on the event loop, not on worker threads
+    from neuradocs.llm_gateway import AsyncLLMGateway
+    return AsyncLLMGateway.from_env()
+
+def load_local_ner():
+    # spaCy entity spans for mode=local and /NER/bulk (run in the thread pool, off the event loop)
+    import spacy
+    return LocalNER(
+        spacy.load("en_core_web_sm"),
+        batch_size=get_env_var("NER_BATCH_SIZE", 64, int),
+        n_process=get_env_var("NER_N_PROCESS", 1, int)  # Worker processes for large /NER/bulk requests
+    )
+
+# Heavy resources are built on first use, or in the background right after startup (WARM_UP), behind /ready
+gateway = LazyResource("openai", load_gateway)
+local_ner = LazyResource("spacy", load_local_ner)
+resources = [gateway, local_ner]
+if os.getenv("WARM_UP", "true").lower() == "true":
+    warm_up(resources)
+
+@registry.collector
+def collect_metrics():
+    # Response cache hits and LLM token/retry counters, read when /metrics is scraped
+    return cache_metrics("response", response_cache.stats()) + gateway_metrics(gateway)
+
+async def read_payload(request):
+    try:
+        payload = await request.json()
+    except ValueError:
+        raise HTTPException(400, "Failed to decode JSON object")
+    if not isinstance(payload, dict):
+        raise HTTPException(400, "Request body must be a JSON object")
+    return payload
+
+def wants_stream(request, payload):
+    """Streaming is requested with `"stream": true` in the body or `?stream=true`."""
+    return bool(payload.get("stream")) or request.query_params.get("stream", "").lower() == "true"
+
+def sse_response(deltas, result_key, on_complete=None):
+    """Relay text deltas as server-sent events; the final `done` event carries the full text under `result_key`."""
+    async def events():
+        parts = []
+        try:
+            async for delta in deltas:
+                parts.append(delta)
+                yield f"data: {json.dumps({'delta': delta})}\n\n"
+        except Exception as e:
+            yield f"event: error\ndata: {json.dumps({'message': str(e)})}\n\n"
+            return
+        text = ''.join(parts)
+        if on_complete:
+            await run_in_threadpool(on_complete, text)
+        yield f"event: done\ndata: {json.dumps({result_key: text})}\n\n"
+
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+async def get_openai_response(system_prompt, user_prompt, max_tokens, temperature, stream=False, name="chat"):
+    """Return the completion text, or with `stream=True` an async generator of text deltas."""
+    deployment = os.getenv("DEPLOYMENT_NAME", "gpt-35-turbo")
+
+    chat_prompt = [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": user_prompt}
+    ]
+
+    client = await gateway.get_async()  # Waits for warm-up in a worker thread, not on the event loop
+    completion = await client.chat(
+        chat_prompt,
+        deployment,
+        name=name,
+        max_tokens=max_tokens,
+        temperature=temperature,
+        top_p=0.9,
+        frequency_penalty=0,
+        presence_penalty=0,
+        stream=stream
+    )
+
+    if stream:
+        async def deltas():
+            async with completion:  # Closes the upstream stream even if the client goes away mid-answer
+                # Azure sends a first chunk without choices (prompt filter results)
+                async for chunk in completion:
+                    if chunk.choices and chunk.choices[0].delta.content:
+                        yield chunk.choices[0].delta.content
+        return deltas()
+    return completion.choices[0].message.content
+
+async def single_delta(text):
+    yield text
+
+async def respond(request, payload, result_key, system_prompt, user_prompt, max_tokens, temperature, cache_text=None):
+    """JSON `{result_key: text}`, or an SSE token stream when the client asked for one.
+
+    With `cache_text` (the submitted text), the response is served from and stored in the response cache.
+    Cache calls may hit SQLite, so they run in the thread pool rather than on the event loop.
+    """
+    key = None
+    if cache_text is not None and response_cache.cacheable(temperature):
+        deployment = os.getenv("DEPLOYMENT_NAME", "gpt-35-turbo")
+        key = response_cache.key(result_key, system_prompt, cache_text, deployment, max_tokens, temperature)
+        cached = await run_in_threadpool(response_cache.get, key)
+        if cached is not None:
+            if wants_stream(request, payload):
+                return sse_response(single_delta(cached), result_key)
+            return JSONResponse({result_key: cached})
+
+    if wants_stream(request, payload):
+        deltas = await get_openai_response(system_prompt, user_prompt, max_tokens, temperature, stream=True, name=result_key)
+        return sse_response(deltas, result_key, on_complete=(lambda text: response_cache.put(key, text)) if key else None)
+    text = await get_openai_response(system_prompt, user_prompt, max_tokens, temperature, name=result_key)
+    if key:
+        await run_in_threadpool(response_cache.put, key, text)
+    return JSONResponse({result_key: text})
+
+# Long documents: segments summarised concurrently, then merged in a tree; segment summaries are cached
+summarizer = AsyncMapReduceSummarizer(
+    get_openai_response,
+    response_cache,
+    os.getenv("DEPLOYMENT_NAME", "gpt-35-turbo"),
+    segment_tokens=get_env_var("SUMMARY_SEGMENT_TOKENS", 3000, int),
+    fan_in=get_env_var("SUMMARY_FAN_IN", 4, int),  # Partial summaries merged per reduce call
+    max_tokens=get_env_var("SUMMARY_SEGMENT_MAX_TOKENS", 300, int),
+    temperature=get_env_var("SUMMARY_TEMPERATURE", 0.5, float),
+    max_workers=get_env_var("SUMMARY_CONCURRENCY", 8, int)  # Concurrent segment calls across all requests
+)
+
+async def local_entities(text, refine=False):
+    """spaCy entity spans, optionally corrected by the LLM (the spaCy spans stand if its answer is unusable)."""
+    spans = await run_in_threadpool(lambda: local_ner.extract(text))
+    if not refine:
+        return {"entities": spans, "source": "spacy"}
+    client = await gateway.get_async()
+    completion = await client.chat(
+        refine_messages(text, spans),
+        os.getenv("DEPLOYMENT_NAME", "gpt-35-turbo"),
+        name="entities_refine",
+        max_tokens=get_env_var("NER_MAX_TOKENS", 500, int),
+        temperature=0
+    )
+    refined = parse_refined(text, completion.choices[0].message.content)
+    if refined is None:
+        return {"entities": spans, "source": "spacy"}
+    return {"entities": refined, "source": "spacy+llm"}
+
+async def query(request):
+    payload = await read_payload(request)
+    user_query = payload.get("query", "").lower()
+    return await respond(
+        request, payload,
+        "response",
+        "You are an AI assistant that helps people find information in Computer Science.",
+        user_query,
+        max_tokens=get_env_var("QUERY_MAX_TOKENS", 800, int),
+        temperature=get_env_var("QUERY_TEMPERATURE", 0.21, float)
+    )
+
+async def summary(request):
+    payload = await read_payload(request)
+    text_to_summarize = payload.get("text", "")
+    mode = (payload.get("mode") or os.getenv("SUMMARY_MODE", "map_reduce")).lower()
+    if mode not in ("single", "map_reduce"):
+        raise HTTPException(400, "mode must be 'single' or 'map_reduce'")
+    segments = []
+    if mode == "map_reduce":
+        segments = await run_in_threadpool(lambda: split_segments(text_to_summarize, summarizer.segment_tokens))
+    if len(segments) > 1:
+        # The final merge goes through respond(), so it streams and is cached like a single-prompt summary
+        partials = await summarizer.reduce(segments)
+        return await respond(
+            request, payload,
+            "summary",
+            REDUCE_SYSTEM_PROMPT,
+            partials,
+            max_tokens=get_env_var("SUMMARY_MAX_TOKENS", 200, int),
+            temperature=get_env_var("SUMMARY_TEMPERATURE", 0.5, float),
+            cache_text=partials
+        )
+    return await respond(
+        request, payload,
+        "summary",
+        "You are an advanced AI summarizer. Generate a concise summary while preserving key points.",
+        f"Summarize the following text: {text_to_summarize}",
+        max_tokens=get_env_var("SUMMARY_MAX_TOKENS", 200, int),
+        temperature=get_env_var("SUMMARY_TEMPERATURE", 0.5, float),
+        cache_text=text_to_summarize
+    )
+
+async def sentiment(request):
+    payload = await read_payload(request)
+    text_to_analyze = payload.get("text", "")
+    return await respond(
+        request, payload,
+        "sentiment",
+        "You are an AI that performs sentiment analysis. Identify whether the sentiment is Positive, Negative, or Neutral and explain briefly.",
+        f"Analyze the sentiment of the following text: {text_to_analyze}",
+        max_tokens=get_env_var("SENTIMENT_MAX_TOKENS", 800, int),
+        temperature=get_env_var("SENTIMENT_TEMPERATURE", 0.34, float),
+        cache_text=text_to_analyze
+    )
+
+async def ner(request):
+    payload = await read_payload(request)
+    text_to_analyze = payload.get("text", "")
+    mode = (payload.get("mode") or os.getenv("NER_MODE", "llm")).lower()
+    if mode == "local":
+        return JSONResponse(await local_entities(text_to_analyze, refine=bool(payload.get("refine"))))
+    if mode != "llm":
+        raise HTTPException(400, "mode must be 'llm' or 'local'")
+    return await respond(
+        request, payload,
+        "entities",
+        "You are an AI trained to extract named entities from text. Identify persons, organizations, locations, dates, and other important entities.",
+        f"Extract named entities from the following text:\n\n{text_to_analyze}",
+        max_tokens=get_env_var("NER_MAX_TOKENS", 500, int),
+        temperature=get_env_var("NER_TEMPERATURE", 0.3, float),
+        cache_text=text_to_analyze
+    )
+
+async def ner_bulk(request):
+    """spaCy entity spans for many texts in one call (batched nlp.pipe)."""
+    payload = await read_payload(request)
+    texts = payload.get("texts")
+    if not isinstance(texts, list) or not texts or not all(isinstance(text, str) for text in texts):
+        raise HTTPException(400, "texts must be a non-empty list of strings")
+    if len(texts) > get_env_var("NER_BULK_MAX_TEXTS", 10000, int):
+        raise HTTPException(400, "Too many texts in one request")
+    return JSONResponse({"entities": await run_in_threadpool(lambda: local_ner.extract_many(texts))})
+
+async def ready(request):
+    """200 once the OpenAI client and spaCy pipeline are loaded, 503 (with per-resource status) until then."""
+    body, status = readiness(resources)
+    return JSONResponse(body, status_code=status)
+
+async def gateway_stats(request):
+    """Per-endpoint LLM call counts, token usage, retries, throttling and latency percentiles."""
+    return JSONResponse((await gateway.get_async()).stats())
+
+async def cache_stats(request):
+    """Hit/miss/bypass counts of the summary, sentiment and NER response cache."""
+    return JSONResponse(await run_in_threadpool(response_cache.stats))
+
+async def metrics(request):
+    """Prometheus metrics: LLM latency histogram, per-route latencies, token/retry counters and cache hits."""
+    return Response(await run_in_threadpool(registry.render), headers={"Content-Type": CONTENT_TYPE})  # Collectors query SQLite
+
+# Error bodies match Flask-RESTx: {"message": ...}
+async def http_error(request, exc):
+    return JSONResponse({"message": exc.detail}, status_code=exc.status_code)
+
+async def server_error(request, exc):
+    log(f"Error occurred: {exc}")
+    return JSONResponse({"message": "Internal Server Error"}, status_code=500)
+
+app = ASGIMetricsMiddleware(Starlette(
+    routes=[
+        Route("/query/", query, methods=["POST"]),
+        Route("/summary/", summary, methods=["POST"]),
+        Route("/sentiment/", sentiment, methods=["POST"]),
+        Route("/NER/", ner, methods=["POST"]),
+        Route("/NER/bulk", ner_bulk, methods=["POST"]),
+        Route("/ready", ready, methods=["GET"]),
+        Route("/gateway/stats", gateway_stats, methods=["GET"]),
+        Route("/cache/stats", cache_stats, methods=["GET"]),
+        Route("/metrics", metrics, methods=["GET"])
+    ],
+    exception_handlers={HTTPException: http_error, Exception: server_error}
+))  # Request latency histograms and, with TRACE_IDS, per-request trace IDs
+
+if __name__ == '__main__':
+    import uvicorn
+    uvicorn.run(app, host="127.0.0.1", port=5000)
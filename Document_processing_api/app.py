@@ -1,23 +1,48 @@
 import os
+import json
+import time
 import shutil
-import openai
-from flask import Flask, request
+import contextvars
+import sys
+from concurrent.futures import ThreadPoolExecutor
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))  # Repo root: the shared neuradocs package
+from flask import Flask, Response, request
 from flask_restx import Api, Resource, fields
 from dotenv import load_dotenv
 from config import (
-    DATA_INPUT_FOLDER, PROCESSED_FOLDER,
-    AZURE_OPENAI_API_KEY, AZURE_OPENAI_ENDPOINT, 
-    AZURE_OPENAI_DEPLOYMENT_NAME, AZURE_OPENAI_VERSION, AZURE_OPENAI_API_VERSION
+    DATA_INPUT_FOLDER, PROCESSED_FOLDER, EXTRACT_WORKERS, EXTRACT_PAGES_PER_TASK,
+    CHUNK_TOKENS, CHUNK_OVERLAP_TOKENS, TOKENIZER_ENCODING,
+    EMBED_BATCH_SIZE, INSERT_BATCH_SIZE, PIPELINE_QUEUE_SIZE, INDEX_MANIFEST_PATH,
+    INDEX_JOB_WORKERS, INDEX_MAX_JOBS, BATCH_QUERY_MAX_QUESTIONS, BATCH_QUERY_CONCURRENCY,
+    QUERY_CACHE_SIZE, QUERY_CACHE_TTL, ANSWER_CACHE_SIZE, ANSWER_CACHE_TTL, ANSWER_CACHE_THRESHOLD,
+    CONTEXT_CANDIDATES, CONTEXT_MAX_CHUNKS, CONTEXT_DIVERSITY, CONTEXT_DUPLICATE_THRESHOLD,
+    CONTEXT_SENTENCE_WINDOW, PROMPT_TOKEN_BUDGET, DEPLOYMENT_CHAT, DEFAULT_TENANT, WARM_UP
+)
+from neuradocs.process_pdf import iter_pdfs
+from embedding import embed_text, gateway, batcher, cache as embedding_cache
+from vector_db import (
+    store_embeddings, delete_embeddings, flush_embeddings, search_hits, search_hits_many, get_embeddings,
+    reset_vector_store, vector_store, lexical_index
+)
+from neuradocs.chunker import chunk_pages
+from neuradocs.pipeline import run_pipeline
+from neuradocs.context_packer import ContextPacker
+from neuradocs.search_filter import SearchFilter
+from neuradocs.query_cache import QueryEmbeddingCache, SemanticAnswerCache, normalize_query
+from neuradocs.manifest import IndexManifest, file_sha256
+from neuradocs.jobs import JobManager, JobCancelled, JobQueueFull
+from neuradocs.lazy_resource import warm_up, readiness
+from neuradocs.metrics import (
+    registry, stage, timed_iter, log, set_trace_id, instrument_flask, cache_metrics, gateway_metrics, batcher_metrics,
+    TRACE_IDS, CONTENT_TYPE
 )
-from process_pdf import extract_text_from_pdf
-from embedding import embed_text
-from vector_db import store_embeddings, search_embeddings
 
 # Load environment variables
 load_dotenv()
 
-# Initialize Flask App
+# Initialize Flask App (request latency histograms and, with TRACE_IDS, per-request trace IDs)
 app = Flask(__name__)
+instrument_flask(app)
 
 # Initialize Flask-RESTx API with Swagger UI
 api = Api(app, 
@@ -29,43 +54,346 @@ api = Api(app,
 ns_processing = api.namespace("documents_processing", description="Operations related to document processing")
 ns_query = api.namespace("documents_query", description="Operations related to querying documents")
 
-# Configure Azure OpenAI API
-openai.api_type = "azure"
-openai.api_base = AZURE_OPENAI_ENDPOINT
-openai.api_key = AZURE_OPENAI_API_KEY
-openai.api_version = AZURE_OPENAI_API_VERSION 
+# Query caches (invalidated whenever the collection changes)
+query_embedding_cache = QueryEmbeddingCache(max_entries=QUERY_CACHE_SIZE, ttl=QUERY_CACHE_TTL)
+answer_cache = SemanticAnswerCache(max_entries=ANSWER_CACHE_SIZE, ttl=ANSWER_CACHE_TTL, threshold=ANSWER_CACHE_THRESHOLD)
+
+def invalidate_query_caches():
+    """Drop cached query embeddings and answers after the collection changes."""
+    query_embedding_cache.clear()
+    answer_cache.clear()
+
+# Retrieved chunks are deduplicated, diversified (MMR) and trimmed to the query-relevant sentences within the prompt budget
+context_packer = ContextPacker(
+    token_budget=PROMPT_TOKEN_BUDGET,
+    max_chunks=CONTEXT_MAX_CHUNKS,
+    diversity=CONTEXT_DIVERSITY,
+    duplicate_threshold=CONTEXT_DUPLICATE_THRESHOLD,
+    sentence_window=CONTEXT_SENTENCE_WINDOW,
+    encoding_name=TOKENIZER_ENCODING
+)
+
+# Manifest of indexed files (content hash -> chunk IDs) for incremental indexing
+manifest = IndexManifest(INDEX_MANIFEST_PATH)
+
+# OpenAI clients and indexes are built lazily; warm-up starts them in the background, /ready reports when done
+resources = [gateway, batcher, vector_store] + ([lexical_index] if lexical_index is not None else [])
+if WARM_UP and __name__ != "__mp_main__":  # Not in PDF extraction workers, which re-import the main module
+    warm_up(resources)
+
+@registry.collector
+def collect_metrics():
+    """Cache hit counts, LLM token/retry counters and embedding counters, read when /metrics is scraped."""
+    families = cache_metrics("query_embedding", query_embedding_cache.stats()) + cache_metrics("answer", answer_cache.stats())
+    if embedding_cache:
+        families += cache_metrics("embedding", embedding_cache.stats())
+    return families + gateway_metrics(gateway) + batcher_metrics(batcher)
 
 # Define Swagger model for query input
+index_model = api.model("IndexModel", {
+    "tenant": fields.String(description=f"Tenant the files belong to (default: {DEFAULT_TENANT!r})")
+})
+filter_model = api.model("FilterModel", {
+    "tenant": fields.List(fields.String, description="Only these tenants (a single string also works)"),
+    "source": fields.List(fields.String, description="Only these source files"),
+    "page_from": fields.Integer(description="Only chunks ending on or after this page"),
+    "page_to": fields.Integer(description="Only chunks starting on or before this page"),
+    "ingested_after": fields.Float(description="Only chunks indexed at or after this Unix time")
+})
 query_model = api.model("QueryModel", {
-    "query": fields.String(required=True, description="User query in JSON format")
+    "query": fields.String(required=True, description="User query in JSON format"),
+    "stream": fields.Boolean(default=False, description="Stream the answer as server-sent events"),
+    "filters": fields.Nested(filter_model, description="Search only the matching chunks (tenant/source narrow the partitions scanned)")
 })
+batch_query_model = api.model("BatchQueryModel", {
+    "queries": fields.List(fields.String, required=True, description="User queries, answered in this order"),
+    "filters": fields.Nested(filter_model, description="Filters applied to every query")
+})
+
+def embed_queries(user_queries):
+    """Embed queries through the query cache; all misses go out in one batched `embed_text` call."""
+    embeddings = [query_embedding_cache.get(user_query) for user_query in user_queries]
+    missing = list(dict.fromkeys(q for q, e in zip(user_queries, embeddings) if e is None))
+    if missing:
+        fresh = dict(zip(missing, embed_text(missing)))
+        for user_query, embedding in fresh.items():
+            query_embedding_cache.put(user_query, embedding)
+        embeddings = [fresh[q] if e is None else e for q, e in zip(user_queries, embeddings)]
+    return embeddings
+
+def build_augmented_prompt(user_query, top_k_chunks):
+    """Augment the query with retrieved knowledge."""
+    augmented_prompt = (
+        f"You are an intelligent assistant helping a user with their question.\n\n"
+        f"User's Query: \"{user_query}\"\n\n"
+        f"Relevant Information:\n"
+    )
+
+    for idx, chunk in enumerate(top_k_chunks, 1):
+        augmented_prompt += f"Chunk {idx}: {chunk}\n"
+
+    augmented_prompt += (
+        "\nBased on the provided information, generate a clear, concise, and factual response to the user's query."
+        " If the retrieved information is insufficient, indicate that you do not have enough data to answer fully."
+    )
+    return augmented_prompt
+
+def prompt_messages(user_query, top_k_chunks):
+    return [
+        {"role": "system", "content": "You are a helpful AI assistant."},
+        {"role": "user", "content": build_augmented_prompt(user_query, top_k_chunks)}
+    ]
+
+def citations_for(hits, ids):
+    """Source, page span and chunk index of each packed chunk, numbered like the prompt's "Chunk N" labels."""
+    metadata = {hit["id"]: hit.get("metadata") for hit in hits}
+    return [{"chunk": n, "id": chunk_id, **(metadata.get(chunk_id) or {})} for n, chunk_id in enumerate(ids, 1)]
+
+def hit_vectors(hits):
+    """Embeddings of `hits` for MMR: those the search returned, plus one lookup for any hit without one."""
+    vectors = {hit["id"]: hit["vector"] for hit in hits if "vector" in hit}
+    missing = {hit["id"] for hit in hits if hit["id"] not in vectors}
+    if missing:
+        vectors.update(get_embeddings(missing))
+    return vectors
+
+def pack_context(user_query, query_embedding, hits, vectors=None):
+    """Chunks for the prompt and their citations: the over-fetched `hits` deduplicated, diversified and trimmed to PROMPT_TOKEN_BUDGET."""
+    if vectors is None:
+        vectors = hit_vectors(hits)
+    with stage("prompt_build"):
+        # The instructions and query come out of the budget first; allow a few tokens per "Chunk N:" label
+        overhead = context_packer.count("\n".join(m["content"] for m in prompt_messages(user_query, [])))
+        budget = max(0, PROMPT_TOKEN_BUDGET - overhead - 8 * CONTEXT_MAX_CHUNKS)
+        chunks, stats = context_packer.pack(user_query, query_embedding, hits, vectors, budget=budget)
+    log(f"📦 Context: {stats['chunks']} chunks from {stats['candidates']} candidates ({stats['unique']} unique), "
+        f"{stats['context_tokens']}/{stats['budget']} tokens")
+    return chunks, citations_for(hits, stats["ids"])
+
+def generate_answer(user_query, top_k_chunks, stream=False):
+    """Get a response from Azure OpenAI grounded in the retrieved chunks.
+
+    With `stream=True`, returns a generator of text deltas as they arrive.
+    """
+    messages = prompt_messages(user_query, top_k_chunks)
+    prompt_tokens = context_packer.count("\n".join(m["content"] for m in messages))
+    log(f"🧮 Prompt tokens: {prompt_tokens} (budget {PROMPT_TOKEN_BUDGET}) for query: {user_query}")
+    response = gateway.chat(
+        messages,
+        DEPLOYMENT_CHAT,
+        name="documents_query",
+        max_tokens=500,
+        temperature=0.7,
+        stream=stream
+    )
+    if stream:
+        # Azure sends a first chunk without choices (prompt filter results)
+        return (chunk.choices[0].delta.content for chunk in response
+                if chunk.choices and chunk.choices[0].delta.content)
+    return response.choices[0].message.content.strip()
+
+def sse_response(deltas, on_complete=None, citations=None):
+    """Relay text deltas as server-sent events; the final `done` event carries the full response and its citations."""
+    def events():
+        parts = []
+        try:
+            for delta in deltas:
+                parts.append(delta)
+                yield f"data: {json.dumps({'delta': delta})}\n\n"
+        except Exception as e:
+            log(f"Error occurred: {e}")
+            yield f"event: error\ndata: {json.dumps({'message': f'Error occurred: {str(e)}'})}\n\n"
+            return
+        ai_response = "".join(parts).strip()
+        if on_complete:
+            on_complete(ai_response)
+        yield f"event: done\ndata: {json.dumps({'response': ai_response, 'citations': citations or []})}\n\n"
+
+    return Response(events(), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+# Background indexing: extraction, embedding and vector inserts run off the request thread
+def index_file(job, progress, pages, chunk_ids):
+    """Chunk, embed and store one file's pages with their metadata, updating its progress counters."""
+    ingested_at = int(time.time())
+
+    def counted_pages():
+        for page in timed_iter("extract", pages):  # Time spent waiting on the extraction workers
+            job.check_cancelled()
+            progress.pages_extracted += 1
+            yield page
+
+    def embed_batch(chunks):
+        job.check_cancelled()
+        embeddings = embed_text([chunk.text for _, chunk in chunks])
+        progress.chunks_embedded += len(chunks)
+        return embeddings
+
+    def store_batch(embeddings, chunks):
+        job.check_cancelled()
+        metadata = [
+            {"source": progress.file_name, "tenant": job.tenant, "page_start": chunk.page_start,
+             "page_end": chunk.page_end, "chunk_index": chunk_index, "ingested_at": ingested_at}
+            for chunk_index, chunk in chunks
+        ]
+        chunk_ids.extend(store_embeddings(embeddings, [chunk.text for _, chunk in chunks], flush=False, metadata=metadata))
+        progress.vectors_stored += len(chunks)
+
+    # Split pages into token-bounded, overlapping chunks
+    chunks = chunk_pages(
+        counted_pages(),
+        chunk_tokens=CHUNK_TOKENS,
+        overlap_tokens=CHUNK_OVERLAP_TOKENS,
+        encoding_name=TOKENIZER_ENCODING
+    )
+
+    # Stream pages through embedding and Milvus inserts in bounded batches
+    run_pipeline(
+        enumerate(timed_iter("chunk", chunks)),
+        embed_batch,
+        store_batch,
+        embed_batch_size=EMBED_BATCH_SIZE,
+        insert_batch_size=INSERT_BATCH_SIZE,
+        queue_size=PIPELINE_QUEUE_SIZE
+    )
+
+def manifest_key(job, file_name):
+    """Manifest entry of a file: its name, prefixed by the tenant unless it is the default one."""
+    return file_name if job.tenant == DEFAULT_TENANT else f"{job.tenant}/{file_name}"
+
+def run_index_job(job):
+    """Index the job's files; a failing file is rolled back and reported without stopping the others."""
+    if TRACE_IDS:
+        set_trace_id(job.id)  # The job's log lines carry its ID
+    file_paths = [os.path.join(DATA_INPUT_FOLDER, file_name) for file_name in job.files]
+    finished = []  # Files to move to the processed folder once the manifest is saved
+
+    # Skip files whose content was already indexed
+    file_hashes, changed = {}, []
+    for file_path in file_paths:
+        progress = job.files[os.path.basename(file_path)]
+        if not os.path.exists(file_path):
+            progress.status, progress.error = "failed", "File is no longer in the data_input folder"
+            continue
+        file_hashes[file_path] = file_sha256(file_path)
+        if manifest.is_unchanged(manifest_key(job, progress.file_name), file_hashes[file_path]):
+            progress.status = "skipped"
+            finished.append(file_path)
+        else:
+            changed.append(file_path)
+
+    try:
+        # Extract text from PDFs in parallel (files and page ranges spread across worker processes)
+        extracted = iter_pdfs(changed, workers=EXTRACT_WORKERS, pages_per_task=EXTRACT_PAGES_PER_TASK)
+
+        for file_path, pages in extracted:
+            job.check_cancelled()
+            file_name = os.path.basename(file_path)
+            progress = job.files[file_name]
+            progress.status = "running"
+
+            chunk_ids = []
+            try:
+                index_file(job, progress, pages, chunk_ids)
+            except JobCancelled:
+                delete_embeddings(chunk_ids)  # Leave no partial copy of this file behind
+                progress.status = "cancelled"
+                raise
+            except Exception as e:
+                log(f"❌ Failed to index {file_name}: {e}")
+                delete_embeddings(chunk_ids)
+                progress.status, progress.error = "failed", str(e)
+                continue
+
+            # Replace the vectors of a previously indexed version of this file
+            previous = manifest.get(manifest_key(job, file_name))
+            if previous:
+                delete_embeddings(previous["chunk_ids"])
+            manifest.update(manifest_key(job, file_name), file_hashes[file_path], chunk_ids)
+            invalidate_query_caches()
+            progress.status = "done"
+            finished.append(file_path)
+    finally:
+        for progress in job.files.values():
+            if progress.status == "queued":
+                progress.status = "cancelled" if job.cancelled else "failed"
+                if not job.cancelled:
+                    progress.error = progress.error or "Not processed (extraction stopped early)"
+
+        # Flush once for the whole job (larger segments), record the manifest, then move finished files
+        flush_embeddings()
+        manifest.save()
+        for file_path in finished:
+            shutil.move(file_path, os.path.join(PROCESSED_FOLDER, os.path.basename(file_path)))
+
+        if embedding_cache:
+            log(f"Embedding cache: {embedding_cache.stats()}")
+
+jobs = JobManager(run_index_job, max_workers=INDEX_JOB_WORKERS, max_jobs=INDEX_MAX_JOBS)
 
 # 1️⃣ API for Document Processing
 @ns_processing.route("/index")
 class DocumentIndexer(Resource):
+    @api.expect(index_model)
     def post(self):
-        """Automatically process all PDFs in the data_input folder"""
+        """Queue a background job that processes all PDFs in the data_input folder (optionally for a tenant)"""
+        tenant = (request.get_json(silent=True) or {}).get("tenant", DEFAULT_TENANT)
+        if not isinstance(tenant, str) or not tenant.strip() or len(tenant) > 128:
+            return {"message": "'tenant' must be a non-empty string of at most 128 characters!"}, 400
+
         files = [f for f in os.listdir(DATA_INPUT_FOLDER) if f.endswith(".pdf")]
 
         if not files:
             return {"message": "No PDF files found in data_input folder!"}, 400
 
-        for file_name in files:
-            file_path = os.path.join(DATA_INPUT_FOLDER, file_name)
+        try:
+            job = jobs.submit(files, tenant=tenant)
+        except JobQueueFull as e:
+            return {"message": str(e)}, 429
+
+        if job is None:
+            return {"message": "All PDF files are already being indexed by another job."}, 409
 
-            # Extract text from PDF
-            chunks = extract_text_from_pdf(file_path)
+        return {
+            "message": "Indexing job queued.",
+            "job_id": job.id,
+            "files": len(job.files),
+            "status_url": api.url_for(IndexJobStatus, job_id=job.id)
+        }, 202
 
-            # Generate embeddings for extracted text
-            embeddings = embed_text(chunks)
+@ns_processing.route("/jobs")
+class IndexJobList(Resource):
+    def get(self):
+        """List recent indexing jobs, newest first"""
+        return {"jobs": [job.to_dict() for job in jobs.list()]}, 200
 
-            # Store embeddings in Milvus
-            store_embeddings(embeddings, chunks)
+@ns_processing.route("/jobs/<string:job_id>")
+class IndexJobStatus(Resource):
+    def get(self, job_id):
+        """Per-file progress (pages extracted, chunks embedded, vectors stored), throughput and errors of a job"""
+        job = jobs.get(job_id)
+        if job is None:
+            return {"message": "Job not found."}, 404
+        return job.to_dict(), 200
 
-            # Move processed file to the processed folder
-            shutil.move(file_path, os.path.join(PROCESSED_FOLDER, file_name))
+    def delete(self, job_id):
+        """Cancel a queued or running job (a running job stops at its next batch)"""
+        job = jobs.cancel(job_id)
+        if job is None:
+            return {"message": "Job not found."}, 404
+        return job.to_dict(), 202
 
-        return {"message": "All documents processed and moved successfully!"}, 200
+@ns_processing.route("/reset")
+class CollectionReset(Resource):
+    def post(self):
+        """Admin: drop every stored vector and the index manifest (the next /index re-ingests from scratch)"""
+        if jobs.has_active():
+            return {"message": "Indexing jobs are queued or running; cancel them before resetting."}, 409
+        reset_vector_store()
+        manifest.clear()
+        manifest.save()
+        invalidate_query_caches()
+        return {"message": "Collection reset successfully!"}, 200
 
 # 2️⃣ API for Querying Documents
 @ns_query.route("/query")
@@ -78,54 +406,165 @@ class DocumentQuery(Resource):
             user_query = request.json.get("query")
             if not user_query:
                 return {"message": "Query not provided!"}, 400
+            stream = bool(request.json.get("stream")) or request.args.get("stream", "").lower() == "true"
+            try:
+                search_filter = SearchFilter.from_request(request.json.get("filters"))
+            except ValueError as e:
+                return {"message": str(e)}, 400
             
-            print(f"User Query: {user_query}")  # Debugging
+            log(f"User Query: {user_query}")  # Debugging
+
+            # Step 2: Embed the user's query (cached per normalised query)
+            query_embedding = query_embedding_cache.get(user_query)
+            if query_embedding is None:
+                query_embedding = embed_text([user_query])[0]
+                query_embedding_cache.put(user_query, query_embedding)
 
-            # Step 2: Embed the user's query
-            query_embedding = embed_text([user_query])[0]
+            # Return a cached answer for the same or a near-identical question (filtered queries are not cached)
+            cache_generation = answer_cache.generation  # Answers computed after an index change are not cached
+            cached = answer_cache.lookup(query_embedding, user_query) if search_filter is None else None
+            if cached is not None:
+                return sse_response(iter([cached["response"]]), citations=cached["citations"]) if stream else (cached, 200)
             
-            # Step 3: Search for similar document chunks in Milvus
-            top_k_chunks = search_embeddings(query_embedding, top_k=3)
+            # Step 3: Search for similar document chunks (dense + BM25, fused), over-fetching for the packing stage
+            hits = search_hits(query_embedding, top_k=CONTEXT_CANDIDATES, query_text=user_query, search_filter=search_filter,
+                               with_vectors=True)
+            top_k_chunks, citations = pack_context(user_query, query_embedding, hits)
             
             if not top_k_chunks:
                 return {"message": "No relevant information found."}, 404
             
-            # Step 4: Augment the query with retrieved knowledge
-            augmented_prompt = (
-                f"You are an intelligent assistant helping a user with their question.\n\n"
-                f"User's Query: \"{user_query}\"\n\n"
-                f"Relevant Information:\n"
-            )
+            # Step 4 + 5: Augment the query with retrieved knowledge and get a response from Azure OpenAI
+            if stream:
+                # Relay tokens as they arrive; the full answer is cached once the stream completes
+                deltas = generate_answer(user_query, top_k_chunks, stream=True)
+                on_complete = None if search_filter else \
+                    lambda text: answer_cache.add(query_embedding, user_query, {"response": text, "citations": citations},
+                                                  cache_generation)
+                return sse_response(deltas, on_complete=on_complete, citations=citations)
+            ai_response = generate_answer(user_query, top_k_chunks)
+            
+            # Step 6: Return AI-generated response with the chunks it was grounded in
+            log(f"Azure OpenAI Response: {ai_response}")  # Debugging
+            result = {"response": ai_response, "citations": citations}
+            if search_filter is None:
+                answer_cache.add(query_embedding, user_query, result, cache_generation)
 
-            for idx, chunk in enumerate(top_k_chunks, 1):
-                augmented_prompt += f"Chunk {idx}: {chunk}\n"
+            return result, 200
 
-            augmented_prompt += (
-                "\nBased on the provided information, generate a clear, concise, and factual response to the user's query."
-                " If the retrieved information is insufficient, indicate that you do not have enough data to answer fully."
-            )
+        except Exception as e:
+            log(f"Error occurred: {e}")
+            return {"message": f"Error occurred: {str(e)}"}, 500
 
-            # Step 5: Get response from Azure OpenAI 
-            response = openai.ChatCompletion.create(
-                engine=AZURE_OPENAI_DEPLOYMENT_NAME,  
-                messages=[
-                    {"role": "system", "content": "You are a helpful AI assistant."},
-                    {"role": "user", "content": augmented_prompt}
-                ],
-                max_tokens=500,
-                temperature=0.7
-            )
-            
-            # Step 6: Return AI-generated response
-            ai_response = response["choices"][0]["message"]["content"].strip()
-            print(f"Azure OpenAI Response: {ai_response}")  # Debugging
+@ns_query.route("/batch_query")
+class DocumentBatchQuery(Resource):
+    @api.expect(batch_query_model)
+    def post(self):
+        """Answer many queries in one call, streamed back as NDJSON (one line per query, in input order)."""
+        user_queries = (request.json or {}).get("queries")
+        if not isinstance(user_queries, list) or not user_queries \
+                or not all(isinstance(q, str) and q.strip() for q in user_queries):
+            return {"message": "Provide a non-empty list of query strings!"}, 400
+        if len(user_queries) > BATCH_QUERY_MAX_QUESTIONS:
+            return {"message": f"At most {BATCH_QUERY_MAX_QUESTIONS} queries per batch."}, 413
+        try:
+            search_filter = SearchFilter.from_request(request.json.get("filters"))
+        except ValueError as e:
+            return {"message": str(e)}, 400
 
-            return {"response": ai_response}, 200
+        try:
+            # One batched embedding call for every uncached query
+            query_embeddings = embed_queries(user_queries)
 
+            # Cached answers are returned as is; the rest go to one multi-vector search
+            results = [None] * len(user_queries)
+            pending = []
+            cache_generation = answer_cache.generation
+            for idx, query_embedding in enumerate(query_embeddings):
+                cached = answer_cache.lookup(query_embedding, user_queries[idx]) if search_filter is None else None
+                if cached is not None:
+                    results[idx] = {**cached, "cached": True}
+                else:
+                    pending.append(idx)
+            retrieved = search_hits_many(
+                [query_embeddings[idx] for idx in pending],
+                top_k=CONTEXT_CANDIDATES,
+                query_texts=[user_queries[idx] for idx in pending],
+                search_filter=search_filter,
+                with_vectors=True
+            )
+            # Candidates come with their embeddings (one lookup for any without), then per-query packing
+            vectors = hit_vectors([hit for hits in retrieved for hit in hits])
+            retrieved = [pack_context(user_queries[idx], query_embeddings[idx], hits, vectors)
+                         for idx, hits in zip(pending, retrieved)]
         except Exception as e:
-            print(f"Error occurred: {e}")
+            log(f"Error occurred: {e}")
             return {"message": f"Error occurred: {str(e)}"}, 500
 
+        def stream():
+            # Chat completions run with bounded concurrency; identical queries share one completion
+            executor = ThreadPoolExecutor(max_workers=BATCH_QUERY_CONCURRENCY)
+            try:
+                futures, owners, citations = {}, {}, {}
+                for idx, (top_k_chunks, chunk_citations) in zip(pending, retrieved):
+                    citations[idx] = chunk_citations
+                    if not top_k_chunks:
+                        results[idx] = {"message": "No relevant information found."}
+                        continue
+                    key = normalize_query(user_queries[idx])
+                    if key not in owners:
+                        owners[key] = idx
+                        futures[idx] = executor.submit(contextvars.copy_context().run, generate_answer,
+                                                       user_queries[idx], top_k_chunks)
+                    futures.setdefault(idx, futures[owners[key]])
+
+                for idx, user_query in enumerate(user_queries):
+                    line = {"index": idx, "query": user_query}
+                    if idx in futures:
+                        try:
+                            ai_response = futures[idx].result()
+                            line.update(response=ai_response, citations=citations[idx])
+                            if owners[normalize_query(user_query)] == idx and search_filter is None:
+                                answer_cache.add(query_embeddings[idx], user_query,
+                                                 {"response": ai_response, "citations": citations[idx]}, cache_generation)
+                        except Exception as e:
+                            log(f"Error occurred: {e}")
+                            line["message"] = f"Error occurred: {str(e)}"
+                    else:
+                        line.update(results[idx])
+                    yield json.dumps(line) + "\n"
+            finally:
+                executor.shutdown(wait=False, cancel_futures=True)
+
+        return Response(stream(), mimetype="application/x-ndjson")
+
+@ns_query.route("/cache_stats")
+class QueryCacheStats(Resource):
+    def get(self):
+        """Hit-rate metrics for the query embedding and semantic answer caches."""
+        return {
+            "query_embedding_cache": query_embedding_cache.stats(),
+            "answer_cache": answer_cache.stats()
+        }, 200
+
+@ns_query.route("/llm_stats")
+class LLMStats(Resource):
+    def get(self):
+        """Chat call counts, token usage, retries, throttling and latency percentiles from the LLM gateway."""
+        return gateway.stats(), 200
+
+@api.route("/ready")
+class Readiness(Resource):
+    def get(self):
+        """200 once the OpenAI clients, vector store and lexical index are loaded, else 503 with per-resource status."""
+        return readiness(resources)
+
+@api.route("/metrics")
+class Metrics(Resource):
+    def get(self):
+        """Prometheus metrics: per-stage and per-route latency histograms, LLM token/retry counters, cache hits"""
+        return Response(registry.render(), content_type=CONTENT_TYPE)
+
 # Run Flask App
 if __name__ == "__main__":
     app.run(debug=True)
@@ -0,0 +1,59 @@
+import argparse
+import random
+import time
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))  # Repo root: the shared neuradocs package
+from neuradocs.chunker import chunk_pages, get_tokenizer
+from neuradocs.process_pdf import iter_pages_from_pdf
+
+parser = argparse.ArgumentParser(description="Measure chunker throughput on a large synthetic or real document")
+parser.add_argument("--pages", type=int, default=5000, help="Number of synthetic pages to generate")
+parser.add_argument("--pdf", help="Chunk a real PDF instead of synthetic pages (repeated --repeat times)")
+parser.add_argument("--repeat", type=int, default=1, help="Times to repeat the PDF pages")
+parser.add_argument("--chunk-tokens", type=int, default=512)
+parser.add_argument("--overlap-tokens", type=int, default=64)
+
+WORDS = ("error", "code", "account", "password", "reset", "invoice", "device", "network", "policy",
+         "support", "update", "install", "customer", "order", "refund", "login", "settings", "report")
+
+
+def synthetic_pages(num_pages, seed=42):
+    """Generate pages of varying density, including near-empty ones."""
+    rng = random.Random(seed)
+    pages = []
+    for page_number in range(1, num_pages + 1):
+        paragraphs = []
+        for _ in range(rng.choice((0, 1, 3, 6, 10))):
+            sentences = [
+                " ".join(rng.choice(WORDS) for _ in range(rng.randint(6, 30))).capitalize() + "."
+                for _ in range(rng.randint(1, 6))
+            ]
+            paragraphs.append(" ".join(sentences))
+        pages.append((page_number, "\n\n".join(paragraphs) or "Page intentionally left blank."))
+    return pages
+
+
+if __name__ == "__main__":
+    args = parser.parse_args()
+
+    if args.pdf:
+        pages = list(iter_pages_from_pdf(args.pdf)) * args.repeat
+    else:
+        pages = synthetic_pages(args.pages)
+
+    tokenizer = get_tokenizer()
+    page_tokens = [tokenizer.count(text) for _, text in pages]
+
+    start = time.perf_counter()
+    chunks = list(chunk_pages(pages, chunk_tokens=args.chunk_tokens, overlap_tokens=args.overlap_tokens))
+    elapsed = time.perf_counter() - start
+
+    chunk_tokens = [chunk.num_tokens for chunk in chunks]
+    print(f"Pages: {len(pages)} | Page-per-chunk vectors: {len(pages)} | Token-aware chunks: {len(chunks)}")
+    print(f"Page tokens  min/avg/max: {min(page_tokens)}/{sum(page_tokens) / len(page_tokens):.0f}/{max(page_tokens)}")
+    print(f"Chunk tokens min/avg/max: {min(chunk_tokens)}/{sum(chunk_tokens) / len(chunk_tokens):.0f}/{max(chunk_tokens)}")
+    print(f"Pages over {args.chunk_tokens} tokens: {sum(t > args.chunk_tokens for t in page_tokens)}")
+    print(f"Chunks over 4096 bytes: {sum(len(chunk.text.encode('utf-8')) > 4096 for chunk in chunks)}")
+    print(f"Time: {elapsed:.2f}s ({len(pages) / elapsed:.0f} pages/s, {len(chunks) / elapsed:.0f} chunks/s, "
+          f"{sum(page_tokens) / elapsed:.0f} tokens/s)")
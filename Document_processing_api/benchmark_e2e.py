@@ -0,0 +1,348 @@
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from fake_openai import FakeOpenAIServer
+
+parser = argparse.ArgumentParser(
+    description="Offline end-to-end benchmark: synthetic PDFs through /index and /query against a fake OpenAI "
+                "endpoint and the local vector store")
+parser.add_argument("--pdfs", type=int, default=4, help="Synthetic PDFs to index")
+parser.add_argument("--pages", type=int, default=50, help="Pages per PDF")
+parser.add_argument("--paragraphs", type=int, default=4, help="Paragraphs per page (each states one fact)")
+parser.add_argument("--queries", type=int, default=100, help="Queries sent to /documents_query/query")
+parser.add_argument("--concurrency", type=int, default=1, help="Queries in flight at once")
+parser.add_argument("--embedding-latency", type=float, default=0.05, help="Fake seconds per embeddings request")
+parser.add_argument("--chat-latency", type=float, default=0.3, help="Fake seconds per chat completion")
+parser.add_argument("--jitter", type=float, default=0.2, help="Fake latency varies by ± this fraction")
+parser.add_argument("--rpm", type=int, default=0, help="Fake rate limit in requests per minute (0 = unlimited)")
+parser.add_argument("--answer-cache", action="store_true", help="Keep the semantic answer cache on (off by default)")
+parser.add_argument("--workdir", help="Working directory for PDFs and indexes (default: a temporary one, removed after)")
+parser.add_argument("--seed", type=int, default=42)
+parser.add_argument("--output", help="Write the results as JSON")
+parser.add_argument("--baseline", help="JSON results of an earlier run to compare against")
+parser.add_argument("--tolerance", type=float, default=0.10, help="Relative change flagged as a regression")
+
+WORDS = ("account password login billing invoice refund subscription upgrade device browser network router "
+         "firmware update install restart backup restore sync export import report ticket support error warning "
+         "timeout connection server client storage upload download permission security privacy setting").split()
+
+
+class StageTimer:
+    """Wall time per stage, exclusive of nested timed stages (chunking pulls pages through extraction)."""
+
+    def __init__(self):
+        self.samples = defaultdict(list)
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    def _start(self):
+        stack = self._local.__dict__.setdefault("stack", [])
+        stack.append(0.0)  # Time spent in nested stages
+        return time.perf_counter()
+
+    def _stop(self, name, start, record=True):
+        elapsed = time.perf_counter() - start
+        stack = self._local.stack
+        nested = stack.pop()
+        if stack:
+            stack[-1] += elapsed
+        if record:
+            with self._lock:
+                self.samples[name].append(elapsed - nested)
+
+    def wrap(self, name, func):
+        def timed(*args, **kwargs):
+            start = self._start()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self._stop(name, start)
+        return timed
+
+    def iterate(self, name, iterable):
+        """Yield from `iterable`, timing each item's production."""
+        iterator = iter(iterable)
+        while True:
+            start = self._start()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                self._stop(name, start, record=False)
+                return
+            self._stop(name, start)
+            yield item
+
+    def summary(self):
+        with self._lock:
+            return {name: latency_summary(samples) for name, samples in self.samples.items()}
+
+    def clear(self):
+        with self._lock:
+            self.samples.clear()
+
+
+def latency_summary(samples):
+    samples = np.asarray(samples, dtype=np.float64)
+    if not len(samples):
+        return {"count": 0}
+    return {
+        "count": int(len(samples)),
+        "total_s": round(float(samples.sum()), 4),
+        "mean_ms": round(float(samples.mean() * 1000), 3),
+        "p50_ms": round(float(np.percentile(samples, 50) * 1000), 3),
+        "p95_ms": round(float(np.percentile(samples, 95) * 1000), 3),
+        "p99_ms": round(float(np.percentile(samples, 99) * 1000), 3)
+    }
+
+
+def write_pdf(path, pages):
+    """Write a minimal PDF with one Helvetica text page per list of lines ("" is a blank line)."""
+    def escape(line):
+        return line.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+    objects = [b"<< /Type /Catalog /Pages 2 0 R >>", None,
+               b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    kids = []
+    for lines in pages:
+        content = "BT /F1 10 Tf 14 TL 50 750 Td\n" + "".join(f"({escape(line)}) Tj T*\n" for line in lines) + "ET"
+        content = content.encode("latin-1", "replace")
+        kids.append(len(objects) + 1)
+        objects.append(f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Resources << /Font << /F1 3 0 R >> >> "
+                       f"/Contents {len(objects) + 2} 0 R >>".encode())
+        objects.append(b"<< /Length %d >>\nstream\n%s\nendstream" % (len(content), content))
+    objects[1] = f"<< /Type /Pages /Kids [{' '.join(f'{kid} 0 R' for kid in kids)}] /Count {len(kids)} >>".encode()
+
+    data = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(len(data))
+        data += b"%d 0 obj\n%s\nendobj\n" % (number, body)
+    xref = len(data)
+    data += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    data += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    data += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    with open(path, "wb") as f:
+        f.write(data)
+
+
+def wrap_lines(text, width=95):
+    lines, line = [], ""
+    for word in text.split():
+        if line and len(line) + 1 + len(word) > width:
+            lines.append(line)
+            line = word
+        else:
+            line = f"{line} {word}" if line else word
+    return lines + ([line] if line else [])
+
+
+def synthetic_pdfs(folder, args, rng):
+    """Write the PDFs; every paragraph states one fact (a unique error code) that a query can ask about."""
+    facts = []
+    for doc in range(args.pdfs):
+        pages = []
+        for page in range(args.pages):
+            lines = []
+            for paragraph in range(args.paragraphs):
+                code = f"ERR-{doc:03d}{page:04d}{paragraph}"
+                subject = rng.sample(WORDS, 2)
+                sentences = [f"Error code {code} means the {subject[0]} {subject[1]} step failed on model "
+                             f"X{rng.randrange(1000):03d}."]
+                sentences += [" ".join(rng.choice(WORDS) for _ in range(rng.randint(8, 20))).capitalize() + "."
+                              for _ in range(rng.randint(2, 5))]
+                lines += wrap_lines(" ".join(sentences)) + [""]
+                facts.append((code, subject))
+            pages.append(lines)
+        write_pdf(os.path.join(folder, f"synthetic_{doc:03d}.pdf"), pages)
+    return facts
+
+
+def run_ingest(client, timer):
+    start = time.perf_counter()
+    response = client.post("/documents_processing/index")
+    if response.status_code != 202:
+        raise SystemExit(f"❌ /index returned {response.status_code}: {response.get_json()}")
+    job_id = response.get_json()["job_id"]
+    while True:
+        job = client.get(f"/documents_processing/jobs/{job_id}").get_json()
+        if job["status"] not in ("queued", "running"):
+            break
+        time.sleep(0.05)
+    wall = time.perf_counter() - start
+    if job["status"] != "completed":
+        raise SystemExit(f"❌ Indexing job ended as {job['status']}: "
+                         f"{[f['error'] for f in job['files'] if f['error']] or job['error']}")
+    totals = job["totals"]
+    return {
+        "files": len(job["files"]),
+        "pages": totals["pages_extracted"],
+        "chunks": totals["chunks_embedded"],
+        "seconds": round(wall, 3),
+        "pages_per_s": round(totals["pages_extracted"] / wall, 2),
+        "chunks_per_s": round(totals["chunks_embedded"] / wall, 2),
+        "stages": timer.summary()
+    }
+
+
+def run_queries(app, queries, concurrency, timer, context_hits):
+    latencies, failures = [], 0
+
+    def ask(query):
+        start = time.perf_counter()
+        response = app.app.test_client().post("/documents_query/query", json={"query": query})
+        return time.perf_counter() - start, response.status_code
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for latency, status in pool.map(ask, [query for query, _ in queries]):
+            latencies.append(latency)
+            failures += status != 200
+    wall = time.perf_counter() - start
+    return {
+        "queries": len(queries),
+        "failures": failures,
+        "concurrency": concurrency,
+        "seconds": round(wall, 3),
+        "queries_per_s": round(len(queries) / wall, 2),
+        "context_hit_rate": round(sum(context_hits.values()) / len(queries), 4),  # Asked-about fact made it into the prompt
+        "latency": latency_summary(latencies),
+        "stages": timer.summary()
+    }
+
+
+def compare(results, baseline, tolerance):
+    """Print headline metrics against an earlier run; throughput should not drop, latencies should not rise."""
+    metrics = [("ingest pages/s", ("ingest", "pages_per_s"), True),
+               ("ingest chunks/s", ("ingest", "chunks_per_s"), True),
+               ("query/s", ("query", "queries_per_s"), True)]
+    metrics += [(f"query {q}", ("query", "latency", f"{q}_ms"), False) for q in ("p50", "p95", "p99")]
+    for phase in ("ingest", "query"):
+        metrics += [(f"{phase} {stage} p95", (phase, "stages", stage, "p95_ms"), False)
+                    for stage in results[phase]["stages"]]
+
+    def lookup(data, path):
+        for key in path:
+            data = data.get(key) if isinstance(data, dict) else None
+        return data
+
+    print(f"\nCompared with {baseline['created']}:")
+    for label, path, higher_is_better in metrics:
+        new, old = lookup(results, path), lookup(baseline, path)
+        if not new or not old:
+            continue
+        change = (new - old) / old
+        regressed = -change > tolerance if higher_is_better else change > tolerance
+        print(f"{'⚠️' if regressed else '  '} {label:<24} {old:>10.2f} -> {new:>10.2f} ({change:+.1%})")
+
+
+if __name__ == "__main__":
+    args = parser.parse_args()
+    rng = random.Random(args.seed)
+    here = os.path.dirname(os.path.abspath(__file__))
+    output = os.path.abspath(args.output) if args.output else None  # Relative to where the benchmark was started
+    baseline = os.path.abspath(args.baseline) if args.baseline else None
+    workdir = os.path.abspath(args.workdir or tempfile.mkdtemp(prefix="benchmark_e2e_"))
+    os.makedirs(os.path.join(workdir, "data_input"), exist_ok=True)
+
+    server = FakeOpenAIServer(embedding_latency=args.embedding_latency, chat_latency=args.chat_latency,
+                              jitter=args.jitter, rpm=args.rpm, seed=args.seed).start()
+
+    # Point the app at the fake endpoint and a throwaway local index before it is imported
+    os.environ.update({
+        "ENDPOINT_URL": server.url,
+        "AZURE_OPENAI_API_KEY": "fake-key",
+        "VECTOR_STORE": "local",
+        "LOCAL_INDEX_PATH": os.path.join(workdir, "vector_index", "benchmark"),
+        "LEXICAL_INDEX_PATH": os.path.join(workdir, "vector_index", "lexical_benchmark"),
+        "INDEX_MANIFEST_PATH": os.path.join(workdir, "index_manifest.json"),
+        "EMBEDDING_CACHE_ENABLED": "false",
+        "WARM_UP": "false"
+    })
+    if not args.answer_cache:
+        os.environ["ANSWER_CACHE_SIZE"] = "0"
+    os.chdir(workdir)  # data_input/ and processed/ are relative to the working directory
+    sys.path.insert(0, here)
+
+    facts = synthetic_pdfs("data_input", args, rng)
+    queries = [(f"What does {code} mean for the {subject[0]} {subject[1]}?", code)
+               for code, subject in rng.sample(facts, min(args.queries, len(facts)))]
+
+    import app
+
+    # Time each stage where the app calls it
+    timer = StageTimer()
+    iter_pdfs, chunk_pages = app.iter_pdfs, app.chunk_pages
+    app.iter_pdfs = lambda *a, **kw: ((path, timer.iterate("extract", pages))
+                                      for path, pages in timer.iterate("extract", iter_pdfs(*a, **kw)))
+    app.chunk_pages = lambda *a, **kw: timer.iterate("chunk", chunk_pages(*a, **kw))
+    app.embed_text = timer.wrap("embed", app.embed_text)
+    app.store_embeddings = timer.wrap("vector_insert", app.store_embeddings)
+    app.flush_embeddings = timer.wrap("vector_flush", app.flush_embeddings)
+    app.search_hits = timer.wrap("vector_search", app.search_hits)
+    app.generate_answer = timer.wrap("llm", app.generate_answer)
+
+    expected = dict(queries)
+    context_hits = {}
+    pack_context = timer.wrap("pack_context", app.pack_context)
+
+    def checked_pack_context(user_query, *a, **kw):
+        chunks, citations = pack_context(user_query, *a, **kw)
+        context_hits[user_query] = any(expected.get(user_query, "\0") in chunk for chunk in chunks)
+        return chunks, citations
+    app.pack_context = checked_pack_context
+
+    try:
+        client = app.app.test_client()
+        print(f"Indexing {args.pdfs} PDFs x {args.pages} pages (fake embeddings: {args.embedding_latency * 1000:.0f}ms)...")
+        ingest = run_ingest(client, timer)
+        timer.clear()
+        print(f"Querying {len(queries)} times at concurrency {args.concurrency} "
+              f"(fake chat: {args.chat_latency * 1000:.0f}ms)...")
+        query = run_queries(app, queries, args.concurrency, timer, context_hits)
+
+        results = {
+            "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "config": {key: value for key, value in vars(args).items() if key not in ("output", "baseline", "workdir")},
+            "environment": {"python": platform.python_version(), "platform": platform.platform(),
+                            "cpus": os.cpu_count()},
+            "ingest": ingest,
+            "query": query,
+            "fake_openai": dict(server.counts),
+            "llm": app.gateway.stats()["by_name"]
+        }
+    finally:
+        server.stop()
+        if not args.workdir:
+            os.chdir(here)
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    print(f"\nIngest: {ingest['pages']} pages, {ingest['chunks']} chunks in {ingest['seconds']:.2f}s "
+          f"({ingest['pages_per_s']:.1f} pages/s, {ingest['chunks_per_s']:.1f} chunks/s)")
+    print(f"Query:  {query['queries']} queries in {query['seconds']:.2f}s ({query['queries_per_s']:.1f}/s), "
+          f"{query['failures']} failed, context hit rate {query['context_hit_rate']:.1%}")
+    print(f"{'stage':<22}{'count':>7}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'total s':>10}")
+    for phase in ("ingest", "query"):
+        rows = results[phase]["stages"].items()
+        if phase == "query":
+            rows = list(rows) + [("request (end to end)", results["query"]["latency"])]
+        for stage, s in rows:
+            print(f"{phase + ' ' + stage:<22}{s['count']:>7}{s['p50_ms']:>10.2f}{s['p95_ms']:>10.2f}"
+                  f"{s['p99_ms']:>10.2f}{s.get('total_s', 0):>10.2f}")
+    print(f"Fake endpoint: {server.counts}")
+
+    if output:
+        with open(output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+    if baseline:
+        with open(baseline, encoding="utf-8") as f:
+            compare(results, json.load(f), args.tolerance)
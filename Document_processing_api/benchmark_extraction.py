@@ -0,0 +1,49 @@
+import argparse
+import os
+import time
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))  # Repo root: the shared neuradocs package
+from neuradocs.process_pdf import extract_text_from_pdf, extract_text_from_pdfs
+
+parser = argparse.ArgumentParser(description="Compare serial and process-pool PDF extraction")
+parser.add_argument("--folder", default="processed", help="Folder containing the PDFs to extract")
+parser.add_argument("--copies", type=int, default=1, help="Repeat the file list to simulate a larger batch")
+parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Worker processes for the parallel run")
+parser.add_argument("--pages-per-task", type=int, default=50, help="Page range handed to each worker")
+
+
+def run_serial(file_paths):
+    return [extract_text_from_pdf(file_path) for file_path in file_paths]
+
+
+def run_parallel(file_paths, workers, pages_per_task):
+    return [pages for _, pages in extract_text_from_pdfs(file_paths, workers=workers, pages_per_task=pages_per_task)]
+
+
+if __name__ == "__main__":
+    args = parser.parse_args()
+
+    files = sorted(f for f in os.listdir(args.folder) if f.endswith(".pdf"))
+    if not files:
+        raise SystemExit(f"❌ No PDF files found in '{args.folder}'")
+
+    file_paths = [os.path.join(args.folder, f) for f in files] * args.copies
+
+    start = time.perf_counter()
+    serial = run_serial(file_paths)
+    serial_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    parallel = run_parallel(file_paths, args.workers, args.pages_per_task)
+    parallel_time = time.perf_counter() - start
+
+    total_pages = sum(len(pages) for pages in serial)
+    print(f"Files: {len(file_paths)} | Pages with text: {total_pages} | Workers: {args.workers}")
+    print(f"Serial:   {serial_time:.2f}s ({total_pages / serial_time:.1f} pages/s)")
+    print(f"Parallel: {parallel_time:.2f}s ({total_pages / parallel_time:.1f} pages/s)")
+    print(f"Speed-up: {serial_time / parallel_time:.2f}x")
+
+    if serial == parallel:
+        print("✅ Parallel output matches serial output (same order, same pages)")
+    else:
+        print("❌ Parallel output differs from serial output!")
@@ -0,0 +1,81 @@
+import argparse
+import os
+import shutil
+import tempfile
+import time
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))  # Repo root: the shared neuradocs package
+import numpy as np
+from neuradocs.vector_store import LocalVectorStore, QuantizedVectorStore
+
+parser = argparse.ArgumentParser(description="Memory, recall@k and latency of float16/int8 vector storage vs. float32")
+parser.add_argument("--sizes", default="10000,100000", help="Comma-separated corpus sizes")
+parser.add_argument("--dim", type=int, default=1536)
+parser.add_argument("--queries", type=int, default=200)
+parser.add_argument("--top-k", type=int, default=10)
+parser.add_argument("--rerank-factors", default="1,2,4,8", help="Candidates per hit rescored at full precision (1 = none)")
+parser.add_argument("--index", help="Benchmark on the embeddings of an existing local index (<path>.npy) instead")
+
+
+def clustered_vectors(n, dim, rng, clusters=100):
+    """Gaussian clusters, closer to real embeddings than uniform noise (where every neighbour is nearly tied)."""
+    centers = rng.standard_normal((clusters, dim), dtype=np.float32)
+    return centers[rng.integers(0, clusters, n)] + 0.3 * rng.standard_normal((n, dim), dtype=np.float32)
+
+
+def fill(store, vectors):
+    for i in range(0, len(vectors), 10000):
+        store.insert(vectors[i:i + 10000], [""] * len(vectors[i:i + 10000]))
+    store.flush()
+    return store
+
+
+def measure(store, queries, top_k):
+    latencies, found = [], []
+    for query in queries:
+        start = time.perf_counter()
+        hits = store.search(query, top_k)
+        latencies.append(time.perf_counter() - start)
+        found.append([hit["id"] for hit in hits])
+    return found, np.percentile(latencies, 50) * 1000, np.percentile(latencies, 95) * 1000
+
+
+def recall_at_k(found, truth):
+    return float(np.mean([len(set(f) & set(t)) / len(t) for f, t in zip(found, truth)]))
+
+
+def bench(vectors, queries, top_k, rerank_factors, workdir):
+    size = len(vectors)
+    baseline = fill(LocalVectorStore(os.path.join(workdir, f"float32_{size}"), vectors.shape[1]), vectors)
+    truth, p50, p95 = measure(baseline, queries, top_k)  # Exact search: the ground truth
+    base_memory = baseline.memory_bytes()
+    print(f"float32 n={size:<8} memory={base_memory / 2**20:8.1f} MiB (1.00x)  recall@{top_k}=1.000  "
+          f"p50={p50:7.2f}ms p95={p95:7.2f}ms")
+
+    for precision in ("float16", "int8"):
+        store = fill(QuantizedVectorStore(os.path.join(workdir, f"{precision}_{size}"), vectors.shape[1], precision), vectors)
+        memory = store.memory_bytes()
+        for factor in rerank_factors:
+            store.rerank_factor = factor
+            found, p50, p95 = measure(store, queries, top_k)
+            print(f"{precision:<7} n={size:<8} memory={memory / 2**20:8.1f} MiB ({memory / base_memory:.2f}x)  "
+                  f"recall@{top_k}={recall_at_k(found, truth):.3f}  p50={p50:7.2f}ms p95={p95:7.2f}ms  rerank x{factor}")
+
+
+if __name__ == "__main__":
+    args = parser.parse_args()
+    rng = np.random.default_rng(0)
+    rerank_factors = [int(f) for f in args.rerank_factors.split(",")]
+    workdir = tempfile.mkdtemp(prefix="benchmark_quantization_")
+    try:
+        if args.index:
+            stored = np.load(args.index, mmap_mode="r")
+            picks = rng.choice(len(stored), size=min(args.queries, len(stored)), replace=False)
+            queries = np.asarray(stored[picks]) + 0.01 * rng.standard_normal((len(picks), stored.shape[1]), dtype=np.float32)
+            bench(np.asarray(stored), queries, args.top_k, rerank_factors, workdir)
+        else:
+            for size in (int(s) for s in args.sizes.split(",")):
+                vectors = clustered_vectors(size + args.queries, args.dim, rng)  # Queries drawn from the same clusters
+                bench(vectors[:size], vectors[size:], args.top_k, rerank_factors, workdir)
+    finally:
+        shutil.rmtree(workdir)
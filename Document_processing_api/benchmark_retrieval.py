@@ -0,0 +1,149 @@
+import argparse
+import json
+import os
+import time
+import zlib
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))  # Repo root: the shared neuradocs package
+import numpy as np
+from neuradocs.vector_store import LocalVectorStore
+from neuradocs.lexical_index import BM25Index, reciprocal_rank_fusion
+
+parser = argparse.ArgumentParser(description="Compare dense-only and hybrid (BM25 + dense, RRF) retrieval: recall@k and latency")
+parser.add_argument("--chunks", type=int, default=100000, help="Synthetic corpus size")
+parser.add_argument("--queries", type=int, default=500, help="Synthetic queries (each targets one chunk by its error code)")
+parser.add_argument("--dim", type=int, default=256, help="Synthetic embedding dimension")
+parser.add_argument("--topics", type=int, default=200)
+parser.add_argument("--code-weight", type=float, default=0.15,
+                    help="How strongly the synthetic embedding encodes the exact code (embeddings blur codes)")
+parser.add_argument("--top-k", type=int, default=3)
+parser.add_argument("--candidates", type=int, default=20, help="Hits taken from each retriever before fusion")
+parser.add_argument("--rrf-k", type=int, default=60)
+parser.add_argument("--labelled", help="JSONL of {\"query\", \"answer\"}: evaluate the configured store instead "
+                                        "(a hit is a retrieved chunk containing the answer text)")
+parser.add_argument("--path", default="vector_index/retrieval_benchmark", help="Where the synthetic indexes are written")
+
+WORDS = ("account password login billing invoice refund subscription upgrade device browser network router "
+         "firmware update install restart backup restore sync export import report ticket support error warning "
+         "timeout connection server client storage upload download permission security privacy setting").split()
+
+
+def percentile_ms(latencies, q):
+    return float(np.percentile(latencies, q) * 1000)
+
+
+def unit(vectors):
+    return vectors / np.linalg.norm(vectors, axis=-1, keepdims=True)
+
+
+def code_vector(code, dim):
+    return np.random.default_rng(zlib.crc32(code.encode())).standard_normal(dim).astype(np.float32)
+
+
+def synthetic_corpus(args, rng):
+    """Chunks about a topic, each mentioning one unique error code and a product model."""
+    topic_vectors = unit(rng.standard_normal((args.topics, args.dim)).astype(np.float32))
+    topic_words = [rng.choice(WORDS, size=6, replace=False) for _ in range(args.topics)]
+    texts, vectors, topics = [], np.empty((args.chunks, args.dim), dtype=np.float32), []
+    for i in range(args.chunks):
+        topic = int(rng.integers(args.topics))
+        code = f"ERR-{i:07d}"
+        words = " ".join(rng.choice(topic_words[topic], size=40))
+        texts.append(f"{words}. Error code {code} affects model X{int(rng.integers(1000)):03d}.")
+        noise = rng.standard_normal(args.dim).astype(np.float32) / np.sqrt(args.dim)
+        vectors[i] = topic_vectors[topic] + 0.35 * noise + args.code_weight * unit(code_vector(code, args.dim))
+        topics.append(topic)
+    return texts, unit(vectors), topic_vectors, topic_words, topics
+
+
+def synthetic_queries(args, rng, topic_vectors, topic_words, topics):
+    queries = []
+    for target in rng.choice(args.chunks, size=args.queries, replace=False):
+        topic, code = topics[target], f"ERR-{target:07d}"
+        text = f"What does {code} mean when my {' '.join(rng.choice(topic_words[topic], size=2))} fails?"
+        noise = rng.standard_normal(args.dim).astype(np.float32) / np.sqrt(args.dim)
+        vector = unit(topic_vectors[topic] + 0.35 * noise + args.code_weight * unit(code_vector(code, args.dim)))
+        queries.append((text, vector, int(target)))
+    return queries
+
+
+def hybrid_search(store, lexical, text, vector, args):
+    dense_hits = store.search(vector, top_k=max(args.top_k, args.candidates))
+    lexical_hits = lexical.search(text, top_k=max(args.top_k, args.candidates))
+    return reciprocal_rank_fusion(
+        [[hit["id"] for hit in dense_hits], [doc_id for doc_id, _ in lexical_hits]], k=args.rrf_k, top_k=args.top_k
+    )
+
+
+def report(name, hits, latencies):
+    print(f"{name:<8} recall@k={np.mean(hits):.3f}  p50={percentile_ms(latencies, 50):7.2f}ms "
+          f"p95={percentile_ms(latencies, 95):7.2f}ms p99={percentile_ms(latencies, 99):7.2f}ms")
+
+
+def run_synthetic(args):
+    rng = np.random.default_rng(0)
+    for suffix in (".npy", ".ids.npy", ".meta.npy", ".names.json", ".texts.jsonl", ".state.json", ".lexical.npz"):
+        if os.path.exists(args.path + suffix):
+            os.remove(args.path + suffix)  # Start from empty indexes on every run
+
+    texts, vectors, topic_vectors, topic_words, topics = synthetic_corpus(args, rng)
+    store = LocalVectorStore(args.path, args.dim)
+    lexical = BM25Index(f"{args.path}.lexical")
+    start = time.perf_counter()
+    for i in range(0, args.chunks, 10000):
+        ids = store.insert(vectors[i:i + 10000], texts[i:i + 10000])
+        lexical.add(ids, texts[i:i + 10000])
+    print(f"Indexed {args.chunks} chunks in {time.perf_counter() - start:.1f}s")
+    start = time.perf_counter()
+    lexical.save()
+    print(f"Lexical index: {os.path.getsize(lexical.path) / 2**20:.1f} MiB on disk, saved in {time.perf_counter() - start:.2f}s")
+
+    queries = synthetic_queries(args, rng, topic_vectors, topic_words, topics)
+    modes = {
+        "dense": lambda text, vector: [hit["id"] for hit in store.search(vector, top_k=args.top_k)],
+        "bm25": lambda text, vector: [doc_id for doc_id, _ in lexical.search(text, top_k=args.top_k)],
+        "hybrid": lambda text, vector: hybrid_search(store, lexical, text, vector, args)
+    }
+    for name, search in modes.items():
+        hits, latencies = [], []
+        for text, vector, target in queries:
+            start = time.perf_counter()
+            retrieved = search(text, vector)
+            latencies.append(time.perf_counter() - start)
+            hits.append(target in retrieved)
+        report(name, hits, latencies)
+
+    # Single-term lookups on the exact codes (the case dense retrieval misses)
+    latencies = []
+    for _, _, target in queries:
+        start = time.perf_counter()
+        lexical.search(f"ERR-{target:07d}", top_k=args.top_k)
+        latencies.append(time.perf_counter() - start)
+    print(f"term lookup p50={percentile_ms(latencies, 50):.3f}ms p99={percentile_ms(latencies, 99):.3f}ms")
+
+
+def run_labelled(args):
+    """Evaluate the configured store and lexical index on real queries (needs the embedding service)."""
+    from embedding import embed_text
+    from vector_db import search_embeddings
+
+    with open(args.labelled, encoding="utf-8") as f:
+        labelled = [json.loads(line) for line in f if line.strip()]
+    embeddings = embed_text([item["query"] for item in labelled])
+
+    for name, use_text in (("dense", False), ("hybrid", True)):
+        hits, latencies = [], []
+        for item, embedding in zip(labelled, embeddings):
+            start = time.perf_counter()
+            chunks = search_embeddings(embedding, top_k=args.top_k, query_text=item["query"] if use_text else None)
+            latencies.append(time.perf_counter() - start)
+            hits.append(any(item["answer"].lower() in chunk.lower() for chunk in chunks))
+        report(name, hits, latencies)
+
+
+if __name__ == "__main__":
+    args = parser.parse_args()
+    if args.labelled:
+        run_labelled(args)
+    else:
+        run_synthetic(args)
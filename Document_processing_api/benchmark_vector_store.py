@@ -0,0 +1,139 @@
+import argparse
+import os
+import time
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))  # Repo root: the shared neuradocs package
+import numpy as np
+from neuradocs.vector_store import LocalVectorStore
+from neuradocs.search_filter import SearchFilter, partition_name
+
+parser = argparse.ArgumentParser(description="Benchmark the local NumPy vector store against Milvus")
+parser.add_argument("--sizes", default="10000,100000,1000000", help="Comma-separated corpus sizes")
+parser.add_argument("--dim", type=int, default=1536)
+parser.add_argument("--queries", type=int, default=200)
+parser.add_argument("--top-k", type=int, default=3)
+parser.add_argument("--milvus", action="store_true", help="Also benchmark a Milvus server (MILVUS_HOST/PORT from config)")
+parser.add_argument("--path", default="vector_index/benchmark", help="Where the local index is written")
+parser.add_argument("--tenants", type=int, default=0,
+                    help="Spread the corpus over this many tenants and also time searches scoped to one of them")
+
+
+def random_vectors(n, dim, rng):
+    return rng.standard_normal((n, dim), dtype=np.float32)
+
+
+def percentile_ms(latencies, q):
+    return float(np.percentile(latencies, q) * 1000)
+
+
+def time_searches(search, queries, top_k):
+    latencies = []
+    for query in queries:
+        start = time.perf_counter()
+        search(query, top_k)
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+def report(name, size, insert_time, latencies):
+    print(f"{name:<7} n={size:<8} insert={size / insert_time:>9.0f} vec/s  "
+          f"search p50={percentile_ms(latencies, 50):7.2f}ms p95={percentile_ms(latencies, 95):7.2f}ms "
+          f"p99={percentile_ms(latencies, 99):7.2f}ms")
+
+
+def tenant_of(row, tenants, file_rows=1000):
+    """Tenant of a corpus row: files of `file_rows` chunks each, dealt to the tenants in turn (as jobs interleave)."""
+    return f"tenant{row // file_rows % tenants}"
+
+
+def bench_local(size, vectors, queries, top_k, path, tenants=0):
+    index_path = f"{path}_{size}"
+    for suffix in (".npy", ".texts.jsonl", ".meta.npy", ".names.json"):
+        if os.path.exists(index_path + suffix):
+            os.remove(index_path + suffix)  # Start from an empty index on every run
+
+    store = LocalVectorStore(index_path, vectors.shape[1])
+    texts = [f"chunk {i}" for i in range(size)]
+    start = time.perf_counter()
+    for i in range(0, size, 10000):
+        metadata = [{"tenant": tenant_of(j, tenants)} for j in range(i, min(i + 10000, size))] if tenants else None
+        store.insert(vectors[i:i + 10000], texts[i:i + 10000], metadata)
+    store.flush()
+    insert_time = time.perf_counter() - start
+
+    latencies = time_searches(lambda q, k: store.search(q, k), queries, top_k)
+    report("local", size, insert_time, latencies)
+    if tenants:
+        scoped = SearchFilter(tenants=(tenant_of(0, tenants),))
+        report(f"  1/{tenants}", size, insert_time,
+               time_searches(lambda q, k: store.search(q, k, search_filter=scoped), queries, top_k))
+    print(f"        matrix memory: {store.count() * vectors.shape[1] * 4 / 2**20:.0f} MiB")
+
+    # Exact search, so recall@k is 1.0 by construction; check it on a sample anyway.
+    exact = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+    expected = np.argsort(-(exact @ (queries[0] / np.linalg.norm(queries[0]))))[:top_k]
+    assert [hit["id"] for hit in store.search(queries[0], top_k)] == expected.tolist()
+
+
+def bench_milvus(size, vectors, queries, top_k, tenants=0):
+    from pymilvus import connections, Collection, CollectionSchema, FieldSchema, DataType, utility
+    from config import MILVUS_HOST, MILVUS_PORT
+    from vector_db import MILVUS_INDEX_PARAMS, MILVUS_SEARCH_PARAMS  # The service's configured index
+
+    name = f"benchmark_{size}"
+    connections.connect(alias="default", host=MILVUS_HOST, port=MILVUS_PORT)
+    if name in utility.list_collections():
+        Collection(name).drop()
+    fields = [
+        FieldSchema(name="id", dtype=DataType.INT64, is_primary=True, auto_id=True),
+        FieldSchema(name="embedding", dtype=DataType.FLOAT_VECTOR, dim=vectors.shape[1]),
+        FieldSchema(name="text", dtype=DataType.VARCHAR, max_length=64)
+    ]
+    collection = Collection(name, CollectionSchema(fields))
+
+    start = time.perf_counter()
+    if tenants:
+        # One partition per tenant, as the service stores them with PARTITION_BY=tenant
+        owners = np.array([tenant_of(row, tenants) for row in range(size)])
+        for tenant in np.unique(owners):
+            collection.create_partition(partition_name(tenant))
+            rows = np.flatnonzero(owners == tenant)
+            for i in range(0, len(rows), 10000):
+                batch = rows[i:i + 10000]
+                collection.insert([vectors[batch].tolist(), [f"chunk {j}" for j in batch]],
+                                  partition_name=partition_name(tenant))
+    else:
+        for i in range(0, size, 10000):
+            batch = vectors[i:i + 10000]
+            collection.insert([batch.tolist(), [f"chunk {j}" for j in range(i, i + len(batch))]])
+    collection.flush()
+    collection.create_index("embedding", MILVUS_INDEX_PARAMS)
+    collection.load()
+    insert_time = time.perf_counter() - start
+
+    latencies = time_searches(
+        lambda q, k: collection.search(data=[q.tolist()], anns_field="embedding", param=MILVUS_SEARCH_PARAMS, limit=k,
+                                       output_fields=["text"]),
+        queries, top_k
+    )
+    report("milvus", size, insert_time, latencies)
+    if tenants:
+        scoped = [partition_name(tenant_of(0, tenants))]
+        report(f"  1/{tenants}", size, insert_time, time_searches(
+            lambda q, k: collection.search(data=[q.tolist()], anns_field="embedding", param=MILVUS_SEARCH_PARAMS,
+                                           limit=k, output_fields=["text"], partition_names=scoped),
+            queries, top_k
+        ))
+    collection.drop()
+
+
+if __name__ == "__main__":
+    args = parser.parse_args()
+    rng = np.random.default_rng(0)
+    queries = random_vectors(args.queries, args.dim, rng)
+
+    for size in (int(s) for s in args.sizes.split(",")):
+        vectors = random_vectors(size, args.dim, rng)
+        bench_local(size, vectors, queries, args.top_k, args.path, args.tenants)
+        if args.milvus:
+            bench_milvus(size, vectors, queries, args.top_k, args.tenants)
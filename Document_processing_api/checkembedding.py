@@ -1,31 +1,248 @@
-from pymilvus import connections, Collection
-from config import MILVUS_HOST, MILVUS_PORT, COLLECTION_NAME
+import argparse
+import json
+import time
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))  # Repo root: the shared neuradocs package
+import numpy as np
+from pymilvus import connections, Collection, CollectionSchema, FieldSchema, DataType, utility
+from config import (
+    MILVUS_HOST, MILVUS_PORT, COLLECTION_NAME, EMBEDDING_DIM, MILVUS_METRIC_TYPE, MILVUS_INDEX_EF_CONSTRUCTION
+)
+from neuradocs.ann_index import INDEX_TYPES, index_params, search_params, memory_estimate
 
-# Connect to Milvus
-connections.connect(alias="default", host=MILVUS_HOST, port=MILVUS_PORT)
+parser = argparse.ArgumentParser(description="Inspect the Milvus collection, or tune its ANN index with --tune")
+parser.add_argument("--tune", action="store_true", help="Sweep index types and parameters for recall@k and latency")
+parser.add_argument("--sample", type=int, default=20000, help="Vectors sampled from the collection as the tuning corpus")
+parser.add_argument("--synthetic", type=int, default=0, help="Tune on this many clustered random vectors instead")
+parser.add_argument("--queries", type=int, default=200, help="Vectors held out of the corpus as queries")
+parser.add_argument("--queries-file", help="Query embeddings (.npy, shape [n, dim]) instead of held-out vectors")
+parser.add_argument("--top-k", type=int, default=10)
+parser.add_argument("--target-recall", type=float, default=0.95, help="Recommend the fastest setting reaching this recall@k")
+parser.add_argument("--index-types", default="FLAT,IVF_FLAT,IVF_SQ8,IVF_PQ,HNSW", help="Comma-separated subset of " + ",".join(INDEX_TYPES))
+parser.add_argument("--nlist", default="256,1024", help="IVF_* cluster counts to build")
+parser.add_argument("--pq-m", default="48,96", help="IVF_PQ sub-vector counts to build (must divide the dimension)")
+parser.add_argument("--pq-nbits", type=int, default=8)
+parser.add_argument("--hnsw-m", default="16,32", help="HNSW links per node to build")
+parser.add_argument("--ef-construction", type=int, default=MILVUS_INDEX_EF_CONSTRUCTION)
+parser.add_argument("--nprobe", default="8,16,32,64,128", help="IVF_* clusters scanned per query")
+parser.add_argument("--ef", default="16,32,64,128,256", help="HNSW candidates per query (values below --top-k are skipped)")
+parser.add_argument("--output", help="Write every measured setting to this JSON file")
 
-# Load Collection
-collection = Collection(COLLECTION_NAME)
-collection.load()
 
-# Check Total Number of Embeddings
-num_entities = collection.num_entities
-print(f"✅ Total stored embeddings: {num_entities}")
+def ints(value):
+    return [int(v) for v in value.split(",") if v]
 
-# Fetch Sample Records
-results = collection.query(
-    expr="id >= 0",  
-    output_fields=["id", "embedding", "text"],  
-    limit=5  # Retrieve 5 records
-)
 
-print("\n✅ Sample Records:")
-for doc in results:
-    print(doc)  # Print ID, embedding, and text
+def inspect_collection():
+    """Prints the size of the collection and a few sample records."""
+    collection = Collection(COLLECTION_NAME)
+    collection.load()
+
+    # Check Total Number of Embeddings
+    num_entities = collection.num_entities
+    print(f"✅ Total stored embeddings: {num_entities}")
+
+    # Fetch Sample Records
+    results = collection.query(
+        expr="id >= 0",
+        output_fields=["id", "embedding", "text"],
+        limit=5  # Retrieve 5 records
+    )
+
+    print("\n✅ Sample Records:")
+    for doc in results:
+        print(doc)  # Print ID, embedding, and text
+
+    # Check Embedding Dimensions
+    if results:
+        embedding_sample = results[0]["embedding"]
+        print(f"\n✅ Embedding shape: {len(embedding_sample)} (should be {EMBEDDING_DIM})")
+    else:
+        print("\n❌ No embeddings found in the collection!")
+
+
+def sample_vectors(count):
+    """Up to `count` stored embeddings, read in pages so large samples stay under Milvus' query limit."""
+    collection = Collection(COLLECTION_NAME)
+    collection.load()
+    iterator = collection.query_iterator(batch_size=1000, expr="id >= 0", output_fields=["embedding"])
+    vectors = []
+    try:
+        while len(vectors) < count:
+            page = iterator.next()
+            if not page:
+                break
+            vectors.extend(row["embedding"] for row in page)
+    finally:
+        iterator.close()
+    return np.asarray(vectors[:count], dtype=np.float32)
+
+
+def synthetic_vectors(count, dim, rng, clusters=100):
+    """Gaussian clusters, which ANN indexes partition like real embeddings (uniform noise has no structure)."""
+    centers = rng.standard_normal((clusters, dim), dtype=np.float32)
+    return centers[rng.integers(0, clusters, count)] + 0.3 * rng.standard_normal((count, dim), dtype=np.float32)
+
+
+def exact_top_k(corpus, queries, top_k):
+    """Ground truth: row indices of the `top_k` highest cosine similarities per query."""
+    corpus = corpus / np.linalg.norm(corpus, axis=1, keepdims=True)
+    queries = queries / np.linalg.norm(queries, axis=1, keepdims=True)
+    scores = queries @ corpus.T
+    top = np.argpartition(-scores, top_k - 1, axis=1)[:, :top_k]
+    order = np.argsort(-np.take_along_axis(scores, top, axis=1), axis=1)
+    return np.take_along_axis(top, order, axis=1)
+
+
+def recall_at_k(found, truth):
+    """Share of the exact top-k neighbours the index returned, averaged over queries."""
+    return float(np.mean([len(set(f) & set(t.tolist())) / len(t) for f, t in zip(found, truth)]))
+
+
+def build_grid(args, dim):
+    """Index parameter sets to build, one per combination of the build options that apply to each type."""
+    grid = []
+    for index_type in args.index_types.upper().split(","):
+        if index_type == "FLAT":
+            grid.append(index_params("FLAT", MILVUS_METRIC_TYPE))
+        elif index_type in ("IVF_FLAT", "IVF_SQ8"):
+            grid.extend(index_params(index_type, MILVUS_METRIC_TYPE, nlist=n) for n in ints(args.nlist))
+        elif index_type == "IVF_PQ":
+            grid.extend(index_params("IVF_PQ", MILVUS_METRIC_TYPE, nlist=n, pq_m=m, pq_nbits=args.pq_nbits)
+                        for n in ints(args.nlist) for m in ints(args.pq_m) if dim % m == 0)
+        elif index_type == "HNSW":
+            grid.extend(index_params("HNSW", MILVUS_METRIC_TYPE, hnsw_m=m, ef_construction=args.ef_construction)
+                        for m in ints(args.hnsw_m))
+        else:
+            raise ValueError(f"Unknown index type {index_type!r}; expected one of {', '.join(INDEX_TYPES)}")
+    return grid
+
+
+def search_grid(args, index_type):
+    """Search parameter sets to sweep for one built index."""
+    if index_type == "FLAT":
+        return [search_params("FLAT", MILVUS_METRIC_TYPE)]
+    if index_type == "HNSW":
+        return [search_params("HNSW", MILVUS_METRIC_TYPE, ef=ef) for ef in ints(args.ef) if ef >= args.top_k]
+    return [search_params(index_type, MILVUS_METRIC_TYPE, nprobe=n) for n in ints(args.nprobe)]
+
+
+def create_tuning_collection(name, corpus):
+    """Scratch collection whose primary keys are the corpus row indices, so hits compare directly to ground truth."""
+    if name in utility.list_collections():
+        Collection(name).drop()
+    fields = [
+        FieldSchema(name="id", dtype=DataType.INT64, is_primary=True, auto_id=False),
+        FieldSchema(name="embedding", dtype=DataType.FLOAT_VECTOR, dim=corpus.shape[1])
+    ]
+    collection = Collection(name, CollectionSchema(fields, description="ANN tuning scratch collection"))
+    for start in range(0, len(corpus), 5000):
+        batch = corpus[start:start + 5000]
+        collection.insert([list(range(start, start + len(batch))), batch.tolist()])
+    collection.flush()
+    return collection
+
+
+def measure(collection, queries, truth, params, top_k):
+    """recall@k and per-query latency percentiles for one search setting (one query per request, as the API does)."""
+    found, latencies = [], []
+    for query in queries:
+        start = time.perf_counter()
+        results = collection.search(data=[query.tolist()], anns_field="embedding", param=params, limit=top_k)
+        latencies.append(time.perf_counter() - start)
+        found.append([hit.id for hit in results[0]])
+    return {
+        "recall": recall_at_k(found, truth),
+        "p50_ms": float(np.percentile(latencies, 50) * 1000),
+        "p95_ms": float(np.percentile(latencies, 95) * 1000)
+    }
+
+
+def recommend(rows, target_recall):
+    """Lowest p95 latency among settings reaching `target_recall`, else the most accurate setting."""
+    reaching = [row for row in rows if row["recall"] >= target_recall]
+    if reaching:
+        return min(reaching, key=lambda row: (row["p95_ms"], row["memory_mb"]))
+    return max(rows, key=lambda row: (row["recall"], -row["p95_ms"]))
+
+
+def env_lines(row):
+    """The config settings that reproduce a measured row."""
+    build, search = row["index"]["params"], row["search"]["params"]
+    names = {"nlist": "MILVUS_INDEX_NLIST", "m": "MILVUS_INDEX_PQ_M", "nbits": "MILVUS_INDEX_PQ_NBITS",
+             "M": "MILVUS_INDEX_HNSW_M", "efConstruction": "MILVUS_INDEX_EF_CONSTRUCTION",
+             "nprobe": "MILVUS_SEARCH_NPROBE", "ef": "MILVUS_SEARCH_EF"}
+    lines = [f"MILVUS_INDEX_TYPE={row['index']['index_type']}"]
+    lines.extend(f"{names[key]}={value}" for key, value in {**build, **search}.items())
+    return lines
+
+
+def tune(args):
+    """Builds each candidate index on a scratch copy of the corpus and reports recall@k vs. latency."""
+    rng = np.random.default_rng(0)
+    if args.synthetic:
+        corpus = synthetic_vectors(args.synthetic + args.queries, EMBEDDING_DIM, rng)
+    else:
+        corpus = sample_vectors(args.sample + (0 if args.queries_file else args.queries))
+    if args.queries_file:
+        queries = np.load(args.queries_file).astype(np.float32)
+    else:
+        held_out = rng.choice(len(corpus), size=min(args.queries, len(corpus) // 10), replace=False)
+        queries = corpus[held_out]
+        corpus = np.delete(corpus, held_out, axis=0)  # Held out, so no query finds itself
+    if len(corpus) < args.top_k or not len(queries):
+        raise SystemExit(f"❌ Not enough vectors to tune on ({len(corpus)} in the corpus, {len(queries)} queries)")
+
+    dim = corpus.shape[1]
+    print(f"Tuning on {len(corpus)} vectors (dim={dim}) with {len(queries)} queries, recall@{args.top_k}")
+    truth = exact_top_k(corpus, queries, args.top_k)
+
+    collection = create_tuning_collection(f"{COLLECTION_NAME}_tuning", corpus)
+    rows = []
+    try:
+        for build in build_grid(args, dim):
+            collection.release()
+            if collection.has_index():
+                collection.drop_index()
+            start = time.perf_counter()
+            collection.create_index("embedding", build)
+            build_seconds = time.perf_counter() - start
+            collection.load()
+            memory = memory_estimate(build["index_type"], len(corpus), dim, **{
+                key: build["params"][name] for key, name in
+                (("nlist", "nlist"), ("pq_m", "m"), ("pq_nbits", "nbits"), ("hnsw_m", "M")) if name in build["params"]
+            })
+            for params in search_grid(args, build["index_type"]):
+                row = {"index": build, "search": params, "build_s": round(build_seconds, 2),
+                       "memory_mb": round(memory / 2**20, 1), **measure(collection, queries, truth, params, args.top_k)}
+                rows.append(row)
+                print(f"{build['index_type']:<8} {json.dumps(build['params']):<32} {json.dumps(params['params']):<18} "
+                      f"recall@{args.top_k}={row['recall']:.3f} p50={row['p50_ms']:6.2f}ms p95={row['p95_ms']:6.2f}ms "
+                      f"build={row['build_s']:6.1f}s mem≈{row['memory_mb']:.0f}MiB")
+    finally:
+        collection.drop()
+
+    best = recommend(rows, args.target_recall)
+    if best["recall"] < args.target_recall:
+        print(f"\n⚠️ No setting reached recall@{args.top_k} >= {args.target_recall}; the most accurate one is:")
+    else:
+        print(f"\n✅ Fastest setting with recall@{args.top_k} >= {args.target_recall}:")
+    print("\n".join(env_lines(best)))
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"top_k": args.top_k, "target_recall": args.target_recall, "recommended": best, "results": rows},
+                      f, indent=2)
+
+
+if __name__ == "__main__":
+    args = parser.parse_args()
+
+    # Connect to Milvus
+    connections.connect(alias="default", host=MILVUS_HOST, port=MILVUS_PORT)
 
-# Check Embedding Dimensions
-if results:
-    embedding_sample = results[0]["embedding"]
-    print(f"\n✅ Embedding shape: {len(embedding_sample)} (should be 1536)")
-else:
-    print("\n❌ No embeddings found in the collection!")
+    if args.tune:
+        tune(args)
+    else:
+        inspect_collection()
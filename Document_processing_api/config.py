@@ -4,19 +4,116 @@ from dotenv import load_dotenv
 # Load environment variables
 load_dotenv()
 
+
+def env(name, default=None):
+    """`os.getenv`, except that a blank value (as left in sample.env) also means "use the default"."""
+    value = os.getenv(name)
+    return default if value is None or not value.strip() else value
+
+
 # Azure OpenAI Configuration
 USE_AZURE = True  # Set to False to use SentenceTransformers
-AZURE_OPENAI_API_KEY = os.getenv("AZURE_OPENAI_API_KEY")
-AZURE_OPENAI_ENDPOINT = os.getenv("ENDPOINT_URL")
-AZURE_OPENAI_DEPLOYMENT_NAME = os.getenv("DEPLOYMENT_NAME","text-embedding-ada-002")
-AZURE_OPENAI_VERSION=os.getenv("AZURE_OPENAI_VERSION","gpt-35-turbo")
-AZURE_OPENAI_API_VERSION=("AZURE_OPENAI_API_VERSION","2023-03-15-preview")
+AZURE_OPENAI_API_KEY = env("AZURE_OPENAI_API_KEY")
+AZURE_OPENAI_ENDPOINT = env("ENDPOINT_URL")
+AZURE_OPENAI_DEPLOYMENT_NAME = env("DEPLOYMENT_NAME","text-embedding-ada-002")
+AZURE_OPENAI_VERSION=env("AZURE_OPENAI_VERSION","gpt-35-turbo")
+AZURE_OPENAI_API_VERSION = env("AZURE_OPENAI_API_VERSION", "2024-05-01-preview")  # Same default as LLMGateway.from_env
+DEPLOYMENT_CHAT = env("DEPLOYMENT_CHAT", AZURE_OPENAI_VERSION)  # Chat deployment used by /documents_query
 
 
 # Milvus Configuration
 MILVUS_HOST = "localhost"
 MILVUS_PORT = "19530"
 COLLECTION_NAME = "document_embeddings"
+MILVUS_POOL_SIZE = int(env("MILVUS_POOL_SIZE", 4))  # Connection aliases for concurrent requests
+MILVUS_FLUSH_ROWS = int(env("MILVUS_FLUSH_ROWS", 50000))  # Flush after this many inserted rows...
+MILVUS_FLUSH_INTERVAL = int(env("MILVUS_FLUSH_INTERVAL", 300))  # ...or this many seconds
+
+# ANN Index (built with the collection; an existing index with other settings is rebuilt when the store opens)
+MILVUS_INDEX_TYPE = env("MILVUS_INDEX_TYPE", "IVF_FLAT").upper()  # FLAT, IVF_FLAT, IVF_SQ8, IVF_PQ or HNSW
+MILVUS_METRIC_TYPE = "COSINE"  # ✅ Same metric for building and searching the index
+MILVUS_INDEX_NLIST = int(env("MILVUS_INDEX_NLIST", 1024))  # IVF_*: clusters built
+MILVUS_INDEX_PQ_M = int(env("MILVUS_INDEX_PQ_M", 96))  # IVF_PQ: sub-vectors per embedding (must divide EMBEDDING_DIM)
+MILVUS_INDEX_PQ_NBITS = int(env("MILVUS_INDEX_PQ_NBITS", 8))  # IVF_PQ: bits per sub-vector code
+MILVUS_INDEX_HNSW_M = int(env("MILVUS_INDEX_HNSW_M", 16))  # HNSW: links per node
+MILVUS_INDEX_EF_CONSTRUCTION = int(env("MILVUS_INDEX_EF_CONSTRUCTION", 200))  # HNSW: candidates while building
+MILVUS_SEARCH_NPROBE = int(env("MILVUS_SEARCH_NPROBE", 10))  # IVF_*: clusters scanned per query
+MILVUS_SEARCH_EF = int(env("MILVUS_SEARCH_EF", 64))  # HNSW: candidates per query (raised to top_k if lower)
+
+# Vector Store ("milvus" or "local" for the in-process NumPy index)
+VECTOR_STORE = env("VECTOR_STORE", "milvus").lower()
+LOCAL_INDEX_PATH = env("LOCAL_INDEX_PATH", "vector_index/document_embeddings")  # Writes .npy + .texts.jsonl
+
+# Compact Vector Storage (scan compressed vectors, then rerank the best candidates at full precision)
+VECTOR_PRECISION = env("VECTOR_PRECISION", "float32").lower()  # Local store: float32, float16 or int8
+RERANK_FACTOR = int(env("RERANK_FACTOR", 4))  # Candidates per requested hit rescored at full precision (local float16/int8, Milvus IVF_SQ8/IVF_PQ)
+
+# Chunk Metadata & Partitions (Milvus keeps each tenant or document in its own partition; filtered queries scan only those)
+PARTITION_BY = env("PARTITION_BY", "tenant").lower()  # "tenant", "document" or "none" (Milvus allows ~1024-4096 partitions)
+DEFAULT_TENANT = env("DEFAULT_TENANT", "default")  # Tenant of files indexed without one
+
+# PDF Extraction
+EXTRACT_WORKERS = int(env("EXTRACT_WORKERS", os.cpu_count() or 1))  # Set to 1 for serial extraction
+EXTRACT_PAGES_PER_TASK = int(env("EXTRACT_PAGES_PER_TASK", 50))  # Page range handed to each worker
+
+# Chunking
+CHUNK_TOKENS = int(env("CHUNK_TOKENS", 512))  # Maximum tokens per chunk
+CHUNK_OVERLAP_TOKENS = int(env("CHUNK_OVERLAP_TOKENS", 64))  # Tokens shared by consecutive chunks
+TOKENIZER_ENCODING = env("TOKENIZER_ENCODING", "cl100k_base")  # Matches text-embedding-ada-002
+
+# Embedding Batcher
+EMBED_MAX_BATCH_TOKENS = int(env("EMBED_MAX_BATCH_TOKENS", 8000))  # Token cap per embedding request
+EMBED_MAX_BATCH_ITEMS = int(env("EMBED_MAX_BATCH_ITEMS", 16))  # Input cap per embedding request
+EMBED_CONCURRENCY = int(env("EMBED_CONCURRENCY", 4))  # Embedding requests in flight at once
+EMBED_MAX_RETRIES = int(env("EMBED_MAX_RETRIES", 6))  # Retries on 429/5xx before giving up
+
+# Embedding Cache
+EMBEDDING_DIM = 1536  # ✅ Must match Azure OpenAI embeddings
+EMBEDDING_CACHE_ENABLED = env("EMBEDDING_CACHE_ENABLED", "true").lower() == "true"
+EMBEDDING_CACHE_PATH = env("EMBEDDING_CACHE_PATH", "embedding_cache.sqlite3")
+EMBEDDING_CACHE_MAX_ENTRIES = int(env("EMBEDDING_CACHE_MAX_ENTRIES", 500000))  # LRU eviction beyond this
+
+# Indexing Pipeline
+EMBED_BATCH_SIZE = int(env("EMBED_BATCH_SIZE", 128))  # Chunks per embedding stage batch (split further by the batcher)
+INSERT_BATCH_SIZE = int(env("INSERT_BATCH_SIZE", 256))  # Vectors per Milvus insert
+PIPELINE_QUEUE_SIZE = int(env("PIPELINE_QUEUE_SIZE", 4))  # Batches buffered between stages
+INDEX_MANIFEST_PATH = env("INDEX_MANIFEST_PATH", "index_manifest.json")  # File hash -> chunk IDs
+INDEX_JOB_WORKERS = int(env("INDEX_JOB_WORKERS", 1))  # Indexing jobs running at the same time
+INDEX_MAX_JOBS = int(env("INDEX_MAX_JOBS", 4))  # Jobs queued or running before /index returns 429
+
+# Hybrid Retrieval (BM25 + vector hits fused with reciprocal rank fusion)
+HYBRID_SEARCH = env("HYBRID_SEARCH", "true").lower() == "true"
+LEXICAL_INDEX_PATH = env("LEXICAL_INDEX_PATH", "vector_index/lexical_index")  # Writes .npz
+HYBRID_CANDIDATES = int(env("HYBRID_CANDIDATES", 20))  # Hits taken from each retriever before fusion
+RRF_K = int(env("RRF_K", 60))  # Rank constant of reciprocal rank fusion
+
+# Query Caches
+QUERY_CACHE_SIZE = int(env("QUERY_CACHE_SIZE", 1024))  # Query embeddings kept in memory
+QUERY_CACHE_TTL = int(env("QUERY_CACHE_TTL", 3600))  # Seconds
+ANSWER_CACHE_SIZE = int(env("ANSWER_CACHE_SIZE", 1024))  # Answers kept for semantic lookup
+ANSWER_CACHE_TTL = int(env("ANSWER_CACHE_TTL", 3600))  # Seconds
+ANSWER_CACHE_THRESHOLD = float(env("ANSWER_CACHE_THRESHOLD", 0.99))  # Cosine similarity for a hit (and the same numbers and identifiers)
+
+# Batch Queries
+BATCH_QUERY_MAX_QUESTIONS = int(env("BATCH_QUERY_MAX_QUESTIONS", 5000))  # Queries accepted per batch call
+BATCH_QUERY_CONCURRENCY = int(env("BATCH_QUERY_CONCURRENCY", 8))  # Chat completions in flight per batch
+
+# Context Packing (over-fetch, dedup, MMR, sentence trimming, token budget)
+CONTEXT_CANDIDATES = int(env("CONTEXT_CANDIDATES", 20))  # Chunks retrieved per query before packing
+CONTEXT_MAX_CHUNKS = int(env("CONTEXT_MAX_CHUNKS", 8))  # Chunks kept after MMR
+CONTEXT_DIVERSITY = float(env("CONTEXT_DIVERSITY", 0.3))  # MMR trade-off: 0 = relevance only, 1 = novelty only
+CONTEXT_DUPLICATE_THRESHOLD = float(env("CONTEXT_DUPLICATE_THRESHOLD", 0.95))  # Cosine similarity of near-duplicates
+CONTEXT_SENTENCE_WINDOW = int(env("CONTEXT_SENTENCE_WINDOW", 1))  # Neighbour sentences kept around each match
+PROMPT_TOKEN_BUDGET = int(env("PROMPT_TOKEN_BUDGET", 2000))  # Tokens of the whole chat prompt (instructions + query + context)
+
+# LLM Gateway (client-side limits sized to the deployment's quota; 0 disables a limiter)
+LLM_RPM = int(env("LLM_RPM", 0))  # Chat requests per minute
+LLM_TPM = int(env("LLM_TPM", 0))  # Chat tokens per minute (prompt estimate + max_tokens)
+LLM_MAX_RETRIES = int(env("LLM_MAX_RETRIES", 6))  # Retries on 429/5xx before giving up
+LLM_TIMEOUT = float(env("LLM_TIMEOUT", 60))  # Seconds per chat request
+
+# Startup
+WARM_UP = env("WARM_UP", "true").lower() == "true"  # Build clients and indexes in the background at startup
 
 # Folder Paths
 DATA_INPUT_FOLDER = "data_input"
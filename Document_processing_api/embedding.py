@@ -1,19 +1,55 @@
 import os
-from openai import AzureOpenAI
-from config import AZURE_OPENAI_API_KEY, AZURE_OPENAI_ENDPOINT, AZURE_OPENAI_DEPLOYMENT_NAME
-
-# Initialize Azure OpenAI client
-client = AzureOpenAI(
-    api_key=AZURE_OPENAI_API_KEY,
-    azure_endpoint=AZURE_OPENAI_ENDPOINT,
-    api_version="2023-03-15-preview"
+from config import (
+    AZURE_OPENAI_API_KEY, AZURE_OPENAI_ENDPOINT, AZURE_OPENAI_DEPLOYMENT_NAME, AZURE_OPENAI_API_VERSION, TOKENIZER_ENCODING,
+    LLM_RPM, LLM_TPM, LLM_MAX_RETRIES, LLM_TIMEOUT,
+    EMBED_MAX_BATCH_TOKENS, EMBED_MAX_BATCH_ITEMS, EMBED_CONCURRENCY, EMBED_MAX_RETRIES,
+    EMBEDDING_DIM, EMBEDDING_CACHE_ENABLED, EMBEDDING_CACHE_PATH, EMBEDDING_CACHE_MAX_ENTRIES
 )
+from neuradocs.embedding_cache import EmbeddingCache
+from neuradocs.lazy_resource import LazyResource
+from neuradocs.metrics import stage
+
+def load_gateway():
+    # Process-wide gateway: one pooled Azure OpenAI client, rate-limited and retried chat calls
+    from neuradocs.llm_gateway import LLMGateway
+    return LLMGateway(
+        AZURE_OPENAI_ENDPOINT,
+        AZURE_OPENAI_API_KEY,
+        AZURE_OPENAI_API_VERSION,
+        rpm=LLM_RPM,
+        tpm=LLM_TPM,
+        max_retries=LLM_MAX_RETRIES,
+        timeout=LLM_TIMEOUT
+    )
+
+def load_batcher():
+    # Token-budgeted, concurrent batcher with 429/5xx backoff; embeddings share the gateway's connection pool
+    from neuradocs.embedding_batcher import EmbeddingBatcher
+    return EmbeddingBatcher(
+        gateway.client,
+        AZURE_OPENAI_DEPLOYMENT_NAME,
+        max_batch_tokens=EMBED_MAX_BATCH_TOKENS,
+        max_batch_items=EMBED_MAX_BATCH_ITEMS,
+        max_concurrency=EMBED_CONCURRENCY,
+        max_retries=EMBED_MAX_RETRIES,
+        encoding_name=TOKENIZER_ENCODING
+    )
+
+# Built on first use or by the app's warm-up, so importing this module stays cheap
+gateway = LazyResource("openai", load_gateway)
+batcher = LazyResource("embedding batcher", load_batcher)
+
+# Persistent cache so unchanged chunks are never re-embedded
+cache = EmbeddingCache(
+    EMBEDDING_CACHE_PATH,
+    AZURE_OPENAI_DEPLOYMENT_NAME,
+    EMBEDDING_DIM,
+    max_entries=EMBEDDING_CACHE_MAX_ENTRIES
+) if EMBEDDING_CACHE_ENABLED else None
 
 def embed_text(chunks):
     """Generate embeddings using Azure OpenAI."""
-    response = client.embeddings.create(input=chunks, model=AZURE_OPENAI_DEPLOYMENT_NAME)
-
-    if hasattr(response, "data") and isinstance(response.data, list):
-        return [item.embedding for item in response.data]  # Extract embeddings
-    
-    raise ValueError("Azure OpenAI response structure is invalid!")
+    with stage("embed"):
+        if cache:
+            return cache.embed(chunks, batcher.embed)
+        return batcher.embed(chunks)
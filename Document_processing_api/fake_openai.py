@@ -0,0 +1,191 @@
+import argparse
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import numpy as np
+
+# Azure (/openai/deployments/<name>/...) and OpenAI (/v1/...) routes
+EMBEDDINGS_PATH = re.compile(r"^(/openai/deployments/[^/]+|/v1)/embeddings$")
+CHAT_PATH = re.compile(r"^(/openai/deployments/[^/]+|/v1)/chat/completions$")
+WORD = re.compile(r"[a-z0-9]+(?:-[a-z0-9]+)*")
+
+
+def fake_embedding(text, dim):
+    """Deterministic unit vector: hashed bag of words plus a little per-text noise.
+
+    Texts that share words get similar vectors, so retrieval over fake
+    embeddings still ranks the matching chunks first.
+    """
+    vector = np.zeros(dim, dtype=np.float32)
+    for word in WORD.findall(text.lower()):
+        vector[int.from_bytes(hashlib.blake2b(word.encode(), digest_size=4).digest(), "little") % dim] += 1.0
+    seed = int.from_bytes(hashlib.blake2b(text.encode(), digest_size=8).digest(), "little")
+    vector += 0.05 * np.random.default_rng(seed).standard_normal(dim).astype(np.float32)
+    return (vector / (np.linalg.norm(vector) or 1.0)).tolist()
+
+
+class FakeOpenAIServer:
+    """Local OpenAI/Azure OpenAI-compatible endpoint for offline benchmarks.
+
+    Serves embeddings and (optionally streamed) chat completions after a
+    configurable latency (`latency * (1 ± jitter)`). With `rpm` set, requests
+    beyond the per-minute budget get 429 with `Retry-After` headers, as Azure
+    does, so the clients' retry and backoff paths are exercised too.
+    """
+
+    def __init__(self, host="127.0.0.1", port=0, embedding_latency=0.05, chat_latency=0.5, jitter=0.2,
+                 rpm=0, dim=1536, seed=0):
+        self.embedding_latency = embedding_latency
+        self.chat_latency = chat_latency
+        self.jitter = jitter
+        self.rpm = rpm
+        self.dim = dim
+        self.counts = {"embeddings": 0, "chat": 0, "throttled": 0}
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._allowance = rpm / 6.0  # Burst of ten seconds' worth
+        self._last_refill = time.monotonic()
+        self._thread = None
+        self.httpd = ThreadingHTTPServer((host, port), self._handler())
+        self.httpd.daemon_threads = True
+
+    @property
+    def url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def _delay(self, latency):
+        with self._lock:
+            factor = 1 + self._random.uniform(-self.jitter, self.jitter)
+        time.sleep(max(0.0, latency * factor))
+
+    def _admit(self):
+        """Seconds to wait before retrying, or 0 when the request is within the rate limit."""
+        if not self.rpm:
+            return 0.0
+        with self._lock:
+            now = time.monotonic()
+            self._allowance = min(self.rpm / 6.0, self._allowance + (now - self._last_refill) * self.rpm / 60.0)
+            self._last_refill = now
+            if self._allowance >= 1:
+                self._allowance -= 1
+                return 0.0
+            self.counts["throttled"] += 1
+            return (1 - self._allowance) * 60.0 / self.rpm
+
+    def _count(self, name):
+        with self._lock:
+            self.counts[name] += 1
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"  # Keep-alive, like the real endpoint
+
+            def log_message(self, format, *args):
+                pass
+
+            def _send_json(self, status, body, headers=None):
+                data = json.dumps(body).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_POST(self):
+                path = self.path.split("?", 1)[0]
+                body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+                wait = server._admit()
+                if wait:
+                    self._send_json(429, {"error": {"code": "429", "message": "Rate limit is exceeded."}},
+                                    {"Retry-After": str(max(1, round(wait))), "retry-after-ms": str(int(wait * 1000))})
+                    return
+                if EMBEDDINGS_PATH.match(path):
+                    self._embeddings(body)
+                elif CHAT_PATH.match(path):
+                    self._chat(body)
+                else:
+                    self._send_json(404, {"error": {"code": "404", "message": f"Unknown route {path}"}})
+
+            def _embeddings(self, body):
+                server._count("embeddings")
+                inputs = body.get("input", [])
+                inputs = [inputs] if isinstance(inputs, str) else inputs
+                server._delay(server.embedding_latency)
+                self._send_json(200, {
+                    "object": "list",
+                    "model": body.get("model", "fake-embedding"),
+                    "data": [{"object": "embedding", "index": i, "embedding": fake_embedding(text, server.dim)}
+                             for i, text in enumerate(inputs)],
+                    "usage": {"prompt_tokens": sum(len(text) // 4 for text in inputs),
+                              "total_tokens": sum(len(text) // 4 for text in inputs)}
+                })
+
+            def _chat(self, body):
+                server._count("chat")
+                messages = body.get("messages", [])
+                prompt_tokens = sum(len(str(message.get("content", ""))) // 4 + 4 for message in messages)
+                answer = f"Fake answer grounded in a {prompt_tokens}-token prompt."
+                completion_tokens = len(answer.split())
+                server._delay(server.chat_latency)
+                if not body.get("stream"):
+                    self._send_json(200, {
+                        "id": "chatcmpl-fake", "object": "chat.completion", "created": int(time.time()),
+                        "model": body.get("model", "fake-chat"),
+                        "choices": [{"index": 0, "finish_reason": "stop",
+                                     "message": {"role": "assistant", "content": answer}}],
+                        "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                                  "total_tokens": prompt_tokens + completion_tokens}
+                    })
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Connection", "close")  # Stream length is not known up front
+                self.end_headers()
+                for word in answer.split(" "):
+                    chunk = {"id": "chatcmpl-fake", "object": "chat.completion.chunk", "created": int(time.time()),
+                             "model": body.get("model", "fake-chat"),
+                             "choices": [{"index": 0, "delta": {"content": word + " "}, "finish_reason": None}]}
+                    self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+                self.wfile.write(b"data: [DONE]\n\n")
+                self.close_connection = True
+
+        return Handler
+
+    def start(self):
+        """Serve in a daemon thread (for in-process benchmarks)."""
+        self._thread = threading.Thread(target=self.httpd.serve_forever, name="fake-openai", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve a fake Azure OpenAI endpoint (embeddings + chat) for offline runs")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9100)
+    parser.add_argument("--embedding-latency", type=float, default=0.05, help="Seconds per embeddings request")
+    parser.add_argument("--chat-latency", type=float, default=0.5, help="Seconds per chat completion")
+    parser.add_argument("--jitter", type=float, default=0.2, help="Latency varies by ± this fraction")
+    parser.add_argument("--rpm", type=int, default=0, help="Requests per minute before 429s (0 = unlimited)")
+    parser.add_argument("--dim", type=int, default=1536, help="Embedding dimension")
+    args = parser.parse_args()
+
+    server = FakeOpenAIServer(args.host, args.port, args.embedding_latency, args.chat_latency, args.jitter,
+                              args.rpm, args.dim)
+    print(f"✅ Fake OpenAI endpoint on {server.url} (set ENDPOINT_URL to this and any AZURE_OPENAI_API_KEY)")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        server.stop()
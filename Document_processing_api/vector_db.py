@@ -1,43 +1,134 @@
-from pymilvus import connections, Collection, CollectionSchema, FieldSchema, DataType, utility
-from config import MILVUS_HOST, MILVUS_PORT, COLLECTION_NAME
+from config import (
+    MILVUS_HOST, MILVUS_PORT, COLLECTION_NAME, EMBEDDING_DIM, VECTOR_STORE, LOCAL_INDEX_PATH,
+    VECTOR_PRECISION, RERANK_FACTOR, PARTITION_BY,
+    MILVUS_POOL_SIZE, MILVUS_FLUSH_ROWS, MILVUS_FLUSH_INTERVAL,
+    MILVUS_INDEX_TYPE, MILVUS_METRIC_TYPE, MILVUS_INDEX_NLIST, MILVUS_INDEX_PQ_M, MILVUS_INDEX_PQ_NBITS,
+    MILVUS_INDEX_HNSW_M, MILVUS_INDEX_EF_CONSTRUCTION, MILVUS_SEARCH_NPROBE, MILVUS_SEARCH_EF,
+    HYBRID_SEARCH, LEXICAL_INDEX_PATH, HYBRID_CANDIDATES, RRF_K
+)
+from neuradocs.vector_store import LocalVectorStore, QuantizedVectorStore
+from neuradocs.ann_index import index_params, search_params, same_index, QUANTIZED_INDEX_TYPES
+from neuradocs.lexical_index import BM25Index, reciprocal_rank_fusion
+from neuradocs.lazy_resource import LazyResource
+from neuradocs.metrics import stage, log
 
-# Constants
-EMBEDDING_DIM = 1536  # ✅ Ensure this matches Azure OpenAI embeddings
+# Built and searched with the same index type and metric (see `checkembedding.py --tune` to pick them)
+MILVUS_INDEX_PARAMS = index_params(
+    MILVUS_INDEX_TYPE, MILVUS_METRIC_TYPE, nlist=MILVUS_INDEX_NLIST, pq_m=MILVUS_INDEX_PQ_M,
+    pq_nbits=MILVUS_INDEX_PQ_NBITS, hnsw_m=MILVUS_INDEX_HNSW_M, ef_construction=MILVUS_INDEX_EF_CONSTRUCTION,
+    dim=EMBEDDING_DIM
+)
+MILVUS_SEARCH_PARAMS = search_params(MILVUS_INDEX_TYPE, MILVUS_METRIC_TYPE, nprobe=MILVUS_SEARCH_NPROBE, ef=MILVUS_SEARCH_EF)
 
-# Connect to Milvus
-connections.connect(alias="default", host=MILVUS_HOST, port=MILVUS_PORT)
+def create_milvus_collection():
+    """Creates the collection with the correct schema."""
+    from pymilvus import Collection, CollectionSchema, FieldSchema, DataType
 
-def reset_milvus_collection():
-    """Drops the existing collection and recreates it with the correct schema."""
-    
-    if COLLECTION_NAME in utility.list_collections():
-        print(f"Dropping existing collection: {COLLECTION_NAME}")
-        Collection(COLLECTION_NAME).drop()
-    
     print(f"Creating new collection: {COLLECTION_NAME}")
 
     # Define schema
     fields = [
         FieldSchema(name="id", dtype=DataType.INT64, is_primary=True, auto_id=True),  # ✅ Auto-generated IDs
         FieldSchema(name="embedding", dtype=DataType.FLOAT_VECTOR, dim=EMBEDDING_DIM),
-        FieldSchema(name="text", dtype=DataType.VARCHAR, max_length=4096)  # ✅ Store text chunks
+        FieldSchema(name="text", dtype=DataType.VARCHAR, max_length=4096),  # ✅ Store text chunks
+        # Chunk metadata for citations and filtered search
+        FieldSchema(name="source", dtype=DataType.VARCHAR, max_length=512),
+        FieldSchema(name="tenant", dtype=DataType.VARCHAR, max_length=128),
+        FieldSchema(name="page_start", dtype=DataType.INT64),
+        FieldSchema(name="page_end", dtype=DataType.INT64),
+        FieldSchema(name="chunk_index", dtype=DataType.INT64),
+        FieldSchema(name="ingested_at", dtype=DataType.INT64)
     ]
-    
+
     schema = CollectionSchema(fields, description="Document Embeddings")
 
     # Create collection
     collection = Collection(COLLECTION_NAME, schema)
-    collection.create_index("embedding", {"metric_type": "COSINE"})  # 🔹 Similarity search index
+    collection.create_index("embedding", MILVUS_INDEX_PARAMS)  # 🔹 Similarity search index
+
+    print(f"✅ Created new collection: {COLLECTION_NAME} with embedding dim={EMBEDDING_DIM}, {MILVUS_INDEX_TYPE} index")
+    return collection
 
-    print(f"✅ Created new collection: {COLLECTION_NAME} with embedding dim={EMBEDDING_DIM}")
+def ensure_milvus_index(collection):
+    """Rebuilds the embedding index when it is missing or was built with other settings than the config."""
+    built = collection.indexes[0].params if collection.indexes else None
+    if same_index(built, MILVUS_INDEX_PARAMS):
+        return collection
+    if built:
+        print(f"⚠️ Rebuilding index of '{COLLECTION_NAME}': {built} -> {MILVUS_INDEX_PARAMS}")
+        collection.release()
+        collection.drop_index()
+    collection.create_index("embedding", MILVUS_INDEX_PARAMS)
     return collection
 
-# Initialize fresh collection
-collection = reset_milvus_collection()
+def ensure_milvus_collection():
+    """Creates the collection only if it does not exist yet, keeping previously indexed vectors."""
+    from pymilvus import Collection, utility
+    if COLLECTION_NAME in utility.list_collections():
+        return ensure_milvus_index(Collection(COLLECTION_NAME))
+    return create_milvus_collection()
+
+def reset_milvus_collection():
+    """Drops the existing collection and recreates it with the correct schema."""
+    from pymilvus import Collection, utility
+
+    if COLLECTION_NAME in utility.list_collections():
+        print(f"Dropping existing collection: {COLLECTION_NAME}")
+        Collection(COLLECTION_NAME).drop()
+
+    return create_milvus_collection()
+
+def open_vector_store():
+    """Connects the backend selected in config ("milvus" or "local") and loads its index."""
+    if VECTOR_STORE == "local" and VECTOR_PRECISION != "float32":
+        return QuantizedVectorStore(LOCAL_INDEX_PATH, EMBEDDING_DIM, VECTOR_PRECISION, RERANK_FACTOR)
+    if VECTOR_STORE == "local":
+        return LocalVectorStore(LOCAL_INDEX_PATH, EMBEDDING_DIM)
+    from neuradocs.milvus_store import MilvusVectorStore
+    store = MilvusVectorStore(
+        MILVUS_HOST, MILVUS_PORT, COLLECTION_NAME,
+        search_params=MILVUS_SEARCH_PARAMS,
+        pool_size=MILVUS_POOL_SIZE,
+        flush_rows=MILVUS_FLUSH_ROWS,
+        flush_interval=MILVUS_FLUSH_INTERVAL,
+        rerank_factor=RERANK_FACTOR if MILVUS_INDEX_TYPE in QUANTIZED_INDEX_TYPES else 1,
+        partition_by=PARTITION_BY
+    )
+    ensure_milvus_collection()  # Reuse the existing index across restarts
+    store.open()  # Load once instead of on every search
+    return store
+
+def load_lexical_index():
+    """BM25 index over the same chunk IDs, maintained alongside every insert and delete."""
+    index = BM25Index(LEXICAL_INDEX_PATH)
+    if not len(index) and vector_store.count():
+        print("⚠️ Lexical index is empty but the vector store is not; reset and re-index to enable hybrid search.")
+    return index
+
+# Connected on first use or by the app's warm-up, so the service starts (and reports /ready) even if Milvus is down
+vector_store = LazyResource("vector store", open_vector_store)
+lexical_index = LazyResource("lexical index", load_lexical_index) if HYBRID_SEARCH else None
+
+def reset_vector_store():
+    """Admin action: wipe every stored vector and start from an empty index."""
+    vector_store.get()  # Connects Milvus before the collection is dropped
+    if VECTOR_STORE == "local":
+        vector_store.clear()
+        vector_store.flush()
+    else:
+        reset_milvus_collection()
+        vector_store.open()
+    if lexical_index is not None:
+        lexical_index.clear()
+        lexical_index.save()
+
+def store_embeddings(embeddings, texts, flush=True, metadata=None):
+    """Stores embeddings and corresponding text chunks in the vector store and returns their IDs.
+
+    `metadata` holds one dict per chunk (source, tenant, page span, chunk index, ingest time).
+    Pass `flush=False` when inserting in batches and call `flush_embeddings()` once at the end.
+    """
 
-def store_embeddings(embeddings, texts):
-    """Stores embeddings and corresponding text chunks in Milvus."""
-    
     if not isinstance(embeddings, list) or not all(isinstance(e, list) for e in embeddings):
         raise ValueError("Embeddings should be a list of lists.")
 
@@ -47,31 +138,97 @@ def store_embeddings(embeddings, texts):
     if len(embeddings) != len(texts):
         raise ValueError("Number of embeddings must match number of text chunks.")
 
-    # ✅ Correct data format (Milvus expects only embedding & text, NOT IDs)
-    data_to_insert = [
-        embeddings,  # List of embeddings
-        texts        # Corresponding text chunks
-    ]
+    if metadata is not None and len(metadata) != len(texts):
+        raise ValueError("Number of metadata entries must match number of text chunks.")
+
+    with stage("vector_insert"):
+        ids = vector_store.insert(embeddings, texts, metadata)
+        if lexical_index is not None:
+            lexical_index.add(ids, texts)
+    if flush:
+        flush_embeddings()
+
+    log(f"✅ Stored {len(embeddings)} embeddings with text in '{COLLECTION_NAME}' ({VECTOR_STORE}).")
+    return ids
+
+def delete_embeddings(ids):
+    """Removes previously stored chunks by ID."""
+    if ids:
+        vector_store.delete(ids)
+        if lexical_index is not None:
+            lexical_index.delete(ids)
+        log(f"🗑️ Deleted {len(ids)} embeddings from '{COLLECTION_NAME}' ({VECTOR_STORE}).")
+
+def flush_embeddings():
+    """Seals pending inserts so they become searchable and durable."""
+    with stage("vector_flush"):
+        vector_store.flush()
+        if lexical_index is not None:
+            lexical_index.save()
 
-    collection.insert(data_to_insert)
-    collection.flush()
-
-    print(f"✅ Stored {len(embeddings)} embeddings with text in '{COLLECTION_NAME}'.")
-
-def search_embeddings(query_embedding, top_k=3):
-    """Performs similarity search in Milvus."""
-    
-    collection.load()
-    
-    search_params = {"metric_type": "L2", "params": {"nprobe": 10}}
-    
-    results = collection.search(
-        data=[query_embedding],  # Query vector
-        anns_field="embedding",
-        param=search_params,
-        limit=top_k,
-        output_fields=["text"]  # ✅ Retrieve text along with similarity score
+def _fuse(dense_hits, query_text, top_k, search_filter=None, with_vectors=False):
+    """Reciprocal rank fusion of the dense hits with the BM25 hits for `query_text`; returns `{"id", "text", "metadata"}` hits.
+
+    BM25 covers the whole corpus, so with a `search_filter` its hits outside the filter are dropped.
+    """
+    lexical_hits = lexical_index.search(query_text, top_k=max(top_k, HYBRID_CANDIDATES))
+    fused_ids = reciprocal_rank_fusion(
+        [[hit["id"] for hit in dense_hits], [doc_id for doc_id, _ in lexical_hits]],
+        k=RRF_K,
+        top_k=None if search_filter else top_k
     )
-    
-    retrieved_chunks = [hit.entity.get("text") for hit in results[0]]
-    return retrieved_chunks
+
+    found = {hit["id"]: hit for hit in dense_hits}
+    missing = [doc_id for doc_id in fused_ids if doc_id not in found]
+    for doc_id, chunk in vector_store.get_chunks(missing, with_vectors=with_vectors).items():  # One lookup
+        if search_filter is None or search_filter.matches(chunk["metadata"]):
+            found[doc_id] = chunk
+    hits = [{"id": doc_id, "text": found[doc_id]["text"], "metadata": found[doc_id].get("metadata")}
+            for doc_id in fused_ids if doc_id in found][:top_k]
+    for hit in hits:
+        if "vector" in found[hit["id"]]:
+            hit["vector"] = found[hit["id"]]["vector"]
+    return hits
+
+def search_hits_many(query_embeddings, top_k=3, query_texts=None, search_filter=None, with_vectors=False):
+    """Searches several queries in one vector store request; returns one list of `{"id", "text", "metadata"}` hits per query.
+
+    With hybrid search enabled and `query_texts` given, each query's dense
+    hits are fused with its BM25 hits via reciprocal rank fusion, so exact
+    codes and acronyms that embeddings blur still surface. A `SearchFilter`
+    restricts every query to the chunks it matches. With `with_vectors`,
+    dense hits also carry their stored embedding as `vector`.
+    """
+    with stage("vector_search"):
+        if lexical_index is None or query_texts is None:
+            return vector_store.search_many(query_embeddings, top_k=top_k, search_filter=search_filter,
+                                            with_vectors=with_vectors)
+
+        dense_results = vector_store.search_many(query_embeddings, top_k=max(top_k, HYBRID_CANDIDATES),
+                                                 search_filter=search_filter, with_vectors=with_vectors)
+        return [
+            _fuse(dense_hits, query_text, top_k, search_filter, with_vectors) if query_text else dense_hits[:top_k]
+            for dense_hits, query_text in zip(dense_results, query_texts)
+        ]
+
+def search_hits(query_embedding, top_k=3, query_text=None, search_filter=None, with_vectors=False):
+    """Performs similarity search in the vector store (hybrid when `query_text` is given); returns hits."""
+    with stage("vector_search"):
+        if lexical_index is None or not query_text:
+            return vector_store.search(query_embedding, top_k=top_k, search_filter=search_filter, with_vectors=with_vectors)
+        dense_hits = vector_store.search(query_embedding, top_k=max(top_k, HYBRID_CANDIDATES), search_filter=search_filter,
+                                         with_vectors=with_vectors)
+        return _fuse(dense_hits, query_text, top_k, search_filter, with_vectors)
+
+def search_embeddings_many(query_embeddings, top_k=3, query_texts=None):
+    """`search_hits_many`, returning only the texts."""
+    return [[hit["text"] for hit in hits] for hits in search_hits_many(query_embeddings, top_k, query_texts)]
+
+def search_embeddings(query_embedding, top_k=3, query_text=None):
+    """`search_hits`, returning only the texts."""
+    return [hit["text"] for hit in search_hits(query_embedding, top_k, query_text)]
+
+def get_embeddings(ids):
+    """Stored embeddings of the given chunk IDs (for MMR over candidates that did not come with a `vector`)."""
+    with stage("vector_fetch"):
+        return vector_store.get_vectors(ids)
@@ -1,105 +1,308 @@
 import os
+import json
+import time
 import shutil
-from flask import Flask, request, jsonify
+import contextvars
+import sys
+from concurrent.futures import ThreadPoolExecutor
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))  # Repo root: the shared neuradocs package
+from flask import Flask, Response, request, jsonify
 from flask_restx import Api, Resource, fields
 from dotenv import load_dotenv
-from openai import AzureOpenAI
-from pymilvus import connections, Collection, CollectionSchema, FieldSchema, DataType, utility
+from neuradocs.process_pdf import iter_pdfs
+from neuradocs.chunker import chunk_pages
+from neuradocs.embedding_cache import EmbeddingCache
+from neuradocs.pipeline import run_pipeline
+from neuradocs.context_packer import ContextPacker
+from neuradocs.search_filter import SearchFilter
+from neuradocs.query_cache import QueryEmbeddingCache, SemanticAnswerCache, normalize_query
+from neuradocs.vector_store import LocalVectorStore, QuantizedVectorStore
+from neuradocs.ann_index import index_params, search_params, same_index, QUANTIZED_INDEX_TYPES
+from neuradocs.lexical_index import BM25Index, reciprocal_rank_fusion
+from neuradocs.manifest import IndexManifest, file_sha256
+from neuradocs.jobs import JobManager, JobCancelled, JobQueueFull
+from neuradocs.lazy_resource import LazyResource, warm_up, readiness
+from neuradocs.metrics import (
+    registry, stage, timed_iter, log, set_trace_id, instrument_flask, cache_metrics, gateway_metrics, batcher_metrics,
+    TRACE_IDS, CONTENT_TYPE
+)
 from config import (
-    DATA_INPUT_FOLDER, PROCESSED_FOLDER,
+    DATA_INPUT_FOLDER, PROCESSED_FOLDER, EXTRACT_WORKERS, EXTRACT_PAGES_PER_TASK,
+    CHUNK_TOKENS, CHUNK_OVERLAP_TOKENS, TOKENIZER_ENCODING,
+    EMBED_MAX_BATCH_TOKENS, EMBED_MAX_BATCH_ITEMS, EMBED_CONCURRENCY, EMBED_MAX_RETRIES,
+    EMBEDDING_DIM, EMBEDDING_CACHE_ENABLED, EMBEDDING_CACHE_PATH, EMBEDDING_CACHE_MAX_ENTRIES,
+    EMBED_BATCH_SIZE, INSERT_BATCH_SIZE, PIPELINE_QUEUE_SIZE, INDEX_MANIFEST_PATH,
+    INDEX_JOB_WORKERS, INDEX_MAX_JOBS, BATCH_QUERY_MAX_QUESTIONS, BATCH_QUERY_CONCURRENCY,
+    QUERY_CACHE_SIZE, QUERY_CACHE_TTL, ANSWER_CACHE_SIZE, ANSWER_CACHE_TTL, ANSWER_CACHE_THRESHOLD,
     AZURE_OPENAI_API_KEY, AZURE_OPENAI_ENDPOINT, AZURE_OPENAI_DEPLOYMENT_EMBEDDING,
-    DEPLOYMENT_CHAT, AZURE_OPENAI_API_VERSION,
-    MILVUS_HOST, MILVUS_PORT, COLLECTION_NAME
+    DEPLOYMENT_CHAT, AZURE_OPENAI_API_VERSION, TEMPERATURE,
+    MILVUS_HOST, MILVUS_PORT, COLLECTION_NAME, VECTOR_STORE, LOCAL_INDEX_PATH, VECTOR_PRECISION, RERANK_FACTOR,
+    PARTITION_BY, DEFAULT_TENANT,
+    MILVUS_POOL_SIZE, MILVUS_FLUSH_ROWS, MILVUS_FLUSH_INTERVAL,
+    MILVUS_INDEX_TYPE, MILVUS_METRIC_TYPE, MILVUS_INDEX_NLIST, MILVUS_INDEX_PQ_M, MILVUS_INDEX_PQ_NBITS,
+    MILVUS_INDEX_HNSW_M, MILVUS_INDEX_EF_CONSTRUCTION, MILVUS_SEARCH_NPROBE, MILVUS_SEARCH_EF,
+    HYBRID_SEARCH, LEXICAL_INDEX_PATH, HYBRID_CANDIDATES, RRF_K,
+    CONTEXT_CANDIDATES, CONTEXT_MAX_CHUNKS, CONTEXT_DIVERSITY, CONTEXT_DUPLICATE_THRESHOLD,
+    CONTEXT_SENTENCE_WINDOW, PROMPT_TOKEN_BUDGET,
+    LLM_RPM, LLM_TPM, LLM_MAX_RETRIES, LLM_TIMEOUT, WARM_UP
 )
 
 # Load environment variables
 load_dotenv()
 
-# Initialize Flask App
+# Initialize Flask App (request latency histograms and, with TRACE_IDS, per-request trace IDs)
 app = Flask(__name__)
+instrument_flask(app)
 api = Api(app, title="Document Processing API", description="API for PDF processing, embedding, and Milvus storage", version="1.0")
 
 # Define API namespaces
 ns_processing = api.namespace("documents_processing", description="Operations related to document processing")
 ns_query = api.namespace("documents_query", description="Operations related to querying documents")
 
-# Initialize Azure OpenAI client
-client = AzureOpenAI(
-    api_key=AZURE_OPENAI_API_KEY,
-    azure_endpoint=AZURE_OPENAI_ENDPOINT,
-    api_version=AZURE_OPENAI_API_VERSION
+# ✅ **Function: Build the LLM Gateway**
+def load_gateway():
+    """Process-wide LLM gateway: one pooled Azure OpenAI client, rate-limited and retried chat calls."""
+    from neuradocs.llm_gateway import LLMGateway
+    return LLMGateway(
+        AZURE_OPENAI_ENDPOINT,
+        AZURE_OPENAI_API_KEY,
+        AZURE_OPENAI_API_VERSION,
+        rpm=LLM_RPM,
+        tpm=LLM_TPM,
+        max_retries=LLM_MAX_RETRIES,
+        timeout=LLM_TIMEOUT
+    )
+
+
+# ✅ **Function: Build the Embedding Batcher**
+def load_batcher():
+    """Token-budgeted, concurrent embedding batcher with 429/5xx backoff, sharing the gateway's connection pool."""
+    from neuradocs.embedding_batcher import EmbeddingBatcher
+    return EmbeddingBatcher(
+        gateway.client,
+        AZURE_OPENAI_DEPLOYMENT_EMBEDDING,
+        max_batch_tokens=EMBED_MAX_BATCH_TOKENS,
+        max_batch_items=EMBED_MAX_BATCH_ITEMS,
+        max_concurrency=EMBED_CONCURRENCY,
+        max_retries=EMBED_MAX_RETRIES,
+        encoding_name=TOKENIZER_ENCODING
+    )
+
+
+# Built on first use or by warm-up, so importing the app stays cheap
+gateway = LazyResource("openai", load_gateway)
+batcher = LazyResource("embedding batcher", load_batcher)
+
+# Persistent cache so unchanged chunks are never re-embedded
+embedding_cache = EmbeddingCache(
+    EMBEDDING_CACHE_PATH,
+    AZURE_OPENAI_DEPLOYMENT_EMBEDDING,
+    EMBEDDING_DIM,
+    max_entries=EMBEDDING_CACHE_MAX_ENTRIES
+) if EMBEDDING_CACHE_ENABLED else None
+
+# Query caches (invalidated whenever the collection changes)
+query_embedding_cache = QueryEmbeddingCache(max_entries=QUERY_CACHE_SIZE, ttl=QUERY_CACHE_TTL)
+answer_cache = SemanticAnswerCache(max_entries=ANSWER_CACHE_SIZE, ttl=ANSWER_CACHE_TTL, threshold=ANSWER_CACHE_THRESHOLD)
+
+# Retrieved chunks are deduplicated, diversified (MMR) and trimmed to the query-relevant sentences within the prompt budget
+context_packer = ContextPacker(
+    token_budget=PROMPT_TOKEN_BUDGET,
+    max_chunks=CONTEXT_MAX_CHUNKS,
+    diversity=CONTEXT_DIVERSITY,
+    duplicate_threshold=CONTEXT_DUPLICATE_THRESHOLD,
+    sentence_window=CONTEXT_SENTENCE_WINDOW,
+    encoding_name=TOKENIZER_ENCODING
 )
 
-# Connect to Milvus
-connections.connect(alias="default", host=MILVUS_HOST, port=MILVUS_PORT)
+# Manifest of indexed files (content hash -> chunk IDs) for incremental indexing
+manifest = IndexManifest(INDEX_MANIFEST_PATH)
 
 # Define query model for Swagger UI
+index_model = api.model("IndexModel", {
+    "tenant": fields.String(description=f"Tenant the files belong to (default: {DEFAULT_TENANT!r})")
+})
+filter_model = api.model("FilterModel", {
+    "tenant": fields.List(fields.String, description="Only these tenants (a single string also works)"),
+    "source": fields.List(fields.String, description="Only these source files"),
+    "page_from": fields.Integer(description="Only chunks ending on or after this page"),
+    "page_to": fields.Integer(description="Only chunks starting on or before this page"),
+    "ingested_after": fields.Float(description="Only chunks indexed at or after this Unix time")
+})
 query_model = api.model("QueryModel", {
-    "query": fields.String(required=True, description="User query in JSON format")
+    "query": fields.String(required=True, description="User query in JSON format"),
+    "stream": fields.Boolean(default=False, description="Stream the answer as server-sent events"),
+    "filters": fields.Nested(filter_model, description="Search only the matching chunks (tenant/source narrow the partitions scanned)")
+})
+batch_query_model = api.model("BatchQueryModel", {
+    "queries": fields.List(fields.String, required=True, description="User queries, answered in this order"),
+    "filters": fields.Nested(filter_model, description="Filters applied to every query")
 })
 
 # Ensure folders exist
 os.makedirs(DATA_INPUT_FOLDER, exist_ok=True)
 os.makedirs(PROCESSED_FOLDER, exist_ok=True)
 
-# Define Constants
-EMBEDDING_DIM = 1536  # Must match Azure OpenAI embeddings
-
-
-# ✅ **Function: Extract text from PDF**
-def extract_text_from_pdf(file_path):
-    import pypdf
-    """Extract text from each page of a PDF."""
-    chunk_text = []
-    with open(file_path, "rb") as f:
-        reader = pypdf.PdfReader(f)
-        for page in reader.pages:
-            text = page.extract_text()
-            if text:
-                chunk_text.append(text.strip())  # Each page is one chunk
-    return chunk_text
-
 
 # ✅ **Function: Generate Embeddings**
 def embed_text(chunks):
     """Generate embeddings using Azure OpenAI."""
     try:
-        response = client.embeddings.create(input=chunks, model=AZURE_OPENAI_DEPLOYMENT_EMBEDDING)
-        if hasattr(response, "data") and isinstance(response.data, list):
-            return [item.embedding for item in response.data]  # Extract embeddings
+        with stage("embed"):
+            if embedding_cache:
+                return embedding_cache.embed(chunks, batcher.embed)
+            return batcher.embed(chunks)  # Retries rate limits and server errors before failing
     except Exception as e:
-        print(f"Embedding Error: {e}")
-    raise ValueError("Failed to generate embeddings with Azure OpenAI.")
+        log(f"Embedding Error: {e}")
+        raise ValueError("Failed to generate embeddings with Azure OpenAI.") from e
 
 
-# ✅ **Function: Reset & Create Milvus Collection**
-def reset_milvus_collection():
-    """Drops existing collection and recreates it."""
-    
-    if COLLECTION_NAME in utility.list_collections():
-        print(f"Dropping existing collection: {COLLECTION_NAME}")
-        Collection(COLLECTION_NAME).drop()
-    
+# ✅ **Function: Invalidate Query Caches**
+def invalidate_query_caches():
+    """Drop cached query embeddings and answers after the collection changes."""
+    query_embedding_cache.clear()
+    answer_cache.clear()
+
+
+# ✅ **ANN Index Settings** (built and searched with the same index type and metric; see `checkembedding.py --tune`)
+MILVUS_INDEX_PARAMS = index_params(
+    MILVUS_INDEX_TYPE, MILVUS_METRIC_TYPE, nlist=MILVUS_INDEX_NLIST, pq_m=MILVUS_INDEX_PQ_M,
+    pq_nbits=MILVUS_INDEX_PQ_NBITS, hnsw_m=MILVUS_INDEX_HNSW_M, ef_construction=MILVUS_INDEX_EF_CONSTRUCTION,
+    dim=EMBEDDING_DIM
+)
+MILVUS_SEARCH_PARAMS = search_params(MILVUS_INDEX_TYPE, MILVUS_METRIC_TYPE, nprobe=MILVUS_SEARCH_NPROBE, ef=MILVUS_SEARCH_EF)
+
+
+# ✅ **Function: Create Milvus Collection**
+def create_milvus_collection():
+    """Creates the collection with the document schema."""
+    from pymilvus import Collection, CollectionSchema, FieldSchema, DataType
     print(f"Creating new collection: {COLLECTION_NAME}")
 
     fields = [
         FieldSchema(name="id", dtype=DataType.INT64, is_primary=True, auto_id=True),
         FieldSchema(name="embedding", dtype=DataType.FLOAT_VECTOR, dim=EMBEDDING_DIM),
-        FieldSchema(name="text", dtype=DataType.VARCHAR, max_length=4096)
+        FieldSchema(name="text", dtype=DataType.VARCHAR, max_length=4096),
+        # ✅ Chunk metadata for citations and filtered search
+        FieldSchema(name="source", dtype=DataType.VARCHAR, max_length=512),
+        FieldSchema(name="tenant", dtype=DataType.VARCHAR, max_length=128),
+        FieldSchema(name="page_start", dtype=DataType.INT64),
+        FieldSchema(name="page_end", dtype=DataType.INT64),
+        FieldSchema(name="chunk_index", dtype=DataType.INT64),
+        FieldSchema(name="ingested_at", dtype=DataType.INT64)
     ]
     
     schema = CollectionSchema(fields, description="Document Embeddings")
     collection = Collection(COLLECTION_NAME, schema)
-    collection.create_index("embedding", {"metric_type": "COSINE"})  # ✅ Ensure consistency
+    collection.create_index("embedding", MILVUS_INDEX_PARAMS)  # ✅ Ensure consistency
 
-    print(f"✅ Created new collection: {COLLECTION_NAME} with embedding dim={EMBEDDING_DIM}")
+    print(f"✅ Created new collection: {COLLECTION_NAME} with embedding dim={EMBEDDING_DIM}, {MILVUS_INDEX_TYPE} index")
     return collection
 
 
-# ✅ **Function: Store Embeddings in Milvus**
-def store_embeddings(embeddings, texts):
-    """Stores embeddings and corresponding text chunks in Milvus."""
-    collection = Collection(COLLECTION_NAME)
+# ✅ **Function: Ensure the Configured Index**
+def ensure_milvus_index(collection):
+    """Rebuilds the embedding index when it is missing or was built with other settings than the config."""
+    built = collection.indexes[0].params if collection.indexes else None
+    if same_index(built, MILVUS_INDEX_PARAMS):
+        return collection
+    if built:
+        print(f"⚠️ Rebuilding index of '{COLLECTION_NAME}': {built} -> {MILVUS_INDEX_PARAMS}")
+        collection.release()
+        collection.drop_index()
+    collection.create_index("embedding", MILVUS_INDEX_PARAMS)
+    return collection
+
+
+# ✅ **Function: Ensure Milvus Collection Exists**
+def ensure_milvus_collection():
+    """Creates the collection only if it does not exist yet, keeping previously indexed vectors."""
+    from pymilvus import Collection, utility
+    if COLLECTION_NAME in utility.list_collections():
+        return ensure_milvus_index(Collection(COLLECTION_NAME))
+    return create_milvus_collection()
+
+
+# ✅ **Function: Reset & Create Milvus Collection**
+def reset_milvus_collection():
+    """Drops existing collection and recreates it."""
+    from pymilvus import Collection, utility
+    if COLLECTION_NAME in utility.list_collections():
+        print(f"Dropping existing collection: {COLLECTION_NAME}")
+        Collection(COLLECTION_NAME).drop()
+    return create_milvus_collection()
+
+
+# ✅ **Function: Open the Vector Store**
+def open_vector_store():
+    """Connects the backend selected in config ("milvus" or "local") and loads its index."""
+    if VECTOR_STORE == "local" and VECTOR_PRECISION != "float32":
+        return QuantizedVectorStore(LOCAL_INDEX_PATH, EMBEDDING_DIM, VECTOR_PRECISION, RERANK_FACTOR)
+    if VECTOR_STORE == "local":
+        return LocalVectorStore(LOCAL_INDEX_PATH, EMBEDDING_DIM)
+    from neuradocs.milvus_store import MilvusVectorStore
+    store = MilvusVectorStore(
+        MILVUS_HOST, MILVUS_PORT, COLLECTION_NAME,
+        search_params=MILVUS_SEARCH_PARAMS,  # ✅ Same metric as the index
+        pool_size=MILVUS_POOL_SIZE,
+        flush_rows=MILVUS_FLUSH_ROWS,
+        flush_interval=MILVUS_FLUSH_INTERVAL,
+        rerank_factor=RERANK_FACTOR if MILVUS_INDEX_TYPE in QUANTIZED_INDEX_TYPES else 1,
+        partition_by=PARTITION_BY  # ✅ One partition per tenant or document
+    )
+    ensure_milvus_collection()
+    store.open()  # Load once instead of on every search
+    return store
+
+
+# ✅ **Function: Load the Lexical Index**
+def load_lexical_index():
+    """BM25 index over the same chunk IDs, maintained alongside every insert and delete."""
+    index = BM25Index(LEXICAL_INDEX_PATH)
+    if not len(index) and vector_store.count():
+        print("⚠️ Lexical index is empty but the vector store is not; reset and re-index to enable hybrid search.")
+    return index
+
+
+# Connected on first use or by warm-up, so the service starts (and reports /ready) even if Milvus is down
+vector_store = LazyResource("vector store", open_vector_store)
+lexical_index = LazyResource("lexical index", load_lexical_index) if HYBRID_SEARCH else None
+resources = [gateway, batcher, vector_store] + ([lexical_index] if lexical_index is not None else [])
+if WARM_UP and __name__ != "__mp_main__":  # Not in PDF extraction workers, which re-import the main module
+    warm_up(resources)
+
+
+# ✅ **Function: Collect Counters for /metrics**
+@registry.collector
+def collect_metrics():
+    """Cache hit counts, LLM token/retry counters and embedding counters, read when /metrics is scraped."""
+    families = cache_metrics("query_embedding", query_embedding_cache.stats()) + cache_metrics("answer", answer_cache.stats())
+    if embedding_cache:
+        families += cache_metrics("embedding", embedding_cache.stats())
+    return families + gateway_metrics(gateway) + batcher_metrics(batcher)
+
+
+# ✅ **Function: Reset the Vector Store (admin)**
+def reset_vector_store():
+    """Wipes every stored vector and starts from an empty index."""
+    vector_store.get()  # Connects Milvus before the collection is dropped
+    if VECTOR_STORE == "local":
+        vector_store.clear()
+        vector_store.flush()
+    else:
+        reset_milvus_collection()
+        vector_store.open()
+    if lexical_index is not None:
+        lexical_index.clear()
+        lexical_index.save()
+
+
+# ✅ **Function: Store Embeddings in the Vector Store**
+def store_embeddings(embeddings, texts, flush=True, metadata=None):
+    """Stores embeddings and corresponding text chunks (with one metadata dict each) in the vector store and returns their IDs.
+
+    Pass `flush=False` when inserting in batches and call `flush_embeddings()` once at the end.
+    """
     if not isinstance(embeddings, list) or not all(isinstance(e, list) for e in embeddings):
         raise ValueError("Embeddings should be a list of lists.")
 
@@ -109,46 +312,368 @@ def store_embeddings(embeddings, texts):
     if len(embeddings) != len(texts):
         raise ValueError("Number of embeddings must match number of text chunks.")
 
-    collection.insert([embeddings, texts])
-    collection.flush()
-    print(f"✅ Stored {len(embeddings)} embeddings in '{COLLECTION_NAME}'.")
+    if metadata is not None and len(metadata) != len(texts):
+        raise ValueError("Number of metadata entries must match number of text chunks.")
+
+    with stage("vector_insert"):
+        ids = vector_store.insert(embeddings, texts, metadata)
+        if lexical_index is not None:
+            lexical_index.add(ids, texts)
+    if flush:
+        flush_embeddings()
+    log(f"✅ Stored {len(embeddings)} embeddings in '{COLLECTION_NAME}' ({VECTOR_STORE}).")
+    return ids
+
+
+# ✅ **Function: Delete Embeddings by ID**
+def delete_embeddings(ids):
+    """Removes previously stored chunks by ID."""
+    if ids:
+        vector_store.delete(ids)
+        if lexical_index is not None:
+            lexical_index.delete(ids)
+        log(f"🗑️ Deleted {len(ids)} embeddings from '{COLLECTION_NAME}' ({VECTOR_STORE}).")
+
+
+# ✅ **Function: Flush Pending Inserts**
+def flush_embeddings():
+    """Seals pending inserts so they become searchable and durable."""
+    with stage("vector_flush"):
+        vector_store.flush()
+        if lexical_index is not None:
+            lexical_index.save()
+
+
+# ✅ **Function: Fuse Dense and BM25 Hits**
+def fuse_hits(dense_hits, query_text, top_k, search_filter=None, with_vectors=False):
+    """Reciprocal rank fusion of the dense hits with the BM25 hits for `query_text`; returns `{"id", "text", "metadata"}` hits.
+
+    BM25 covers the whole corpus, so with a `search_filter` its hits outside the filter are dropped.
+    """
+    lexical_hits = lexical_index.search(query_text, top_k=max(top_k, HYBRID_CANDIDATES))
+    fused_ids = reciprocal_rank_fusion(
+        [[hit["id"] for hit in dense_hits], [doc_id for doc_id, _ in lexical_hits]],
+        k=RRF_K,
+        top_k=None if search_filter else top_k
+    )
+
+    found = {hit["id"]: hit for hit in dense_hits}
+    missing = [doc_id for doc_id in fused_ids if doc_id not in found]
+    for doc_id, chunk in vector_store.get_chunks(missing, with_vectors=with_vectors).items():  # One lookup
+        if search_filter is None or search_filter.matches(chunk["metadata"]):
+            found[doc_id] = chunk
+    hits = [{"id": doc_id, "text": found[doc_id]["text"], "metadata": found[doc_id].get("metadata")}
+            for doc_id in fused_ids if doc_id in found][:top_k]
+    for hit in hits:
+        if "vector" in found[hit["id"]]:
+            hit["vector"] = found[hit["id"]]["vector"]
+    return hits
+
+
+# ✅ **Function: Search Hits in the Vector Store (hybrid)**
+def search_hits(query_embedding, top_k=3, query_text=None, search_filter=None, with_vectors=False):
+    """Performs similarity search (only over chunks matching `search_filter`, if given); with `query_text`, fuses dense and BM25 hits."""
+    with stage("vector_search"):
+        if lexical_index is None or not query_text:
+            return vector_store.search(query_embedding, top_k=top_k, search_filter=search_filter, with_vectors=with_vectors)
+        dense_hits = vector_store.search(query_embedding, top_k=max(top_k, HYBRID_CANDIDATES), search_filter=search_filter,
+                                         with_vectors=with_vectors)
+        return fuse_hits(dense_hits, query_text, top_k, search_filter, with_vectors)
+
+
+# ✅ **Function: Search Many Queries at Once**
+def search_hits_many(query_embeddings, top_k=3, query_texts=None, search_filter=None, with_vectors=False):
+    """Searches all queries in one multi-vector request; returns one list of hits per query."""
+    with stage("vector_search"):
+        if lexical_index is None or query_texts is None:
+            return vector_store.search_many(query_embeddings, top_k=top_k, search_filter=search_filter,
+                                            with_vectors=with_vectors)
+
+        dense_results = vector_store.search_many(query_embeddings, top_k=max(top_k, HYBRID_CANDIDATES),
+                                                 search_filter=search_filter, with_vectors=with_vectors)
+        return [
+            fuse_hits(dense_hits, query_text, top_k, search_filter, with_vectors) if query_text else dense_hits[:top_k]
+            for dense_hits, query_text in zip(dense_results, query_texts)
+        ]
+
+
+# ✅ **Function: Index One File (background job)**
+def index_file(job, progress, pages, chunk_ids):
+    """Chunks, embeds and stores one file's pages with their metadata, updating its progress counters."""
+    ingested_at = int(time.time())
+
+    def counted_pages():
+        for page in timed_iter("extract", pages):  # Time spent waiting on the extraction workers
+            job.check_cancelled()
+            progress.pages_extracted += 1
+            yield page
+
+    def embed_batch(chunks):
+        job.check_cancelled()
+        embeddings = embed_text([chunk.text for _, chunk in chunks])
+        progress.chunks_embedded += len(chunks)
+        return embeddings
+
+    def store_batch(embeddings, chunks):
+        job.check_cancelled()
+        metadata = [
+            {"source": progress.file_name, "tenant": job.tenant, "page_start": chunk.page_start,
+             "page_end": chunk.page_end, "chunk_index": chunk_index, "ingested_at": ingested_at}
+            for chunk_index, chunk in chunks
+        ]
+        chunk_ids.extend(store_embeddings(embeddings, [chunk.text for _, chunk in chunks], flush=False, metadata=metadata))
+        progress.vectors_stored += len(chunks)
+
+    chunks = chunk_pages(counted_pages(), chunk_tokens=CHUNK_TOKENS, overlap_tokens=CHUNK_OVERLAP_TOKENS, encoding_name=TOKENIZER_ENCODING)
+    run_pipeline(
+        enumerate(timed_iter("chunk", chunks)),  # (chunk index, chunk) pairs
+        embed_batch,
+        store_batch,
+        embed_batch_size=EMBED_BATCH_SIZE,
+        insert_batch_size=INSERT_BATCH_SIZE,
+        queue_size=PIPELINE_QUEUE_SIZE
+    )
 
 
-# ✅ **Function: Search Embeddings in Milvus**
-def search_embeddings(query_embedding, top_k=3):
-    """Performs similarity search in Milvus."""
-    collection = Collection(COLLECTION_NAME)
-    collection.load()
+# ✅ **Function: Manifest Key of a File**
+def manifest_key(job, file_name):
+    """The file name, prefixed by the job's tenant unless it is the default one."""
+    return file_name if job.tenant == DEFAULT_TENANT else f"{job.tenant}/{file_name}"
+
+
+# ✅ **Function: Run an Indexing Job**
+def run_index_job(job):
+    """Indexes the job's files; a failing file is rolled back and reported without stopping the others."""
+    if TRACE_IDS:
+        set_trace_id(job.id)  # The job's log lines carry its ID
+    file_paths = [os.path.join(DATA_INPUT_FOLDER, file_name) for file_name in job.files]
+    finished = []  # Moved to the processed folder once the manifest is saved
+
+    file_hashes, changed = {}, []
+    for file_path in file_paths:
+        progress = job.files[os.path.basename(file_path)]
+        if not os.path.exists(file_path):
+            progress.status, progress.error = "failed", "File is no longer in the data_input folder"
+            continue
+        file_hashes[file_path] = file_sha256(file_path)
+        if manifest.is_unchanged(manifest_key(job, progress.file_name), file_hashes[file_path]):
+            progress.status = "skipped"
+            finished.append(file_path)
+        else:
+            changed.append(file_path)
 
-    search_params = {"metric_type": "COSINE", "params": {"nprobe": 10}}  # ✅ Fixed metric type
-    results = collection.search(
-        data=[query_embedding],
-        anns_field="embedding",
-        param=search_params,
-        limit=top_k,
-        output_fields=["text"]
+    try:
+        extracted = iter_pdfs(changed, workers=EXTRACT_WORKERS, pages_per_task=EXTRACT_PAGES_PER_TASK)
+        for file_path, pages in extracted:
+            job.check_cancelled()
+            file_name = os.path.basename(file_path)
+            progress = job.files[file_name]
+            progress.status = "running"
+
+            chunk_ids = []
+            try:
+                index_file(job, progress, pages, chunk_ids)
+            except JobCancelled:
+                delete_embeddings(chunk_ids)  # Leave no partial copy of this file behind
+                progress.status = "cancelled"
+                raise
+            except Exception as e:
+                log(f"❌ Failed to index {file_name}: {e}")
+                delete_embeddings(chunk_ids)
+                progress.status, progress.error = "failed", str(e)
+                continue
+
+            previous = manifest.get(manifest_key(job, file_name))
+            if previous:
+                delete_embeddings(previous["chunk_ids"])  # Replace the old version's vectors
+            manifest.update(manifest_key(job, file_name), file_hashes[file_path], chunk_ids)
+            invalidate_query_caches()
+            progress.status = "done"
+            finished.append(file_path)
+    finally:
+        for progress in job.files.values():
+            if progress.status == "queued":
+                progress.status = "cancelled" if job.cancelled else "failed"
+                if not job.cancelled:
+                    progress.error = progress.error or "Not processed (extraction stopped early)"
+
+        flush_embeddings()  # Once per job rather than per file
+        manifest.save()
+        for file_path in finished:
+            shutil.move(file_path, os.path.join(PROCESSED_FOLDER, os.path.basename(file_path)))
+
+        if embedding_cache:
+            log(f"Embedding cache: {embedding_cache.stats()}")
+
+
+# Background worker pool for indexing jobs
+jobs = JobManager(run_index_job, max_workers=INDEX_JOB_WORKERS, max_jobs=INDEX_MAX_JOBS)
+
+
+# ✅ **Function: Embed Queries (cached, one batched call for misses)**
+def embed_queries(user_queries):
+    """Embeds queries through the query cache; all misses go out in one batched `embed_text` call."""
+    embeddings = [query_embedding_cache.get(user_query) for user_query in user_queries]
+    missing = list(dict.fromkeys(q for q, e in zip(user_queries, embeddings) if e is None))
+    if missing:
+        fresh = dict(zip(missing, embed_text(missing)))
+        for user_query, embedding in fresh.items():
+            query_embedding_cache.put(user_query, embedding)
+        embeddings = [fresh[q] if e is None else e for q, e in zip(user_queries, embeddings)]
+    return embeddings
+
+
+# ✅ **Function: Build the Chat Prompt**
+def prompt_messages(user_query, top_k_chunks):
+    augmented_prompt = f"User Query: {user_query}\n\nRelevant Chunks:\n" + "\n".join(top_k_chunks)
+    return [{"role": "system", "content": "You just need to repond as mentioned from the releavent chunks, don't add extra information. if you cannot find the answer respond with I don't know"},
+            {"role": "user", "content": augmented_prompt}]
+
+
+# ✅ **Function: Cite the Packed Chunks**
+def citations_for(hits, ids):
+    """Source, page span and chunk index of each packed chunk, numbered in prompt order."""
+    metadata = {hit["id"]: hit.get("metadata") for hit in hits}
+    return [{"chunk": n, "id": chunk_id, **(metadata.get(chunk_id) or {})} for n, chunk_id in enumerate(ids, 1)]
+
+
+# ✅ **Function: Embeddings of Retrieved Chunks**
+def hit_vectors(hits):
+    """Embeddings of `hits` for MMR: those the search returned, plus one lookup for any hit without one."""
+    vectors = {hit["id"]: hit["vector"] for hit in hits if "vector" in hit}
+    missing = {hit["id"] for hit in hits if hit["id"] not in vectors}
+    if missing:
+        with stage("vector_fetch"):
+            vectors.update(vector_store.get_vectors(missing))
+    return vectors
+
+
+# ✅ **Function: Pack Retrieved Chunks into the Prompt Budget**
+def pack_context(user_query, query_embedding, hits, vectors=None):
+    """Chunks for the prompt and their citations: the over-fetched `hits` deduplicated, diversified and trimmed to PROMPT_TOKEN_BUDGET."""
+    if vectors is None:
+        vectors = hit_vectors(hits)
+    with stage("prompt_build"):
+        # The instructions and query come out of the budget first; allow a token per line break between chunks
+        overhead = context_packer.count("\n".join(m["content"] for m in prompt_messages(user_query, [])))
+        budget = max(0, PROMPT_TOKEN_BUDGET - overhead - CONTEXT_MAX_CHUNKS)
+        chunks, stats = context_packer.pack(user_query, query_embedding, hits, vectors, budget=budget)
+    log(f"📦 Context: {stats['chunks']} chunks from {stats['candidates']} candidates ({stats['unique']} unique), "
+        f"{stats['context_tokens']}/{stats['budget']} tokens")
+    return chunks, citations_for(hits, stats["ids"])
+
+
+# ✅ **Function: Generate an Answer from Retrieved Chunks**
+def generate_answer(user_query, top_k_chunks, stream=False):
+    """Asks the chat deployment to answer strictly from the retrieved chunks (a generator of deltas with `stream=True`)."""
+    messages = prompt_messages(user_query, top_k_chunks)
+    prompt_tokens = context_packer.count("\n".join(m["content"] for m in messages))
+    log(f"🧮 Prompt tokens: {prompt_tokens} (budget {PROMPT_TOKEN_BUDGET}) for query: {user_query}")
+
+    response = gateway.chat(
+        messages,
+        DEPLOYMENT_CHAT,  # ✅ Fixed model reference
+        name="documents_query",
+        max_tokens=500,
+        temperature=TEMPERATURE,
+        stream=stream
     )
+    if stream:
+        # Azure sends a first chunk without choices (prompt filter results)
+        return (chunk.choices[0].delta.content for chunk in response
+                if chunk.choices and chunk.choices[0].delta.content)
+    return response.choices[0].message.content.strip()
+
+
+# ✅ **Function: Relay Deltas as Server-Sent Events**
+def sse_response(deltas, on_complete=None, citations=None):
+    """Streams `data: {"delta": ...}` events, then a `done` event carrying the full response and its citations."""
+    def events():
+        parts = []
+        try:
+            for delta in deltas:
+                parts.append(delta)
+                yield f"data: {json.dumps({'delta': delta})}\n\n"
+        except Exception as e:
+            log(f"Error occurred: {e}")
+            yield f"event: error\ndata: {json.dumps({'message': f'Error: {str(e)}'})}\n\n"
+            return
+        ai_response = "".join(parts).strip()
+        if on_complete:
+            on_complete(ai_response)
+        yield f"event: done\ndata: {json.dumps({'response': ai_response, 'citations': citations or []})}\n\n"
 
-    return [hit.entity.get("text") for hit in results[0]]
+    return Response(events(), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
 
 
 # 📌 **API Route: Process PDF Files**
 @ns_processing.route("/index")
 class DocumentIndexer(Resource):
+    @api.expect(index_model)
     def post(self):
-        """Automatically process all PDFs in the data_input folder."""
+        """Queue a background job that processes all PDFs in the data_input folder (optionally for a tenant)."""
+        tenant = (request.get_json(silent=True) or {}).get("tenant", DEFAULT_TENANT)
+        if not isinstance(tenant, str) or not tenant.strip() or len(tenant) > 128:
+            return {"message": "'tenant' must be a non-empty string of at most 128 characters!"}, 400
+
         files = [f for f in os.listdir(DATA_INPUT_FOLDER) if f.endswith(".pdf")]
         if not files:
             return {"message": "No PDF files found in data_input folder!"}, 400
 
-        for file_name in files:
-            file_path = os.path.join(DATA_INPUT_FOLDER, file_name)
-            chunks = extract_text_from_pdf(file_path)
-            embeddings = embed_text(chunks)
-            store_embeddings(embeddings, chunks)
-            shutil.move(file_path, os.path.join(PROCESSED_FOLDER, file_name))
-
-        return {"message": "All documents processed and moved successfully!"}, 200
+        try:
+            job = jobs.submit(files, tenant=tenant)
+        except JobQueueFull as e:
+            return {"message": str(e)}, 429
+        if job is None:
+            return {"message": "All PDF files are already being indexed by another job."}, 409
+
+        return {
+            "message": "Indexing job queued.",
+            "job_id": job.id,
+            "files": len(job.files),
+            "status_url": api.url_for(IndexJobStatus, job_id=job.id)
+        }, 202
+
+
+# 📌 **API Route: List Indexing Jobs**
+@ns_processing.route("/jobs")
+class IndexJobList(Resource):
+    def get(self):
+        """List recent indexing jobs, newest first."""
+        return {"jobs": [job.to_dict() for job in jobs.list()]}, 200
+
+
+# 📌 **API Route: Indexing Job Status / Cancel**
+@ns_processing.route("/jobs/<string:job_id>")
+class IndexJobStatus(Resource):
+    def get(self, job_id):
+        """Per-file progress (pages extracted, chunks embedded, vectors stored), throughput and errors of a job."""
+        job = jobs.get(job_id)
+        if job is None:
+            return {"message": "Job not found."}, 404
+        return job.to_dict(), 200
+
+    def delete(self, job_id):
+        """Cancel a queued or running job (a running job stops at its next batch)."""
+        job = jobs.cancel(job_id)
+        if job is None:
+            return {"message": "Job not found."}, 404
+        return job.to_dict(), 202
+
+
+# 📌 **API Route: Reset Collection (admin)**
+@ns_processing.route("/reset")
+class CollectionReset(Resource):
+    def post(self):
+        """Drop every stored vector and the index manifest (the next /index re-ingests from scratch)."""
+        if jobs.has_active():
+            return {"message": "Indexing jobs are queued or running; cancel them before resetting."}, 409
+        reset_vector_store()
+        manifest.clear()
+        manifest.save()
+        invalidate_query_caches()
+        return {"message": "Collection reset successfully!"}, 200
 
 
 # 📌 **API Route: Query Documents**
@@ -161,30 +686,162 @@ class DocumentQuery(Resource):
             user_query = request.json.get("query")
             if not user_query:
                 return {"message": "Query not provided!"}, 400
-
-            query_embedding = embed_text([user_query])[0]
-            top_k_chunks = search_embeddings(query_embedding, top_k=3)
+            stream = bool(request.json.get("stream")) or request.args.get("stream", "").lower() == "true"
+            try:
+                search_filter = SearchFilter.from_request(request.json.get("filters"))
+            except ValueError as e:
+                return {"message": str(e)}, 400
+
+            query_embedding = query_embedding_cache.get(user_query)
+            if query_embedding is None:
+                query_embedding = embed_text([user_query])[0]
+                query_embedding_cache.put(user_query, query_embedding)
+
+            cache_generation = answer_cache.generation  # Answers computed after an index change are not cached
+            cached = answer_cache.lookup(query_embedding, user_query) if search_filter is None else None  # Filtered queries are not cached
+            if cached is not None:
+                return sse_response(iter([cached["response"]]), citations=cached["citations"]) if stream else (cached, 200)
+
+            hits = search_hits(query_embedding, top_k=CONTEXT_CANDIDATES, query_text=user_query,  # Over-fetch for packing
+                               search_filter=search_filter, with_vectors=True)
+            top_k_chunks, citations = pack_context(user_query, query_embedding, hits)
 
             if not top_k_chunks:
                 return {"message": "No relevant information found."}, 200
 
-            augmented_prompt = f"User Query: {user_query}\n\nRelevant Chunks:\n" + "\n".join(top_k_chunks)
-            print(augmented_prompt)
+            if stream:
+                deltas = generate_answer(user_query, top_k_chunks, stream=True)
+                on_complete = None if search_filter else \
+                    lambda text: answer_cache.add(query_embedding, user_query, {"response": text, "citations": citations},
+                                                  cache_generation)
+                return sse_response(deltas, on_complete=on_complete, citations=citations)
 
-            response = client.chat.completions.create(
-                model=DEPLOYMENT_CHAT,  # ✅ Fixed model reference
-                messages=[{"role": "system", "content": "You just need to repond as mentioned from the releavent chunks, don't add extra information. if you cannot find the answer respond with I don't know"},
-                          {"role": "user", "content": augmented_prompt}],
-                max_tokens=500,
-                temperature= int(os.getenv("Temperature"))
-            )
+            ai_response = generate_answer(user_query, top_k_chunks)
+            result = {"response": ai_response, "citations": citations}
+            if search_filter is None:
+                answer_cache.add(query_embedding, user_query, result, cache_generation)
+            return result, 200
 
-            return {"response": response.choices[0].message.content.strip()}, 200
+        except Exception as e:
+            log(f"Error occurred: {e}")
+            return {"message": f"Error: {str(e)}"}, 500
 
+
+# 📌 **API Route: Batch Query Documents (NDJSON stream)**
+@ns_query.route("/batch_query")
+class DocumentBatchQuery(Resource):
+    @api.expect(batch_query_model)
+    def post(self):
+        """Answer many queries in one call, streamed back as NDJSON (one line per query, in input order)."""
+        user_queries = (request.json or {}).get("queries")
+        if not isinstance(user_queries, list) or not user_queries \
+                or not all(isinstance(q, str) and q.strip() for q in user_queries):
+            return {"message": "Provide a non-empty list of query strings!"}, 400
+        if len(user_queries) > BATCH_QUERY_MAX_QUESTIONS:
+            return {"message": f"At most {BATCH_QUERY_MAX_QUESTIONS} queries per batch."}, 413
+        try:
+            search_filter = SearchFilter.from_request(request.json.get("filters"))
+        except ValueError as e:
+            return {"message": str(e)}, 400
+
+        try:
+            query_embeddings = embed_queries(user_queries)  # One batched embedding call
+            results = [None] * len(user_queries)
+            pending = []
+            cache_generation = answer_cache.generation
+            for idx, query_embedding in enumerate(query_embeddings):
+                cached = answer_cache.lookup(query_embedding, user_queries[idx]) if search_filter is None else None
+                if cached is not None:
+                    results[idx] = {**cached, "cached": True}
+                else:
+                    pending.append(idx)
+            retrieved = search_hits_many(  # One multi-vector search
+                [query_embeddings[idx] for idx in pending],
+                top_k=CONTEXT_CANDIDATES,
+                query_texts=[user_queries[idx] for idx in pending],
+                search_filter=search_filter,
+                with_vectors=True
+            )
+            # Candidates come with their embeddings (one lookup for any without), then per-query packing
+            vectors = hit_vectors([hit for hits in retrieved for hit in hits])
+            retrieved = [pack_context(user_queries[idx], query_embeddings[idx], hits, vectors)
+                         for idx, hits in zip(pending, retrieved)]
         except Exception as e:
-            print(f"Error occurred: {e}")
+            log(f"Error occurred: {e}")
             return {"message": f"Error: {str(e)}"}, 500
 
+        def stream():
+            # Chat completions run with bounded concurrency; identical queries share one completion
+            executor = ThreadPoolExecutor(max_workers=BATCH_QUERY_CONCURRENCY)
+            try:
+                futures, owners, citations = {}, {}, {}
+                for idx, (top_k_chunks, chunk_citations) in zip(pending, retrieved):
+                    citations[idx] = chunk_citations
+                    if not top_k_chunks:
+                        results[idx] = {"message": "No relevant information found."}
+                        continue
+                    key = normalize_query(user_queries[idx])
+                    if key not in owners:
+                        owners[key] = idx
+                        futures[idx] = executor.submit(contextvars.copy_context().run, generate_answer,
+                                                       user_queries[idx], top_k_chunks)
+                    futures.setdefault(idx, futures[owners[key]])
+
+                for idx, user_query in enumerate(user_queries):
+                    line = {"index": idx, "query": user_query}
+                    if idx in futures:
+                        try:
+                            ai_response = futures[idx].result()
+                            line.update(response=ai_response, citations=citations[idx])
+                            if owners[normalize_query(user_query)] == idx and search_filter is None:
+                                answer_cache.add(query_embeddings[idx], user_query,
+                                                 {"response": ai_response, "citations": citations[idx]}, cache_generation)
+                        except Exception as e:
+                            log(f"Error occurred: {e}")
+                            line["message"] = f"Error: {str(e)}"
+                    else:
+                        line.update(results[idx])
+                    yield json.dumps(line) + "\n"
+            finally:
+                executor.shutdown(wait=False, cancel_futures=True)
+
+        return Response(stream(), mimetype="application/x-ndjson")
+
+
+# 📌 **API Route: Query Cache Stats**
+@ns_query.route("/cache_stats")
+class QueryCacheStats(Resource):
+    def get(self):
+        """Hit-rate metrics for the query embedding and semantic answer caches."""
+        return {
+            "query_embedding_cache": query_embedding_cache.stats(),
+            "answer_cache": answer_cache.stats()
+        }, 200
+
+
+# 📌 **API Route: LLM Gateway Stats**
+@ns_query.route("/llm_stats")
+class LLMStats(Resource):
+    def get(self):
+        """Chat call counts, token usage, retries, throttling and latency percentiles from the LLM gateway."""
+        return gateway.stats(), 200
+
+
+# 📌 **API Route: Readiness Probe**
+@api.route("/ready")
+class Readiness(Resource):
+    def get(self):
+        """200 once the OpenAI clients, vector store and lexical index are loaded, else 503 with per-resource status."""
+        return readiness(resources)
+
+
+# 📌 **API Route: Prometheus Metrics**
+@api.route("/metrics")
+class Metrics(Resource):
+    def get(self):
+        """Prometheus metrics: per-stage and per-route latency histograms, LLM token/retry counters, cache hits."""
+        return Response(registry.render(), content_type=CONTENT_TYPE)
+
 
 # Run Flask App
 if __name__ == "__main__":
@@ -1,6 +1,22 @@
+import json
 import requests
 import streamlit as st
 
+
+def iter_sse(response):
+    """Yield (event, data) pairs from a server-sent-events response as they arrive."""
+    response.encoding = "utf-8"
+    event, data = "message", []
+    for line in response.iter_lines(chunk_size=None, decode_unicode=True):
+        if not line:  # A blank line ends an event
+            if data:
+                yield event, json.loads("\n".join(data))
+            event, data = "message", []
+        elif line.startswith("event:"):
+            event = line[len("event:"):].strip()
+        elif line.startswith("data:"):
+            data.append(line[len("data:"):].strip())
+
 st.title("ChatGPT-like Chatbot")
 
 # Initialize chat history
@@ -21,17 +37,29 @@ if prompt := st.chat_input("What is up?"):
     with st.chat_message("assistant"):
         message_placeholder = st.empty()
         
-        # Make a POST request with JSON payload
+        # Make a POST request with JSON payload, asking for a token stream
         api_url = "http://127.0.0.1:5000/query/"
-        payload = {"query": prompt}  # Include the user input in request body
+        payload = {"query": prompt, "stream": True}  # Include the user input in request body
         headers = {"Content-Type": "application/json"}
 
-        response = requests.post(api_url, json=payload, headers=headers)
+        response = requests.post(api_url, json=payload, headers=headers, stream=True)
 
-        if response.status_code == 200:
-            response_text = response.json().get("response", "No response received.")
-        else:
+        if response.status_code != 200:
             response_text = f"Error: {response.status_code}, {response.text}"
+        elif response.headers.get("Content-Type", "").startswith("text/event-stream"):
+            # Render tokens as they arrive
+            response_text = ""
+            for event, data in iter_sse(response):
+                if event == "error":
+                    response_text = f"Error: {data.get('message')}"
+                    break
+                if event == "done":
+                    break
+                response_text += data["delta"]
+                message_placeholder.markdown(response_text + "▌")
+            response_text = response_text or "No response received."
+        else:
+            response_text = response.json().get("response", "No response received.")
 
         message_placeholder.markdown(response_text)
     
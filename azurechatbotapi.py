@@ -1,22 +1,24 @@
 import os 
-import spacy
-from flask import Flask
+from flask import Flask, Response
 from flask_restx import Api, Resource, fields
 from werkzeug.middleware.proxy_fix import ProxyFix
-from openai import AzureOpenAI
 from dotenv import load_dotenv 
+from local_ner import LocalNER, refine_messages, parse_refined
+from neuradocs.lazy_resource import LazyResource, warm_up, readiness
+from neuradocs.metrics import registry, log, instrument_flask, gateway_metrics, CONTENT_TYPE
 load_dotenv()
 
 app = Flask(__name__)
 app.wsgi_app = ProxyFix(app.wsgi_app)
+instrument_flask(app)  # Request latency histograms and, with TRACE_IDS, per-request trace IDs
 
 api = Api(app, version='1.0', title='Simple API', description='A simple API with Flask-RESTx')
-nlp = spacy.load("en_core_web_sm")
 
 ns_query = api.namespace('query', description='Query operations')
 ns_summary = api.namespace('summary', description='Summarizer')
 ns_sentiment = api.namespace('sentiment', description='Sentiment analysis')
 ns_ner = api.namespace('NER', description='Named Entity Recognition')
+ns_gateway = api.namespace('gateway', description='LLM gateway metrics')
 
 query_model = api.model('Query', {
     'query': fields.String(required=True, description='User query')})
@@ -28,7 +30,36 @@ sentiment_model = api.model('Sentiment', {
     'text': fields.String(required=True, description='Text for sentiment analysis')})
 
 ner_model = api.model('NER', {
-    'text': fields.String(required=True, description='Text for named entity recognition')})
+    'text': fields.String(required=True, description='Text for named entity recognition'),
+    'mode': fields.String(enum=['llm', 'local'], description="'llm' (free-text answer) or 'local' (spaCy spans); defaults to NER_MODE"),
+    'refine': fields.Boolean(default=False, description='Local mode: let the LLM correct the spaCy entities')})
+
+ner_bulk_model = api.model('NERBulk', {
+    'texts': fields.List(fields.String, required=True, description='Texts for local named entity recognition')})
+
+def load_gateway():
+    # One pooled, rate-limited client shared by every request instead of a new client per call
+    from neuradocs.llm_gateway import LLMGateway
+    return LLMGateway.from_env()
+
+def load_local_ner():
+    # spaCy entity spans for mode=local and /NER/bulk
+    import spacy
+    return LocalNER(
+        spacy.load("en_core_web_sm"),
+        batch_size=int(os.getenv("NER_BATCH_SIZE", 64)),
+        n_process=int(os.getenv("NER_N_PROCESS", 1))  # Worker processes for large /NER/bulk requests
+    )
+
+# Heavy resources are built on first use, or in the background right after startup (WARM_UP), behind /ready
+gateway = LazyResource("openai", load_gateway)
+local_ner = LazyResource("spacy", load_local_ner)
+resources = [gateway, local_ner]
+if os.getenv("WARM_UP", "true").lower() == "true":
+    warm_up(resources)
+
+# LLM token/retry counters for /metrics, read from the gateway when scraped
+registry.collector(lambda: gateway_metrics(gateway))
 
 '''
 hardcoded_responses = {
@@ -45,18 +76,9 @@ class QueryResource(Resource):
     def post(self):
         """Process user query"""
         user_query = api.payload.get("query", "").lower()
-        print("api call")
+        log("api call")
        
-        endpoint = os.getenv("ENDPOINT_URL", "")  
         deployment = os.getenv("DEPLOYMENT_NAME", "gpt-35-turbo")  
-        subscription_key = os.getenv("AZURE_OPENAI_API_KEY", "")  
- 
-        # Initialize Azure OpenAI Service client with key-based authentication    
-        client = AzureOpenAI(  
-        azure_endpoint=endpoint,  
-        api_key=subscription_key,  
-        api_version="2024-05-01-preview",
-)
 
         #Prepare the chat prompt 
         chat_prompt = [
@@ -72,9 +94,10 @@ class QueryResource(Resource):
         # Include speech result if speech is enabled  
         messages = chat_prompt  
         # Generate the completion  
-        completion = client.chat.completions.create(  
-            model=deployment,
-            messages=messages,
+        completion = gateway.chat(  
+            messages,
+            deployment,
+            name="query",
             max_tokens=800,  
             temperature=0.21,  
             top_p=0.95,  
@@ -84,10 +107,6 @@ class QueryResource(Resource):
             stream=False
 )
  
-        print(completion.to_json())
-
-        print(completion.choices[0].message.content);
-
         response = completion.choices[0].message.content
         return {"response": response}
 @ns_summary.route('/')
@@ -96,15 +115,7 @@ class Summarizer(Resource):
     def post(self):
         text_to_summarize = api.payload.get("text", "")
         
-        endpoint = os.getenv("ENDPOINT_URL", "")  
         deployment = os.getenv("DEPLOYMENT_NAME", "gpt-35-turbo")  
-        subscription_key = os.getenv("AZURE_OPENAI_API_KEY", "")  
-    
-        client = AzureOpenAI(  
-            azure_endpoint=endpoint,  
-            api_key=subscription_key,  
-            api_version="2024-05-01-preview",
-        )
 
         chat_prompt = [
             {"role": "system", 
@@ -114,9 +125,10 @@ class Summarizer(Resource):
              "content": f"Summarize the following text: {text_to_summarize}"}
         ] 
         
-        completion = client.chat.completions.create(  
-            model=deployment,
-            messages=chat_prompt,
+        completion = gateway.chat(  
+            chat_prompt,
+            deployment,
+            name="summary",
             max_tokens=200,  
             temperature=0.5,  
             top_p=0.9,  
@@ -126,10 +138,6 @@ class Summarizer(Resource):
             stream=False
         )
         
-        print(completion.to_json())
-
-        print(completion.choices[0].message.content);
-        
         response = completion.choices[0].message.content
         return {"summary": response}
 @ns_sentiment.route('/')
@@ -138,24 +146,17 @@ class sentiment(Resource):
     def post(self):
         text_to_analyze = api.payload.get("text", "")
         
-        endpoint = os.getenv("ENDPOINT_URL", "")  
         deployment = os.getenv("DEPLOYMENT_NAME", "gpt-35-turbo")  
-        subscription_key = os.getenv("AZURE_OPENAI_API_KEY", "")  
-    
-        client = AzureOpenAI(  
-            azure_endpoint=endpoint,  
-            api_key=subscription_key,  
-            api_version="2024-05-01-preview",
-        )
 
         chat_prompt = [
             {"role": "system", "content": "You are an AI that performs sentiment analysis. Identify whether the sentiment is Positive, Negative, or Neutral and explain briefly."},
             {"role": "user", "content": f"Analyze the sentiment of the following text: {text_to_analyze}"}
         ] 
         
-        completion = client.chat.completions.create(  
-            model=deployment,
-            messages=chat_prompt,
+        completion = gateway.chat(  
+            chat_prompt,
+            deployment,
+            name="sentiment",
             max_tokens=800,  
             temperature=0.34,  
             top_p=0.9,  
@@ -171,27 +172,39 @@ class sentiment(Resource):
 class NERResource(Resource):
     @api.expect(ner_model)
     def post(self):
-        """Perform Named Entity Recognition using OpenAI"""
+        """Perform Named Entity Recognition using OpenAI, or spaCy with mode=local"""
         text_to_analyze = api.payload.get("text", "")
         
-        endpoint = os.getenv("ENDPOINT_URL", "")  
         deployment = os.getenv("DEPLOYMENT_NAME", "gpt-35-turbo")  
-        subscription_key = os.getenv("AZURE_OPENAI_API_KEY", "")  
 
-        client = AzureOpenAI(  
-            azure_endpoint=endpoint,  
-            api_key=subscription_key,  
-            api_version="2024-05-01-preview",
-        )
+        mode = (api.payload.get("mode") or os.getenv("NER_MODE", "llm")).lower()
+        if mode == "local":
+            spans = local_ner.extract(text_to_analyze)
+            if not api.payload.get("refine"):
+                return {"entities": spans, "source": "spacy"}
+            completion = gateway.chat(
+                refine_messages(text_to_analyze, spans),
+                deployment,
+                name="NER_refine",
+                max_tokens=500,
+                temperature=0
+            )
+            refined = parse_refined(text_to_analyze, completion.choices[0].message.content)
+            if refined is None:  # Unusable answer: keep the spaCy spans
+                return {"entities": spans, "source": "spacy"}
+            return {"entities": refined, "source": "spacy+llm"}
+        if mode != "llm":
+            return {"message": "mode must be 'llm' or 'local'"}, 400
 
         chat_prompt = [
             {"role": "system", "content": "You are an AI trained to extract named entities from text. Identify persons, organizations, locations, dates, and other important entities."},
             {"role": "user", "content": f"Extract named entities from the following text:\n\n{text_to_analyze}"}
         ] 
         
-        completion = client.chat.completions.create(  
-            model=deployment,
-            messages=chat_prompt,
+        completion = gateway.chat(  
+            chat_prompt,
+            deployment,
+            name="NER",
             max_tokens=500,  
             temperature=0.3,  
             top_p=0.9,  
@@ -201,7 +214,37 @@ class NERResource(Resource):
 
         response = completion.choices[0].message.content
         return {"entities": response}
-    
+
+@ns_ner.route('/bulk')
+class NERBulkResource(Resource):
+    @api.expect(ner_bulk_model)
+    def post(self):
+        """spaCy entity spans for many texts in one call (batched nlp.pipe)"""
+        texts = api.payload.get("texts")
+        if not isinstance(texts, list) or not texts or not all(isinstance(text, str) for text in texts):
+            return {"message": "texts must be a non-empty list of strings"}, 400
+        if len(texts) > int(os.getenv("NER_BULK_MAX_TEXTS", 10000)):
+            return {"message": "Too many texts in one request"}, 400
+        return {"entities": local_ner.extract_many(texts)}
+
+@api.route('/ready')
+class ReadinessResource(Resource):
+    def get(self):
+        """200 once the OpenAI client and spaCy pipeline are loaded, 503 (with per-resource status) until then"""
+        return readiness(resources)
+
+@ns_gateway.route('/stats')
+class GatewayStatsResource(Resource):
+    def get(self):
+        """Per-endpoint LLM call counts, token usage, retries, throttling and latency percentiles."""
+        return gateway.stats()
+
+@api.route('/metrics')
+class MetricsResource(Resource):
+    def get(self):
+        """Prometheus metrics: LLM latency histogram, per-route latencies and token/retry counters"""
+        return Response(registry.render(), content_type=CONTENT_TYPE)
+
 if __name__ == '__main__':
     app.run(debug=True, use_reloader=False)
 
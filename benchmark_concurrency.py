@@ -0,0 +1,86 @@
+import argparse
+import asyncio
+import json
+import time
+from urllib.parse import urlsplit
+import numpy as np
+
+parser = argparse.ArgumentParser(description="Load-test an endpoint at increasing concurrency: throughput and latency percentiles")
+parser.add_argument("--url", default="http://127.0.0.1:5000/summary/",
+                    help="Endpoint to call (CleanAPI on Flask or CleanAPI_async on uvicorn)")
+parser.add_argument("--field", default="text", help="Request body field carrying the text ('query' or 'text')")
+parser.add_argument("--text", default="Hash tables map keys to buckets; collisions are resolved by chaining or probing.")
+parser.add_argument("--concurrency", default="1,10,50,100,500,1000", help="Comma-separated in-flight request levels")
+parser.add_argument("--requests", type=int, default=0, help="Requests per level (default: 5x the concurrency, at least 50)")
+parser.add_argument("--timeout", type=float, default=300)
+parser.add_argument("--output", help="Write the results as JSON")
+
+
+def percentile_ms(latencies, q):
+    return float(np.percentile(latencies, q) * 1000) if latencies else 0.0
+
+
+async def post(url, body, timeout):
+    """Minimal HTTP/1.1 POST on its own connection (no client library, so thousands can be open at once)."""
+    parts = urlsplit(url)
+    reader, writer = await asyncio.wait_for(asyncio.open_connection(parts.hostname, parts.port or 80), timeout)
+    try:
+        path = parts.path + (f"?{parts.query}" if parts.query else "")
+        writer.write(
+            f"POST {path} HTTP/1.1\r\nHost: {parts.netloc}\r\nContent-Type: application/json\r\n"
+            f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode() + body
+        )
+        await writer.drain()
+        response = await asyncio.wait_for(reader.read(), timeout)  # Connection: close, so read to EOF
+        return int(response.split(b" ", 2)[1])
+    finally:
+        writer.close()
+
+
+async def run_level(args, concurrency, total):
+    body = json.dumps({args.field: args.text}).encode()
+    latencies, errors = [], 0
+    remaining = iter(range(total))
+
+    async def worker():
+        nonlocal errors
+        for _ in remaining:
+            start = time.perf_counter()
+            try:
+                status = await post(args.url, body, args.timeout)
+            except (OSError, asyncio.TimeoutError, IndexError, ValueError):
+                status = None
+            if status == 200:
+                latencies.append(time.perf_counter() - start)
+            else:
+                errors += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    return {
+        "concurrency": concurrency,
+        "requests": total,
+        "errors": errors,
+        "throughput_rps": round(len(latencies) / elapsed, 2),
+        "p50_ms": round(percentile_ms(latencies, 50), 1),
+        "p95_ms": round(percentile_ms(latencies, 95), 1),
+        "p99_ms": round(percentile_ms(latencies, 99), 1)
+    }
+
+
+async def main(args):
+    results = []
+    for concurrency in (int(level) for level in args.concurrency.split(",")):
+        result = await run_level(args, concurrency, args.requests or max(50, 5 * concurrency))
+        print(f"concurrency={result['concurrency']:<5} {result['throughput_rps']:8.1f} req/s  "
+              f"p50={result['p50_ms']:8.1f}ms p95={result['p95_ms']:8.1f}ms p99={result['p99_ms']:8.1f}ms  "
+              f"errors={result['errors']}")
+        results.append(result)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"url": args.url, "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,38 @@
+import argparse
+import json
+import time
+from urllib.request import Request, urlopen
+import numpy as np
+
+parser = argparse.ArgumentParser(description="Measure first-byte and total latency of an endpoint with and without streaming")
+parser.add_argument("--url", default="http://127.0.0.1:5000/query/", help="Endpoint to call (CleanAPI or /documents_query/query)")
+parser.add_argument("--field", default="query", help="Request body field carrying the text ('query' or 'text')")
+parser.add_argument("--text", default="Explain how a hash table handles collisions.")
+parser.add_argument("--requests", type=int, default=20,
+                    help="Requests per mode (run the document services with ANSWER_CACHE_SIZE=0 so repeats are not cached)")
+
+
+def percentile_ms(latencies, q):
+    return float(np.percentile(latencies, q) * 1000)
+
+
+def measure(url, payload):
+    """Seconds until the first body byte and until the end of the body."""
+    request = Request(url, data=json.dumps(payload).encode(), headers={"Content-Type": "application/json"})
+    start = time.perf_counter()
+    with urlopen(request, timeout=300) as response:  # Raises HTTPError on a non-2xx status
+        first_byte = None
+        while chunk := response.read1(65536):  # Whatever has arrived, without waiting for a full buffer
+            if first_byte is None:
+                first_byte = time.perf_counter() - start
+    return first_byte, time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    args = parser.parse_args()
+    for stream in (False, True):
+        payload = {args.field: args.text, "stream": stream}
+        first_bytes, totals = zip(*(measure(args.url, payload) for _ in range(args.requests)))
+        print(f"{'stream' if stream else 'blocking':<8} first byte p50={percentile_ms(first_bytes, 50):8.1f}ms "
+              f"p95={percentile_ms(first_bytes, 95):8.1f}ms  total p50={percentile_ms(totals, 50):8.1f}ms "
+              f"p95={percentile_ms(totals, 95):8.1f}ms")
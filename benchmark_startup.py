@@ -0,0 +1,75 @@
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+parser = argparse.ArgumentParser(description="Measure import time and time-to-ready of each service in a fresh process")
+parser.add_argument("--services", default="CleanAPI,CleanAPI_async,azurechatbotapi,Document_processing_api,RAG_processing",
+                    help="Comma-separated services to measure")
+parser.add_argument("--repeat", type=int, default=3, help="Cold starts per service (the median is reported)")
+parser.add_argument("--timeout", type=float, default=120, help="Seconds to wait for readiness")
+parser.add_argument("--output", help="Write the results as JSON")
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+SERVICES = {
+    "CleanAPI": (ROOT, "CleanAPI"),
+    "CleanAPI_async": (ROOT, "CleanAPI_async"),
+    "azurechatbotapi": (ROOT, "azurechatbotapi"),
+    "Document_processing_api": (os.path.join(ROOT, "Document_processing_api"), "app"),
+    "RAG_processing": (os.path.join(ROOT, "RAG_processing"), "app")
+}
+
+# Runs inside the child: import the service, then wait until warm-up has built (or failed to build) every resource.
+PROBE = """
+import json, sys, time
+start = time.perf_counter()
+service = __import__(sys.argv[1])
+imported = time.perf_counter() - start
+deadline = start + float(sys.argv[2])
+while not all(r.ready or r.error for r in service.resources) and time.perf_counter() < deadline:
+    time.sleep(0.005)
+print("STARTUP " + json.dumps({
+    "import_s": imported,
+    "ready_s": time.perf_counter() - start,
+    "ready": all(r.ready for r in service.resources),
+    "resources": {r.name: r.status() for r in service.resources}
+}))
+"""
+
+
+def cold_start(cwd, module, timeout):
+    env = dict(os.environ, WARM_UP="true", PYTHONDONTWRITEBYTECODE="1")
+    result = subprocess.run([sys.executable, "-c", PROBE, module, str(timeout)], cwd=cwd, env=env,
+                            capture_output=True, text=True, timeout=timeout + 60)
+    for line in result.stdout.splitlines():
+        if line.startswith("STARTUP "):
+            return json.loads(line[len("STARTUP "):])
+    return {"error": (result.stderr.strip().splitlines() or ["no output"])[-1]}
+
+
+if __name__ == "__main__":
+    args = parser.parse_args()
+    results = {}
+    for name in args.services.split(","):
+        cwd, module = SERVICES[name]
+        runs = [cold_start(cwd, module, args.timeout) for _ in range(args.repeat)]
+        ok = [run for run in runs if "error" not in run]
+        if not ok:
+            results[name] = {"error": runs[-1]["error"]}
+            print(f"{name:<24} failed to import: {runs[-1]['error']}")
+            continue
+        results[name] = {
+            "import_s": round(statistics.median(run["import_s"] for run in ok), 3),
+            "ready_s": round(statistics.median(run["ready_s"] for run in ok), 3),
+            "ready": ok[-1]["ready"],
+            "resources": ok[-1]["resources"]
+        }
+        not_ready = [f"{resource} ({status['error']})" for resource, status in ok[-1]["resources"].items()
+                     if not status["ready"]]
+        print(f"{name:<24} import={results[name]['import_s']:6.3f}s  ready={results[name]['ready_s']:6.3f}s"
+              + (f"  not ready: {', '.join(not_ready)}" if not_ready else ""))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
@@ -0,0 +1,76 @@
+import json
+import re
+
+NER_PIPES = ("tok2vec", "transformer", "ner", "entity_ruler")  # Components entity recognition depends on
+
+REFINE_SYSTEM_PROMPT = (
+    "You are an AI trained to extract named entities from text. A fast statistical tagger proposed the candidate "
+    "entities below. Fix wrong labels, drop false positives and add missed persons, organizations, locations, dates "
+    "and other important entities. Respond only with a JSON array of objects with \"text\" and \"label\" keys, "
+    "copying each \"text\" exactly as it appears in the input."
+)
+
+
+def entity_spans(doc):
+    """Entities of a spaCy Doc as JSON-ready spans with character offsets."""
+    return [{"text": ent.text, "label": ent.label_, "start": ent.start_char, "end": ent.end_char} for ent in doc.ents]
+
+
+class LocalNER:
+    """Named entity recognition on a loaded spaCy pipeline.
+
+    Components the entity recognizer does not need (tagger, parser,
+    lemmatizer, ...) are disabled once at construction, so each call runs
+    only tokenisation and NER. Bulk calls go through `nlp.pipe` in batches
+    and fan out to `n_process` worker processes when there are enough texts
+    to pay for starting them.
+    """
+
+    def __init__(self, nlp, batch_size=64, n_process=1, min_texts_per_process=500):
+        self.nlp = nlp
+        self.nlp.select_pipes(disable=[name for name in nlp.pipe_names if name not in NER_PIPES])
+        self.batch_size = batch_size
+        self.n_process = n_process
+        self.min_texts_per_process = min_texts_per_process
+
+    def extract(self, text):
+        return entity_spans(self.nlp(text))
+
+    def extract_many(self, texts):
+        """Spans for each text, in input order."""
+        n_process = max(1, min(self.n_process, len(texts) // self.min_texts_per_process))
+        return [entity_spans(doc) for doc in self.nlp.pipe(texts, batch_size=self.batch_size, n_process=n_process)]
+
+
+def refine_messages(text, spans):
+    """Chat messages asking the LLM to correct the tagger's candidate entities."""
+    candidates = json.dumps([{"text": span["text"], "label": span["label"]} for span in spans])
+    return [
+        {"role": "system", "content": REFINE_SYSTEM_PROMPT},
+        {"role": "user", "content": f"Text:\n{text}\n\nCandidate entities:\n{candidates}"}
+    ]
+
+
+def parse_refined(text, content):
+    """Spans from the LLM's JSON answer, located in `text`; None if the answer is not usable."""
+    content = re.sub(r"^```(?:json)?\s*|\s*```$", "", content.strip())
+    try:
+        items = json.loads(content)
+    except ValueError:
+        return None
+    if not isinstance(items, list):
+        return None
+    spans, cursor = [], 0
+    for item in items:
+        if not isinstance(item, dict) or not item.get("text") or not item.get("label"):
+            continue
+        entity = str(item["text"])
+        # Entities usually come back in reading order; fall back to the first occurrence.
+        start = text.find(entity, cursor)
+        if start < 0:
+            start = text.find(entity)
+        if start < 0:
+            continue  # Not copied verbatim, so no offsets to report
+        spans.append({"text": entity, "label": str(item["label"]).upper(), "start": start, "end": start + len(entity)})
+        cursor = start + len(entity)
+    return sorted(spans, key=lambda span: span["start"])
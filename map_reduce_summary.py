@@ -0,0 +1,154 @@
+import asyncio
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from neuradocs.chunker import get_tokenizer, iter_units
+from neuradocs.metrics import stage
+
+SEGMENT_SYSTEM_PROMPT = (
+    "You are an advanced AI summarizer. You are given one section of a longer document. "
+    "Generate a concise summary of the section while preserving key points, names and figures."
+)
+REDUCE_SYSTEM_PROMPT = (
+    "You are an advanced AI summarizer. You are given summaries of consecutive sections of one document. "
+    "Combine them into a single concise summary that preserves the key points, in document order."
+)
+
+
+def split_segments(text, segment_tokens=3000, encoding_name="cl100k_base"):
+    """Split text into segments of at most `segment_tokens` tokens, at sentence boundaries.
+
+    Boundaries are content-defined: past a small minimum size, a segment
+    closes after any sentence whose hash marks it as a boundary (on average
+    one per third of `segment_tokens`, weighted by sentence length), and
+    only falls back to closing at the token limit. An edit moves boundaries
+    only up to the next such sentence, so the segments after it, and their
+    cached summaries, are unchanged. Timed as the `chunk` stage of `/metrics`.
+    """
+    tokenizer = get_tokenizer(encoding_name)
+    segments, parts, num_tokens = [], [], 0
+    with stage("chunk"):
+        for _, sentence, sentence_tokens, starts_paragraph in iter_units([(1, text)], tokenizer, segment_tokens):
+            if parts and num_tokens + sentence_tokens > segment_tokens:
+                segments.append("".join(parts))
+                parts, num_tokens = [], 0
+            if parts:
+                parts.append("\n\n" if starts_paragraph else " ")
+            parts.append(sentence)
+            num_tokens += sentence_tokens
+            boundary = zlib.crc32(sentence.encode("utf-8")) / 2 ** 32 < 3 * sentence_tokens / segment_tokens
+            if boundary and num_tokens >= segment_tokens // 8:
+                segments.append("".join(parts))
+                parts, num_tokens = [], 0
+        if parts:
+            segments.append("".join(parts))
+    return segments
+
+
+class MapReduceSummarizer:
+    """Summarise long documents as a tree of LLM calls.
+
+    Segments are summarised concurrently (map). Consecutive partial summaries
+    are then merged in groups of up to `fan_in`, level by level, until they
+    fit a single prompt (reduce). The caller makes that last call, so it can
+    be streamed. Every segment and intermediate summary is stored in the
+    response cache, so re-summarising an edited document only calls the LLM
+    for the segments that changed and the merges above them.
+
+    `complete(system_prompt, user_prompt, max_tokens, temperature, name=...)`
+    returns the completion text.
+    """
+
+    def __init__(self, complete, cache, deployment, segment_tokens=3000, fan_in=4, max_tokens=300,
+                 temperature=0.5, max_workers=8, encoding_name="cl100k_base"):
+        self.complete = complete
+        self.cache = cache
+        self.deployment = deployment
+        self.segment_tokens = segment_tokens
+        self.fan_in = max(2, fan_in)
+        self.max_tokens = max_tokens
+        self.temperature = temperature
+        self.max_workers = max_workers
+        self.encoding_name = encoding_name
+
+    def _key(self, name, system_prompt, text):
+        if not self.cache.cacheable(self.temperature):
+            return None
+        return self.cache.key(name, system_prompt, text, self.deployment, self.max_tokens, self.temperature)
+
+    def _summarize(self, name, system_prompt, text):
+        key = self._key(name, system_prompt, text)
+        summary = self.cache.get(key) if key else None
+        if summary is None:
+            summary = self.complete(system_prompt, text, self.max_tokens, self.temperature, name=name)
+            if key:
+                self.cache.put(key, summary)
+        return summary
+
+    def _fits(self, partials):
+        tokenizer = get_tokenizer(self.encoding_name)
+        return len(partials) <= self.fan_in and tokenizer.count("\n\n".join(partials)) <= self.segment_tokens
+
+    def _groups(self, partials):
+        """Consecutive runs of at most `fan_in` partial summaries that fit one prompt together."""
+        tokenizer = get_tokenizer(self.encoding_name)
+        groups, group, num_tokens = [], [], 0
+        for partial in partials:
+            partial_tokens = tokenizer.count(partial)
+            if group and (len(group) == self.fan_in or num_tokens + partial_tokens > self.segment_tokens):
+                groups.append(group)
+                group, num_tokens = [], 0
+            group.append(partial)
+            num_tokens += partial_tokens
+        groups.append(group)
+        return groups
+
+    def _merge(self, group):
+        if len(group) == 1:
+            return group[0]
+        return self._summarize("summary_reduce", REDUCE_SYSTEM_PROMPT, "\n\n".join(group))
+
+    def reduce(self, segments):
+        """Text of the partial summaries of `segments`, merged until they fit one final summary prompt."""
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            partials = list(pool.map(lambda segment: self._summarize("summary_segment", SEGMENT_SYSTEM_PROMPT, segment),
+                                     segments))
+            while not self._fits(partials):
+                groups = self._groups(partials)
+                if len(groups) == len(partials):
+                    break  # Partial summaries too long to merge any further within segment_tokens
+                partials = list(pool.map(self._merge, groups))
+        return "\n\n".join(partials)
+
+
+class AsyncMapReduceSummarizer(MapReduceSummarizer):
+    """MapReduceSummarizer for an async `complete`; at most `max_workers` calls run at once, across requests."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._slots = asyncio.Semaphore(self.max_workers)
+
+    async def _summarize(self, name, system_prompt, text):
+        key = self._key(name, system_prompt, text)
+        # The cache may read and write SQLite, so it is used from a worker thread, not the event loop
+        summary = await asyncio.to_thread(self.cache.get, key) if key else None
+        if summary is None:
+            async with self._slots:
+                summary = await self.complete(system_prompt, text, self.max_tokens, self.temperature, name=name)
+            if key:
+                await asyncio.to_thread(self.cache.put, key, summary)
+        return summary
+
+    async def _merge(self, group):
+        if len(group) == 1:
+            return group[0]
+        return await self._summarize("summary_reduce", REDUCE_SYSTEM_PROMPT, "\n\n".join(group))
+
+    async def reduce(self, segments):
+        partials = await asyncio.gather(
+            *(self._summarize("summary_segment", SEGMENT_SYSTEM_PROMPT, segment) for segment in segments))
+        while not self._fits(partials):
+            groups = self._groups(partials)
+            if len(groups) == len(partials):
+                break
+            partials = await asyncio.gather(*(self._merge(group) for group in groups))
+        return "\n\n".join(partials)
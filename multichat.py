@@ -1,6 +1,22 @@
+import json
 import requests
 import streamlit as st
 
+
+def iter_sse(response):
+    """Yield (event, data) pairs from a server-sent-events response as they arrive."""
+    response.encoding = "utf-8"
+    event, data = "message", []
+    for line in response.iter_lines(chunk_size=None, decode_unicode=True):
+        if not line:  # A blank line ends an event
+            if data:
+                yield event, json.loads("\n".join(data))
+            event, data = "message", []
+        elif line.startswith("event:"):
+            event = line[len("event:"):].strip()
+        elif line.startswith("data:"):
+            data.append(line[len("data:"):].strip())
+
 st.title("Multi-Function Chatbot")
 
 # Define API base URL
@@ -43,15 +59,27 @@ if prompt := st.chat_input("Enter your text here:"):
         selected_endpoint = endpoint_map[option]
         api_url = f"{API_BASE_URL}/{selected_endpoint}"
         print(selected_endpoint)
-        payload = {"query" if selected_endpoint == "query" else "text": prompt}
+        payload = {"query" if selected_endpoint == "query" else "text": prompt, "stream": True}
         print(payload)
         headers = {"Content-Type": "application/json"}
 
-        # Send request to Flask API
-        response = requests.post(api_url, json=payload, headers=headers)
+        # Send request to Flask API (tokens are streamed back as server-sent events)
+        response = requests.post(api_url, json=payload, headers=headers, stream=True)
 
         # Handle response
-        if response.status_code == 200:
+        if response.status_code == 200 and response.headers.get("Content-Type", "").startswith("text/event-stream"):
+            # Render tokens as they arrive
+            response_text = ""
+            for event, data in iter_sse(response):
+                if event == "error":
+                    response_text = f"Error: {data.get('message')}"
+                    break
+                if event == "done":
+                    break
+                response_text += data["delta"]
+                message_placeholder.markdown(response_text + "▌")
+            response_text = response_text or "No response received."
+        elif response.status_code == 200:
             response_data = response.json()
             response_text = (
                 response_data.get("response") or  # For 'query'
@@ -0,0 +1 @@
+"""Modules shared by the chat services and the document services (`Document_processing_api`, `RAG_processing`)."""
@@ -0,0 +1,79 @@
+import json
+
+INDEX_TYPES = ("FLAT", "IVF_FLAT", "IVF_SQ8", "IVF_PQ", "HNSW")
+QUANTIZED_INDEX_TYPES = ("IVF_SQ8", "IVF_PQ")  # Lossy vector codes; hits are worth reranking at full precision
+
+
+def index_params(index_type, metric_type="COSINE", nlist=1024, pq_m=96, pq_nbits=8, hnsw_m=16,
+                 ef_construction=200, dim=None):
+    """Milvus `create_index` parameters for `index_type`, with only the build parameters that type takes.
+
+    FLAT is exact (brute force). IVF_FLAT clusters vectors into `nlist`
+    lists; IVF_SQ8 also stores them as int8 (1 byte per dimension) and IVF_PQ
+    compresses them into `pq_m` codes of `pq_nbits` bits (`pq_m` must divide
+    `dim`). HNSW builds a graph with `hnsw_m` links per
+    node, searched while building with `ef_construction` candidates.
+    """
+    index_type = index_type.upper()
+    if index_type == "FLAT":
+        params = {}
+    elif index_type in ("IVF_FLAT", "IVF_SQ8"):
+        params = {"nlist": nlist}
+    elif index_type == "IVF_PQ":
+        if dim is not None and dim % pq_m:
+            raise ValueError(f"IVF_PQ needs m dividing the embedding dimension ({pq_m} does not divide {dim})")
+        params = {"nlist": nlist, "m": pq_m, "nbits": pq_nbits}
+    elif index_type == "HNSW":
+        params = {"M": hnsw_m, "efConstruction": ef_construction}
+    else:
+        raise ValueError(f"Unknown index type {index_type!r}; expected one of {', '.join(INDEX_TYPES)}")
+    return {"index_type": index_type, "metric_type": metric_type, "params": params}
+
+
+def search_params(index_type, metric_type="COSINE", nprobe=10, ef=64):
+    """Milvus `search` parameters matching an index built with `index_params(index_type, metric_type, ...)`.
+
+    `nprobe` is the number of IVF lists scanned per query and `ef` the HNSW
+    candidate list (raised to the query's `limit` by the store when smaller).
+    """
+    index_type = index_type.upper()
+    if index_type == "FLAT":
+        params = {}
+    elif index_type in ("IVF_FLAT", "IVF_SQ8", "IVF_PQ"):
+        params = {"nprobe": nprobe}
+    elif index_type == "HNSW":
+        params = {"ef": ef}
+    else:
+        raise ValueError(f"Unknown index type {index_type!r}; expected one of {', '.join(INDEX_TYPES)}")
+    return {"metric_type": metric_type, "params": params}
+
+
+def same_index(built, wanted):
+    """Whether a collection's described index params (values may come back as strings) match `wanted`."""
+    if not built:
+        return False
+    # Depending on the server version, build parameters are nested (possibly as JSON) or flattened
+    nested = built.get("params") or {}
+    built_params = {k: v for k, v in built.items() if k not in ("index_type", "metric_type", "params")}
+    built_params.update(json.loads(nested) if isinstance(nested, str) else nested)
+    return (str(built.get("index_type", "")).upper() == wanted["index_type"]
+            and str(built.get("metric_type", "")).upper() == wanted["metric_type"]
+            and {k: str(v) for k, v in built_params.items()} == {k: str(v) for k, v in wanted["params"].items()})
+
+
+def memory_estimate(index_type, num_vectors, dim, nlist=1024, pq_m=96, pq_nbits=8, hnsw_m=16):
+    """Approximate bytes an index of `num_vectors` float32 vectors holds in memory (vectors + index structures)."""
+    index_type = index_type.upper()
+    raw = num_vectors * dim * 4
+    if index_type == "FLAT":
+        return raw
+    if index_type == "IVF_FLAT":
+        return raw + nlist * dim * 4 + num_vectors * 8  # Centroids + list IDs
+    if index_type == "IVF_SQ8":
+        return num_vectors * (dim + 8) + nlist * dim * 4  # int8 codes + list IDs, centroids
+    if index_type == "IVF_PQ":
+        codebooks = pq_m * 2 ** pq_nbits * (dim // pq_m) * 4
+        return num_vectors * (pq_m * pq_nbits // 8 + 8) + nlist * dim * 4 + codebooks
+    if index_type == "HNSW":
+        return raw + num_vectors * hnsw_m * 2 * 4  # ~2M neighbour IDs per node on the base layer
+    raise ValueError(f"Unknown index type {index_type!r}")
@@ -0,0 +1,153 @@
+import re
+from dataclasses import dataclass
+
+try:
+    import tiktoken
+except ImportError:  # Fall back to an approximate word/punctuation count
+    tiktoken = None
+
+PARAGRAPH_SPLIT = re.compile(r"\n\s*\n")
+SENTENCE_SPLIT = re.compile(r"(?<=[.!?])\s+")
+APPROX_TOKEN = re.compile(r"\w+|[^\w\s]")
+
+
+@dataclass
+class Chunk:
+    """A token-bounded piece of a document and the pages it came from."""
+    text: str
+    page_start: int
+    page_end: int
+    num_tokens: int
+
+
+class Tokenizer:
+    """Counts and splits text by model tokens (tiktoken when available)."""
+
+    def __init__(self, encoding_name="cl100k_base"):
+        self.encoding = None
+        if tiktoken:
+            try:
+                self.encoding = tiktoken.get_encoding(encoding_name)
+            except Exception as e:  # e.g. encoding file cannot be downloaded
+                print(f"Tokenizer Error: {e}; falling back to approximate token counts")
+
+    def count(self, text):
+        if self.encoding:
+            return len(self.encoding.encode(text, disallowed_special=()))
+        return len(APPROX_TOKEN.findall(text))
+
+    def split(self, text, max_tokens):
+        """Hard-split text that has no usable sentence boundary into pieces of `max_tokens`."""
+        if self.encoding:
+            tokens = self.encoding.encode(text, disallowed_special=())
+            return [self.encoding.decode(tokens[i:i + max_tokens]) for i in range(0, len(tokens), max_tokens)]
+        words = text.split()
+        return [" ".join(words[i:i + max_tokens]) for i in range(0, len(words), max_tokens)]
+
+
+_tokenizers = {}
+
+def get_tokenizer(encoding_name="cl100k_base"):
+    """Return a shared Tokenizer for the given encoding."""
+    if encoding_name not in _tokenizers:
+        _tokenizers[encoding_name] = Tokenizer(encoding_name)
+    return _tokenizers[encoding_name]
+
+
+def _split_bytes(text, max_bytes):
+    """Hard-split text into pieces of at most `max_bytes` UTF-8 bytes, cutting between characters."""
+    data = text.encode("utf-8")
+    pieces, start = [], 0
+    while len(data) - start > max_bytes:
+        end = start + max_bytes
+        while data[end] & 0xC0 == 0x80:  # Continuation byte: back up to the start of the character
+            end -= 1
+        pieces.append(data[start:end].decode("utf-8"))
+        start = end
+    pieces.append(data[start:].decode("utf-8"))
+    return pieces
+
+
+def iter_units(pages, tokenizer, max_tokens, max_bytes=None):
+    """Split pages into (page_number, text, num_tokens, starts_paragraph) sentence units.
+
+    Units longer than `max_tokens` tokens, or `max_bytes` UTF-8 bytes, are
+    hard-split (a run without spaces counts as one token in the fallback
+    tokenizer, so the byte bound is checked separately).
+    """
+    for page_number, text in pages:
+        for paragraph in PARAGRAPH_SPLIT.split(text):
+            paragraph = " ".join(paragraph.split())
+            if not paragraph:
+                continue
+            starts_paragraph = True
+            for sentence in SENTENCE_SPLIT.split(paragraph):
+                num_tokens = tokenizer.count(sentence)
+                pieces = [sentence] if num_tokens <= max_tokens else tokenizer.split(sentence, max_tokens)
+                if max_bytes and any(len(piece.encode("utf-8")) > max_bytes for piece in pieces):
+                    pieces = [part for piece in pieces for part in _split_bytes(piece, max_bytes)]
+                for piece in pieces:
+                    yield page_number, piece, (num_tokens if len(pieces) == 1 else tokenizer.count(piece)), starts_paragraph
+                    starts_paragraph = False
+
+
+def _build_chunk(units):
+    parts = []
+    for _, text, _, starts_paragraph in units:
+        if parts:
+            parts.append("\n\n" if starts_paragraph else " ")
+        parts.append(text)
+    return Chunk(
+        text="".join(parts),
+        page_start=units[0][0],
+        page_end=units[-1][0],
+        num_tokens=sum(unit[2] for unit in units)
+    )
+
+
+def chunk_pages(pages, chunk_tokens=512, overlap_tokens=64, max_bytes=4000, encoding_name="cl100k_base"):
+    """Lazily split `(page_number, text)` pairs into token-bounded chunks.
+
+    Chunks are built from whole sentences, close early at a paragraph break
+    once they are three quarters full, and never exceed `chunk_tokens` tokens
+    or `max_bytes` UTF-8 bytes (the Milvus `text` field limit). Consecutive
+    chunks share up to `overlap_tokens` tokens of trailing sentences. Short
+    pages are merged with their neighbours, so each chunk records the span of
+    pages it was taken from.
+    """
+    tokenizer = get_tokenizer(encoding_name)
+    overlap_tokens = min(overlap_tokens, chunk_tokens // 2)
+    # Keep single units well inside the byte limit as well as the token limit.
+    max_unit_tokens = min(chunk_tokens, max_bytes // 8)
+    max_unit_bytes = max_bytes // 2
+
+    window, window_tokens, window_bytes = [], 0, 0
+    for unit in iter_units(pages, tokenizer, max_unit_tokens, max_unit_bytes):
+        _, text, num_tokens, starts_paragraph = unit
+        num_bytes = len(text.encode("utf-8")) + 2
+
+        full = window_tokens + num_tokens > chunk_tokens or window_bytes + num_bytes > max_bytes
+        soft_break = starts_paragraph and window_tokens >= chunk_tokens * 3 // 4
+        if window and (full or soft_break):
+            yield _build_chunk(window)
+
+            # Carry trailing sentences over as overlap for the next chunk.
+            carried, carried_tokens = [], 0
+            for previous in reversed(window):
+                if carried_tokens + previous[2] > overlap_tokens:
+                    break
+                carried.insert(0, previous)
+                carried_tokens += previous[2]
+            window = carried
+            window_tokens = carried_tokens
+            window_bytes = sum(len(previous[1].encode("utf-8")) + 2 for previous in carried)
+
+            if window_tokens + num_tokens > chunk_tokens or window_bytes + num_bytes > max_bytes:
+                window, window_tokens, window_bytes = [], 0, 0
+
+        window.append(unit)
+        window_tokens += num_tokens
+        window_bytes += num_bytes
+
+    if window:
+        yield _build_chunk(window)
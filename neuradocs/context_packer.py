@@ -0,0 +1,137 @@
+import re
+import numpy as np
+from .chunker import get_tokenizer
+from .lexical_index import tokenize
+
+SENTENCE_SPLIT = re.compile(r"(?<=[.!?])\s+")
+
+
+def mmr_select(query_vector, vectors, k, diversity=0.3, duplicate_threshold=0.95, prior=None):
+    """Indices of up to `k` rows of `vectors` chosen by maximal marginal relevance, best first.
+
+    Each pick maximises `(1 - diversity) * relevance - diversity * max sim(picked)`,
+    where relevance is the cosine similarity to the query, averaged with
+    `prior` (e.g. a retrieval-rank score in [0, 1]) when one is given.
+    Candidates at least `duplicate_threshold` similar to a picked row are
+    near-duplicates and are dropped.
+    """
+    vectors = np.asarray(vectors, dtype=np.float32)
+    vectors = vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+    query = np.asarray(query_vector, dtype=np.float32)
+    relevance = vectors @ (query / max(float(np.linalg.norm(query)), 1e-12))
+    if prior is not None:
+        relevance = (relevance + np.asarray(prior, dtype=np.float32)) / 2
+
+    picked = []
+    redundancy = np.zeros(len(vectors), dtype=np.float32)  # Highest similarity to any picked row
+    available = np.ones(len(vectors), dtype=bool)
+    while len(picked) < k and available.any():
+        scores = np.where(available, (1 - diversity) * relevance - diversity * redundancy, -np.inf)
+        best = int(np.argmax(scores))
+        picked.append(best)
+        redundancy = np.maximum(redundancy, vectors @ vectors[best])
+        available &= redundancy < duplicate_threshold
+        available[best] = False  # Self-similarity can round below a threshold of 1.0
+    return picked
+
+
+def truncate(tokenizer, text, max_tokens):
+    """Leading part of `text` with at most `max_tokens` tokens (re-cut while the approximate split overshoots)."""
+    limit = max_tokens
+    piece = tokenizer.split(text, limit)[0]
+    while limit > 1 and tokenizer.count(piece) > max_tokens:
+        limit -= max(1, tokenizer.count(piece) - max_tokens)
+        piece = tokenizer.split(text, limit)[0]
+    return piece
+
+
+class ContextPacker:
+    """Assemble retrieved chunks into a prompt context that fits a token budget.
+
+    Over-fetched candidates are deduplicated (identical text, then
+    near-identical embeddings) and ordered by maximal marginal relevance,
+    with relevance taken from both the query embedding and the retrieval
+    rank, so exact matches surfaced by BM25 keep their place. Each chunk is
+    trimmed to its sentences sharing the most query terms (at least
+    `min_overlap` of its best sentence's), plus `sentence_window`
+    neighbours on each side. Sentences already taken from
+    an earlier chunk (overlap, repeated headers and footers) are skipped.
+    Chunks are added until `token_budget` tokens, counted with the model's
+    tokenizer, are used; the last one is cut to fit.
+    """
+
+    def __init__(self, token_budget=1500, max_chunks=8, diversity=0.3, duplicate_threshold=0.95,
+                 sentence_window=1, min_overlap=0.5, min_chunk_tokens=32, encoding_name="cl100k_base"):
+        self.token_budget = token_budget
+        self.max_chunks = max_chunks
+        self.diversity = diversity
+        self.duplicate_threshold = duplicate_threshold
+        self.sentence_window = sentence_window
+        self.min_overlap = min_overlap
+        self.min_chunk_tokens = min_chunk_tokens  # Smaller leftovers of the budget are not worth a chunk
+        self.encoding_name = encoding_name
+
+    def count(self, text):
+        return get_tokenizer(self.encoding_name).count(text)
+
+    def trim(self, text, query_terms, seen):
+        """Query-relevant sentences of a chunk (with neighbours), in order; None if nothing new is left."""
+        sentences = [s for s in SENTENCE_SPLIT.split(" ".join(text.split())) if s]
+        keys = [" ".join(tokenize(sentence)) for sentence in sentences]
+        overlaps = [len(query_terms & set(key.split())) for key in keys]
+        best = max(overlaps, default=0)
+        matches = [i for i, overlap in enumerate(overlaps) if overlap and overlap >= self.min_overlap * best]
+        keep = set()
+        for i in matches or range(len(sentences)):  # No term overlap: the embedding match is all we have
+            keep.update(range(max(0, i - self.sentence_window), min(len(sentences), i + self.sentence_window + 1)))
+        kept = [sentences[i] for i in sorted(keep) if not keys[i] or keys[i] not in seen]
+        seen.update(keys[i] for i in keep if keys[i])
+        return " ".join(kept) or None
+
+    def pack(self, query_text, query_embedding, hits, vectors, budget=None):
+        """Chunk texts for the prompt and packing stats (with the IDs of the packed chunks, in prompt order).
+
+        `hits` are `{"id", "text"}` dicts in retrieval order and `vectors`
+        maps chunk IDs to stored embeddings (hits without one are skipped).
+        """
+        budget = self.token_budget if budget is None else budget
+        unique, texts_seen = [], set()
+        for hit in hits:
+            key = " ".join(hit["text"].lower().split())
+            if hit["id"] in vectors and key not in texts_seen:
+                texts_seen.add(key)
+                unique.append(hit)
+
+        order = []
+        if unique:
+            order = mmr_select(query_embedding, [vectors[hit["id"]] for hit in unique], self.max_chunks,
+                               diversity=self.diversity, duplicate_threshold=self.duplicate_threshold,
+                               prior=np.linspace(1.0, 0.0, len(unique)))  # Retrieval rank, best first
+
+        tokenizer = get_tokenizer(self.encoding_name)
+        query_terms = set(tokenize(query_text))
+        chunks, ids, used, sentences_seen = [], [], 0, set()
+        for i in order:
+            text = self.trim(unique[i]["text"], query_terms, sentences_seen)
+            if text is None:
+                continue
+            num_tokens = tokenizer.count(text)
+            if used + num_tokens > budget:
+                if budget - used >= self.min_chunk_tokens:
+                    text = truncate(tokenizer, text, budget - used)
+                    chunks.append(text)
+                    ids.append(unique[i]["id"])
+                    used += tokenizer.count(text)
+                break
+            chunks.append(text)
+            ids.append(unique[i]["id"])
+            used += num_tokens
+
+        return chunks, {
+            "ids": ids,
+            "candidates": len(hits),
+            "unique": len(unique),
+            "chunks": len(chunks),
+            "context_tokens": used,
+            "budget": budget
+        }
@@ -0,0 +1,109 @@
+import contextvars
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import openai
+from .chunker import get_tokenizer
+from .metrics import log
+
+RETRYABLE_STATUS = {408, 409, 429}  # Plus every 5xx
+
+
+def _retry_after(error):
+    """Return the server-requested delay in seconds from a Retry-After header, if any."""
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    try:
+        if headers.get("retry-after-ms"):
+            return float(headers["retry-after-ms"]) / 1000
+        if headers.get("retry-after"):
+            return float(headers["retry-after"])
+    except ValueError:  # HTTP-date form is not used by Azure OpenAI
+        pass
+    return None
+
+
+def _is_retryable(error):
+    if isinstance(error, (openai.APIConnectionError, openai.APITimeoutError)):
+        return True
+    status = getattr(error, "status_code", None)
+    return status is not None and (status in RETRYABLE_STATUS or status >= 500)
+
+
+class EmbeddingBatcher:
+    """Splits texts into token/item-capped batches and embeds them concurrently.
+
+    Batches are retried on 429/5xx and connection errors with jittered
+    exponential backoff that honours `Retry-After`. Vectors are returned in
+    the same order as the input texts. Requests, retries and input tokens
+    are counted for `/metrics`.
+    """
+
+    def __init__(self, client, model, max_batch_tokens=8000, max_batch_items=16, max_concurrency=4,
+                 max_retries=6, base_delay=1.0, max_delay=60.0, encoding_name="cl100k_base"):
+        # Retries are handled here, so disable the SDK's own retry loop.
+        self.client = client.with_options(max_retries=0)
+        self.model = model
+        self.max_batch_tokens = max_batch_tokens
+        self.max_batch_items = max_batch_items
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.tokenizer = get_tokenizer(encoding_name)
+        self.executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="embed")
+        self.requests = 0
+        self.retries = 0
+        self.tokens = 0
+        self._lock = threading.Lock()
+
+    def make_batches(self, texts):
+        """Group text indices into batches capped by token count and item count."""
+        batches, batch, batch_tokens = [], [], 0
+        for index, text in enumerate(texts):
+            num_tokens = self.tokenizer.count(text)
+            if batch and (batch_tokens + num_tokens > self.max_batch_tokens or len(batch) >= self.max_batch_items):
+                batches.append(batch)
+                batch, batch_tokens = [], 0
+            batch.append(index)
+            batch_tokens += num_tokens
+        if batch:
+            batches.append(batch)
+        return batches
+
+    def _embed_batch(self, batch):
+        for attempt in range(self.max_retries + 1):
+            try:
+                response = self.client.embeddings.create(input=batch, model=self.model)
+                with self._lock:
+                    self.requests += 1
+                    self.tokens += getattr(getattr(response, "usage", None), "prompt_tokens", 0) or 0
+                if hasattr(response, "data") and isinstance(response.data, list):
+                    # Azure returns items with an `index`; sort to be safe.
+                    return [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
+                raise ValueError("Azure OpenAI response structure is invalid!")
+            except openai.APIError as e:
+                if attempt == self.max_retries or not _is_retryable(e):
+                    raise
+                delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+                retry_after = _retry_after(e)
+                if retry_after is not None:
+                    delay = min(self.max_delay, retry_after) + random.uniform(0, self.base_delay)
+                with self._lock:
+                    self.retries += 1
+                log(f"Embedding retry {attempt + 1}/{self.max_retries} in {delay:.1f}s: {e}")
+                time.sleep(delay)
+
+    def embed(self, texts):
+        """Embed `texts`, returning one vector per text in input order."""
+        texts = list(texts)
+        batches = self.make_batches(texts)
+        # Each batch runs in the caller's context, so retries are logged under its trace ID
+        futures = [self.executor.submit(contextvars.copy_context().run, self._embed_batch, [texts[i] for i in batch])
+                   for batch in batches]
+
+        embeddings = [None] * len(texts)
+        for batch, future in zip(batches, futures):
+            for index, vector in zip(batch, future.result()):
+                embeddings[index] = vector
+        return embeddings
@@ -0,0 +1,127 @@
+import hashlib
+import sqlite3
+import threading
+import time
+import unicodedata
+from array import array
+
+
+def normalize_text(text):
+    """Normalise text so trivially different copies of a chunk share a cache entry."""
+    return " ".join(unicodedata.normalize("NFKC", text).split())
+
+
+class EmbeddingCache:
+    """Persistent, content-addressed embedding cache backed by SQLite.
+
+    Entries are keyed by a SHA-256 of (normalised text, deployment, dimension)
+    and stored as float32 blobs. When the cache grows past `max_entries` the
+    least recently used entries are evicted. The number of entries is kept as
+    a running count, so writes do not scan the table.
+    """
+
+    def __init__(self, path, model, dimension, max_entries=500_000):
+        self.model = model
+        self.dimension = dimension
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            "key BLOB PRIMARY KEY, vector BLOB NOT NULL, last_used REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings (last_used)")
+        self._conn.commit()
+        self._count = self._count_entries()
+
+    def _count_entries(self):
+        (count,) = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()
+        return count
+
+    def _count_existing(self, keys):
+        """How many of `keys` are already stored (primary key lookups, in batches)."""
+        existing = 0
+        for start in range(0, len(keys), 500):
+            batch = keys[start:start + 500]
+            placeholders = ",".join("?" * len(batch))
+            (found,) = self._conn.execute(
+                f"SELECT COUNT(*) FROM embeddings WHERE key IN ({placeholders})", batch
+            ).fetchone()
+            existing += found
+        return existing
+
+    def key(self, text):
+        payload = f"{self.model}\x00{self.dimension}\x00{normalize_text(text)}"
+        return hashlib.sha256(payload.encode("utf-8")).digest()
+
+    def get_many(self, texts):
+        """Return a list with the cached vector for each text, or None on a miss."""
+        keys = [self.key(text) for text in texts]
+        found = {}
+        with self._lock:
+            # Stay well below SQLite's bound-parameter limit.
+            for start in range(0, len(keys), 500):
+                batch = keys[start:start + 500]
+                placeholders = ",".join("?" * len(batch))
+                rows = self._conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", batch
+                ).fetchall()
+                found.update(rows)
+            if found:
+                now = time.time()
+                self._conn.executemany("UPDATE embeddings SET last_used = ? WHERE key = ?", [(now, k) for k in found])
+                self._conn.commit()
+            self.hits += sum(1 for k in keys if k in found)
+            self.misses += sum(1 for k in keys if k not in found)
+        return [array("f", found[k]).tolist() if k in found else None for k in keys]
+
+    def put_many(self, texts, vectors):
+        """Store vectors for texts, evicting least recently used entries if over capacity."""
+        now = time.time()
+        rows = [(self.key(text), array("f", vector).tobytes(), now) for text, vector in zip(texts, vectors)]
+        keys = list({row[0] for row in rows})
+        with self._lock:
+            self._count += len(keys) - self._count_existing(keys)
+            self._conn.executemany("INSERT OR REPLACE INTO embeddings (key, vector, last_used) VALUES (?, ?, ?)", rows)
+            if self._count > self.max_entries:
+                self._count = self._count_entries()  # Resync (other processes may share the file) before evicting
+            if self._count > self.max_entries:
+                # Evict down to 90% of capacity so eviction is not paid on every insert.
+                excess = self._count - int(self.max_entries * 0.9)
+                deleted = self._conn.execute(
+                    "DELETE FROM embeddings WHERE key IN "
+                    "(SELECT key FROM embeddings ORDER BY last_used LIMIT ?)", (excess,)
+                ).rowcount
+                self._count -= deleted
+            self._conn.commit()
+
+    def embed(self, texts, embed_fn):
+        """Return embeddings for texts, calling `embed_fn` only for cache misses."""
+        texts = list(texts)
+        vectors = self.get_many(texts)
+        missing = [i for i, vector in enumerate(vectors) if vector is None]
+        if missing:
+            # Embed each distinct (normalised) missing text once.
+            unique = {}
+            for i in missing:
+                unique.setdefault(normalize_text(texts[i]), texts[i])
+            new_vectors = dict(zip(unique, embed_fn(list(unique.values()))))
+            self.put_many(list(unique.values()), list(new_vectors.values()))
+            for i in missing:
+                vectors[i] = new_vectors[normalize_text(texts[i])]
+        return vectors
+
+    def stats(self):
+        with self._lock:
+            entries = self._count
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+                "entries": entries
+            }
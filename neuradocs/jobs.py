@@ -0,0 +1,176 @@
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+
+class JobCancelled(Exception):
+    """Raised inside a job once cancellation has been requested."""
+
+
+class JobQueueFull(Exception):
+    """Raised by `JobManager.submit` when the job limit is reached."""
+
+
+class FileProgress:
+    """Per-file counters updated by the indexing job as work advances."""
+
+    def __init__(self, file_name):
+        self.file_name = file_name
+        self.status = "queued"  # queued, running, done, skipped, failed, cancelled
+        self.pages_extracted = 0
+        self.chunks_embedded = 0
+        self.vectors_stored = 0
+        self.error = None
+
+    def to_dict(self):
+        return {
+            "file": self.file_name,
+            "status": self.status,
+            "pages_extracted": self.pages_extracted,
+            "chunks_embedded": self.chunks_embedded,
+            "vectors_stored": self.vectors_stored,
+            "error": self.error
+        }
+
+
+class IndexJob:
+    """State of one background indexing run over a fixed set of files."""
+
+    def __init__(self, file_names, tenant=None):
+        self.id = uuid.uuid4().hex
+        self.tenant = tenant  # Stored on every chunk; with PARTITION_BY=tenant, also its Milvus partition
+        self.status = "queued"  # queued, running, completed, completed_with_errors, failed, cancelled
+        self.files = {name: FileProgress(name) for name in file_names}
+        self.error = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self._cancel = threading.Event()
+
+    def cancel(self):
+        self._cancel.set()
+
+    @property
+    def cancelled(self):
+        return self._cancel.is_set()
+
+    def check_cancelled(self):
+        """Call between units of work; raises `JobCancelled` once `cancel()` was requested."""
+        if self._cancel.is_set():
+            raise JobCancelled(f"Job {self.id} was cancelled")
+
+    @property
+    def finished(self):
+        return self.finished_at is not None
+
+    def to_dict(self):
+        files = [progress.to_dict() for progress in self.files.values()]
+        pages = sum(f["pages_extracted"] for f in files)
+        chunks = sum(f["chunks_embedded"] for f in files)
+        vectors = sum(f["vectors_stored"] for f in files)
+        elapsed = ((self.finished_at or time.time()) - self.started_at) if self.started_at else 0.0
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "tenant": self.tenant,
+            "cancel_requested": self.cancelled,
+            "error": self.error,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "elapsed_seconds": round(elapsed, 3),
+            "totals": {"pages_extracted": pages, "chunks_embedded": chunks, "vectors_stored": vectors},
+            "throughput": {
+                "pages_per_second": round(pages / elapsed, 2) if elapsed else 0.0,
+                "chunks_per_second": round(chunks / elapsed, 2) if elapsed else 0.0,
+                "vectors_per_second": round(vectors / elapsed, 2) if elapsed else 0.0
+            },
+            "files": files
+        }
+
+
+class JobManager:
+    """Runs indexing jobs on a small worker pool and keeps their state for status queries.
+
+    At most `max_workers` jobs run at once; up to `max_jobs` may be queued or
+    running, beyond which `submit` raises `JobQueueFull`. Files claimed by an
+    unfinished job are not handed to another one. Finished jobs are kept
+    (newest `history` of them) so their final status can still be read.
+    """
+
+    def __init__(self, run_job, max_workers=1, max_jobs=4, history=100):
+        self.run_job = run_job
+        self.max_jobs = max_jobs
+        self.history = history
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="index-job")
+        self._lock = threading.Lock()
+        self._jobs = {}
+
+    def _active(self):
+        return [job for job in self._jobs.values() if not job.finished]
+
+    def has_active(self):
+        with self._lock:
+            return bool(self._active())
+
+    def submit(self, file_names, tenant=None):
+        """Queue a job for the given files, skipping any already claimed by an unfinished job."""
+        with self._lock:
+            if len(self._active()) >= self.max_jobs:
+                raise JobQueueFull(f"{self.max_jobs} indexing jobs are already queued or running")
+            claimed = {name for job in self._active() for name in job.files}
+            file_names = [name for name in file_names if name not in claimed]
+            if not file_names:
+                return None
+            job = IndexJob(file_names, tenant)
+            self._jobs[job.id] = job
+            self._prune()
+        self._executor.submit(self._run, job)
+        return job
+
+    def _run(self, job):
+        with self._lock:
+            if job.finished:  # Cancelled while still queued
+                return
+            job.status = "running"
+            job.started_at = time.time()
+        try:
+            self.run_job(job)
+            failed = any(f.status == "failed" for f in job.files.values())
+            job.status = "completed_with_errors" if failed else "completed"
+        except JobCancelled:
+            job.status = "cancelled"
+        except Exception as e:
+            print(f"❌ Indexing job {job.id} failed: {e}")
+            job.status = "failed"
+            job.error = str(e)
+        finally:
+            job.finished_at = time.time()
+
+    def _prune(self):
+        finished = sorted((job for job in self._jobs.values() if job.finished), key=lambda job: job.finished_at)
+        for job in finished[:max(0, len(finished) - self.history)]:
+            del self._jobs[job.id]
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def list(self):
+        with self._lock:
+            return sorted(self._jobs.values(), key=lambda job: job.created_at, reverse=True)
+
+    def cancel(self, job_id):
+        """Request cancellation; a running job stops at its next checkpoint."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or job.finished:
+                return job
+            job.cancel()
+            if job.status == "queued":
+                job.status = "cancelled"
+                job.finished_at = time.time()
+                for progress in job.files.values():
+                    progress.status = "cancelled"
+        return job
@@ -0,0 +1,119 @@
+import asyncio
+import threading
+import time
+
+
+class LazyResource:
+    """A heavy dependency (model, client, connection) built on first use instead of at import.
+
+    Attribute access is forwarded to the built object, so call sites use the
+    resource as if it were the object itself. The factory runs once, under a
+    lock. A failed build is recorded, and later uses fail fast with that error
+    for `retry_interval` seconds before the build is tried again, so a down
+    backend does not stall every request on its connect timeout.
+    """
+
+    def __init__(self, name, factory, retry_interval=5.0):
+        self.name = name
+        self.retry_interval = retry_interval
+        self.ready = False
+        self.error = None
+        self.seconds = None
+        self._factory = factory
+        self._value = None
+        self._failed_at = None
+        self._lock = threading.Lock()
+        self._warming = False  # A background warm-up of this resource is queued or running
+        self._warming_lock = threading.Lock()
+
+    def get(self):
+        if self.ready:
+            return self._value
+        with self._lock:
+            if self.ready:
+                return self._value
+            if self._failed_at is not None and time.monotonic() - self._failed_at < self.retry_interval:
+                raise RuntimeError(f"{self.name} is unavailable: {self.error}")
+            start = time.perf_counter()
+            try:
+                self._value = self._factory()
+            except Exception as e:
+                self.error = str(e)
+                self._failed_at = time.monotonic()
+                raise
+            self.seconds = time.perf_counter() - start
+            self.error = None
+            self._failed_at = None
+            self.ready = True
+            print(f"✅ {self.name} ready in {self.seconds:.2f}s")
+            return self._value
+
+    async def get_async(self):
+        """`get` for coroutines: a build, or a wait on one, runs in a worker thread instead of blocking the event loop."""
+        if self.ready:
+            return self._value
+        return await asyncio.to_thread(self.get)
+
+    def claim_warm_up(self):
+        """True if the caller may start a background build, i.e. none is queued or running already."""
+        with self._warming_lock:
+            if self.ready or self._warming:
+                return False
+            self._warming = True
+            return True
+
+    def release_warm_up(self):
+        with self._warming_lock:
+            self._warming = False
+
+    def __getattr__(self, attr):
+        # Only called for attributes not set in __init__, i.e. those of the wrapped object.
+        return getattr(self.get(), attr)
+
+    def __len__(self):
+        return len(self.get())
+
+    def status(self):
+        return {
+            "ready": self.ready,
+            "seconds": round(self.seconds, 3) if self.seconds is not None else None,
+            "error": self.error
+        }
+
+
+def warm_up(resources, background=True):
+    """Build every resource now, in a daemon thread with `background=True`; failures are logged, not raised.
+
+    A background warm-up skips resources another one is still building, so
+    repeated calls do not pile up threads behind a slow build.
+    """
+    def build(resources):
+        for resource in resources:
+            try:
+                resource.get()
+            except Exception as e:
+                print(f"❌ Warm-up of {resource.name} failed: {e}")
+            finally:
+                if background:
+                    resource.release_warm_up()
+
+    if background:
+        claimed = [resource for resource in resources if resource.claim_warm_up()]
+        if claimed:
+            threading.Thread(target=build, args=(claimed,), name="warm-up", daemon=True).start()
+    else:
+        build(resources)
+
+
+def readiness(resources):
+    """Body and status code for a readiness probe: 200 once every resource is built, else 503.
+
+    Resources not built yet are (re)started in the background, so probes
+    alone bring a replica to ready and let it recover once a backend is back.
+    A probe made while a build is still running only reports its status.
+    """
+    statuses = {resource.name: resource.status() for resource in resources}
+    ready = all(status["ready"] for status in statuses.values())
+    if not ready:
+        warm_up([resource for resource in resources if not resource.ready])
+    return {"ready": ready, "resources": statuses}, 200 if ready else 503
@@ -0,0 +1,252 @@
+import os
+import re
+import threading
+import unicodedata
+from array import array
+import numpy as np
+
+# Words, numbers and codes such as "err-404", "v2.1" or "x_1000" (kept whole and split into parts)
+TOKEN = re.compile(r"[a-z0-9]+(?:[-_./:][a-z0-9]+)*")
+PART = re.compile(r"[a-z0-9]+")
+STOPWORDS = frozenset(
+    "a an and are as at be by can do does for from has have how i if in is it its of on or so that the "
+    "their there this to was we what when where which who why will with you your".split()
+)
+MAX_TF = 65535  # Term frequencies are stored as uint16
+
+
+def tokenize(text):
+    """Lowercased lexical tokens; compound codes also yield their parts."""
+    tokens = []
+    for match in TOKEN.finditer(unicodedata.normalize("NFKC", text).lower()):
+        token = match.group()
+        if token in STOPWORDS:
+            continue
+        tokens.append(token)
+        if not token.isalnum():
+            tokens.extend(part for part in PART.findall(token) if part not in STOPWORDS)
+    return tokens
+
+
+def reciprocal_rank_fusion(rankings, k=60, top_k=None):
+    """Fuse ranked ID lists: score(id) = sum(1 / (k + rank)) over the lists it appears in."""
+    scores = {}
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking, 1):
+            scores[doc_id] = scores.get(doc_id, 0.0) + 1.0 / (k + rank)
+    fused = sorted(scores, key=scores.get, reverse=True)
+    return fused[:top_k] if top_k else fused
+
+
+class BM25Index:
+    """Incrementally updatable inverted index with BM25 scoring.
+
+    Each term maps to two packed arrays (document slot as uint32, term
+    frequency as uint16), so a posting costs 6 bytes and a term lookup is a
+    single dict access. Deletes are tombstones; the postings are compacted
+    once a quarter of the slots are dead. Terms found in more than `max_df`
+    of the chunks add almost nothing to BM25, so they are skipped whenever the
+    query has rarer terms. Persisted to `<path>.npz`.
+    """
+
+    def __init__(self, path=None, k1=1.2, b=0.75, max_df=0.5):
+        self.path = f"{path}.npz" if path else None
+        self.k1 = k1
+        self.b = b
+        self.max_df = max_df
+        self._lock = threading.Lock()
+        self._reset()
+        if self.path and os.path.exists(self.path):
+            self._load()
+
+    def _reset(self):
+        self._terms = {}
+        self._docs = []  # Per term: array("I") of document slots
+        self._tfs = []  # Per term: array("H") of term frequencies
+        self._ids = array("q")  # Slot -> external chunk ID
+        self._lengths = array("I")  # Slot -> document length in tokens
+        self._alive = bytearray()
+        self._slots = {}  # External chunk ID -> slot
+        self._live = 0
+        self._total_length = 0
+        self._dirty = False
+
+    def __len__(self):
+        return self._live
+
+    def add(self, ids, texts):
+        with self._lock:
+            for doc_id, text in zip(ids, texts):
+                doc_id = int(doc_id)
+                if doc_id in self._slots:
+                    self._remove(doc_id)
+                counts = {}
+                for token in tokenize(text):
+                    counts[token] = counts.get(token, 0) + 1
+                slot = len(self._ids)
+                for token, count in counts.items():
+                    term = self._terms.get(token)
+                    if term is None:
+                        term = self._terms[token] = len(self._docs)
+                        self._docs.append(array("I"))
+                        self._tfs.append(array("H"))
+                    self._docs[term].append(slot)
+                    self._tfs[term].append(min(count, MAX_TF))
+                length = sum(counts.values())
+                self._ids.append(doc_id)
+                self._lengths.append(length)
+                self._alive.append(1)
+                self._slots[doc_id] = slot
+                self._live += 1
+                self._total_length += length
+            self._dirty = True
+
+    def _remove(self, doc_id):
+        slot = self._slots.pop(doc_id, None)
+        if slot is None:
+            return False
+        self._alive[slot] = 0
+        self._live -= 1
+        self._total_length -= self._lengths[slot]
+        return True
+
+    def delete(self, ids):
+        with self._lock:
+            removed = sum(self._remove(int(doc_id)) for doc_id in ids)
+            dead = len(self._ids) - self._live
+            if dead > max(1000, len(self._ids) // 4):
+                self._compact()
+            self._dirty = self._dirty or bool(removed)
+            return removed
+
+    def clear(self):
+        with self._lock:
+            self._reset()
+            self._dirty = True
+
+    def _compact(self):
+        """Drop tombstoned slots from every posting list and renumber the survivors."""
+        alive = np.frombuffer(self._alive, dtype=np.uint8).astype(bool)
+        remap = np.cumsum(alive, dtype=np.int64) - 1
+        terms, docs, tfs = {}, [], []
+        for token, term in self._terms.items():
+            slots = np.frombuffer(self._docs[term], dtype=np.uint32)
+            keep = alive[slots]
+            if not keep.any():
+                continue
+            terms[token] = len(docs)
+            docs.append(array("I", remap[slots[keep]].astype(np.uint32).tobytes()))
+            tfs.append(array("H", np.frombuffer(self._tfs[term], dtype=np.uint16)[keep].tobytes()))
+        ids = np.frombuffer(self._ids, dtype=np.int64)[alive]
+        lengths = np.frombuffer(self._lengths, dtype=np.uint32)[alive]
+        self._terms, self._docs, self._tfs = terms, docs, tfs
+        self._ids = array("q", ids.tobytes())
+        self._lengths = array("I", lengths.tobytes())
+        self._alive = bytearray(b"\x01" * len(self._ids))
+        self._slots = {int(doc_id): slot for slot, doc_id in enumerate(ids)}
+
+    def _score(self, tokens):
+        """BM25 scores of every live document containing any of `tokens` (as slots, scores)."""
+        avg_length = self._total_length / self._live
+        lengths = np.frombuffer(self._lengths, dtype=np.uint32)
+        alive = np.frombuffer(self._alive, dtype=np.uint8)
+        tombstones = self._live < len(alive)
+        postings = []
+        for token in tokens:
+            term = self._terms.get(token)
+            if term is not None:
+                slots = np.frombuffer(self._docs[term], dtype=np.uint32)
+                # Document frequency over live documents: tombstones stay in the postings until the next
+                # compaction, and counting them would push df above the live count and make idf negative
+                df = int(np.count_nonzero(alive[slots])) if tombstones else len(slots)
+                if df:
+                    postings.append((slots, np.frombuffer(self._tfs[term], dtype=np.uint16), df))
+        if not postings:
+            return np.empty(0, dtype=np.uint32), np.empty(0, dtype=np.float32)
+        selective = [p for p in postings if p[2] <= self.max_df * self._live]
+        postings = selective or postings
+
+        # Sparse merge for selective queries, dense accumulator once postings cover a large share of the slots
+        dense = len(postings) > 1 and sum(len(slots) for slots, _, _ in postings) > len(alive) // 8
+        accumulator = np.zeros(len(alive), dtype=np.float32) if dense else None
+        all_slots, all_scores = [], []
+        for slots, tf, df in postings:
+            tf = tf.astype(np.float32)
+            idf = np.log1p((self._live - df + 0.5) / (df + 0.5))
+            norm = self.k1 * (1 - self.b + self.b * lengths[slots] / avg_length)
+            scores = idf * tf * (self.k1 + 1) / (tf + norm)
+            if dense:
+                accumulator[slots] += scores  # Slots are unique within a posting list
+            else:
+                all_slots.append(slots.copy())
+                all_scores.append(scores)
+        if dense:
+            accumulator[alive == 0] = 0
+            slots = np.flatnonzero(accumulator).astype(np.uint32)
+            return slots, accumulator[slots]
+        if len(all_slots) == 1:
+            slots, scores = all_slots[0], all_scores[0]
+        else:
+            slots, inverse = np.unique(np.concatenate(all_slots), return_inverse=True)
+            scores = np.bincount(inverse, weights=np.concatenate(all_scores))
+        keep = alive[slots].astype(bool)
+        return slots[keep], scores[keep]
+
+    def search(self, query, top_k=10):
+        """Top `top_k` (chunk ID, BM25 score) pairs for a free-text query, best first."""
+        tokens = set(tokenize(query))
+        with self._lock:
+            if not tokens or not self._live:
+                return []
+            # Views on the packed arrays must not outlive the lock (appends would fail while exported).
+            slots, scores = self._score(tokens)
+            ids = np.frombuffer(self._ids, dtype=np.int64)[slots]
+        if len(scores) > top_k:
+            best = np.argpartition(-scores, top_k)[:top_k]
+        else:
+            best = np.arange(len(scores))
+        best = best[np.argsort(-scores[best])]
+        return [(int(ids[i]), float(scores[i])) for i in best]
+
+    def save(self):
+        """Write the index atomically (compacting it first) if it changed since the last save."""
+        if not self.path:
+            return
+        with self._lock:
+            if not self._dirty and os.path.exists(self.path):
+                return
+            if self._live < len(self._ids):
+                self._compact()
+            offsets = np.zeros(len(self._docs) + 1, dtype=np.int64)
+            offsets[1:] = np.cumsum([len(docs) for docs in self._docs])
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, "wb") as f:
+                np.savez(
+                    f,
+                    vocabulary=np.frombuffer("\n".join(self._terms).encode("utf-8"), dtype=np.uint8),
+                    offsets=offsets,
+                    docs=np.frombuffer(b"".join(docs.tobytes() for docs in self._docs), dtype=np.uint32),
+                    tfs=np.frombuffer(b"".join(tfs.tobytes() for tfs in self._tfs), dtype=np.uint16),
+                    ids=np.frombuffer(self._ids, dtype=np.int64),
+                    lengths=np.frombuffer(self._lengths, dtype=np.uint32)
+                )
+            os.replace(tmp_path, self.path)
+            self._dirty = False
+
+    def _load(self):
+        with np.load(self.path) as data:
+            vocabulary = data["vocabulary"].tobytes().decode("utf-8")
+            offsets, docs, tfs = data["offsets"], data["docs"], data["tfs"]
+            ids, lengths = data["ids"], data["lengths"]
+        terms = vocabulary.split("\n") if vocabulary else []
+        self._terms = {token: term for term, token in enumerate(terms)}
+        self._docs = [array("I", docs[offsets[t]:offsets[t + 1]].tobytes()) for t in range(len(terms))]
+        self._tfs = [array("H", tfs[offsets[t]:offsets[t + 1]].tobytes()) for t in range(len(terms))]
+        self._ids = array("q", ids.tobytes())
+        self._lengths = array("I", lengths.tobytes())
+        self._alive = bytearray(b"\x01" * len(ids))
+        self._slots = {int(doc_id): slot for slot, doc_id in enumerate(ids)}
+        self._live = len(ids)
+        self._total_length = int(lengths.sum())
+        print(f"✅ Loaded lexical index with {self._live} chunks and {len(terms)} terms from {self.path}")
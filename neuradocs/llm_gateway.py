@@ -0,0 +1,419 @@
+import os
+import random
+import asyncio
+import threading
+import time
+from collections import deque
+import openai
+from openai import AzureOpenAI, AsyncAzureOpenAI
+from .metrics import log, observe
+
+RETRYABLE_STATUS = {408, 409, 429}  # Plus every 5xx
+
+
+def _retry_after(error):
+    """Return the server-requested delay in seconds from a Retry-After header, if any."""
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    try:
+        if headers.get("retry-after-ms"):
+            return float(headers["retry-after-ms"]) / 1000
+        if headers.get("retry-after"):
+            return float(headers["retry-after"])
+    except ValueError:  # HTTP-date form is not used by Azure OpenAI
+        pass
+    return None
+
+
+def _is_retryable(error):
+    if isinstance(error, (openai.APIConnectionError, openai.APITimeoutError)):
+        return True
+    status = getattr(error, "status_code", None)
+    return status is not None and (status in RETRYABLE_STATUS or status >= 500)
+
+
+def estimate_tokens(messages, max_tokens=None):
+    """Quota cost of a chat call the way Azure estimates it: prompt (~4 characters per token) plus `max_tokens`."""
+    prompt_chars = sum(len(message.get("content") or "") for message in messages)
+    return prompt_chars // 4 + 4 * len(messages) + (max_tokens or 0)
+
+
+def _percentile(sorted_values, q):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(q / 100 * len(sorted_values)))]
+
+
+class TokenBucket:
+    """Refills at `per_minute / 60` units per second and holds up to a 10-second burst.
+
+    Azure evaluates quotas over short windows, so the burst is a sixth of the
+    per-minute quota. A request larger than the burst waits for a full bucket
+    and then runs into debt. `per_minute=0` disables the limiter.
+    """
+
+    def __init__(self, per_minute):
+        self.rate = per_minute / 60.0
+        self.capacity = per_minute / 6.0
+        self.available = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, amount=1):
+        """Block until `amount` can be taken; returns the seconds spent waiting."""
+        if not self.rate:
+            return 0.0
+        waited = 0.0
+        with self._lock:  # Waiters queue on the lock, so they are served in arrival order
+            while True:
+                now = time.monotonic()
+                self.available = min(self.capacity, self.available + (now - self.updated) * self.rate)
+                self.updated = now
+                needed = min(amount, self.capacity)
+                if self.available >= needed:
+                    self.available -= amount
+                    return waited
+                delay = (needed - self.available) / self.rate
+                time.sleep(delay)
+                waited += delay
+
+
+class AsyncTokenBucket(TokenBucket):
+    """`TokenBucket` for asyncio: waiting suspends the coroutine instead of blocking the event loop."""
+
+    def __init__(self, per_minute):
+        super().__init__(per_minute)
+        self._lock = asyncio.Lock()
+
+    async def acquire(self, amount=1):
+        if not self.rate:
+            return 0.0
+        waited = 0.0
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.available = min(self.capacity, self.available + (now - self.updated) * self.rate)
+                self.updated = now
+                needed = min(amount, self.capacity)
+                if self.available >= needed:
+                    self.available -= amount
+                    return waited
+                delay = (needed - self.available) / self.rate
+                await asyncio.sleep(delay)
+                waited += delay
+
+
+class StreamRelay:
+    """Iterator over a streamed completion that closes the upstream stream and accounts the call exactly once.
+
+    The call is recorded when the stream is exhausted, fails or is closed,
+    including by a consumer that stops early or never reads a chunk (a client
+    that disconnected), so an abandoned stream neither keeps its connection
+    open nor goes missing from the gateway's stats. Streams carry no usage
+    block; content chunks approximate completion tokens.
+    """
+
+    def __init__(self, chunks, gateway, name, model, start, prompt_tokens, retries, throttled):
+        self._gateway = gateway
+        self._call = (name, model, start, prompt_tokens, retries, throttled)
+        self._stream = chunks
+        self.completion_tokens = 0
+        self.first_token = None
+        self.closed = False
+        self._chunks = self._iterate(chunks)
+
+    def _record(self, error):
+        name, model, start, prompt_tokens, retries, throttled = self._call
+        self._gateway._record(name, model, time.perf_counter() - start, prompt_tokens, self.completion_tokens,
+                              retries, throttled, first_token=self.first_token, error=error)
+
+    def _iterate(self, chunks):
+        return iter(chunks)
+
+    def _count(self, chunk):
+        if chunk.choices and chunk.choices[0].delta.content:
+            self.completion_tokens += 1
+            if self.first_token is None:
+                self.first_token = time.perf_counter() - self._call[2]
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self.closed:
+            raise StopIteration
+        try:
+            chunk = next(self._chunks)
+        except StopIteration:
+            self.close()
+            raise
+        except Exception as e:
+            self.close(e)
+            raise
+        except BaseException:  # KeyboardInterrupt and the like end the call without failing it
+            self.close()
+            raise
+        self._count(chunk)
+        return chunk
+
+    def close(self, error=None):
+        """Close the upstream stream and record the call; later calls do nothing."""
+        if self.closed:
+            return
+        self.closed = True
+        try:
+            close = getattr(self._stream, "close", None)
+            if close is not None:
+                close()
+        finally:
+            self._record(error)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __del__(self):
+        self.close()
+
+
+class AsyncStreamRelay(StreamRelay):
+    """`StreamRelay` over an async stream; close it with `aclose()` (cancellation closes it too)."""
+
+    def _iterate(self, chunks):
+        return chunks.__aiter__()
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if self.closed:
+            raise StopAsyncIteration
+        try:
+            chunk = await self._chunks.__anext__()
+        except StopAsyncIteration:
+            await self.aclose()
+            raise
+        except Exception as e:
+            await self.aclose(e)
+            raise
+        except BaseException:  # Cancelled, e.g. the client disconnected
+            await self.aclose()
+            raise
+        self._count(chunk)
+        return chunk
+
+    async def aclose(self, error=None):
+        """Close the upstream stream and record the call; later calls do nothing."""
+        if self.closed:
+            return
+        self.closed = True
+        try:
+            close = getattr(self._stream, "close", None)
+            if close is not None:
+                await close()
+        finally:
+            self._record(error)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.aclose()
+
+    def __del__(self):
+        # The upstream close needs the event loop; an unclosed relay is still accounted
+        if not self.closed:
+            self.closed = True
+            self._record(None)
+
+
+class LLMGateway:
+    """Process-wide access to Azure OpenAI chat completions.
+
+    Holds one long-lived client, so every call reuses the same pooled HTTP
+    connections (keep-alive, TLS sessions). Calls are throttled client-side
+    by request and token buckets sized from the deployment's RPM/TPM quota,
+    retried on 429/5xx and connection errors with jittered exponential
+    backoff that honours `Retry-After`, and accounted per call name
+    (latency, prompt/completion tokens, retries, time spent throttled).
+    Latencies also go to the `llm` stage histogram of `/metrics`.
+    """
+
+    client_class = AzureOpenAI
+    bucket_class = TokenBucket
+
+    def __init__(self, endpoint, api_key, api_version, rpm=0, tpm=0, max_retries=6,
+                 base_delay=1.0, max_delay=60.0, timeout=60.0, history=1000):
+        # Retries are handled here, so disable the SDK's own retry loop.
+        self.client = self.client_class(
+            azure_endpoint=endpoint,
+            api_key=api_key,
+            api_version=api_version,
+            max_retries=0,
+            timeout=timeout
+        )
+        self.request_limiter = self.bucket_class(rpm)
+        self.token_limiter = self.bucket_class(tpm)
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.history = history
+        self._stats = {}
+        self._recent = deque(maxlen=20)
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls, api_version="2024-05-01-preview"):
+        """Build a gateway from ENDPOINT_URL, AZURE_OPENAI_API_KEY and the LLM_* limits."""
+        return cls(
+            os.getenv("ENDPOINT_URL", ""),
+            os.getenv("AZURE_OPENAI_API_KEY", ""),
+            os.getenv("AZURE_OPENAI_API_VERSION", api_version),
+            rpm=int(os.getenv("LLM_RPM", 0)),
+            tpm=int(os.getenv("LLM_TPM", 0)),
+            max_retries=int(os.getenv("LLM_MAX_RETRIES", 6)),
+            timeout=float(os.getenv("LLM_TIMEOUT", 60))
+        )
+
+    def _retry_delay(self, error, attempt):
+        """Seconds to wait before retrying `error`, or None when it should be raised."""
+        if attempt == self.max_retries or not _is_retryable(error):
+            error.retries = attempt
+            return None
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+        retry_after = _retry_after(error)
+        if retry_after is not None:
+            delay = min(self.max_delay, retry_after) + random.uniform(0, self.base_delay)
+        log(f"LLM retry {attempt + 1}/{self.max_retries} in {delay:.1f}s: {error}")
+        return delay
+
+    def _call_with_retries(self, call):
+        """Run `call`, retrying transient failures; returns (result, retries)."""
+        for attempt in range(self.max_retries + 1):
+            try:
+                return call(), attempt
+            except openai.APIError as e:
+                delay = self._retry_delay(e, attempt)
+                if delay is None:
+                    raise
+                time.sleep(delay)
+
+    def chat(self, messages, model, name="chat", stream=False, **params):
+        """`chat.completions.create` through the limiters and retry loop.
+
+        Returns the completion, or with `stream=True` a `StreamRelay` over the
+        chunks (accounted once the stream is exhausted or closed).
+        """
+        throttled = self.request_limiter.acquire(1)
+        throttled += self.token_limiter.acquire(estimate_tokens(messages, params.get("max_tokens")))
+        start = time.perf_counter()
+        try:
+            completion, retries = self._call_with_retries(
+                lambda: self.client.chat.completions.create(model=model, messages=messages, stream=stream, **params)
+            )
+        except Exception as e:
+            self._record(name, model, time.perf_counter() - start, 0, 0, getattr(e, "retries", 0), throttled, error=e)
+            raise
+
+        if stream:
+            return StreamRelay(completion, self, name, model, start, estimate_tokens(messages), retries, throttled)
+        usage = getattr(completion, "usage", None)
+        self._record(name, model, time.perf_counter() - start,
+                     getattr(usage, "prompt_tokens", 0), getattr(usage, "completion_tokens", 0), retries, throttled)
+        return completion
+
+    def _record(self, name, model, latency, prompt_tokens, completion_tokens, retries, throttled,
+                first_token=None, error=None):
+        observe("llm", latency)
+        with self._lock:
+            stats = self._stats.get(name)
+            if stats is None:
+                stats = self._stats[name] = {
+                    "calls": 0, "errors": 0, "retries": 0, "prompt_tokens": 0, "completion_tokens": 0,
+                    "throttled_seconds": 0.0, "latencies": deque(maxlen=self.history),
+                    "first_token_latencies": deque(maxlen=self.history)
+                }
+            stats["calls"] += 1
+            stats["errors"] += error is not None
+            stats["retries"] += retries
+            stats["prompt_tokens"] += prompt_tokens or 0
+            stats["completion_tokens"] += completion_tokens or 0
+            stats["throttled_seconds"] += throttled
+            stats["latencies"].append(latency)
+            if first_token is not None:
+                stats["first_token_latencies"].append(first_token)
+            self._recent.append({
+                "name": name,
+                "model": model,
+                "latency_ms": round(latency * 1000, 1),
+                "first_token_ms": round(first_token * 1000, 1) if first_token is not None else None,
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "retries": retries,
+                "throttled_ms": round(throttled * 1000, 1),
+                "error": str(error) if error is not None else None
+            })
+
+    def stats(self):
+        """Per-name call counts, token totals and latency percentiles, plus the most recent calls."""
+        with self._lock:
+            by_name = {}
+            for name, stats in self._stats.items():
+                latencies = sorted(stats["latencies"])
+                first_tokens = sorted(stats["first_token_latencies"])
+                by_name[name] = {
+                    key: value for key, value in stats.items() if key not in ("latencies", "first_token_latencies")
+                }
+                by_name[name]["throttled_seconds"] = round(stats["throttled_seconds"], 3)
+                by_name[name]["latency_ms"] = {
+                    f"p{q}": round(_percentile(latencies, q) * 1000, 1) for q in (50, 95, 99)
+                }
+                if first_tokens:
+                    by_name[name]["first_token_ms"] = {
+                        f"p{q}": round(_percentile(first_tokens, q) * 1000, 1) for q in (50, 95, 99)
+                    }
+            return {"by_name": by_name, "recent": list(self._recent)}
+
+
+class AsyncLLMGateway(LLMGateway):
+    """`LLMGateway` on `AsyncAzureOpenAI` for ASGI services.
+
+    Limiter waits and retry backoff are `asyncio.sleep`s, so one event loop
+    can keep thousands of calls in flight. The client's pool allows 1000
+    concurrent connections; any calls beyond that wait for a free connection.
+    """
+
+    client_class = AsyncAzureOpenAI
+    bucket_class = AsyncTokenBucket
+
+    async def _call_with_retries(self, call):
+        for attempt in range(self.max_retries + 1):
+            try:
+                return await call(), attempt
+            except openai.APIError as e:
+                delay = self._retry_delay(e, attempt)
+                if delay is None:
+                    raise
+                await asyncio.sleep(delay)
+
+    async def chat(self, messages, model, name="chat", stream=False, **params):
+        """Awaitable `chat.completions.create`; with `stream=True` returns an `AsyncStreamRelay` over the chunks."""
+        throttled = await self.request_limiter.acquire(1)
+        throttled += await self.token_limiter.acquire(estimate_tokens(messages, params.get("max_tokens")))
+        start = time.perf_counter()
+        try:
+            completion, retries = await self._call_with_retries(
+                lambda: self.client.chat.completions.create(model=model, messages=messages, stream=stream, **params)
+            )
+        except Exception as e:
+            self._record(name, model, time.perf_counter() - start, 0, 0, getattr(e, "retries", 0), throttled, error=e)
+            raise
+
+        if stream:
+            return AsyncStreamRelay(completion, self, name, model, start, estimate_tokens(messages), retries, throttled)
+        usage = getattr(completion, "usage", None)
+        self._record(name, model, time.perf_counter() - start,
+                     getattr(usage, "prompt_tokens", 0), getattr(usage, "completion_tokens", 0), retries, throttled)
+        return completion
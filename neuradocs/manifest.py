@@ -0,0 +1,57 @@
+import hashlib
+import json
+import os
+import threading
+import time
+
+
+def file_sha256(file_path, block_size=1 << 20):
+    """Content hash of a file, read in blocks."""
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        while block := f.read(block_size):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class IndexManifest:
+    """Tracks which files have been indexed: file name -> content hash and chunk IDs.
+
+    Persisted as JSON and rewritten atomically on `save()`.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._files = {}
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                self._files = json.load(f)
+
+    def get(self, file_name):
+        with self._lock:
+            return self._files.get(file_name)
+
+    def is_unchanged(self, file_name, sha256):
+        entry = self.get(file_name)
+        return entry is not None and entry["sha256"] == sha256
+
+    def update(self, file_name, sha256, chunk_ids):
+        with self._lock:
+            self._files[file_name] = {"sha256": sha256, "chunk_ids": list(chunk_ids), "indexed_at": time.time()}
+
+    def clear(self):
+        with self._lock:
+            self._files = {}
+
+    def save(self):
+        with self._lock:
+            directory = os.path.dirname(os.path.abspath(self.path))
+            os.makedirs(directory, exist_ok=True)
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(self._files, f)
+            os.replace(tmp_path, self.path)
+
+    def __len__(self):
+        return len(self._files)
@@ -0,0 +1,301 @@
+import contextvars
+import os
+import threading
+import time
+import uuid
+from bisect import bisect_left
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"  # Prometheus text exposition format
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+TRACE_IDS = os.getenv("TRACE_IDS", "false").lower() == "true"  # Tag log lines with a per-request trace ID
+TRACE_HEADER = "X-Request-ID"
+
+_trace_id = contextvars.ContextVar("trace_id", default=None)
+_local = threading.local()
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in labels.items()) + "}"
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _HistogramChild:
+    __slots__ = ("buckets", "counts", "sum", "lock")
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # Last slot: above the largest bound (+Inf only)
+        self.sum = 0.0
+        self.lock = threading.Lock()
+
+    def observe(self, value):
+        index = bisect_left(self.buckets, value)  # First bound >= value, i.e. the `le` bucket
+        with self.lock:
+            self.counts[index] += 1
+            self.sum += value
+
+
+class Histogram:
+    """Prometheus histogram with fixed buckets, one series per label combination.
+
+    `observe` is a bisect and two increments under a per-series lock, so it
+    can sit on every request and every pipeline batch.
+    """
+
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._children = {}
+        self._lock = threading.Lock()
+
+    def labels(self, *values):
+        child = self._children.get(values)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(values, _HistogramChild(self.buckets))
+        return child
+
+    def observe(self, value, *values):
+        self.labels(*values).observe(value)
+
+    def samples(self):
+        with self._lock:
+            children = list(self._children.items())
+        for values, child in sorted(children):
+            labels = dict(zip(self.labelnames, values))
+            with child.lock:
+                counts, total = list(child.counts), child.sum
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                yield self.name + "_bucket", dict(labels, le=_format_value(float(bound))), cumulative
+            yield self.name + "_sum", labels, total
+            yield self.name + "_count", labels, cumulative
+
+
+class Registry:
+    """Metrics of one process, rendered in the Prometheus text format for a `/metrics` endpoint.
+
+    Histograms are recorded on the hot path. Counters and gauges that the
+    caches, the LLM gateway and the embedding batcher already keep are read
+    by collectors only when the endpoint is scraped, so they cost nothing
+    per request.
+    """
+
+    def __init__(self):
+        self._metrics = []
+        self._collectors = []
+        self._lock = threading.Lock()
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        metric = Histogram(name, documentation, labelnames, buckets)
+        with self._lock:
+            self._metrics.append(metric)
+        return metric
+
+    def collector(self, func):
+        """Register `func() -> [(name, kind, help, [(labels, value), ...]), ...]`, called on every scrape."""
+        with self._lock:
+            self._collectors.append(func)
+        return func
+
+    def render(self):
+        with self._lock:
+            metrics, collectors = list(self._metrics), list(self._collectors)
+        lines = []
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(f"{name}{_format_labels(labels)} {_format_value(value)}"
+                         for name, labels, value in metric.samples())
+        families = {}
+        for collect in collectors:
+            try:
+                for name, kind, documentation, samples in collect():
+                    families.setdefault(name, (kind, documentation, []))[2].extend(samples)
+            except Exception as e:  # A failing collector must not take the endpoint down
+                print(f"⚠️ Metrics collector {getattr(collect, '__name__', collect)} failed: {e}")
+        for name, (kind, documentation, samples) in families.items():
+            lines.append(f"# HELP {name} {documentation}")
+            lines.append(f"# TYPE {name} {kind}")
+            lines.extend(f"{name}{_format_labels(labels)} {_format_value(value)}" for labels, value in samples)
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+stage_seconds = registry.histogram(
+    "stage_duration_seconds", "Seconds spent in each pipeline stage, excluding stages nested inside it", ["stage"])
+request_seconds = registry.histogram(
+    "http_request_duration_seconds", "Seconds from request to response headers", ["method", "endpoint", "status"])
+
+
+class stage:
+    """Time a block as pipeline stage `name` (`with stage("embed"): ...`).
+
+    Time spent in stages nested inside it on the same thread is subtracted,
+    so e.g. chunking does not also count the page extraction it pulls from.
+    """
+
+    __slots__ = ("child", "start")
+
+    def __init__(self, name):
+        self.child = stage_seconds.labels(name)
+
+    def __enter__(self):
+        stack = _local.__dict__.setdefault("stack", [])
+        stack.append(0.0)  # Seconds spent in nested stages
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        elapsed = time.perf_counter() - self.start
+        stack = _local.stack
+        nested = stack.pop()
+        if stack:
+            stack[-1] += elapsed
+        self.child.observe(elapsed - nested)
+
+
+def timed_iter(name, iterable):
+    """Yield from `iterable`, timing each `next()` as stage `name` (for lazy producers like page extraction)."""
+    iterator = iter(iterable)
+    while True:
+        with stage(name):
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+        yield item
+
+
+def observe(name, seconds):
+    """Record `seconds` for stage `name` when it was measured elsewhere (e.g. an LLM call's own latency)."""
+    stage_seconds.labels(name).observe(seconds)
+
+
+# Trace IDs
+def trace_id():
+    return _trace_id.get()
+
+
+def set_trace_id(value):
+    """Tag this request's (or job's) log lines with `value`; a new ID is generated when it is empty."""
+    value = value or uuid.uuid4().hex[:16]
+    _trace_id.set(value)
+    return value
+
+
+def log(message):
+    """`print` prefixed with the current trace ID, when tracing is on and one is set."""
+    current = _trace_id.get()
+    print(f"[{current}] {message}" if current else message)
+
+
+def cache_metrics(name, stats):
+    """Collector families for a cache's `stats()` dict (hits, misses, entries)."""
+    return [
+        ("cache_hits_total", "counter", "Cache lookups answered from the cache", [({"cache": name}, stats["hits"])]),
+        ("cache_misses_total", "counter", "Cache lookups that fell through", [({"cache": name}, stats["misses"])]),
+        ("cache_entries", "gauge", "Entries held by the cache", [({"cache": name}, stats["entries"])])
+    ]
+
+
+def gateway_metrics(gateway):
+    """Collector families for an `LLMGateway`'s per-name counters; nothing until the gateway is built."""
+    if not gateway.ready:
+        return []
+    by_name = gateway.stats()["by_name"]
+    return [
+        ("llm_requests_total", "counter", "Chat completion calls", [({"name": n}, s["calls"]) for n, s in by_name.items()]),
+        ("llm_errors_total", "counter", "Chat completion calls that failed after retries",
+         [({"name": n}, s["errors"]) for n, s in by_name.items()]),
+        ("llm_retries_total", "counter", "Chat completion retries on 429/5xx and connection errors",
+         [({"name": n}, s["retries"]) for n, s in by_name.items()]),
+        ("llm_tokens_total", "counter", "Chat tokens by kind (streamed completions are counted per chunk)",
+         [({"name": n, "kind": kind}, s[f"{kind}_tokens"]) for n, s in by_name.items()
+          for kind in ("prompt", "completion")]),
+        ("llm_throttled_seconds_total", "counter", "Seconds chat calls waited on the client-side rate limiters",
+         [({"name": n}, s["throttled_seconds"]) for n, s in by_name.items()])
+    ]
+
+
+def batcher_metrics(batcher):
+    """Collector families for an `EmbeddingBatcher`; nothing until the batcher is built."""
+    if not batcher.ready:
+        return []
+    return [
+        ("embedding_requests_total", "counter", "Embedding API requests", [({}, batcher.requests)]),
+        ("embedding_retries_total", "counter", "Embedding retries on 429/5xx and connection errors",
+         [({}, batcher.retries)]),
+        ("embedding_tokens_total", "counter", "Embedding input tokens reported by the API", [({}, batcher.tokens)])
+    ]
+
+
+def instrument_flask(app):
+    """Time every request into `http_request_duration_seconds` and, with TRACE_IDS, assign trace IDs.
+
+    The trace ID comes from the caller's `X-Request-ID` header or is
+    generated, is echoed in the response header, and prefixes `log` lines.
+    """
+    from flask import g, request
+
+    @app.before_request
+    def start_request():
+        g.request_start = time.perf_counter()
+        if TRACE_IDS:
+            g.trace_id = set_trace_id(request.headers.get(TRACE_HEADER))
+
+    @app.after_request
+    def finish_request(response):
+        start = g.pop("request_start", None)
+        if start is not None:
+            endpoint = request.url_rule.rule if request.url_rule is not None else "unmatched"
+            request_seconds.observe(time.perf_counter() - start, request.method, endpoint, str(response.status_code))
+        if TRACE_IDS and "trace_id" in g:
+            response.headers[TRACE_HEADER] = g.trace_id
+        return response
+
+    return app
+
+
+class ASGIMetricsMiddleware:
+    """ASGI counterpart of `instrument_flask`; wrap the Starlette app (`app = ASGIMetricsMiddleware(Starlette(...))`)."""
+
+    def __init__(self, app):
+        self.app = app
+        self.paths = {route.endpoint: route.path for route in getattr(app, "routes", [])}
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        start = time.perf_counter()
+        current = None
+        if TRACE_IDS:
+            headers = dict(scope.get("headers") or [])
+            current = set_trace_id(headers.get(TRACE_HEADER.lower().encode(), b"").decode("latin-1"))
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                endpoint = self.paths.get(scope.get("endpoint"), "unmatched")
+                request_seconds.observe(time.perf_counter() - start, scope["method"], endpoint, str(message["status"]))
+                if current:
+                    message["headers"] = list(message.get("headers", [])) + [
+                        (TRACE_HEADER.lower().encode(), current.encode("latin-1"))]
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
@@ -0,0 +1,256 @@
+import queue
+import threading
+import time
+from contextlib import contextmanager
+import numpy as np
+from pymilvus import connections, Collection
+from .vector_store import VectorStore
+from .search_filter import METADATA_FIELDS, EMPTY_METADATA, partition_of
+
+
+class MilvusVectorStore(VectorStore):
+    """Vector store backed by a Milvus server, with reusable collection handles.
+
+    Opens `pool_size` connection aliases (the first is "default") and keeps one
+    Collection handle per alias, so concurrent requests each get their own
+    connection without reconnecting. The collection is loaded once and the
+    loaded state is tracked. Inserts are flushed only when `flush()` is called
+    at the end of a batch or when `flush_rows` rows or `flush_interval`
+    seconds have accumulated, so ingest produces fewer, larger segments.
+
+    With a quantised index (IVF_SQ8, IVF_PQ) pass `rerank_factor` > 1: each
+    search then fetches `rerank_factor * top_k` hits with their stored
+    float32 embeddings and keeps the `top_k` with the highest exact cosine.
+
+    With `partition_by` "tenant" or "document", each chunk is inserted into
+    the partition of its tenant or source file, and a filtered search only
+    scans the partitions its `SearchFilter` names. Collections created before
+    the metadata fields existed keep working, but without metadata.
+    """
+
+    def __init__(self, host, port, collection_name, search_params, pool_size=4,
+                 flush_rows=50000, flush_interval=300, rerank_factor=1, partition_by="none"):
+        self.collection_name = collection_name
+        self.partition_by = partition_by
+        self.search_params = search_params
+        self.rerank_factor = max(1, rerank_factor)
+        self.flush_rows = flush_rows
+        self.flush_interval = flush_interval
+        self.aliases = ["default"] + [f"milvus_{i}" for i in range(1, pool_size)]
+        for alias in self.aliases:
+            connections.connect(alias=alias, host=host, port=port)
+
+        self._pool = None
+        self._loaded = False
+        self._pending_rows = 0
+        self._last_flush = time.monotonic()
+        self._lock = threading.Lock()
+        self.flush_count = 0
+        self.fields = ["embedding", "text"]  # Inserted columns, in schema order (set by `open`)
+        self.metadata_fields = []
+        self._partitions = set()
+
+    def open(self):
+        """Create the collection handles and load the collection into memory once."""
+        with self._lock:
+            self._pool = queue.Queue()
+            handles = [Collection(self.collection_name, using=alias) for alias in self.aliases]
+            for collection in handles:
+                self._pool.put(collection)
+            collection = handles[0]
+            self.fields = [field.name for field in collection.schema.fields if not field.auto_id]
+            self.metadata_fields = [name for name in METADATA_FIELDS if name in self.fields]
+            self._partitions = {partition.name for partition in collection.partitions}
+            self._loaded = False
+        if len(self.metadata_fields) < len(METADATA_FIELDS):
+            print(f"⚠️ Collection '{self.collection_name}' has no chunk metadata fields; "
+                  "reset and re-index to enable citations and filters.")
+        self.ensure_loaded()
+
+    @contextmanager
+    def _collection(self):
+        if self._pool is None:
+            self.open()
+        collection = self._pool.get()
+        try:
+            yield collection
+        finally:
+            self._pool.put(collection)
+
+    def ensure_loaded(self):
+        if self._pool is None:
+            self.open()
+        if self._loaded:
+            return
+        with self._lock:
+            if self._loaded:
+                return
+            collection = self._pool.get()
+            try:
+                collection.load()
+            finally:
+                self._pool.put(collection)
+            self._loaded = True
+            print(f"✅ Loaded collection '{self.collection_name}' into memory")
+
+    def _partition(self, collection, name):
+        """Create a partition on first use (and load it, so the loaded collection covers it)."""
+        if name is None or name in self._partitions:
+            return name
+        with self._lock:
+            if name not in self._partitions:
+                if not collection.has_partition(name):
+                    collection.create_partition(name)
+                    if self._loaded:
+                        collection.load()
+                self._partitions.add(name)
+        return name
+
+    def _refresh_partitions(self):
+        with self._collection() as collection:
+            names = {partition.name for partition in collection.partitions}
+        with self._lock:
+            self._partitions |= names
+
+    def insert(self, embeddings, texts, metadata=None):
+        metadata = [{**EMPTY_METADATA, **(item or {})} for item in (metadata or [None] * len(texts))]
+        groups = {}  # Partition -> row positions, so each partition gets one insert
+        for position, item in enumerate(metadata):
+            groups.setdefault(partition_of(item, self.partition_by) if self.metadata_fields else None, []).append(position)
+        ids = [None] * len(texts)
+        with self._collection() as collection:
+            for partition, positions in groups.items():
+                columns = {"embedding": [embeddings[i] for i in positions], "text": [texts[i] for i in positions]}
+                columns.update({name: [metadata[i][name] for i in positions] for name in self.metadata_fields})
+                result = collection.insert([columns[name] for name in self.fields],
+                                           partition_name=self._partition(collection, partition))
+                for position, primary_key in zip(positions, result.primary_keys):
+                    ids[position] = primary_key
+        with self._lock:
+            self._pending_rows += len(embeddings)
+            due = (self._pending_rows >= self.flush_rows
+                   or time.monotonic() - self._last_flush >= self.flush_interval)
+        if due:
+            self.flush()
+        return ids
+
+    def delete(self, ids):
+        ids = [int(i) for i in ids]
+        with self._collection() as collection:
+            for start in range(0, len(ids), 1000):
+                collection.delete(expr=f"id in {ids[start:start + 1000]}")
+        return len(ids)
+
+    def flush(self):
+        with self._lock:
+            if not self._pending_rows:
+                return
+            self._pending_rows = 0
+            self._last_flush = time.monotonic()
+            self.flush_count += 1
+        with self._collection() as collection:
+            collection.flush()
+
+    def _search_param(self, top_k):
+        """HNSW returns at most `ef` hits, so `ef` is raised to `top_k` when a query asks for more."""
+        params = self.search_params.get("params", {})
+        if params.get("ef", top_k) >= top_k:
+            return self.search_params
+        return {**self.search_params, "params": {**params, "ef": top_k}}
+
+    def _hit(self, hit, score, with_vectors=False):
+        metadata = {name: hit.entity.get(name) for name in self.metadata_fields}
+        result = {"id": hit.id, "text": hit.entity.get("text"), "score": score, "metadata": {**EMPTY_METADATA, **metadata}}
+        if with_vectors:
+            result["vector"] = hit.entity.get("embedding")
+        return result
+
+    def _hits(self, query_embedding, hits, top_k, with_vectors=False):
+        if self.rerank_factor == 1:
+            return [self._hit(hit, hit.distance, with_vectors) for hit in hits]
+        hits = list(hits)
+        if not hits:
+            return []
+        vectors = np.asarray([hit.entity.get("embedding") for hit in hits], dtype=np.float32)
+        query = np.asarray(query_embedding, dtype=np.float32)
+        exact = vectors @ query / (np.linalg.norm(vectors, axis=1) * np.linalg.norm(query) + 1e-12)
+        return [self._hit(hits[i], float(exact[i]), with_vectors) for i in np.argsort(-exact)[:top_k]]
+
+    def _search(self, query_embeddings, top_k, search_filter=None, with_vectors=False):
+        limit = top_k * self.rerank_factor
+        partitions, expr = None, ""
+        if search_filter is not None:
+            if self.metadata_fields:
+                expr = search_filter.expression(self.partition_by)
+                partitions = search_filter.partitions(self.partition_by)
+            else:
+                return [[] for _ in query_embeddings]  # No metadata to match
+            if partitions is not None:
+                if not self._partitions.issuperset(partitions):
+                    self._refresh_partitions()  # Another worker may have created them
+                partitions = [name for name in partitions if name in self._partitions]
+                if not partitions:  # None of the tenants or documents has been indexed
+                    return [[] for _ in query_embeddings]
+        self.ensure_loaded()
+        with self._collection() as collection:
+            results = collection.search(
+                data=query_embeddings,
+                anns_field="embedding",
+                param=self._search_param(limit),
+                limit=limit,
+                expr=expr or None,
+                partition_names=partitions,
+                output_fields=["text"] + self.metadata_fields
+                + (["embedding"] if with_vectors or self.rerank_factor > 1 else [])
+            )
+        return [self._hits(query, hits, top_k, with_vectors) for query, hits in zip(query_embeddings, results)]
+
+    def search(self, query_embedding, top_k=3, search_filter=None, with_vectors=False):
+        return self._search([query_embedding], top_k, search_filter, with_vectors)[0]
+
+    def search_many(self, query_embeddings, top_k=3, search_filter=None, with_vectors=False):
+        """All queries in one multi-vector `collection.search` request."""
+        query_embeddings = list(query_embeddings)
+        if not query_embeddings:
+            return []
+        return self._search(query_embeddings, top_k, search_filter, with_vectors)
+
+    def _query_ids(self, ids, output_fields, batch=1000):
+        """Rows of the given IDs, queried 1000 at a time to stay within Milvus' expression and result limits."""
+        ids = [int(i) for i in ids]
+        if not ids:
+            return []
+        self.ensure_loaded()
+        rows = []
+        with self._collection() as collection:
+            for start in range(0, len(ids), batch):
+                rows.extend(collection.query(expr=f"id in {ids[start:start + batch]}", output_fields=output_fields))
+        return rows
+
+    def get_texts(self, ids):
+        return {row["id"]: row["text"] for row in self._query_ids(ids, ["text"])}
+
+    def get_vectors(self, ids):
+        return {row["id"]: row["embedding"] for row in self._query_ids(ids, ["embedding"])}
+
+    def get_metadata(self, ids):
+        if not self.metadata_fields:
+            return {}
+        rows = self._query_ids(ids, self.metadata_fields)
+        return {row["id"]: {**EMPTY_METADATA, **{name: row[name] for name in self.metadata_fields}} for row in rows}
+
+    def get_chunks(self, ids, with_vectors=False):
+        """Text, metadata and (optionally) embedding of each ID in one query instead of one per field."""
+        rows = self._query_ids(ids, ["text"] + self.metadata_fields + (["embedding"] if with_vectors else []))
+        chunks = {}
+        for row in rows:
+            metadata = {**EMPTY_METADATA, **{name: row[name] for name in self.metadata_fields}} \
+                if self.metadata_fields else None
+            chunks[row["id"]] = {"id": row["id"], "text": row["text"], "metadata": metadata}
+            if with_vectors:
+                chunks[row["id"]]["vector"] = row["embedding"]
+        return chunks
+
+    def count(self):
+        with self._collection() as collection:
+            return collection.num_entities
@@ -0,0 +1,111 @@
+import contextvars
+import queue
+import threading
+from itertools import islice
+
+_DONE = object()  # Sentinel marking the end of a stage's output
+
+
+def batched(iterable, size):
+    """Group an iterable into lists of at most `size` items."""
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+class _Stage(threading.Thread):
+    """Worker thread that feeds items from `source` through `func` into a bounded queue."""
+
+    def __init__(self, source, func, maxsize, stop_event):
+        super().__init__(daemon=True)
+        self.source = source
+        self.func = func
+        self.output = queue.Queue(maxsize=maxsize)
+        self.stop_event = stop_event
+        self.error = None
+        self.context = contextvars.copy_context()  # Keeps the caller's trace ID in this thread's log lines
+
+    def _put(self, item):
+        # Block while the queue is full, but give up if the pipeline was aborted.
+        while not self.stop_event.is_set():
+            try:
+                self.output.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def run(self):
+        self.context.run(self._run)
+
+    def _run(self):
+        try:
+            for item in self.source:
+                if not self._put(self.func(item)):
+                    return
+        except Exception as e:
+            self.error = e
+            self.stop_event.set()
+        finally:
+            self._put(_DONE)
+
+    def __iter__(self):
+        while True:
+            try:
+                item = self.output.get(timeout=0.1)
+            except queue.Empty:
+                if self.stop_event.is_set() and not self.is_alive():
+                    return
+                continue
+            if item is _DONE:
+                return
+            yield item
+
+
+def run_pipeline(texts, embed_fn, store_fn, embed_batch_size=16, insert_batch_size=256, queue_size=4):
+    """Stream `texts` through embedding and storage with bounded memory.
+
+    Texts are pulled lazily in batches of `embed_batch_size` and embedded on
+    a background thread while the next batch is being extracted. Embedded
+    batches are regrouped into inserts of up to `insert_batch_size` and
+    handed to `store_fn(embeddings, texts)` on the calling thread. Stages are
+    joined by queues of `queue_size` batches, so no more than a few batches
+    are held in memory regardless of document size. Items may also be
+    records such as chunks with their page span; they reach `embed_fn` and
+    `store_fn` unchanged.
+
+    Returns the number of stored chunks.
+    """
+    stop_event = threading.Event()
+
+    # Stage 1: extraction + batching, Stage 2: embedding (network bound).
+    extract_stage = _Stage(batched(texts, embed_batch_size), lambda batch: batch, queue_size, stop_event)
+    embed_stage = _Stage(extract_stage, lambda batch: (embed_fn(batch), batch), queue_size, stop_event)
+    extract_stage.start()
+    embed_stage.start()
+
+    # Stage 3: bounded inserts on the calling thread.
+    stored = 0
+    pending_embeddings, pending_texts = [], []
+    try:
+        for embeddings, batch in embed_stage:
+            pending_embeddings.extend(embeddings)
+            pending_texts.extend(batch)
+            while len(pending_texts) >= insert_batch_size:
+                store_fn(pending_embeddings[:insert_batch_size], pending_texts[:insert_batch_size])
+                stored += insert_batch_size
+                del pending_embeddings[:insert_batch_size], pending_texts[:insert_batch_size]
+
+        for error in (extract_stage.error, embed_stage.error):
+            if error is not None:
+                raise error
+
+        if pending_texts:
+            store_fn(pending_embeddings, pending_texts)
+            stored += len(pending_texts)
+    finally:
+        stop_event.set()
+        extract_stage.join()
+        embed_stage.join()
+
+    return stored
@@ -0,0 +1,123 @@
+import multiprocessing
+import os
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from itertools import chain, groupby
+import pypdf
+
+class PdfExtractionError(Exception):
+    """A PDF could not be read; raised while that file's pages are consumed, so later files still extract."""
+
+def iter_pages_from_pdf(file_path, start=0, stop=None):
+    """Lazily yield `(page_number, text)` for each page in [start, stop) of a PDF, skipping empty pages.
+
+    Page numbers are 1-based.
+    """
+    with open(file_path, "rb") as f:
+        reader = pypdf.PdfReader(f)
+        stop = len(reader.pages) if stop is None else stop
+        for page_number in range(start, stop):
+            text = reader.pages[page_number].extract_text()
+            if text:
+                yield page_number + 1, text.strip()
+
+def extract_text_from_pdf(file_path):
+    """Extract text from each page of a PDF."""
+    return [text for _, text in iter_pages_from_pdf(file_path)]  # Each page is one chunk
+
+def count_pdf_pages(file_path):
+    """Return the number of pages in a PDF."""
+    with open(file_path, "rb") as f:
+        return len(pypdf.PdfReader(f).pages)
+
+def count_pdf_pages_or_error(file_path):
+    """Page count of a PDF, or the error message if it cannot be opened (runs inside a worker process)."""
+    try:
+        return count_pdf_pages(file_path)
+    except Exception as e:
+        return f"{type(e).__name__}: {e}"
+
+def failed_pages(file_path, error):
+    """Pages iterator of an unreadable PDF: raises `PdfExtractionError` once consumed."""
+    raise PdfExtractionError(f"Cannot extract {os.path.basename(file_path)}: {error}")
+    yield  # A generator, so the error surfaces where the file's pages are read
+
+def extract_page_range(file_path, start, stop):
+    """Extract `(page_number, text)` pairs from pages [start, stop) of a PDF (runs inside a worker process)."""
+    return list(iter_pages_from_pdf(file_path, start, stop))
+
+def iter_page_ranges(file_paths, workers=None, pages_per_task=50, max_pending=None):
+    """Extract PDFs across a process pool, yielding `(file_index, pages)` per page range.
+
+    Files are split into page ranges of `pages_per_task` so a single large PDF
+    is spread over several cores as well. Ranges are yielded in input order
+    and at most `max_pending` ranges (default: two per worker) are in flight,
+    so memory stays bounded however many pages are queued. Every file yields
+    at least one (possibly empty) range. A file that cannot be read yields a
+    range that raises `PdfExtractionError` when consumed, and the files after
+    it are still extracted.
+
+    Workers are spawned, not forked: the services run gRPC, HTTP-pool and
+    warm-up threads, and a forked child can deadlock on a lock one of them
+    held. The pool lives for one call, i.e. one indexing job.
+    """
+    workers = workers or os.cpu_count() or 1
+
+    if workers <= 1:
+        for file_index, file_path in enumerate(file_paths):
+            num_pages = count_pdf_pages_or_error(file_path)
+            if isinstance(num_pages, str):
+                yield file_index, failed_pages(file_path, num_pages)
+                continue
+            for start in range(0, num_pages or 1, pages_per_task):
+                yield file_index, iter_pages_from_pdf(file_path, start, min(start + pages_per_task, num_pages))
+        return
+
+    max_pending = max_pending or workers * 2
+
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+        page_counts = pool.map(count_pdf_pages_or_error, file_paths)
+
+        def tasks():
+            for file_index, (file_path, num_pages) in enumerate(zip(file_paths, page_counts)):
+                if isinstance(num_pages, str):  # Unreadable: its single range raises instead
+                    yield file_index, failed_pages(file_path, num_pages)
+                    continue
+                for start in range(0, num_pages or 1, pages_per_task):
+                    stop = min(start + pages_per_task, num_pages)
+                    yield file_index, pool.submit(extract_page_range, file_path, start, stop)
+
+        def collect(file_index, task):
+            if not isinstance(task, Future):
+                return file_index, task
+            try:
+                return file_index, task.result()
+            except Exception as e:
+                return file_index, failed_pages(file_paths[file_index], f"{type(e).__name__}: {e}")
+
+        pending = deque()
+        for task in tasks():
+            pending.append(task)
+            if len(pending) >= max_pending:
+                yield collect(*pending.popleft())
+
+        while pending:
+            yield collect(*pending.popleft())
+
+def iter_pdfs(file_paths, workers=None, pages_per_task=50, max_pending=None):
+    """Yield `(file_path, pages)` per file in input order, where `pages` lazily yields `(page_number, text)`.
+
+    Each `pages` iterator must be consumed before advancing to the next file.
+    """
+    page_ranges = iter_page_ranges(file_paths, workers, pages_per_task, max_pending)
+    for file_index, ranges in groupby(page_ranges, key=lambda item: item[0]):
+        yield file_paths[file_index], chain.from_iterable(pages for _, pages in ranges)
+
+def extract_text_from_pdfs(file_paths, workers=None, pages_per_task=50):
+    """Extract text from many PDFs across a process pool.
+
+    Yields `(file_path, pages)` in the same order as `file_paths`, with pages
+    in document order, as soon as each file is complete.
+    """
+    for file_path, pages in iter_pdfs(file_paths, workers, pages_per_task):
+        yield file_path, [text for _, text in pages]
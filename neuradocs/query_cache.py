@@ -0,0 +1,154 @@
+import re
+import threading
+import time
+from collections import OrderedDict
+import numpy as np
+
+
+# Tokens that change what a question asks while barely moving its embedding: numbers and codes ("error 501"),
+# dotted or snake_case identifiers ("os.path", "max_df") and camelCase names
+_KEY_TERM = re.compile(r"\w+(?:(?:\.|::)\w+)+|\w*\d\w*|\w*_\w*|[a-z]+[A-Z]\w*")
+
+
+def normalize_query(query):
+    """Case- and whitespace-insensitive form of a user query."""
+    return " ".join(query.lower().split())
+
+
+def key_terms(query):
+    """The numbers and identifiers in a query, which two questions must share to share an answer."""
+    return frozenset(term.lower() for term in _KEY_TERM.findall(query))
+
+
+class QueryEmbeddingCache:
+    """In-process LRU cache of normalised query -> embedding with a TTL."""
+
+    def __init__(self, max_entries=1024, ttl=3600):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, query):
+        key = normalize_query(query)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or time.monotonic() - entry[1] > self.ttl:
+                self._entries.pop(key, None)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, query, embedding):
+        key = normalize_query(query)
+        with self._lock:
+            self._entries[key] = (embedding, time.monotonic())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {"hits": self.hits, "misses": self.misses, "hit_rate": self.hits / total if total else 0.0,
+                    "entries": len(self._entries)}
+
+
+class SemanticAnswerCache:
+    """Returns a stored answer when a new query embedding is close to a cached one.
+
+    Cached query embeddings are kept L2-normalised in a preallocated float32
+    matrix, so a lookup is a single matrix-vector product. When full, the
+    least recently used slot is overwritten.
+
+    Embeddings such as text-embedding-ada-002 score questions that differ
+    only by a number or an identifier above 0.97, so a hit also needs the
+    same `key_terms` in both queries. `clear` starts a new `generation`: an
+    answer computed before it (e.g. a completion still streaming while the
+    index changed) is dropped by `add` instead of being cached.
+    """
+
+    def __init__(self, max_entries=1024, ttl=3600, threshold=0.99):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.threshold = threshold
+        self.hits = 0
+        self.misses = 0
+        self._matrix = None
+        self._answers = [None] * max_entries
+        self._created = np.full(max_entries, -np.inf)
+        self._last_used = np.full(max_entries, -np.inf)
+        self._terms = [None] * max_entries
+        self._size = 0
+        self.generation = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _normalize(embedding):
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def lookup(self, embedding, query):
+        """Return the cached answer for the most similar query above the threshold with the same key terms, or None."""
+        terms = key_terms(query)
+        with self._lock:
+            if self._size == 0:
+                self.misses += 1
+                return None
+            now = time.monotonic()
+            similarities = self._matrix[:self._size] @ self._normalize(embedding)
+            similarities[now - self._created[:self._size] > self.ttl] = -np.inf
+            candidates = np.flatnonzero(similarities >= self.threshold)
+            for slot in candidates[np.argsort(-similarities[candidates])]:
+                if self._terms[slot] == terms:
+                    self._last_used[slot] = now
+                    self.hits += 1
+                    return self._answers[slot]
+            self.misses += 1
+            return None
+
+    def add(self, embedding, query, answer, generation):
+        """Cache `answer` for `query`, unless the cache was cleared after `generation` was read."""
+        if self.max_entries == 0:  # Cache disabled
+            return
+        with self._lock:
+            if generation != self.generation:  # Computed from an index that has changed since
+                return
+            vector = self._normalize(embedding)
+            if self._matrix is None:
+                self._matrix = np.zeros((self.max_entries, vector.shape[0]), dtype=np.float32)
+            if self._size < self.max_entries:
+                slot = self._size
+                self._size += 1
+            else:
+                slot = int(np.argmin(self._last_used))
+            now = time.monotonic()
+            self._matrix[slot] = vector
+            self._answers[slot] = answer
+            self._terms[slot] = key_terms(query)
+            self._created[slot] = now
+            self._last_used[slot] = now
+
+    def clear(self):
+        with self._lock:
+            self.generation += 1
+            self._size = 0
+            self._answers = [None] * self.max_entries
+            self._terms = [None] * self.max_entries
+            self._created[:] = -np.inf
+            self._last_used[:] = -np.inf
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {"hits": self.hits, "misses": self.misses, "hit_rate": self.hits / total if total else 0.0,
+                    "entries": self._size}
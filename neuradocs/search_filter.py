@@ -0,0 +1,103 @@
+import hashlib
+import json
+import re
+from dataclasses import dataclass
+
+# Per-chunk metadata stored next to each vector (Milvus scalar fields, local store columns)
+METADATA_FIELDS = ("source", "tenant", "page_start", "page_end", "chunk_index", "ingested_at")
+EMPTY_METADATA = {"source": "", "tenant": "", "page_start": -1, "page_end": -1, "chunk_index": -1, "ingested_at": 0}
+PARTITION_BY = ("tenant", "document", "none")
+
+
+def partition_name(value):
+    """Milvus-safe partition name for a tenant or document: a readable slug plus a hash so names stay unique."""
+    slug = re.sub(r"[^0-9A-Za-z_]", "_", value)[:64]
+    return f"p_{slug}_{hashlib.sha1(value.encode('utf-8')).hexdigest()[:8]}"
+
+
+def partition_of(metadata, partition_by):
+    """Partition a chunk is stored in: one per tenant or per source document, or None (the default partition)."""
+    if partition_by == "tenant" and metadata.get("tenant"):
+        return partition_name(metadata["tenant"])
+    if partition_by == "document" and metadata.get("source"):
+        return partition_name(metadata["source"])
+    return None
+
+
+def _strings(value, name):
+    values = [value] if isinstance(value, str) else value
+    if not isinstance(values, list) or not values or not all(isinstance(v, str) and v for v in values):
+        raise ValueError(f"Filter '{name}' must be a non-empty string or list of strings")
+    return tuple(dict.fromkeys(values))
+
+
+def _number(value, name):
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        raise ValueError(f"Filter '{name}' must be a number")
+    return value
+
+
+@dataclass(frozen=True)
+class SearchFilter:
+    """Restricts a search to some tenants or source documents, a page range and recent ingests.
+
+    The tenants (or sources, when partitioned per document) name whole
+    partitions, so Milvus only scans their segments. The remaining
+    conditions become a boolean expression over the metadata fields.
+    """
+    tenants: tuple = ()
+    sources: tuple = ()
+    page_from: int = None
+    page_to: int = None
+    ingested_after: float = None
+
+    @classmethod
+    def from_request(cls, filters):
+        """Parse the `filters` object of a query request (None when absent or empty); raises ValueError if invalid."""
+        if filters is None:
+            return None
+        if not isinstance(filters, dict):
+            raise ValueError("'filters' must be an object")
+        unknown = set(filters) - {"tenant", "source", "page_from", "page_to", "ingested_after"}
+        if unknown:
+            raise ValueError(f"Unknown filter(s): {', '.join(sorted(unknown))}")
+        search_filter = cls(
+            tenants=_strings(filters["tenant"], "tenant") if "tenant" in filters else (),
+            sources=_strings(filters["source"], "source") if "source" in filters else (),
+            page_from=int(_number(filters["page_from"], "page_from")) if "page_from" in filters else None,
+            page_to=int(_number(filters["page_to"], "page_to")) if "page_to" in filters else None,
+            ingested_after=_number(filters["ingested_after"], "ingested_after") if "ingested_after" in filters else None
+        )
+        return search_filter if search_filter != cls() else None
+
+    def partitions(self, partition_by):
+        """Partition names to search, or None to search every partition."""
+        if partition_by == "tenant" and self.tenants:
+            return [partition_name(tenant) for tenant in self.tenants]
+        if partition_by == "document" and self.sources:
+            return [partition_name(source) for source in self.sources]
+        return None
+
+    def expression(self, partition_by):
+        """Milvus boolean expression for the conditions that partitions do not already cover ("" if none)."""
+        conditions = []
+        if self.tenants and partition_by != "tenant":
+            conditions.append(f"tenant in {json.dumps(list(self.tenants))}")
+        if self.sources and partition_by != "document":
+            conditions.append(f"source in {json.dumps(list(self.sources))}")
+        if self.page_from is not None:
+            conditions.append(f"page_end >= {self.page_from}")
+        if self.page_to is not None:
+            conditions.append(f"page_start <= {self.page_to}")
+        if self.ingested_after is not None:
+            conditions.append(f"ingested_at >= {int(self.ingested_after)}")
+        return " and ".join(conditions)
+
+    def matches(self, metadata):
+        """Whether a chunk's metadata passes every condition (for hits found outside the vector store)."""
+        metadata = metadata or EMPTY_METADATA
+        return ((not self.tenants or metadata["tenant"] in self.tenants)
+                and (not self.sources or metadata["source"] in self.sources)
+                and (self.page_from is None or metadata["page_end"] >= self.page_from)
+                and (self.page_to is None or metadata["page_start"] <= self.page_to)
+                and (self.ingested_after is None or metadata["ingested_at"] >= self.ingested_after))
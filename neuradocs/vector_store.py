@@ -0,0 +1,676 @@
+import io
+import json
+import os
+import threading
+import numpy as np
+from .search_filter import EMPTY_METADATA
+
+# Per-row chunk metadata of the local stores; tenant and source are codes into a table of names
+META_DTYPE = np.dtype([("tenant", np.int32), ("source", np.int32), ("page_start", np.int32), ("page_end", np.int32),
+                       ("chunk_index", np.int32), ("ingested_at", np.int64)])
+EMPTY_META_ROW = (-1, -1, -1, -1, -1, 0)
+
+
+class VectorStore:
+    """Interface shared by the vector store backends.
+
+    `insert` takes an optional metadata dict per row (see
+    `search_filter.METADATA_FIELDS`) and returns the IDs assigned to the new
+    rows. `search` returns hits as dicts with `id`, `text`, `score` (cosine
+    similarity, higher is better) and `metadata`, best first; a
+    `SearchFilter` restricts it to matching chunks. With `with_vectors=True`
+    each hit also carries its stored embedding as `vector` (what
+    `get_vectors` would return), saving a second lookup.
+    """
+
+    def insert(self, embeddings, texts, metadata=None):
+        raise NotImplementedError
+
+    def delete(self, ids):
+        raise NotImplementedError
+
+    def flush(self):
+        raise NotImplementedError
+
+    def search(self, query_embedding, top_k=3, search_filter=None, with_vectors=False):
+        raise NotImplementedError
+
+    def search_many(self, query_embeddings, top_k=3, search_filter=None, with_vectors=False):
+        """One list of hits per query embedding, in input order."""
+        return [self.search(query_embedding, top_k=top_k, search_filter=search_filter, with_vectors=with_vectors)
+                for query_embedding in query_embeddings]
+
+    def get_texts(self, ids):
+        """Map chunk IDs to their stored text (unknown IDs are left out)."""
+        raise NotImplementedError
+
+    def get_vectors(self, ids):
+        """Map chunk IDs to their stored embedding (unknown IDs are left out)."""
+        raise NotImplementedError
+
+    def get_metadata(self, ids):
+        """Map chunk IDs to their metadata dict (unknown IDs are left out)."""
+        raise NotImplementedError
+
+    def get_chunks(self, ids, with_vectors=False):
+        """Map chunk IDs to hits without a score (`id`, `text`, `metadata` and, if asked for, `vector`)."""
+        ids = list(ids)
+        texts, metadata = self.get_texts(ids), self.get_metadata(ids)
+        vectors = self.get_vectors(ids) if with_vectors else {}
+        chunks = {doc_id: {"id": doc_id, "text": text, "metadata": metadata.get(doc_id)} for doc_id, text in texts.items()}
+        for doc_id, vector in vectors.items():
+            chunks[doc_id]["vector"] = vector
+        return chunks
+
+    def count(self):
+        raise NotImplementedError
+
+
+class LocalVectorStore(VectorStore):
+    """In-process exact cosine search over a contiguous float32 NumPy matrix.
+
+    Rows are L2-normalised on insert so a search is a single matrix-vector
+    product followed by `argpartition` top-k. The matrix is persisted to
+    `<path>.npy` (memory-mapped on load), row IDs to `<path>.ids.npy` and the
+    texts to a `<path>.texts.jsonl` sidecar, one JSON string per row.
+
+    Chunk metadata is kept as one `META_DTYPE` row per vector in
+    `<path>.meta.npy`, with tenant and source names in `<path>.names.json`.
+    A filtered search masks the rows on these columns first and only scores
+    the rows that pass.
+
+    A flush appends new rows to the matrix file and the text sidecar in
+    place, and writes the other files to temporary paths. It commits by
+    replacing `<path>.state.json` (row count, text sidecar length, next ID
+    and the files to move into place) before renaming them. A load after a
+    crash finishes a committed flush or ignores an uncommitted one, reading
+    only the committed rows, so the files always describe the same rows.
+    Only a flush after `delete` or `clear` rewrites the matrix. IDs are
+    never reused, even after a delete or `clear`.
+    """
+
+    def __init__(self, path, dimension):
+        self.dimension = dimension
+        self.matrix_path = f"{path}.npy"
+        self.ids_path = f"{path}.ids.npy"
+        self.texts_path = f"{path}.texts.jsonl"
+        self.meta_path = f"{path}.meta.npy"
+        self.names_path = f"{path}.names.json"
+        self.state_path = f"{path}.state.json"
+        self._lock = threading.RLock()
+        self._matrix = np.empty((0, dimension), dtype=np.float32)
+        self._ids = np.empty(0, dtype=np.int64)
+        self._texts = []
+        self._meta = np.empty(0, dtype=META_DTYPE)
+        self._names = []  # Code -> tenant or source name
+        self._codes = {}  # Name -> code
+        self._size = 0
+        self._flushed = 0
+        self._rewrite = False
+        self._next_id = 0
+        self._texts_bytes = 0  # Length of the committed text sidecar; later bytes belong to an unfinished flush
+        self._load()
+
+    def _read_state(self):
+        """The committed state, after finishing the renames of a flush that was interrupted once committed."""
+        if not os.path.exists(self.state_path):
+            return None
+        with open(self.state_path, encoding="utf-8") as f:
+            state = json.load(f)
+        if state.get("pending"):
+            for tmp_path, path in state.pop("pending"):
+                if os.path.exists(tmp_path):
+                    os.replace(tmp_path, path)
+            self._write_state(state)
+        return state
+
+    def _write_state(self, state):
+        with open(f"{self.state_path}.tmp", "w", encoding="utf-8") as f:
+            json.dump(state, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(f"{self.state_path}.tmp", self.state_path)
+
+    def _load(self):
+        state = self._read_state()
+        if not os.path.exists(self.matrix_path):
+            return
+        matrix = np.load(self.matrix_path, mmap_mode="r")
+        if matrix.ndim != 2 or matrix.shape[1] != self.dimension:
+            raise ValueError(f"Local index {self.matrix_path} has shape {matrix.shape}, expected dim={self.dimension}.")
+        with open(self.texts_path, "rb") as f:
+            raw = f.read(state["texts_bytes"]) if state else f.read()
+        texts = [json.loads(line) for line in raw.decode("utf-8").splitlines()]
+        ids = np.load(self.ids_path) if os.path.exists(self.ids_path) else np.arange(matrix.shape[0], dtype=np.int64)
+        meta = np.load(self.meta_path) if os.path.exists(self.meta_path) else None
+        if state:
+            self._size = self._flushed = state["size"]
+            if min(len(texts), len(ids), len(meta)) != self._size or matrix.shape[0] < self._size:
+                raise ValueError(f"Local index {self.matrix_path} does not match {self.state_path}.")
+            self._texts_bytes = len(raw)
+        else:  # Index written before flushes were committed: texts went first, so trailing ones may be unfinished
+            self._size = self._flushed = min(len(texts), len(ids), matrix.shape[0], len(meta) if meta is not None else len(ids))
+            self._rewrite = True  # Rewrite the sidecar on the next flush so its committed length is known
+        if meta is None:  # Index written before chunk metadata was stored
+            meta = self._empty_meta(self._size)
+        if os.path.exists(self.names_path):
+            with open(self.names_path, encoding="utf-8") as f:
+                self._names = json.load(f)
+            self._codes = {name: code for code, name in enumerate(self._names)}
+        self._matrix = matrix
+        self._ids = ids
+        self._texts = texts[:self._size]
+        self._meta = meta
+        self._next_id = state["next_id"] if state else int(ids[:self._size].max()) + 1 if self._size else 0
+        print(f"✅ Loaded local vector index with {self._size} vectors from {self.matrix_path}")
+
+    def _reserve(self, extra):
+        """Make room for `extra` rows, moving off the read-only mmap and growing geometrically."""
+        needed = self._size + extra
+        if isinstance(self._matrix, np.memmap) or needed > self._matrix.shape[0]:
+            capacity = max(needed, 2 * self._matrix.shape[0], 1024)
+            matrix = np.empty((capacity, self.dimension), dtype=np.float32)
+            matrix[:self._size] = self._matrix[:self._size]
+            ids = np.empty(capacity, dtype=np.int64)
+            ids[:self._size] = self._ids[:self._size]
+            meta = np.empty(capacity, dtype=META_DTYPE)
+            meta[:self._size] = self._meta[:self._size]
+            self._matrix, self._ids, self._meta = matrix, ids, meta
+
+    @staticmethod
+    def _empty_meta(count):
+        meta = np.empty(count, dtype=META_DTYPE)
+        meta[:] = EMPTY_META_ROW
+        return meta
+
+    def _code(self, name):
+        """Code of a tenant or source name, adding it to the name table if new (call with the lock held)."""
+        if not name:
+            return -1
+        code = self._codes.get(name)
+        if code is None:
+            code = self._codes[name] = len(self._names)
+            self._names.append(name)
+        return code
+
+    def _meta_rows(self, metadata, count):
+        """`META_DTYPE` rows for the metadata dicts of an insert (rows without metadata stay empty)."""
+        rows = self._empty_meta(count)
+        for i, item in enumerate(metadata or ()):
+            item = {**EMPTY_METADATA, **(item or {})}
+            rows[i] = (self._code(item["tenant"]), self._code(item["source"]), item["page_start"], item["page_end"],
+                       item["chunk_index"], int(item["ingested_at"]))
+        return rows
+
+    @staticmethod
+    def _record(row, names):
+        """Metadata dict of one `META_DTYPE` row."""
+        return {
+            "source": names[row["source"]] if row["source"] >= 0 else "",
+            "tenant": names[row["tenant"]] if row["tenant"] >= 0 else "",
+            "page_start": int(row["page_start"]),
+            "page_end": int(row["page_end"]),
+            "chunk_index": int(row["chunk_index"]),
+            "ingested_at": int(row["ingested_at"])
+        }
+
+    def _filter_rows(self, search_filter, meta, size):
+        """Indices of the rows passing `search_filter`, or None to search every row."""
+        if search_filter is None:
+            return None
+        meta = meta[:size]
+        mask = np.ones(size, dtype=bool)
+        if search_filter.tenants:
+            mask &= np.isin(meta["tenant"], [self._codes.get(name, -2) for name in search_filter.tenants])
+        if search_filter.sources:
+            mask &= np.isin(meta["source"], [self._codes.get(name, -2) for name in search_filter.sources])
+        if search_filter.page_from is not None:
+            mask &= meta["page_end"] >= search_filter.page_from
+        if search_filter.page_to is not None:
+            mask &= meta["page_start"] <= search_filter.page_to
+        if search_filter.ingested_after is not None:
+            mask &= meta["ingested_at"] >= search_filter.ingested_after
+        return np.flatnonzero(mask)
+
+    @staticmethod
+    def _score(matrix, rows, queries):
+        """`queries @ matrix[rows].T`, scoring each contiguous run of `rows` in place instead of gathering a copy.
+
+        A file's chunks are inserted together, so a tenant or document filter
+        usually selects a few long runs.
+        """
+        breaks = np.flatnonzero(np.diff(rows) != 1) + 1
+        if len(breaks) > len(rows) // 16:  # Scattered rows: one gather beats many small products
+            return queries @ matrix[rows].T
+        starts, stops = rows[np.r_[0, breaks]], rows[np.r_[breaks - 1, len(rows) - 1]] + 1
+        return np.concatenate([queries @ matrix[a:b].T for a, b in zip(starts, stops)], axis=-1)
+
+    @staticmethod
+    def _normalize(vectors):
+        vectors = np.asarray(vectors, dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return vectors / norms
+
+    def insert(self, embeddings, texts, metadata=None):
+        vectors = self._normalize(embeddings)
+        with self._lock:
+            self._reserve(len(vectors))
+            start, stop = self._size, self._size + len(vectors)
+            new_ids = np.arange(self._next_id, self._next_id + len(vectors), dtype=np.int64)
+            self._matrix[start:stop] = vectors
+            self._ids[start:stop] = new_ids
+            self._meta[start:stop] = self._meta_rows(metadata, len(vectors))
+            self._texts.extend(texts)
+            self._size = stop
+            self._next_id += len(vectors)
+        return new_ids.tolist()
+
+    def delete(self, ids):
+        """Remove rows by ID (the next flush rewrites the files).
+
+        Surviving rows are copied into new arrays so concurrent searches keep
+        a consistent snapshot.
+        """
+        with self._lock:
+            keep = ~np.isin(self._ids[:self._size], np.asarray(list(ids), dtype=np.int64))
+            if keep.all():
+                return 0
+            self._matrix = self._matrix[:self._size][keep]
+            self._ids = self._ids[:self._size][keep]
+            self._meta = self._meta[:self._size][keep]
+            self._texts = [text for text, k in zip(self._texts, keep) if k]
+            removed = self._size - len(self._ids)
+            self._size = len(self._ids)
+            self._rewrite = True  # Sidecar no longer matches; rewrite it on flush
+            return removed
+
+    def clear(self):
+        """Drop every vector; the next flush writes an empty index."""
+        with self._lock:
+            self._matrix = np.empty((0, self.dimension), dtype=np.float32)
+            self._ids = np.empty(0, dtype=np.int64)
+            self._texts = []
+            self._meta = np.empty(0, dtype=META_DTYPE)
+            self._names, self._codes = [], {}
+            self._size = 0
+            self._rewrite = True
+
+    @staticmethod
+    def _save_array(path, array):
+        with open(path, "wb") as f:
+            np.save(f, array)
+            f.flush()
+            os.fsync(f.fileno())
+
+    def _save_matrix(self, path):
+        self._save_array(path, self._matrix[:self._size])
+
+    def _unflushed_rows(self):
+        """Full-precision rows inserted since the last flush."""
+        return self._matrix[self._flushed:self._size]
+
+    def _matrix_header(self, rows, version):
+        buffer = io.BytesIO()
+        header = {"descr": np.lib.format.dtype_to_descr(np.dtype(np.float32)), "fortran_order": False,
+                  "shape": (rows, self.dimension)}
+        if version == (1, 0):
+            np.lib.format.write_array_header_1_0(buffer, header)
+        else:
+            np.lib.format.write_array_header_2_0(buffer, header)
+        return buffer.getvalue()
+
+    def _append_matrix(self):
+        """Append the unflushed rows to the matrix file in place; False if its header cannot grow in place.
+
+        Rows past the committed count (from an interrupted flush) are cut off
+        first. The header is rewritten last, so until the state file commits
+        the new count a load still reads only the committed rows.
+        """
+        with open(self.matrix_path, "r+b") as f:
+            version = np.lib.format.read_magic(f)
+            if version == (1, 0):
+                shape, _, _ = np.lib.format.read_array_header_1_0(f)
+            else:
+                shape, _, _ = np.lib.format.read_array_header_2_0(f)
+            offset = f.tell()
+            if shape[0] < self._flushed or len(self._matrix_header(self._size, version)) != offset:
+                return False  # Written by a NumPy that leaves no room to grow the header
+            if shape[0] != self._flushed:
+                f.write(self._matrix_header(self._flushed, version))
+                f.flush()
+                os.fsync(f.fileno())
+            f.truncate(offset + self._flushed * self.dimension * 4)
+            f.seek(0, os.SEEK_END)
+            rows = self._unflushed_rows()
+            for start in range(0, len(rows), 65536):
+                f.write(np.ascontiguousarray(rows[start:start + 65536], dtype=np.float32).tobytes())
+            f.flush()
+            os.fsync(f.fileno())
+            f.seek(0)
+            f.write(self._matrix_header(self._size, version))
+            f.flush()
+            os.fsync(f.fileno())
+        return True
+
+    def _matrix_saved(self):
+        """Called once the matrix file holds every row."""
+
+    def flush(self):
+        """Persist the rows: append new ones in place, write temporary files, commit in the state file, then rename."""
+        with self._lock:
+            if not self._rewrite and self._flushed == self._size and os.path.exists(self.matrix_path):
+                return
+            os.makedirs(os.path.dirname(os.path.abspath(self.matrix_path)), exist_ok=True)
+            pending = [(f"{path}.tmp", path) for path in (self.ids_path, self.meta_path, self.names_path)]
+            append = (not self._rewrite and self._flushed and os.path.exists(self.texts_path)
+                      and os.path.exists(self.matrix_path) and self._append_matrix())
+            if not append:
+                pending.append((f"{self.matrix_path}.tmp", self.matrix_path))
+                self._save_matrix(pending[-1][0])
+            if append:  # Appended in place: the committed length is what a load reads
+                f = open(self.texts_path, "r+b")
+                f.truncate(self._texts_bytes)
+                f.seek(self._texts_bytes)
+            else:
+                pending.append((f"{self.texts_path}.tmp", self.texts_path))
+                f = open(pending[-1][0], "wb")
+            with f:
+                for text in self._texts[self._flushed if append else 0:self._size]:
+                    f.write((json.dumps(text) + "\n").encode("utf-8"))
+                f.flush()
+                os.fsync(f.fileno())
+                texts_bytes = f.tell()
+            self._save_array(pending[0][0], self._ids[:self._size])
+            self._save_array(pending[1][0], self._meta[:self._size])
+            with open(pending[2][0], "w", encoding="utf-8") as f:
+                json.dump(self._names, f)
+            state = {"size": self._size, "next_id": self._next_id, "texts_bytes": texts_bytes}
+            self._write_state({**state, "pending": pending})  # Commit point
+            for tmp_path, path in pending:
+                os.replace(tmp_path, path)
+            self._write_state(state)
+            self._matrix_saved()
+            self._texts_bytes = texts_bytes
+            self._flushed = self._size
+            self._rewrite = False
+
+    def _snapshot_rows(self):
+        with self._lock:
+            return self._matrix, self._ids, self._texts, self._meta, self._names, self._size
+
+    def _hit(self, row, score, ids, texts, meta, names, vector=None):
+        hit = {"id": int(ids[row]), "text": texts[row], "score": float(score), "metadata": self._record(meta[row], names)}
+        if vector is not None:
+            hit["vector"] = np.array(vector)
+        return hit
+
+    def search(self, query_embedding, top_k=3, search_filter=None, with_vectors=False):
+        matrix, ids, texts, meta, names, size = self._snapshot_rows()
+        rows = self._filter_rows(search_filter, meta, size)
+        n = size if rows is None else len(rows)
+        if n == 0:
+            return []
+        query = self._normalize(query_embedding)
+        # A filtered search scores only the passing rows
+        scores = matrix[:size] @ query if rows is None else self._score(matrix, rows, query)
+        if top_k < n:
+            candidates = np.argpartition(-scores, top_k)[:top_k]
+        else:
+            candidates = np.arange(n)
+        best = candidates[np.argsort(-scores[candidates])]
+        hit_rows = best if rows is None else rows[best]
+        return [self._hit(row, score, ids, texts, meta, names, matrix[row] if with_vectors else None)
+                for row, score in zip(hit_rows, scores[best])]
+
+    def search_many(self, query_embeddings, top_k=3, search_filter=None, with_vectors=False):
+        """Score a block of queries with one matrix-matrix product instead of one product per query."""
+        matrix, ids, texts, meta, names, size = self._snapshot_rows()
+        queries = self._normalize(query_embeddings)
+        rows = self._filter_rows(search_filter, meta, size)
+        n = size if rows is None else len(rows)
+        if n == 0:
+            return [[] for _ in range(len(queries))]
+        k = min(top_k, n)
+        block = max(1, 2**25 // n)  # Bound the (queries x rows) score matrix to ~128 MiB
+        results = []
+        for start in range(0, len(queries), block):
+            batch = queries[start:start + block]
+            scores = batch @ matrix[:size].T if rows is None else self._score(matrix, rows, batch)
+            if k < n:
+                candidates = np.argpartition(-scores, k, axis=1)[:, :k]
+            else:
+                candidates = np.broadcast_to(np.arange(n), scores.shape)
+            order = np.argsort(-np.take_along_axis(scores, candidates, axis=1), axis=1)
+            best = np.take_along_axis(candidates, order, axis=1)
+            for row, columns in zip(scores, best):
+                hit_rows = columns if rows is None else rows[columns]
+                results.append([self._hit(r, row[i], ids, texts, meta, names, matrix[r] if with_vectors else None)
+                                for i, r in zip(columns, hit_rows)])
+        return results
+
+    def _rows(self, ids, stored, size):
+        """Row index of each wanted ID and whether it is stored."""
+        wanted = np.asarray(list(ids), dtype=np.int64)
+        rows = np.searchsorted(stored, wanted)  # IDs are assigned in increasing order
+        found = (rows < size) & (stored[np.minimum(rows, size - 1)] == wanted) if size else np.zeros(len(wanted), bool)
+        return wanted, rows, found
+
+    def get_texts(self, ids):
+        with self._lock:
+            stored, texts, size = self._ids[:self._size], self._texts, self._size
+        wanted, rows, found = self._rows(ids, stored, size)
+        return {int(doc_id): texts[row] for doc_id, row, ok in zip(wanted, rows, found) if ok}
+
+    def get_vectors(self, ids):
+        """Stored rows are L2-normalised copies of the inserted embeddings."""
+        with self._lock:
+            stored, matrix, size = self._ids[:self._size], self._matrix, self._size
+        wanted, rows, found = self._rows(ids, stored, size)
+        return {int(doc_id): np.array(matrix[row]) for doc_id, row, ok in zip(wanted, rows, found) if ok}
+
+    def get_metadata(self, ids):
+        with self._lock:
+            stored, meta, names, size = self._ids[:self._size], self._meta, self._names, self._size
+        wanted, rows, found = self._rows(ids, stored, size)
+        return {int(doc_id): self._record(meta[row], names) for doc_id, row, ok in zip(wanted, rows, found) if ok}
+
+    def count(self):
+        return self._size
+
+    def memory_bytes(self):
+        """Bytes of vector data scanned by every search (held in memory or, after a load, in the page cache)."""
+        return self._matrix[:self._size].nbytes
+
+
+class QuantizedVectorStore(LocalVectorStore):
+    """Local store that scans compact codes and reranks the best candidates at full precision.
+
+    Normalised rows are kept as float16 (2 bytes per dimension) or as int8
+    with one float32 scale per row (1 byte per dimension), instead of float32.
+    A search scores every row on the codes, takes the `rerank_factor * top_k`
+    best and rescores those exactly. The full-precision rows stay in
+    `<path>.npy`, in the same format as `LocalVectorStore`, so switching
+    precision needs no re-index. That file is memory-mapped, and only
+    reranked rows are read from it. Rows inserted since the last flush are
+    held in memory until then. Codes are rebuilt from the file on load.
+    """
+
+    BLOCK_ROWS = 256  # Rows decoded at a time while scanning; the float32 copy (1.5 MiB at 1536 dims) stays in cache
+
+    def __init__(self, path, dimension, precision="int8", rerank_factor=4):
+        if precision not in ("float16", "int8"):
+            raise ValueError(f"Unsupported precision {precision!r}; expected float16 or int8")
+        self.precision = precision
+        self.rerank_factor = max(1, rerank_factor)
+        super().__init__(path, dimension)
+
+    def _load(self):
+        super()._load()
+        # Full-precision rows: the memory-mapped file, then rows inserted since (`_tail`), addressed by `_physical`
+        self._full = self._matrix[:self._size]
+        self._tail = np.empty((0, self.dimension), dtype=np.float32)
+        self._tail_size = 0
+        self._physical = np.arange(self._size, dtype=np.int64)
+        self._matrix, self._scales = self._encode(self._full[:self._size])
+
+    def _encode(self, vectors):
+        """Codes (and int8 scales) of normalised rows, computed in blocks so a memory-mapped input is streamed."""
+        codes = np.empty(vectors.shape, dtype=np.float16 if self.precision == "float16" else np.int8)
+        scales = np.ones(len(vectors), dtype=np.float32)
+        for start in range(0, len(vectors), 65536):
+            block = np.asarray(vectors[start:start + 65536], dtype=np.float32)
+            if self.precision == "float16":
+                codes[start:start + len(block)] = block
+                continue
+            scale = np.abs(block).max(axis=1) / 127
+            scale[scale == 0] = 1.0
+            codes[start:start + len(block)] = np.rint(block / scale[:, None])
+            scales[start:start + len(block)] = scale
+        return codes, scales
+
+    @staticmethod
+    def _grown(array, needed, used):
+        """`array`, or a geometrically larger copy of its first `used` rows when it holds fewer than `needed`."""
+        if needed <= array.shape[0]:
+            return array
+        grown = np.empty((max(needed, 2 * array.shape[0], 1024),) + array.shape[1:], dtype=array.dtype)
+        grown[:used] = array[:used]
+        return grown
+
+    def _reserve(self, extra):
+        needed = self._size + extra
+        self._matrix = self._grown(self._matrix, needed, self._size)
+        self._scales = self._grown(self._scales, needed, self._size)
+        self._ids = self._grown(self._ids, needed, self._size)
+        self._meta = self._grown(self._meta, needed, self._size)
+        self._physical = self._grown(self._physical, needed, self._size)
+        self._tail = self._grown(self._tail, self._tail_size + extra, self._tail_size)
+
+    def _full_rows(self, physical, full, tail):
+        """Full-precision rows at `physical` positions (file rows first, then the in-memory tail)."""
+        physical = np.asarray(physical, dtype=np.int64)
+        rows = np.empty((len(physical), self.dimension), dtype=np.float32)
+        flushed = physical < len(full)
+        rows[flushed] = full[physical[flushed]]
+        rows[~flushed] = tail[physical[~flushed] - len(full)]
+        return rows
+
+    def insert(self, embeddings, texts, metadata=None):
+        vectors = self._normalize(embeddings)
+        codes, scales = self._encode(vectors)
+        with self._lock:
+            self._reserve(len(vectors))
+            start, stop = self._size, self._size + len(vectors)
+            new_ids = np.arange(self._next_id, self._next_id + len(vectors), dtype=np.int64)
+            self._matrix[start:stop] = codes
+            self._scales[start:stop] = scales
+            self._ids[start:stop] = new_ids
+            self._meta[start:stop] = self._meta_rows(metadata, len(vectors))
+            self._tail[self._tail_size:self._tail_size + len(vectors)] = vectors
+            self._physical[start:stop] = np.arange(len(self._full) + self._tail_size,
+                                                   len(self._full) + self._tail_size + len(vectors))
+            self._tail_size += len(vectors)
+            self._texts.extend(texts)
+            self._size = stop
+            self._next_id += len(vectors)
+        return new_ids.tolist()
+
+    def delete(self, ids):
+        """Remove rows by ID; their full-precision rows are dropped from the file on the next flush."""
+        with self._lock:
+            keep = ~np.isin(self._ids[:self._size], np.asarray(list(ids), dtype=np.int64))
+            removed = super().delete(ids)
+            if removed:
+                self._scales = self._scales[:len(keep)][keep]
+                self._physical = self._physical[:len(keep)][keep]
+            return removed
+
+    def clear(self):
+        with self._lock:
+            super().clear()
+            self._matrix, self._scales = self._encode(np.empty((0, self.dimension), dtype=np.float32))
+            self._full = self._tail = np.empty((0, self.dimension), dtype=np.float32)
+            self._tail_size = 0
+            self._physical = np.empty(0, dtype=np.int64)
+
+    def _save_matrix(self, path):
+        """Stream the full-precision rows into a new matrix file in row order."""
+        out = np.lib.format.open_memmap(path, mode="w+", dtype=np.float32, shape=(self._size, self.dimension))
+        for start in range(0, self._size, 65536):
+            physical = self._physical[start:min(start + 65536, self._size)]
+            out[start:start + len(physical)] = self._full_rows(physical, self._full, self._tail)
+        out.flush()
+        del out
+
+    def _unflushed_rows(self):
+        return self._tail[:self._tail_size]  # Rows inserted since the last flush, in insertion order
+
+    def _matrix_saved(self):
+        """Map the flushed matrix file in place of the old one and drop the in-memory tail."""
+        self._full = np.load(self.matrix_path, mmap_mode="r")
+        self._tail = np.empty((0, self.dimension), dtype=np.float32)
+        self._tail_size = 0
+        self._physical = np.arange(self._size, dtype=np.int64)
+
+    def _snapshot(self):
+        with self._lock:
+            return (self._matrix, self._scales, self._ids, self._texts, self._size,
+                    self._physical, self._full, self._tail, self._meta, self._names)
+
+    def _scan(self, queries, codes, scales, size):
+        """Approximate scores of every row, decoding `BLOCK_ROWS` codes at a time."""
+        scores = np.empty((len(queries), size), dtype=np.float32)
+        for start in range(0, size, self.BLOCK_ROWS):
+            stop = min(start + self.BLOCK_ROWS, size)
+            scores[:, start:stop] = queries @ codes[start:stop].astype(np.float32).T
+        if self.precision == "int8":
+            scores *= scales[:size]
+        return scores
+
+    def search(self, query_embedding, top_k=3, search_filter=None, with_vectors=False):
+        return self.search_many([query_embedding], top_k=top_k, search_filter=search_filter, with_vectors=with_vectors)[0]
+
+    def search_many(self, query_embeddings, top_k=3, search_filter=None, with_vectors=False):
+        """Scan the codes for `rerank_factor * top_k` candidates per query, then rank those at full precision."""
+        matrix, scales, ids, texts, size, physical, full, tail, meta, names = self._snapshot()
+        queries = self._normalize(query_embeddings)
+        rows = self._filter_rows(search_filter, meta, size)
+        if rows is None:
+            rows = np.arange(size)
+        else:  # A filtered search decodes and scores only the passing rows
+            matrix, scales = matrix[rows], scales[rows]
+        n = len(rows)
+        if n == 0:
+            return [[] for _ in range(len(queries))]
+        k = min(top_k, n)
+        candidates_k = min(n, k * self.rerank_factor)
+        block = max(1, 2**25 // n)  # Bound the (queries x rows) score matrix to ~128 MiB
+        results = []
+        for start in range(0, len(queries), block):
+            batch = queries[start:start + block]
+            scores = self._scan(batch, matrix, scales, n)
+            if candidates_k < n:
+                candidates = np.argpartition(-scores, candidates_k - 1, axis=1)[:, :candidates_k]
+            else:
+                candidates = np.broadcast_to(np.arange(n), scores.shape)
+            for query, positions in zip(batch, candidates):
+                candidate_rows = rows[positions]
+                vectors = self._full_rows(physical[candidate_rows], full, tail)
+                exact = vectors @ query
+                results.append([self._hit(candidate_rows[i], exact[i], ids, texts, meta, names,
+                                          vectors[i] if with_vectors else None)
+                                for i in np.argsort(-exact)[:k]])
+        return results
+
+    def get_vectors(self, ids):
+        """Full-precision (L2-normalised) rows, not their codes."""
+        _, _, stored, _, size, physical, full, tail, _, _ = self._snapshot()
+        wanted, rows, found = self._rows(ids, stored[:size], size)
+        vectors = self._full_rows(physical[rows[found]], full, tail)
+        return {int(doc_id): vector for doc_id, vector in zip(wanted[found], vectors)}
+
+    def memory_bytes(self):
+        """Bytes held in memory: codes, scales, row positions and unflushed full-precision rows."""
+        return (self._matrix[:self._size].nbytes + self._scales[:self._size].nbytes
+                + self._physical[:self._size].nbytes + self._tail[:self._tail_size].nbytes)
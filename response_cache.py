@@ -0,0 +1,131 @@
+import hashlib
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+
+
+def normalize_text(text):
+    """Normalise text so resubmissions differing only in whitespace or Unicode form share an entry."""
+    return " ".join(unicodedata.normalize("NFKC", text).split())
+
+
+class ResponseCache:
+    """Two-tier cache of LLM responses for repeated inputs.
+
+    Entries are keyed by a SHA-256 of (endpoint, system prompt, normalised
+    text, deployment, max_tokens, temperature). The first tier is an
+    in-process LRU. The optional second tier is a SQLite file that survives
+    restarts and is shared by every worker on the host. Both tiers expire
+    entries after `ttl` seconds. Requests sampled above `max_temperature`
+    are meant to vary between calls, so they bypass the cache.
+
+    SQLite is used under its own lock, so memory-tier lookups and counters
+    never wait on a disk write.
+    """
+
+    def __init__(self, max_entries=1024, path=None, ttl=86400, max_temperature=0.5):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_temperature = max_temperature
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.bypassed = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()  # Memory tier and counters
+        self._db_lock = threading.Lock()  # SQLite tier
+        self._conn = None
+        if path:
+            self._conn = sqlite3.connect(path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "key BLOB PRIMARY KEY, response TEXT NOT NULL, created REAL NOT NULL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS responses_created ON responses (created)")
+            self._conn.commit()
+
+    @staticmethod
+    def key(endpoint, system_prompt, text, deployment, max_tokens, temperature):
+        payload = "\x00".join([endpoint, system_prompt, normalize_text(text), deployment, str(max_tokens), repr(float(temperature))])
+        return hashlib.sha256(payload.encode("utf-8")).digest()
+
+    def cacheable(self, temperature):
+        """False (and counted as a bypass) when sampling is too random for a stored answer to stand in."""
+        if temperature > self.max_temperature or (self.max_entries <= 0 and self._conn is None):
+            with self._lock:
+                self.bypassed += 1
+            return False
+        return True
+
+    def get(self, key):
+        """Return the cached response, or None on a miss."""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and now - entry[1] <= self.ttl:
+                self._entries.move_to_end(key)
+                self.memory_hits += 1
+                return entry[0]
+            self._entries.pop(key, None)
+        row = None
+        if self._conn is not None:
+            with self._db_lock:
+                row = self._conn.execute(
+                    "SELECT response, created FROM responses WHERE key = ? AND created >= ?", (key, now - self.ttl)
+                ).fetchone()
+        with self._lock:
+            if row is not None:
+                self._remember(key, row[0], row[1])  # Promote to the memory tier
+                self.disk_hits += 1
+                return row[0]
+            self.misses += 1
+            return None
+
+    def put(self, key, response):
+        now = time.time()
+        with self._lock:
+            self._remember(key, response, now)
+        if self._conn is not None:
+            with self._db_lock:
+                self._conn.execute("INSERT OR REPLACE INTO responses (key, response, created) VALUES (?, ?, ?)",
+                                   (key, response, now))
+                self._conn.execute("DELETE FROM responses WHERE created < ?", (now - self.ttl,))
+                self._conn.commit()
+
+    def _remember(self, key, response, created):
+        if self.max_entries <= 0:
+            return
+        self._entries[key] = (response, created)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+        if self._conn is not None:
+            with self._db_lock:
+                self._conn.execute("DELETE FROM responses")
+                self._conn.commit()
+
+    def stats(self):
+        with self._lock:
+            hits = self.memory_hits + self.disk_hits
+            total = hits + self.misses
+            stats = {
+                "hits": hits,
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "bypassed": self.bypassed,
+                "hit_rate": hits / total if total else 0.0,
+                "entries": len(self._entries)
+            }
+        if self._conn is not None:
+            with self._db_lock:
+                (stats["disk_entries"],) = self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()
+        return stats
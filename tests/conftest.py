@@ -0,0 +1,5 @@
+import os
+import sys
+
+# The shared modules are imported as the repo-level `neuradocs` package
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,39 @@
+import pytest
+from neuradocs.ann_index import INDEX_TYPES, index_params, memory_estimate, same_index, search_params
+
+
+def test_each_index_type_gets_only_its_own_parameters():
+    assert index_params("flat") == {"index_type": "FLAT", "metric_type": "COSINE", "params": {}}
+    assert index_params("IVF_SQ8", "IP", nlist=256)["params"] == {"nlist": 256}
+    assert index_params("IVF_PQ", nlist=128, pq_m=64, dim=1536)["params"] == {"nlist": 128, "m": 64, "nbits": 8}
+    assert index_params("HNSW", hnsw_m=32)["params"] == {"M": 32, "efConstruction": 200}
+
+    assert search_params("FLAT") == {"metric_type": "COSINE", "params": {}}
+    assert search_params("IVF_PQ", nprobe=32)["params"] == {"nprobe": 32}
+    assert search_params("hnsw", "L2", ef=128) == {"metric_type": "L2", "params": {"ef": 128}}
+
+
+def test_unknown_types_and_invalid_pq_splits_are_rejected():
+    with pytest.raises(ValueError, match="IVF_PQ needs m dividing"):
+        index_params("IVF_PQ", pq_m=100, dim=1536)
+    for build in (index_params, search_params):
+        with pytest.raises(ValueError, match="Unknown index type 'DISKANN'"):
+            build("DISKANN")
+
+
+def test_same_index_accepts_the_servers_string_and_flattened_forms():
+    wanted = index_params("HNSW", hnsw_m=16, ef_construction=200)
+    assert same_index({"index_type": "HNSW", "metric_type": "COSINE", "params": '{"M": "16", "efConstruction": "200"}'},
+                      wanted)
+    assert same_index({"index_type": "hnsw", "metric_type": "COSINE", "M": 16, "efConstruction": 200}, wanted)
+    assert not same_index({"index_type": "HNSW", "metric_type": "COSINE", "params": {"M": 8, "efConstruction": 200}},
+                          wanted)
+    assert not same_index({"index_type": "HNSW", "metric_type": "IP", "params": wanted["params"]}, wanted)
+    assert not same_index(None, wanted)
+
+
+def test_memory_estimates_order_the_index_types_by_compression():
+    estimates = {index_type: memory_estimate(index_type, 100_000, 1536, pq_m=96) for index_type in INDEX_TYPES}
+    assert estimates["FLAT"] == 100_000 * 1536 * 4
+    assert estimates["IVF_PQ"] < estimates["IVF_SQ8"] < estimates["FLAT"] < estimates["IVF_FLAT"]
+    assert estimates["HNSW"] > estimates["FLAT"]
@@ -0,0 +1,97 @@
+import asyncio
+import threading
+import time
+from types import SimpleNamespace
+import pytest
+from neuradocs.chunker import get_tokenizer
+from neuradocs.lazy_resource import LazyResource, warm_up
+from response_cache import ResponseCache
+from map_reduce_summary import AsyncMapReduceSummarizer
+
+BLOCK = 0.3  # Seconds each slow call holds its thread
+MAX_LAG = 0.15  # Longest the event loop may stall while one is in progress
+
+
+def run_with_ticker(make_coro):
+    """Run `make_coro()` next to a 10 ms ticker; return its result and the longest gap between ticks."""
+    async def main():
+        stop, gaps = asyncio.Event(), []
+
+        async def tick():
+            last = time.perf_counter()
+            while not stop.is_set():
+                await asyncio.sleep(0.01)
+                now = time.perf_counter()
+                gaps.append(now - last)
+                last = now
+
+        ticker = asyncio.create_task(tick())
+        await asyncio.sleep(0.02)
+        result = await make_coro()
+        stop.set()
+        await ticker
+        return result, max(gaps)
+    return asyncio.run(main())
+
+
+class SlowCache(ResponseCache):
+    """Memory-only ResponseCache whose reads and writes block like a busy SQLite file."""
+
+    def get(self, key):
+        time.sleep(BLOCK)
+        return super().get(key)
+
+    def put(self, key, response):
+        time.sleep(BLOCK)
+        super().put(key, response)
+
+
+@pytest.fixture
+def clean_api_async(monkeypatch):
+    monkeypatch.setenv("WARM_UP", "false")
+    import CleanAPI_async
+    return CleanAPI_async
+
+
+def test_cached_response_does_not_block_the_event_loop(clean_api_async, monkeypatch):
+    cache = SlowCache()
+    monkeypatch.setattr(clean_api_async, "response_cache", cache)
+    key = cache.key("summary", "system", "text", "gpt-35-turbo", 200, 0.0)
+    cache.put(key, "cached summary")
+
+    request = SimpleNamespace(query_params={})
+    response, lag = run_with_ticker(lambda: clean_api_async.respond(
+        request, {}, "summary", "system", "Summarize: text", max_tokens=200, temperature=0.0, cache_text="text"))
+    assert response.body == b'{"summary":"cached summary"}'
+    assert lag < MAX_LAG
+
+
+def test_map_reduce_cache_calls_do_not_block_the_event_loop():
+    calls = []
+
+    async def complete(system_prompt, user_prompt, max_tokens, temperature, name="chat"):
+        calls.append(user_prompt)
+        return f"summary of {user_prompt}"
+
+    summarizer = AsyncMapReduceSummarizer(complete, SlowCache(), "gpt-35-turbo", segment_tokens=1000, temperature=0.0)
+    get_tokenizer(summarizer.encoding_name)  # Loaded once per process, not what this measures
+    partials, lag = run_with_ticker(lambda: summarizer.reduce(["first", "second"]))
+    assert partials == "summary of first\n\nsummary of second"
+    assert len(calls) == 2
+    assert lag < MAX_LAG
+
+
+def test_lazy_resource_waits_for_warm_up_off_the_event_loop():
+    started = threading.Event()
+
+    def build():
+        started.set()
+        time.sleep(BLOCK)
+        return "client"
+
+    resource = LazyResource("slow", build)
+    warm_up([resource])
+    started.wait()
+    value, lag = run_with_ticker(resource.get_async)
+    assert value == "client"
+    assert lag < MAX_LAG
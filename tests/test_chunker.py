@@ -0,0 +1,17 @@
+from neuradocs.chunker import chunk_pages
+
+
+def test_long_spaceless_run_is_split_under_max_bytes():
+    chunks = list(chunk_pages([(1, "a" * 100000)], max_bytes=4000))
+    assert all(len(chunk.text.encode("utf-8")) <= 4000 for chunk in chunks)
+    assert "".join(chunk.text for chunk in chunks).count("a") >= 100000  # Overlap may repeat a piece
+
+
+def test_cjk_text_is_split_under_max_bytes_on_character_boundaries():
+    text = "中文" * 20000
+    chunks = list(chunk_pages([(3, text)], max_bytes=4000))
+    assert len(chunks) > 1
+    for chunk in chunks:
+        assert len(chunk.text.encode("utf-8")) <= 4000
+        assert set(chunk.text) <= {"中", "文", " "}  # No character was cut in half (pieces are joined by spaces)
+        assert (chunk.page_start, chunk.page_end) == (3, 3)
@@ -0,0 +1,48 @@
+import numpy as np
+from neuradocs.context_packer import ContextPacker, mmr_select
+
+QUERY = np.array([1.0, 0.0, 0.0])
+
+
+def test_mmr_prefers_a_diverse_second_pick_over_a_near_copy():
+    vectors = [[1.0, 0.0, 0.0], [0.99, 0.14, 0.0], [0.8, 0.0, 0.6]]
+    assert mmr_select(QUERY, vectors, k=2, diversity=0.7, duplicate_threshold=1.0) == [0, 2]
+    assert mmr_select(QUERY, vectors, k=2, diversity=0.0, duplicate_threshold=1.0) == [0, 1]  # Relevance only
+
+
+def test_mmr_drops_near_duplicates_and_weighs_the_prior():
+    vectors = [[1.0, 0.0, 0.0], [1.0, 0.01, 0.0], [0.0, 1.0, 0.0]]
+    assert mmr_select(QUERY, vectors, k=3, diversity=0.3, duplicate_threshold=0.95) == [0, 2]
+    # A strong retrieval rank (e.g. an exact BM25 match) can outweigh a weaker embedding match
+    assert mmr_select(QUERY, [[0.6, 0.8, 0.0], [1.0, 0.0, 0.0]], k=1, diversity=0.0, prior=[1.0, 0.0]) == [0]
+
+
+def test_pack_dedupes_trims_and_fits_the_budget():
+    packer = ContextPacker(token_budget=60, max_chunks=4, sentence_window=0, min_chunk_tokens=8)
+    hits = [
+        {"id": 1, "text": "Error E42 means the fan failed. Replace the fan. Unrelated sentence about paint colours."},
+        {"id": 2, "text": "error e42 means the fan failed.  Replace the fan. Unrelated sentence about paint colours."},
+        {"id": 3, "text": "Error E42 means the fan failed. To reset after E42, hold the power button."},
+        {"id": 4, "text": "No vector is stored for this chunk."},
+    ]
+    vectors = {1: [1.0, 0.0, 0.0], 2: [1.0, 0.0, 0.0], 3: [0.9, 0.43, 0.0]}
+    chunks, stats = packer.pack("What does error E42 mean?", QUERY, hits, vectors)
+
+    assert stats["ids"] == [1, 3]  # 2 repeats 1's text, 4 has no vector
+    assert (stats["candidates"], stats["unique"]) == (4, 2)
+    assert chunks[0] == "Error E42 means the fan failed."
+    assert chunks[1] == "To reset after E42, hold the power button."  # The sentence shared with chunk 1 is skipped
+    assert stats["context_tokens"] <= 60
+
+
+def test_last_chunk_is_cut_to_the_remaining_budget():
+    packer = ContextPacker(max_chunks=2, sentence_window=5, min_chunk_tokens=4)
+    long_text = " ".join(f"Step {i} of the E42 repair." for i in range(40))
+    hits = [{"id": 1, "text": "E42 is a fan fault."}, {"id": 2, "text": long_text}]
+    vectors = {1: [1.0, 0.0, 0.0], 2: [0.6, 0.8, 0.0]}
+    chunks, stats = packer.pack("E42", QUERY, hits, vectors, budget=30)
+
+    assert stats["ids"] == [1, 2]
+    assert long_text.startswith(chunks[1]) and len(chunks[1]) < len(long_text)
+    assert packer.count(chunks[0]) + packer.count(chunks[1]) == stats["context_tokens"] <= 30
+    assert packer.pack("E42", QUERY, hits, vectors, budget=packer.count(chunks[0]) + 2)[1]["ids"] == [1]
@@ -0,0 +1,87 @@
+from types import SimpleNamespace
+import httpx
+import openai
+import pytest
+from neuradocs import embedding_batcher
+from neuradocs.embedding_batcher import EmbeddingBatcher
+
+
+def api_error(error_class, status, headers=None):
+    response = httpx.Response(status, headers=headers, request=httpx.Request("POST", "https://example.invalid"))
+    return error_class(f"HTTP {status}", response=response, body=None)
+
+
+class FakeClient:
+    """Embeds each text as [len(text)], raising the queued errors first; returns items out of order like Azure may."""
+
+    def __init__(self, errors=()):
+        self.errors = list(errors)
+        self.batches = []
+        self.embeddings = self
+
+    def with_options(self, max_retries):
+        return self
+
+    def create(self, input, model):
+        if self.errors:
+            raise self.errors.pop(0)
+        self.batches.append(list(input))
+        data = [SimpleNamespace(index=i, embedding=[float(len(text))]) for i, text in enumerate(input)]
+        return SimpleNamespace(data=data[::-1], usage=SimpleNamespace(prompt_tokens=len(input)))
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    delays = []
+    monkeypatch.setattr(embedding_batcher, "time", SimpleNamespace(sleep=delays.append))
+    return delays
+
+
+def test_batches_are_capped_by_tokens_and_items():
+    batcher = EmbeddingBatcher(FakeClient(), "model", max_batch_tokens=10, max_batch_items=3)
+    texts = ["one two three four", "five six", "seven", "eight", "nine", "a b c d e f g h i j k l"]
+    batches = batcher.make_batches(texts)
+    assert [i for batch in batches for i in batch] == list(range(len(texts)))
+    for batch in batches:
+        assert len(batch) <= 3
+        assert len(batch) == 1 or sum(batcher.tokenizer.count(texts[i]) for i in batch) <= 10
+    assert batches[-1] == [5]  # Over the token cap on its own: sent alone rather than dropped
+
+
+def test_vectors_come_back_in_input_order():
+    client = FakeClient()
+    batcher = EmbeddingBatcher(client, "model", max_batch_items=2, max_concurrency=3)
+    texts = ["a" * n for n in range(1, 8)]
+    assert batcher.embed(texts) == [[float(n)] for n in range(1, 8)]
+    assert len(client.batches) == 4
+    assert (batcher.requests, batcher.tokens) == (4, 7)
+
+
+def test_rate_limits_are_retried_after_the_requested_delay(sleeps):
+    errors = [api_error(openai.RateLimitError, 429, {"retry-after": "7"}),
+              api_error(openai.InternalServerError, 503)]
+    batcher = EmbeddingBatcher(FakeClient(errors), "model", base_delay=1.0, max_delay=60.0)
+    assert batcher.embed(["text"]) == [[4.0]]
+    assert batcher.retries == 2
+    assert 7 <= sleeps[0] <= 8  # Retry-After plus up to `base_delay` of jitter
+    assert 0 <= sleeps[1] <= 2  # Exponential backoff for attempt 1
+
+
+def test_retry_after_is_capped_by_max_delay(sleeps):
+    errors = [api_error(openai.RateLimitError, 429, {"retry-after-ms": "90000"})]
+    batcher = EmbeddingBatcher(FakeClient(errors), "model", base_delay=0.5, max_delay=30.0)
+    batcher.embed(["text"])
+    assert 30 <= sleeps[0] <= 30.5
+
+
+def test_client_errors_and_exhausted_retries_are_raised(sleeps):
+    batcher = EmbeddingBatcher(FakeClient([api_error(openai.BadRequestError, 400)]), "model")
+    with pytest.raises(openai.BadRequestError):
+        batcher.embed(["text"])
+    assert sleeps == []
+
+    errors = [api_error(openai.RateLimitError, 429) for _ in range(3)]
+    batcher = EmbeddingBatcher(FakeClient(errors), "model", max_retries=2)
+    with pytest.raises(openai.RateLimitError):
+        batcher.embed(["text"])
+    assert len(sleeps) == 2
@@ -0,0 +1,13 @@
+from neuradocs.embedding_cache import EmbeddingCache
+
+
+def test_entry_count_tracks_inserts_replacements_and_eviction(tmp_path):
+    cache = EmbeddingCache(str(tmp_path / "cache.sqlite3"), "model", 2, max_entries=10)
+    cache.put_many([f"text {i}" for i in range(8)], [[float(i), 0.0] for i in range(8)])
+    cache.put_many(["text 0", "text 1"], [[0.0, 0.0], [1.0, 0.0]])  # Replacements do not add entries
+    assert cache.stats()["entries"] == 8
+
+    cache.put_many([f"more {i}" for i in range(5)], [[0.0, 1.0]] * 5)  # 13 > 10: evict down to 9
+    assert cache.stats()["entries"] == 9
+    assert cache._count_entries() == 9
+    assert EmbeddingCache(str(tmp_path / "cache.sqlite3"), "model", 2, max_entries=10).stats()["entries"] == 9
@@ -0,0 +1,64 @@
+import importlib.util
+import os
+import numpy as np
+import openai
+import pytest
+from openai import AzureOpenAI
+
+# The benchmark stand-in lives beside the benchmarks, not in the package
+spec = importlib.util.spec_from_file_location("fake_openai", os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "Document_processing_api", "fake_openai.py"))
+fake_openai = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(fake_openai)
+
+
+@pytest.fixture
+def serve():
+    servers = []
+
+    def start(**options):
+        server = fake_openai.FakeOpenAIServer(embedding_latency=0, chat_latency=0, dim=64, **options).start()
+        servers.append(server)
+        client = AzureOpenAI(azure_endpoint=server.url, api_key="k", api_version="2024-02-01", max_retries=0)
+        return server, client
+
+    yield start
+    for server in servers:
+        server.stop()
+
+
+def test_fake_embeddings_are_deterministic_and_rank_shared_words_first():
+    query = fake_openai.fake_embedding("reset the router", 64)
+    assert query == fake_openai.fake_embedding("reset the router", 64)
+    assert np.linalg.norm(query) == pytest.approx(1.0, abs=1e-5)
+    related, unrelated = (np.dot(query, fake_openai.fake_embedding(text, 64))
+                          for text in ("how to reset a router", "quarterly revenue grew"))
+    assert related > unrelated
+
+
+def test_serves_embeddings_and_chat_to_the_azure_client(serve):
+    server, client = serve()
+    response = client.embeddings.create(model="embedding", input=["alpha", "beta"])
+    assert [item.embedding for item in response.data] == [fake_openai.fake_embedding(text, 64)
+                                                           for text in ("alpha", "beta")]
+
+    completion = client.chat.completions.create(model="chat", messages=[{"role": "user", "content": "Hello"}])
+    assert completion.choices[0].message.content.startswith("Fake answer")
+    assert completion.usage.total_tokens == completion.usage.prompt_tokens + completion.usage.completion_tokens
+
+    stream = client.chat.completions.create(model="chat", messages=[{"role": "user", "content": "Hello"}],
+                                            stream=True)
+    streamed = "".join(chunk.choices[0].delta.content or "" for chunk in stream if chunk.choices)
+    assert streamed.strip() == completion.choices[0].message.content
+    assert server.counts == {"embeddings": 1, "chat": 2, "throttled": 0}
+
+
+def test_requests_over_the_rate_limit_get_429_with_retry_after(serve):
+    server, client = serve(rpm=12)  # A burst of two requests
+    for _ in range(2):
+        client.embeddings.create(model="embedding", input="alpha")
+    with pytest.raises(openai.RateLimitError) as caught:
+        client.embeddings.create(model="embedding", input="alpha")
+    assert int(caught.value.response.headers["Retry-After"]) >= 1
+    assert int(caught.value.response.headers["retry-after-ms"]) > 0
+    assert server.counts["throttled"] == 1 and server.counts["embeddings"] == 2
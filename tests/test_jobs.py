@@ -0,0 +1,104 @@
+import threading
+import pytest
+from neuradocs.jobs import JobManager, JobCancelled, JobQueueFull
+
+
+def wait_finished(job, timeout=5):
+    for _ in range(int(timeout / 0.01)):
+        if job.finished:
+            return
+        threading.Event().wait(0.01)
+    raise AssertionError(f"job {job.id} did not finish")
+
+
+class BlockingRun:
+    """`run_job` that stores one chunk per file, pausing after the first until released."""
+
+    def __init__(self):
+        self.started = threading.Event()
+        self.release = threading.Event()
+        self.stored = []
+
+    def __call__(self, job):
+        for progress in job.files.values():
+            job.check_cancelled()
+            progress.status = "running"
+            self.stored.append(progress.file_name)
+            self.started.set()
+            self.release.wait(5)
+            try:
+                job.check_cancelled()
+            except JobCancelled:
+                self.stored.remove(progress.file_name)  # Roll back the file's partial work
+                progress.status = "cancelled"
+                raise
+            progress.status = "done"
+
+
+def test_running_job_stops_at_its_next_checkpoint_and_rolls_back():
+    run = BlockingRun()
+    jobs = JobManager(run)
+    job = jobs.submit(["a.pdf", "b.pdf"])
+    run.started.wait(5)
+
+    assert jobs.cancel(job.id) is job
+    assert job.status == "running" and job.cancelled  # Cancellation is cooperative
+    run.release.set()
+    wait_finished(job)
+    assert job.status == "cancelled"
+    assert run.stored == []
+    assert [f["status"] for f in job.to_dict()["files"]] == ["cancelled", "queued"]
+
+
+def test_queued_job_is_cancelled_without_running():
+    run = BlockingRun()
+    jobs = JobManager(run, max_workers=1)
+    first = jobs.submit(["a.pdf"])
+    run.started.wait(5)
+    second = jobs.submit(["b.pdf"])
+
+    jobs.cancel(second.id)
+    assert second.finished and second.status == "cancelled"
+    assert second.files["b.pdf"].status == "cancelled"
+    run.release.set()
+    wait_finished(first)
+    jobs._executor.shutdown(wait=True)
+    assert run.stored == ["a.pdf"]  # The cancelled job never started
+    assert first.status == "completed"
+
+
+def test_failures_are_reported_per_file_and_per_job():
+    def run(job):
+        job.files["bad.pdf"].status = "failed"
+        job.files["good.pdf"].status = "done"
+
+    jobs = JobManager(run)
+    job = jobs.submit(["good.pdf", "bad.pdf"])
+    wait_finished(job)
+    assert job.status == "completed_with_errors"
+
+    def crash(job):
+        raise RuntimeError("extraction pool died")
+
+    job = JobManager(crash).submit(["a.pdf"])
+    wait_finished(job)
+    assert (job.status, job.error) == ("failed", "extraction pool died")
+
+
+def test_claimed_files_and_the_job_limit():
+    run = BlockingRun()
+    jobs = JobManager(run, max_jobs=2)
+    first = jobs.submit(["a.pdf", "b.pdf"])
+    run.started.wait(5)
+
+    assert jobs.submit(["a.pdf"]) is None  # Every file is claimed by the unfinished job
+    second = jobs.submit(["b.pdf", "c.pdf"])
+    assert list(second.files) == ["c.pdf"]
+    with pytest.raises(JobQueueFull):
+        jobs.submit(["d.pdf"])
+
+    run.release.set()
+    wait_finished(first)
+    wait_finished(second)
+    assert not jobs.has_active()
+    assert jobs.submit(["d.pdf"]) is not None
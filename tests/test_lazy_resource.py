@@ -0,0 +1,91 @@
+import threading
+import time
+from types import SimpleNamespace
+import pytest
+from neuradocs import lazy_resource
+from neuradocs.lazy_resource import LazyResource, readiness, warm_up
+
+
+class Factory:
+    """Fails `failures` times, then returns a client; counts its calls."""
+
+    def __init__(self, failures=0):
+        self.failures = failures
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        if self.calls <= self.failures:
+            raise ConnectionError("connection refused")
+        return SimpleNamespace(ping=lambda: "pong", items=[1, 2, 3])
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = SimpleNamespace(value=100.0)
+    monkeypatch.setattr(lazy_resource, "time", SimpleNamespace(monotonic=lambda: now.value, perf_counter=time.perf_counter))
+    return now
+
+
+def test_built_once_on_first_use_and_forwards_attributes():
+    factory = Factory()
+    resource = LazyResource("client", factory)
+    assert factory.calls == 0
+    assert resource.ping() == "pong"
+    assert resource.items == [1, 2, 3]
+    assert factory.calls == 1
+    assert resource.status()["ready"]
+
+
+def test_failed_build_fails_fast_until_the_retry_interval(clock):
+    factory = Factory(failures=1)
+    resource = LazyResource("milvus", factory, retry_interval=5.0)
+    with pytest.raises(ConnectionError):
+        resource.get()
+    clock.value += 4
+    with pytest.raises(RuntimeError, match="milvus is unavailable: connection refused"):
+        resource.get()
+    assert factory.calls == 1  # No second connect attempt inside the interval
+    assert resource.status() == {"ready": False, "seconds": None, "error": "connection refused"}
+
+    clock.value += 2
+    assert resource.ping() == "pong"
+    assert factory.calls == 2
+    assert resource.status()["error"] is None
+
+
+def test_concurrent_first_uses_share_one_build():
+    started, release, calls = threading.Event(), threading.Event(), []
+
+    def slow():
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        return "client"
+
+    resource = LazyResource("slow", slow)
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(resource.get())) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    started.wait(5)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+    assert results == ["client"] * 4
+    assert len(calls) == 1
+
+
+def test_readiness_reports_503_and_retries_in_the_background():
+    factory = Factory(failures=1)
+    resource = LazyResource("gateway", factory, retry_interval=0)
+    warm_up([resource], background=False)  # Logged, not raised
+    body, status = readiness([resource])
+    assert status == 503 and body["resources"]["gateway"]["error"] == "connection refused"
+
+    for _ in range(500):  # The probe started a background rebuild
+        if resource.ready:
+            break
+        threading.Event().wait(0.01)
+    assert readiness([resource])[1] == 200
+    assert factory.calls == 2
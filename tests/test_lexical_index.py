@@ -0,0 +1,42 @@
+import pytest
+from neuradocs.lexical_index import BM25Index
+
+
+def test_common_terms_are_skipped_when_the_query_has_rarer_ones():
+    index = BM25Index()
+    # "error" is in every chunk, "refund" in one; the chunk with "error" three times must not outrank it
+    index.add([1, 2, 3, 4], ["error error error sync", "error refund", "error install", "error login"])
+    hits = index.search("error refund", top_k=4)
+    assert [doc_id for doc_id, _ in hits] == [2]
+
+
+def test_common_terms_are_kept_when_the_query_has_nothing_rarer():
+    index = BM25Index()
+    index.add([1, 2, 3], ["error error error", "error sync", "error install"])
+    hits = index.search("error", top_k=3)
+    assert {doc_id for doc_id, _ in hits} == {1, 2, 3}
+    assert hits[0][0] == 1
+
+
+def test_deleted_documents_do_not_count_towards_document_frequency():
+    index = BM25Index()
+    index.add(range(1, 11), [f"error code {i}" for i in range(1, 11)])
+    index.add([11, 12], ["refund policy", "refund window"])
+    index.delete(range(1, 9))  # Tombstoned, not compacted: "error" keeps 10 postings for 4 live chunks
+
+    hits = index.search("error", top_k=10)
+    assert {doc_id for doc_id, _ in hits} == {9, 10}
+    assert all(score > 0 for _, score in hits)
+
+    fresh = BM25Index()
+    fresh.add([9, 10, 11, 12], ["error code 9", "error code 10", "refund policy", "refund window"])
+    for (doc_id, score), (fresh_id, fresh_score) in zip(hits, fresh.search("error", top_k=10)):
+        assert doc_id == fresh_id and score == pytest.approx(fresh_score)
+
+
+def test_a_term_only_in_deleted_documents_matches_nothing():
+    index = BM25Index()
+    index.add([1, 2, 3], ["legacy importer", "error sync", "error install"])
+    index.delete([1])
+    assert index.search("legacy", top_k=3) == []
+    assert [doc_id for doc_id, _ in index.search("legacy sync", top_k=3)] == [2]
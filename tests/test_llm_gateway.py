@@ -0,0 +1,195 @@
+import asyncio
+import time
+from types import SimpleNamespace
+import httpx
+import openai
+import pytest
+from neuradocs import llm_gateway
+from neuradocs.llm_gateway import LLMGateway, StreamRelay, AsyncStreamRelay, TokenBucket
+
+
+def api_error(error_class, status, headers=None):
+    request = httpx.Request("POST", "https://example.invalid")
+    if status is None:  # Connection-level errors carry no response
+        return error_class(request=request)
+    return error_class(f"HTTP {status}", response=httpx.Response(status, headers=headers, request=request), body=None)
+
+
+def chunk(content):
+    return SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=content))])
+
+
+class FakeStream:
+    """Upstream stream that yields `contents` (raising an exception instance in their place) and counts closes."""
+
+    def __init__(self, contents):
+        self.contents = contents
+        self.closes = 0
+
+    def __iter__(self):
+        for content in self.contents:
+            if isinstance(content, Exception):
+                raise content
+            yield chunk(content)
+
+    def close(self):
+        self.closes += 1
+
+
+class FakeAsyncStream(FakeStream):
+    async def _chunks(self):
+        for content in self.contents:
+            if content is None:
+                await asyncio.Event().wait()  # Stalls until cancelled
+            yield chunk(content)
+
+    def __aiter__(self):
+        return self._chunks()
+
+    async def close(self):
+        self.closes += 1
+
+
+@pytest.fixture
+def gateway():
+    return LLMGateway("https://example.invalid", "key", "2024-05-01-preview")
+
+
+def relay(gateway, stream, relay_class=StreamRelay):
+    return relay_class(stream, gateway, "chat", "gpt", time.perf_counter(), 10, 0, 0.0)
+
+
+def calls(gateway):
+    return gateway.stats()["by_name"].get("chat", {"calls": 0})
+
+
+def test_exhausted_stream_is_closed_and_recorded_once(gateway):
+    stream = FakeStream(["a", "b", "c"])
+    chunks = relay(gateway, stream)
+    assert [c.choices[0].delta.content for c in chunks] == ["a", "b", "c"]
+    chunks.close()
+    assert stream.closes == 1
+    stats = calls(gateway)
+    assert (stats["calls"], stats["errors"], stats["completion_tokens"]) == (1, 0, 3)
+    assert stats["first_token_ms"]
+
+
+def test_stream_closed_before_the_first_chunk_is_recorded(gateway):
+    stream = FakeStream(["a"])
+    relay(gateway, stream).close()
+    assert stream.closes == 1
+    assert calls(gateway)["calls"] == 1
+
+
+def test_abandoned_stream_is_closed_when_its_consumer_is_dropped(gateway):
+    stream = FakeStream(["a", "b", "c"])
+    deltas = (c.choices[0].delta.content for c in relay(gateway, stream))
+    assert next(deltas) == "a"
+    del deltas  # The client disconnected after the first delta
+    assert stream.closes == 1
+    assert calls(gateway)["completion_tokens"] == 1
+
+
+def test_failed_stream_is_recorded_as_an_error(gateway):
+    stream = FakeStream(["a", ConnectionError("reset")])
+    with pytest.raises(ConnectionError):
+        list(relay(gateway, stream))
+    assert stream.closes == 1
+    assert calls(gateway)["errors"] == 1
+    assert gateway.stats()["recent"][-1]["error"] == "reset"
+
+
+def test_cancelled_async_stream_is_closed_and_recorded(gateway):
+    stream = FakeAsyncStream(["a", None])
+
+    async def main():
+        chunks = relay(gateway, stream, AsyncStreamRelay)
+
+        async def consume():
+            async for _ in chunks:
+                pass
+        task = asyncio.create_task(consume())
+        await asyncio.sleep(0.01)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        await chunks.aclose()
+    asyncio.run(main())
+    assert stream.closes == 1
+    stats = calls(gateway)
+    assert (stats["calls"], stats["errors"], stats["completion_tokens"]) == (1, 0, 1)
+
+
+class FakeClock:
+    """`time.monotonic`/`time.sleep` pair where sleeping advances the clock instantly."""
+
+    def __init__(self):
+        self.now = 1000.0
+        self.sleeps = []
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(llm_gateway, "time", SimpleNamespace(monotonic=fake.monotonic, sleep=fake.sleep,
+                                                             perf_counter=time.perf_counter))
+    return fake
+
+
+def raising(error):
+    def call(**params):
+        raise error
+    return call
+
+
+def test_token_bucket_allows_a_burst_then_paces_to_the_rate(clock):
+    bucket = TokenBucket(per_minute=600)  # 10 per second, bursts of 100
+    assert sum(bucket.acquire(10) for _ in range(10)) == 0
+    assert bucket.acquire(10) == pytest.approx(1.0)
+    assert bucket.acquire(5) == pytest.approx(0.5)
+    assert TokenBucket(per_minute=0).acquire(10 ** 9) == 0
+
+
+def test_request_larger_than_the_burst_waits_for_a_full_bucket_then_runs_into_debt(clock):
+    bucket = TokenBucket(per_minute=600)
+    bucket.acquire(50)
+    assert bucket.acquire(250) == pytest.approx(5.0)  # Refill to the 100-unit capacity, not to 250
+    assert bucket.acquire(10) == pytest.approx(16.0)  # The 150-unit debt is paid off first
+
+
+def test_retries_honour_retry_after_and_give_up_on_client_errors(gateway, clock):
+    errors = [api_error(openai.RateLimitError, 429, {"retry-after": "12"}),
+              api_error(openai.APITimeoutError, None),
+              api_error(openai.InternalServerError, 500)]
+
+    def call():
+        if errors:
+            raise errors.pop(0)
+        return "completion"
+
+    assert gateway._call_with_retries(call) == ("completion", 3)
+    assert 12 <= clock.sleeps[0] <= 12 + gateway.base_delay
+    assert all(0 <= delay <= gateway.base_delay * 2 ** attempt for attempt, delay in enumerate(clock.sleeps[1:], 1))
+
+    clock.sleeps.clear()
+    error = api_error(openai.AuthenticationError, 401)
+    with pytest.raises(openai.AuthenticationError):
+        gateway._call_with_retries(raising(error))
+    assert clock.sleeps == [] and error.retries == 0
+
+
+def test_failed_calls_are_recorded_with_their_retries(gateway, clock):
+    gateway.max_retries = 2
+    gateway.client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(
+        create=raising(api_error(openai.RateLimitError, 429)))))
+    with pytest.raises(openai.RateLimitError):
+        gateway.chat([{"role": "user", "content": "hi"}], "gpt", name="chat")
+    stats = calls(gateway)
+    assert (stats["calls"], stats["errors"], stats["retries"]) == (1, 1, 2)
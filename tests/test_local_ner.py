@@ -0,0 +1,41 @@
+import spacy
+from local_ner import LocalNER, parse_refined
+
+TEXT = "Ada Lovelace met Charles Babbage in London in 1833. Ada wrote the notes."
+
+
+def test_parse_refined_locates_entities_in_reading_order():
+    content = '```json\n[{"text": "Ada Lovelace", "label": "person"}, {"text": "London", "label": "GPE"},' \
+              ' {"text": "Ada", "label": "PERSON"}, {"text": "1833", "label": "DATE"}]\n```'
+    spans = parse_refined(TEXT, content)
+    assert [(s["text"], s["label"], s["start"]) for s in spans] == [
+        ("Ada Lovelace", "PERSON", 0), ("London", "GPE", TEXT.index("London")), ("1833", "DATE", TEXT.index("1833")),
+        ("Ada", "PERSON", TEXT.index("Ada wrote"))]  # The second "Ada", found after the cursor
+    assert all(TEXT[s["start"]:s["end"]] == s["text"] for s in spans)
+
+
+def test_parse_refined_skips_entities_it_cannot_place():
+    content = '[{"text": "Babbage", "label": "PERSON"}, {"text": "Paris", "label": "GPE"}, {"text": "London"},' \
+              ' "1833", {"text": "", "label": "DATE"}]'
+    assert [s["text"] for s in parse_refined(TEXT, content)] == ["Babbage"]
+
+
+def test_parse_refined_rejects_unusable_answers():
+    assert parse_refined(TEXT, "Sure! Here are the entities: Ada Lovelace") is None
+    assert parse_refined(TEXT, '{"text": "Ada", "label": "PERSON"}') is None
+    assert parse_refined(TEXT, "[]") == []
+
+
+def test_local_ner_runs_only_the_entity_pipes():
+    nlp = spacy.blank("en")
+    nlp.add_pipe("sentencizer")
+    nlp.add_pipe("entity_ruler").add_patterns([{"label": "PERSON", "pattern": "Ada Lovelace"},
+                                               {"label": "GPE", "pattern": "London"}])
+    ner = LocalNER(nlp, batch_size=2)
+    assert nlp.pipe_names == ["entity_ruler"]
+
+    london = TEXT.index("London")
+    assert ner.extract(TEXT) == [{"text": "Ada Lovelace", "label": "PERSON", "start": 0, "end": 12},
+                                 {"text": "London", "label": "GPE", "start": london, "end": london + 6}]
+    texts = ["London calling", "nothing here", "Ada Lovelace"]
+    assert [[s["text"] for s in spans] for spans in ner.extract_many(texts)] == [["London"], [], ["Ada Lovelace"]]
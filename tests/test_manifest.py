@@ -0,0 +1,33 @@
+from neuradocs.manifest import IndexManifest, file_sha256
+
+
+def test_changed_files_are_detected_by_content_hash(tmp_path):
+    pdf = tmp_path / "report.pdf"
+    pdf.write_bytes(b"version 1")
+    manifest = IndexManifest(str(tmp_path / "manifest.json"))
+    first = file_sha256(str(pdf))
+    assert not manifest.is_unchanged("report.pdf", first)
+
+    manifest.update("report.pdf", first, [1, 2, 3])
+    assert manifest.is_unchanged("report.pdf", first)
+    pdf.write_bytes(b"version 2")
+    assert file_sha256(str(pdf), block_size=4) != first
+    assert not manifest.is_unchanged("report.pdf", file_sha256(str(pdf)))
+    assert manifest.get("report.pdf")["chunk_ids"] == [1, 2, 3]  # The chunks to delete when it is re-indexed
+
+
+def test_manifest_survives_a_restart_and_clear(tmp_path):
+    path = str(tmp_path / "state" / "manifest.json")
+    manifest = IndexManifest(path)
+    manifest.update("a.pdf", "hash-a", [1])
+    manifest.update("b.pdf", "hash-b", [2, 3])
+    manifest.save()
+
+    reloaded = IndexManifest(path)
+    assert len(reloaded) == 2
+    assert reloaded.is_unchanged("b.pdf", "hash-b")
+    assert not (tmp_path / "state" / "manifest.json.tmp").exists()
+
+    reloaded.clear()
+    reloaded.save()
+    assert len(IndexManifest(path)) == 0
@@ -0,0 +1,59 @@
+import random
+from neuradocs.chunker import get_tokenizer
+from map_reduce_summary import MapReduceSummarizer, split_segments
+from response_cache import ResponseCache
+
+WORDS = ("report revenue growth quarter team launch product customer market region cost forecast plan risk "
+         "supplier contract delivery schedule budget review").split()
+
+
+def document(sentences=400, seed=0):
+    rng = random.Random(seed)
+    paragraphs = []
+    for start in range(0, sentences, 8):
+        paragraphs.append(" ".join(
+            f"Sentence {n} says the {' '.join(rng.choices(WORDS, k=rng.randint(4, 18)))}."
+            for n in range(start, min(start + 8, sentences))))
+    return "\n\n".join(paragraphs)
+
+
+def test_segments_respect_the_token_limit_and_keep_every_sentence():
+    text = document()
+    segments = split_segments(text, segment_tokens=300)
+    tokenizer = get_tokenizer("cl100k_base")
+    assert len(segments) > 5
+    assert all(tokenizer.count(segment) <= 300 for segment in segments)
+    assert " ".join(" ".join(segments).split()) == " ".join(text.split())
+
+
+def test_an_edit_only_moves_nearby_boundaries():
+    text = document()
+    before = split_segments(text, segment_tokens=300)
+    edited = text.replace("Sentence 200 says the", "Sentence 200 now says that the")
+    after = split_segments(edited, segment_tokens=300)
+
+    changed = [segment for segment in after if segment not in before]
+    assert 1 <= len(changed) <= 2  # The edited segment, and at most the one its boundary moved into
+    assert after[:3] == before[:3] and after[-3:] == before[-3:]
+
+
+def test_resummarising_an_edited_document_reuses_cached_summaries():
+    calls = []
+
+    def complete(system_prompt, user_prompt, max_tokens, temperature, name="chat"):
+        calls.append(name)
+        return f"summary {len(calls)}"
+
+    summarizer = MapReduceSummarizer(complete, ResponseCache(), "gpt-35-turbo", segment_tokens=300, fan_in=4,
+                                     temperature=0.0)
+    text = document()
+    segments = split_segments(text, segment_tokens=300)
+    summarizer.reduce(segments)
+    first = len(calls)
+    assert calls.count("summary_segment") == len(segments)
+
+    calls.clear()
+    edited = split_segments(text.replace("Sentence 200 says the", "Sentence 200 now says that the"), segment_tokens=300)
+    summarizer.reduce(edited)
+    assert 1 <= calls.count("summary_segment") <= 2
+    assert len(calls) < first / 2  # Only the changed segments and the merges above them
@@ -0,0 +1,83 @@
+from types import SimpleNamespace
+import pytest
+from flask import Flask
+from neuradocs import metrics
+from neuradocs.metrics import Registry, cache_metrics, stage, stage_seconds, timed_iter
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = SimpleNamespace(value=0.0)
+    monkeypatch.setattr(metrics, "time", SimpleNamespace(perf_counter=lambda: now.value))
+    return now
+
+
+def series(name):
+    child = stage_seconds.labels(name)
+    return sum(child.counts), child.sum
+
+
+def test_histogram_renders_cumulative_buckets_in_the_text_format():
+    registry = Registry()
+    histogram = registry.histogram("job_seconds", "Seconds per job", ["kind"], buckets=(0.1, 1.0))
+    for seconds in (0.05, 0.1, 0.5, 3.0):
+        histogram.observe(seconds, 'pdf "scan"')
+
+    assert registry.render().splitlines() == [
+        "# HELP job_seconds Seconds per job",
+        "# TYPE job_seconds histogram",
+        'job_seconds_bucket{kind="pdf \\"scan\\"",le="0.1"} 2',  # A value on a bound falls in that bucket
+        'job_seconds_bucket{kind="pdf \\"scan\\"",le="1.0"} 3',
+        'job_seconds_bucket{kind="pdf \\"scan\\"",le="+Inf"} 4',
+        'job_seconds_sum{kind="pdf \\"scan\\""} 3.65',
+        'job_seconds_count{kind="pdf \\"scan\\""} 4']
+
+
+def test_collectors_merge_families_and_a_failing_one_is_skipped():
+    registry = Registry()
+    registry.collector(lambda: cache_metrics("answer", {"hits": 3, "misses": 1, "entries": 2}))
+    registry.collector(lambda: cache_metrics("query", {"hits": 0, "misses": 4, "entries": 4}))
+    registry.collector(lambda: 1 / 0)
+    lines = registry.render().splitlines()
+
+    assert lines.count("# TYPE cache_hits_total counter") == 1
+    assert 'cache_hits_total{cache="answer"} 3' in lines and 'cache_hits_total{cache="query"} 0' in lines
+    assert 'cache_entries{cache="query"} 4' in lines
+
+
+def test_nested_stages_are_not_counted_twice(clock):
+    before = series("test_outer"), series("test_inner")
+    with stage("test_outer"):
+        clock.value += 1.0
+        with stage("test_inner"):
+            clock.value += 3.0
+        clock.value += 0.5
+    outer, inner = series("test_outer"), series("test_inner")
+    assert (outer[0] - before[0][0], outer[1] - before[0][1]) == (1, 1.5)
+    assert (inner[0] - before[1][0], inner[1] - before[1][1]) == (1, 3.0)
+
+
+def test_timed_iter_times_each_item_of_a_lazy_producer(clock):
+    def pages():
+        for page in ("one", "two"):
+            clock.value += 2.0
+            yield page
+
+    before = series("test_extract")
+    assert list(timed_iter("test_extract", pages())) == ["one", "two"]
+    count, total = series("test_extract")
+    assert (count - before[0], total - before[1]) == (3, 4.0)  # Two pages and the final StopIteration
+
+
+def test_flask_requests_are_timed_by_route_and_tagged_with_trace_ids(monkeypatch):
+    monkeypatch.setattr(metrics, "TRACE_IDS", True)
+    app = metrics.instrument_flask(Flask(__name__))
+    app.add_url_rule("/items/<int:item>", "item", lambda item: str(item))
+    client = app.test_client()
+
+    assert client.get("/items/7", headers={"X-Request-ID": "abc123"}).headers["X-Request-ID"] == "abc123"
+    assert len(client.get("/items/8").headers["X-Request-ID"]) == 16  # Generated when the caller sent none
+    assert client.get("/missing").status_code == 404
+    rendered = metrics.registry.render()
+    assert 'http_request_duration_seconds_count{method="GET",endpoint="/items/<int:item>",status="200"}' in rendered
+    assert 'http_request_duration_seconds_count{method="GET",endpoint="unmatched",status="404"}' in rendered
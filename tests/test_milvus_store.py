@@ -0,0 +1,197 @@
+from types import SimpleNamespace
+import numpy as np
+import pytest
+from neuradocs import milvus_store
+from neuradocs.milvus_store import MilvusVectorStore
+from neuradocs.search_filter import METADATA_FIELDS, SearchFilter, partition_name
+
+
+class FakeMilvus:
+    """In-memory stand-in for one Milvus collection, shared by every `Collection` handle on it."""
+
+    def __init__(self, metadata=True):
+        names = ["embedding", "text"] + (list(METADATA_FIELDS) if metadata else [])
+        self.fields = [SimpleNamespace(name="id", auto_id=True)] + [SimpleNamespace(name=n, auto_id=False) for n in names]
+        self.rows = {}
+        self.partitions = {"_default"}
+        self.handles = []
+        self.calls = []
+
+    def collection(self, name, using):
+        handle = FakeCollection(self, using)
+        self.handles.append(handle)
+        return handle
+
+
+class FakeCollection:
+    def __init__(self, server, alias):
+        self.server = server
+        self.alias = alias
+        self.schema = SimpleNamespace(fields=server.fields)
+
+    @property
+    def partitions(self):
+        return [SimpleNamespace(name=name) for name in self.server.partitions]
+
+    def _call(self, name, **details):
+        self.server.calls.append((name, self.alias, details))
+
+    def load(self):
+        self._call("load")
+
+    def flush(self):
+        self._call("flush")
+
+    def has_partition(self, name):
+        return name in self.server.partitions
+
+    def create_partition(self, name):
+        self._call("create_partition", partition=name)
+        self.server.partitions.add(name)
+
+    def insert(self, columns, partition_name=None):
+        names = [field.name for field in self.server.fields if not field.auto_id]
+        ids = list(range(len(self.server.rows), len(self.server.rows) + len(columns[0])))
+        for position, doc_id in enumerate(ids):
+            self.server.rows[doc_id] = {name: column[position] for name, column in zip(names, columns)}
+            self.server.rows[doc_id]["_partition"] = partition_name or "_default"
+        self._call("insert", partition_name=partition_name, rows=len(ids))
+        return SimpleNamespace(primary_keys=ids)
+
+    def search(self, data, anns_field, param, limit, expr, partition_names, output_fields):
+        self._call("search", param=param, limit=limit, expr=expr, partition_names=partition_names,
+                   output_fields=output_fields)
+        rows = [(doc_id, row) for doc_id, row in self.server.rows.items()
+                if partition_names is None or row["_partition"] in partition_names]
+        results = []
+        for query in data:
+            query = np.asarray(query, dtype=np.float32)
+            scored = sorted(((float(np.dot(row["embedding"], query)), doc_id, row) for doc_id, row in rows), reverse=True)
+            results.append([SimpleNamespace(id=doc_id, distance=score,
+                                            entity={name: row[name] for name in output_fields})
+                            for score, doc_id, row in scored[:limit]])
+        return results
+
+    def query(self, expr, output_fields):
+        self._call("query", expr=expr, output_fields=output_fields)
+        ids = [int(i) for i in expr[expr.index("[") + 1:expr.index("]")].split(",") if i.strip()]
+        return [{"id": i, **{name: self.server.rows[i][name] for name in output_fields}}
+                for i in ids if i in self.server.rows]
+
+
+@pytest.fixture
+def milvus(monkeypatch):
+    server = FakeMilvus()
+    monkeypatch.setattr(milvus_store.connections, "connect", lambda alias, host, port: None)
+    monkeypatch.setattr(milvus_store, "Collection", server.collection)
+    return server
+
+
+def make_store(**options):
+    store = MilvusVectorStore("localhost", 19530, "docs", {"metric_type": "IP", "params": {"ef": 16}}, **options)
+    store.open()
+    return store
+
+
+def unit_vectors(count, dim=8, seed=0):
+    vectors = np.random.default_rng(seed).standard_normal((count, dim)).astype(np.float32)
+    return (vectors / np.linalg.norm(vectors, axis=1, keepdims=True)).tolist()
+
+
+def count(server, name):
+    return sum(1 for call in server.calls if call[0] == name)
+
+
+def test_handles_are_pooled_and_the_collection_is_loaded_once(milvus):
+    store = make_store(pool_size=3)
+    assert [handle.alias for handle in milvus.handles] == ["default", "milvus_1", "milvus_2"]
+    assert store.metadata_fields == list(METADATA_FIELDS)
+
+    vectors = unit_vectors(5)
+    store.insert(vectors, [f"text {i}" for i in range(5)])
+    for vector in vectors:
+        store.search(vector, top_k=2)
+    store.get_texts([0, 1])
+    assert count(milvus, "load") == 1
+    assert len(milvus.handles) == 3  # No handle is created per call
+    assert store._pool.qsize() == 3  # Every handle went back to the pool
+
+
+def test_inserts_are_flushed_in_batches(milvus):
+    store = make_store(flush_rows=10, flush_interval=3600)
+    for batch in range(3):
+        store.insert(unit_vectors(3, seed=batch), ["text"] * 3)
+    assert count(milvus, "flush") == 0
+    store.insert(unit_vectors(3, seed=3), ["text"] * 3)
+    assert count(milvus, "flush") == 1  # Once 10 rows had accumulated, not after every insert
+    store.flush()  # Nothing pending since the last flush
+    store.insert(unit_vectors(1, seed=4), ["text"])
+    store.flush()
+    assert count(milvus, "flush") == 2
+    assert store.flush_count == 2
+
+
+def test_flush_is_due_after_the_interval(milvus, monkeypatch):
+    store = make_store(flush_rows=1000, flush_interval=60)
+    now = store._last_flush
+    monkeypatch.setattr(milvus_store.time, "monotonic", lambda: now + 61)
+    store.insert(unit_vectors(1), ["text"])
+    assert count(milvus, "flush") == 1
+
+
+def test_hnsw_ef_is_raised_to_the_search_limit(milvus):
+    store = make_store()
+    store.insert(unit_vectors(40), ["text"] * 40)
+    store.search(unit_vectors(1, seed=1)[0], top_k=5)
+    store.search(unit_vectors(1, seed=1)[0], top_k=30)
+    params = [call[2]["param"]["params"]["ef"] for call in milvus.calls if call[0] == "search"]
+    assert params == [16, 30]
+    assert store.search_params["params"]["ef"] == 16  # The configured parameters are not modified
+
+
+def test_get_chunks_reads_text_metadata_and_vectors_in_one_query(milvus):
+    store = make_store()
+    vectors = unit_vectors(3)
+    metadata = [{"tenant": "acme", "source": f"doc{i}.pdf", "page_start": i, "page_end": i, "chunk_index": i,
+                 "ingested_at": 1700000000} for i in range(3)]
+    ids = store.insert(vectors, ["a", "b", "c"], metadata)
+    milvus.calls.clear()
+
+    chunks = store.get_chunks([ids[2], 99, ids[0]], with_vectors=True)
+    queries = [call for call in milvus.calls if call[0] == "query"]
+    assert len(queries) == 1
+    assert queries[0][2]["output_fields"] == ["text"] + list(METADATA_FIELDS) + ["embedding"]
+    assert set(chunks) == {ids[0], ids[2]}
+    assert chunks[ids[2]]["text"] == "c" and chunks[ids[2]]["metadata"]["source"] == "doc2.pdf"
+    assert chunks[ids[2]]["vector"] == vectors[2]
+    assert store.get_chunks([]) == {}
+    assert sum(1 for call in milvus.calls if call[0] == "query") == 1
+
+
+def test_search_many_is_one_search_request(milvus):
+    store = make_store()
+    vectors = unit_vectors(20)
+    store.insert(vectors, [f"text {i}" for i in range(20)])
+    results = store.search_many(vectors[:3], top_k=2)
+    assert [hits[0]["id"] for hits in results] == [0, 1, 2]
+    assert sum(1 for call in milvus.calls if call[0] == "search") == 1
+    assert store.search_many([], top_k=2) == []
+
+
+def test_tenant_filters_scan_only_their_partitions(milvus):
+    store = make_store(partition_by="tenant")
+    vectors = unit_vectors(6)
+    metadata = [{"tenant": ("acme", "globex", "")[i % 3], "source": f"doc{i}.pdf", "page_start": i, "page_end": i}
+                for i in range(6)]
+    store.insert(vectors, [f"text {i}" for i in range(6)], metadata)
+    assert count(milvus, "insert") == 3  # One insert per partition, untagged rows in the default one
+    assert milvus.partitions == {"_default", partition_name("acme"), partition_name("globex")}
+
+    hits = store.search(vectors[0], top_k=6, search_filter=SearchFilter(tenants=("acme",), page_from=1))
+    search = [call for call in milvus.calls if call[0] == "search"][-1][2]
+    assert (search["partition_names"], search["expr"]) == ([partition_name("acme")], "page_end >= 1")
+    assert {hit["metadata"]["tenant"] for hit in hits} == {"acme"}
+
+    calls = len(milvus.calls)
+    assert store.search(vectors[0], top_k=3, search_filter=SearchFilter(tenants=("initech",))) == []
+    assert count(milvus, "search") == 1 and len(milvus.calls) == calls  # Unknown tenant: no search at all
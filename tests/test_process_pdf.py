@@ -0,0 +1,43 @@
+import pytest
+from neuradocs.process_pdf import iter_pdfs, PdfExtractionError
+
+
+def write_pdf(path, text):
+    """Minimal one-page PDF showing `text` in Helvetica."""
+    content = f"BT /F1 12 Tf 50 750 Td ({text}) Tj ET".encode("latin-1")
+    objects = [b"<< /Type /Catalog /Pages 2 0 R >>",
+               b"<< /Type /Pages /Kids [3 0 R] /Count 1 >>",
+               b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Resources << /Font << /F1 4 0 R >> >> "
+               b"/Contents 5 0 R >>",
+               b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+               b"<< /Length %d >>\nstream\n%s\nendstream" % (len(content), content)]
+    data, offsets = bytearray(b"%PDF-1.4\n"), []
+    for number, body in enumerate(objects, 1):
+        offsets.append(len(data))
+        data += b"%d 0 obj\n%s\nendobj\n" % (number, body)
+    xref = len(data)
+    data += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    data += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    data += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    path.write_bytes(bytes(data))
+    return str(path)
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_unreadable_pdf_fails_alone(tmp_path, workers):
+    first = write_pdf(tmp_path / "first.pdf", "First document")
+    broken = tmp_path / "broken.pdf"
+    broken.write_bytes(b"%PDF-1.4\nthis is not a pdf")
+    last = write_pdf(tmp_path / "last.pdf", "Last document")
+
+    results = {}
+    for file_path, pages in iter_pdfs([first, str(broken), last], workers=workers):
+        try:
+            results[file_path] = [text for _, text in pages]
+        except PdfExtractionError as e:
+            results[file_path] = e
+
+    assert results[first] == ["First document"]
+    assert isinstance(results[str(broken)], PdfExtractionError)
+    assert "broken.pdf" in str(results[str(broken)])
+    assert results[last] == ["Last document"]
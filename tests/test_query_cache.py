@@ -0,0 +1,45 @@
+import numpy as np
+from neuradocs.query_cache import SemanticAnswerCache, key_terms
+
+
+def near(vector, seed, scale=0.01):
+    """`vector` nudged slightly, as two phrasings of the same question embed."""
+    return vector + scale * np.random.default_rng(seed).standard_normal(vector.shape)
+
+
+def test_key_terms_keep_numbers_and_identifiers():
+    assert key_terms("What does error 501 mean?") == {"501"}
+    assert key_terms("How is max_df used by os.path or getTokenizer in v2?") == {"max_df", "os.path", "gettokenizer", "v2"}
+    assert key_terms("How do hash tables work?") == frozenset()
+
+
+def test_lookup_needs_the_same_numbers_and_identifiers():
+    cache = SemanticAnswerCache(max_entries=8, threshold=0.99)
+    question = np.random.default_rng(0).standard_normal(64)
+    cache.add(question, "What does error 501 mean?", {"response": "501"}, cache.generation)
+
+    assert cache.lookup(near(question, 1), "what does Error 501 mean") == {"response": "501"}
+    assert cache.lookup(near(question, 2), "What does error 502 mean?") is None
+    assert cache.lookup(np.random.default_rng(3).standard_normal(64), "What does error 501 mean?") is None
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 2
+
+
+def test_lookup_falls_back_to_a_less_similar_entry_with_matching_terms():
+    cache = SemanticAnswerCache(max_entries=8, threshold=0.99)
+    question = np.random.default_rng(0).standard_normal(64)
+    cache.add(question, "error 502", {"response": "502"}, cache.generation)
+    cache.add(near(question, 1), "error 501", {"response": "501"}, cache.generation)
+
+    assert cache.lookup(question, "error 501") == {"response": "501"}
+
+
+def test_answers_computed_before_a_clear_are_not_cached():
+    cache = SemanticAnswerCache(max_entries=8, threshold=0.99)
+    question = np.random.default_rng(0).standard_normal(64)
+    generation = cache.generation  # Read when the request starts...
+    cache.clear()  # ...then the index changes while its completion is still running
+    cache.add(question, "error 501", {"response": "stale"}, generation)
+    assert cache.lookup(question, "error 501") is None
+
+    cache.add(question, "error 501", {"response": "fresh"}, cache.generation)
+    assert cache.lookup(question, "error 501") == {"response": "fresh"}
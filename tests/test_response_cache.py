@@ -0,0 +1,62 @@
+from types import SimpleNamespace
+import pytest
+import response_cache
+from response_cache import ResponseCache
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = SimpleNamespace(value=1_700_000_000.0)
+    monkeypatch.setattr(response_cache, "time", SimpleNamespace(time=lambda: now.value))
+    return now
+
+
+def key(text="Some text", temperature=0.0, endpoint="summary"):
+    return ResponseCache.key(endpoint, "system", text, "gpt-35-turbo", 200, temperature)
+
+
+def test_keys_ignore_whitespace_and_unicode_form_but_not_parameters():
+    assert key("Some  text\n") == key("Some text") == key("Some\u00a0text")  # NFKC maps the no-break space
+    assert key("Some text", temperature=0.2) != key("Some text")
+    assert key(endpoint="sentiment") != key()
+
+
+def test_entries_expire_after_the_ttl_in_both_tiers(tmp_path, clock):
+    cache = ResponseCache(path=str(tmp_path / "responses.sqlite3"), ttl=60)
+    cache.put(key(), "summary")
+    clock.value += 59
+    assert cache.get(key()) == "summary"
+
+    clock.value += 2
+    assert cache.get(key()) is None  # Expired in memory and on disk
+    assert ResponseCache(path=str(tmp_path / "responses.sqlite3"), ttl=60).get(key()) is None
+    assert cache.stats()["entries"] == 0
+
+
+def test_disk_tier_survives_a_restart_and_is_promoted(tmp_path, clock):
+    path = str(tmp_path / "responses.sqlite3")
+    ResponseCache(path=path).put(key(), "summary")
+
+    cache = ResponseCache(path=path)
+    assert cache.get(key()) == "summary"
+    assert cache.get(key()) == "summary"
+    stats = cache.stats()
+    assert (stats["disk_hits"], stats["memory_hits"], stats["disk_entries"]) == (1, 1, 1)
+
+
+def test_sampled_or_disabled_requests_bypass_the_cache():
+    cache = ResponseCache(max_temperature=0.5)
+    assert cache.cacheable(0.5)
+    assert not cache.cacheable(0.9)
+    assert not ResponseCache(max_entries=0).cacheable(0.0)  # No memory tier and no disk tier
+    assert cache.stats()["bypassed"] == 1
+
+
+def test_memory_tier_evicts_the_least_recently_used_entry():
+    cache = ResponseCache(max_entries=2)
+    cache.put(key("a"), "A")
+    cache.put(key("b"), "B")
+    cache.get(key("a"))
+    cache.put(key("c"), "C")
+    assert cache.get(key("b")) is None
+    assert (cache.get(key("a")), cache.get(key("c"))) == ("A", "C")
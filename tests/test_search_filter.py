@@ -0,0 +1,58 @@
+import numpy as np
+import pytest
+from neuradocs.search_filter import SearchFilter, partition_name, partition_of
+from neuradocs.vector_store import LocalVectorStore, QuantizedVectorStore
+
+
+def test_from_request_parses_and_validates_filters():
+    assert SearchFilter.from_request(None) is None
+    assert SearchFilter.from_request({}) is None
+    assert SearchFilter.from_request({"tenant": ["acme", "globex", "acme"], "source": "a.pdf", "page_from": 2.0}) == \
+        SearchFilter(tenants=("acme", "globex"), sources=("a.pdf",), page_from=2)
+
+    for filters, message in [(["acme"], "'filters' must be an object"),
+                             ({"tenant": "acme", "owner": "x"}, "Unknown filter\\(s\\): owner"),
+                             ({"tenant": []}, "'tenant' must be a non-empty string"),
+                             ({"source": ["a.pdf", ""]}, "'source' must be a non-empty string"),
+                             ({"page_to": "3"}, "'page_to' must be a number"),
+                             ({"ingested_after": True}, "'ingested_after' must be a number")]:
+        with pytest.raises(ValueError, match=message):
+            SearchFilter.from_request(filters)
+
+
+def test_partitioned_fields_are_left_out_of_the_expression():
+    search_filter = SearchFilter(tenants=("acme",), sources=("a.pdf", "b.pdf"), page_from=2, page_to=5,
+                                 ingested_after=1700000000.5)
+    conditions = ['source in ["a.pdf", "b.pdf"]', "page_end >= 2", "page_start <= 5", "ingested_at >= 1700000000"]
+    assert search_filter.expression("tenant") == " and ".join(conditions)
+    assert search_filter.expression("none") == " and ".join(['tenant in ["acme"]'] + conditions)
+    assert 'source in' not in search_filter.expression("document")
+    assert SearchFilter(tenants=("acme",)).expression("tenant") == ""
+
+    assert search_filter.partitions("tenant") == [partition_name("acme")]
+    assert search_filter.partitions("document") == [partition_name("a.pdf"), partition_name("b.pdf")]
+    assert search_filter.partitions("none") is None
+    assert SearchFilter(page_from=1).partitions("tenant") is None
+
+
+def test_partition_names_are_milvus_safe_and_unique():
+    name = partition_name("reports/2024 Q1.pdf")
+    assert name.startswith("p_reports_2024_Q1_pdf_") and name.replace("_", "").isalnum()
+    assert partition_name("a.pdf") != partition_name("a_pdf")  # Same slug, different hash
+    assert partition_of({"tenant": "acme", "source": "a.pdf"}, "document") == partition_name("a.pdf")
+    assert partition_of({"tenant": "", "source": "a.pdf"}, "tenant") is None  # Untagged rows use the default partition
+
+
+@pytest.mark.parametrize("store_class", [LocalVectorStore, QuantizedVectorStore])
+def test_filtered_local_search_returns_only_matching_chunks(tmp_path, store_class):
+    rng = np.random.default_rng(0)
+    metadata = [{"tenant": ("acme", "globex")[i % 2], "source": f"doc{i % 5}.pdf", "page_start": i % 10,
+                 "page_end": i % 10 + 1, "chunk_index": i, "ingested_at": 1700000000 + i} for i in range(200)]
+    store = store_class(str(tmp_path / "index"), 8)
+    store.insert(rng.standard_normal((200, 8)).astype(np.float32), [f"text {i}" for i in range(200)], metadata)
+    search_filter = SearchFilter(tenants=("acme",), sources=("doc0.pdf", "doc2.pdf"), page_from=3, page_to=6)
+
+    expected = [i for i, item in enumerate(metadata) if search_filter.matches(item)]
+    hits = store.search(rng.standard_normal(8), top_k=200, search_filter=search_filter)
+    assert sorted(hit["id"] for hit in hits) == expected
+    assert store.search(rng.standard_normal(8), top_k=3, search_filter=SearchFilter(tenants=("initech",))) == []
@@ -0,0 +1,38 @@
+import numpy as np
+import pytest
+from neuradocs.search_filter import SearchFilter
+from neuradocs.vector_store import LocalVectorStore, QuantizedVectorStore
+
+STORES = [LocalVectorStore, lambda path, dim: QuantizedVectorStore(path, dim, precision="int8", rerank_factor=100)]
+
+
+def stored(make_store, tmp_path, count=300, dim=16):
+    store = make_store(str(tmp_path / "index"), dim)
+    rng = np.random.default_rng(0)
+    metadata = [{"tenant": ["acme", "globex"][i % 2], "source": f"doc{i % 5}.pdf", "page_start": i % 7,
+                 "page_end": i % 7, "chunk_index": i, "ingested_at": 1700000000} for i in range(count)]
+    store.insert(rng.standard_normal((count, dim)).astype(np.float32), [f"chunk {i}" for i in range(count)], metadata)
+    return store, rng.standard_normal((25, dim)).astype(np.float32)
+
+
+def ids(hits):
+    return [hit["id"] for hit in hits]
+
+
+@pytest.mark.parametrize("make_store", STORES)
+@pytest.mark.parametrize("search_filter", [None, SearchFilter(tenants=("acme",), page_from=2, page_to=4)])
+def test_search_many_matches_one_search_per_query(tmp_path, make_store, search_filter):
+    store, queries = stored(make_store, tmp_path)
+    batched = store.search_many(queries, top_k=5, search_filter=search_filter)
+    assert len(batched) == len(queries)
+    for query, hits in zip(queries, batched):
+        single = store.search(query, top_k=5, search_filter=search_filter)
+        assert ids(hits) == ids(single)
+        assert [hit["score"] for hit in hits] == pytest.approx([hit["score"] for hit in single], abs=1e-5)
+        if search_filter:
+            assert all(search_filter.matches(hit["metadata"]) for hit in hits)
+
+
+def test_search_many_on_an_empty_store(tmp_path):
+    store = LocalVectorStore(str(tmp_path / "index"), 4)
+    assert store.search_many(np.ones((2, 4), dtype=np.float32), top_k=3) == [[], []]
@@ -0,0 +1,208 @@
+import json
+import os
+import numpy as np
+import pytest
+from neuradocs.vector_store import LocalVectorStore, QuantizedVectorStore
+
+STORES = [LocalVectorStore, lambda path, dim: QuantizedVectorStore(path, dim, precision="int8")]
+
+
+def vectors(count, dim=4, seed=0):
+    return np.random.default_rng(seed).standard_normal((count, dim)).astype(np.float32)
+
+
+@pytest.mark.parametrize("make_store", STORES)
+def test_deleted_trailing_ids_are_not_reused_after_reload(tmp_path, make_store):
+    path = str(tmp_path / "index")
+    store = make_store(path, 4)
+    ids = store.insert(vectors(5), [f"text {i}" for i in range(5)])
+    store.flush()
+    store.delete(ids[-2:])
+    store.flush()
+
+    store = make_store(path, 4)
+    assert store.count() == 3
+    new_ids = store.insert(vectors(1, seed=1), ["new"])
+    assert new_ids == [5]
+    store.clear()
+    assert store.insert(vectors(1, seed=2), ["after clear"]) == [6]
+
+
+@pytest.mark.parametrize("make_store", STORES)
+def test_uncommitted_flush_is_ignored_on_load(tmp_path, monkeypatch, make_store):
+    path = str(tmp_path / "index")
+    store = make_store(path, 4)
+    store.insert(vectors(3), ["a", "b", "c"])
+    store.flush()
+    store.insert(vectors(2, seed=1), ["d", "e"])
+
+    # Crash before the commit: the appended texts and temporary files are ignored
+    monkeypatch.setattr(os, "replace", _crash_before_commit(os.replace))
+    with pytest.raises(KeyboardInterrupt):
+        store.flush()
+    monkeypatch.undo()
+    reloaded = make_store(path, 4)
+    assert reloaded.count() == 3
+    assert reloaded.get_texts([0, 1, 2]) == {0: "a", 1: "b", 2: "c"}
+    assert reloaded.insert(vectors(1, seed=2), ["f"]) == [3]
+    reloaded.flush()
+    assert make_store(path, 4).count() == 4
+
+
+@pytest.mark.parametrize("make_store", STORES)
+def test_committed_flush_is_finished_on_load(tmp_path, monkeypatch, make_store):
+    path = str(tmp_path / "index")
+    store = make_store(path, 4)
+    store.insert(vectors(3), ["a", "b", "c"])
+    store.flush()
+    store.delete([0])
+    store.insert(vectors(2, seed=1), ["d", "e"])
+
+    # Crash after the commit, with only some files moved into place
+    monkeypatch.setattr(os, "replace", _crash_after_commit(os.replace, renames=2))
+    with pytest.raises(KeyboardInterrupt):
+        store.flush()
+    monkeypatch.undo()
+    reloaded = make_store(path, 4)
+    assert reloaded.count() == 4
+    hits = reloaded.search(vectors(2, seed=1)[1], top_k=1)
+    assert hits[0]["id"] == 4 and hits[0]["text"] == "e"
+    with open(f"{path}.state.json", encoding="utf-8") as f:
+        assert "pending" not in json.load(f)
+
+
+def _crash_before_commit(replace):
+    def wrapper(src, dst):
+        if dst.endswith(".state.json"):
+            raise KeyboardInterrupt
+        return replace(src, dst)
+    return wrapper
+
+
+def _crash_after_commit(replace, renames):
+    calls = {"committed": False, "renames": 0}
+
+    def wrapper(src, dst):
+        if calls["committed"] and not dst.endswith(".state.json"):
+            if calls["renames"] == renames:
+                raise KeyboardInterrupt
+            calls["renames"] += 1
+        replace(src, dst)
+        if dst.endswith(".state.json"):
+            calls["committed"] = True
+    return wrapper
+
+
+@pytest.mark.parametrize("make_store", STORES)
+def test_flush_appends_to_the_matrix_file_until_a_delete(tmp_path, make_store):
+    path = str(tmp_path / "index")
+    store = make_store(path, 4)
+    store.insert(vectors(3), ["a", "b", "c"])
+    store.flush()
+    inode = os.stat(f"{path}.npy").st_ino
+
+    store.insert(vectors(2, seed=1), ["d", "e"])
+    store.flush()
+    assert os.stat(f"{path}.npy").st_ino == inode  # Grown in place, not rewritten
+    reloaded = make_store(path, 4)
+    expected = np.concatenate([vectors(3), vectors(2, seed=1)])
+    expected /= np.linalg.norm(expected, axis=1, keepdims=True)
+    stored = reloaded.get_vectors(range(5))
+    assert np.allclose([stored[i] for i in range(5)], expected, atol=1e-6)
+
+    reloaded.delete([1])
+    reloaded.flush()
+    assert os.stat(f"{path}.npy").st_ino != inode
+    assert np.load(f"{path}.npy").shape == (4, 4)
+
+
+@pytest.mark.parametrize("make_store", STORES)
+def test_rows_appended_by_an_uncommitted_flush_are_cut_off(tmp_path, monkeypatch, make_store):
+    path = str(tmp_path / "index")
+    store = make_store(path, 4)
+    store.insert(vectors(3), ["a", "b", "c"])
+    store.flush()
+    store.insert(vectors(2, seed=1), ["d", "e"])
+    monkeypatch.setattr(os, "replace", _crash_before_commit(os.replace))
+    with pytest.raises(KeyboardInterrupt):
+        store.flush()
+    monkeypatch.undo()
+    assert np.load(f"{path}.npy", mmap_mode="r").shape == (5, 4)  # Appended, but not committed
+
+    reloaded = make_store(path, 4)
+    assert reloaded.count() == 3
+    reloaded.insert(vectors(1, seed=2), ["f"])
+    reloaded.flush()
+    assert np.load(f"{path}.npy", mmap_mode="r").shape == (4, 4)
+    hits = make_store(path, 4).search(vectors(1, seed=2)[0], top_k=1)
+    assert hits[0]["id"] == 3 and hits[0]["text"] == "f"
+
+
+@pytest.mark.parametrize("make_store", STORES)
+def test_search_with_vectors_returns_the_stored_embeddings(tmp_path, make_store):
+    store = make_store(str(tmp_path / "index"), 4)
+    ids = store.insert(vectors(6), [f"text {i}" for i in range(6)])
+    store.flush()
+    store.insert(vectors(2, seed=1), ["unflushed 0", "unflushed 1"])
+    queries = vectors(2, seed=2)
+
+    stored = store.get_vectors(ids + [6, 7])
+    for hits in [store.search(queries[0], top_k=4, with_vectors=True)] + store.search_many(queries, top_k=4, with_vectors=True):
+        assert len(hits) == 4
+        for hit in hits:
+            np.testing.assert_array_equal(hit["vector"], stored[hit["id"]])
+    assert "vector" not in store.search(queries[0], top_k=4)[0]
+    assert [hit["id"] for hit in store.search(queries[0], top_k=4, with_vectors=True)] == \
+           [hit["id"] for hit in store.search(queries[0], top_k=4)]
+
+
+@pytest.mark.parametrize("make_store", STORES)
+def test_get_chunks_matches_the_per_field_lookups(tmp_path, make_store):
+    store = make_store(str(tmp_path / "index"), 4)
+    metadata = [{"tenant": "acme", "source": f"doc{i}.pdf", "page_start": i, "page_end": i, "chunk_index": i,
+                 "ingested_at": 1700000000} for i in range(3)]
+    ids = store.insert(vectors(3), ["a", "b", "c"], metadata)
+    wanted = [ids[2], 99, ids[0]]
+
+    chunks = store.get_chunks(wanted, with_vectors=True)
+    texts, meta, stored = store.get_texts(wanted), store.get_metadata(wanted), store.get_vectors(wanted)
+    assert set(chunks) == {ids[0], ids[2]}
+    for doc_id, chunk in chunks.items():
+        assert (chunk["id"], chunk["text"], chunk["metadata"]) == (doc_id, texts[doc_id], meta[doc_id])
+        np.testing.assert_array_equal(chunk["vector"], stored[doc_id])
+    assert "vector" not in store.get_chunks(wanted)[ids[0]]
+
+
+@pytest.mark.parametrize("precision", ["float16", "int8"])
+def test_quantized_search_reranks_to_the_exact_top_k(tmp_path, precision):
+    corpus, queries = vectors(2000, dim=64), vectors(20, dim=64, seed=1)
+    exact = LocalVectorStore(str(tmp_path / "exact"), 64)
+    store = QuantizedVectorStore(str(tmp_path / "quantized"), 64, precision=precision, rerank_factor=4)
+    for target in (exact, store):
+        target.insert(corpus[:1500], [str(i) for i in range(1500)])
+        target.flush()
+        target.insert(corpus[1500:], [str(i) for i in range(1500, 2000)])  # Reranked from the in-memory tail
+
+    for expected, hits in zip(exact.search_many(queries, top_k=10), store.search_many(queries, top_k=10)):
+        assert [hit["id"] for hit in hits] == [hit["id"] for hit in expected]
+        np.testing.assert_allclose([hit["score"] for hit in hits], [hit["score"] for hit in expected], atol=1e-5)
+
+    store.flush()
+    code_bytes = 2 if precision == "float16" else 1
+    assert exact.memory_bytes() == 2000 * 64 * 4
+    assert store.memory_bytes() == 2000 * (64 * code_bytes + 4 + 8)  # Codes, a scale and a file position per row
+
+
+def test_quantized_store_opens_the_same_files_at_either_precision(tmp_path):
+    path = str(tmp_path / "index")
+    store = LocalVectorStore(path, 8)
+    ids = store.insert(vectors(50, dim=8), [f"text {i}" for i in range(50)])
+    store.flush()
+    query = vectors(1, dim=8, seed=3)[0]
+    expected = [hit["id"] for hit in store.search(query, top_k=5)]
+
+    quantized = QuantizedVectorStore(path, 8, precision="int8")
+    assert [hit["id"] for hit in quantized.search(query, top_k=5)] == expected
+    np.testing.assert_allclose(quantized.get_vectors(ids[:3])[ids[0]], store.get_vectors(ids[:3])[ids[0]])
+    with pytest.raises(ValueError, match="Unsupported precision 'int4'"):
+        QuantizedVectorStore(path, 8, precision="int4")